@@ -28,6 +28,7 @@ import threading
 from typing import Optional
 
 from . import asert_daa
+from . import metrics
 from . import networks
 from . import util
 
@@ -43,6 +44,10 @@ CHUNK_BAD = -2
 CHUNK_LACKED_PROOF = -1
 CHUNK_ACCEPTED = 0
 
+CONNECT_CHUNK_SECONDS = metrics.histogram('blockchain_connect_chunk_seconds', 'Time to check and save a chunk of headers')
+HEADERS_SAVED = metrics.counter('blockchain_chunk_headers_total', 'Headers saved from chunks')
+CHUNKS_BAD = metrics.counter('blockchain_chunks_bad_total', 'Chunks that failed verification')
+
 HEADER_SIZE = 80  # bytes
 MAX_BITS = 0x1d00ffff
 MAX_BITS_REGTEST = 0x207fffff
@@ -653,6 +658,7 @@ class Blockchain(util.PrintError):
             return False
         return True
 
+    @metrics.timed(CONNECT_CHUNK_SECONDS)
     def connect_chunk(self, base_height, hexdata, proof_was_provided=False):
         chunk = HeaderChunk(base_height, hexdata)
 
@@ -697,7 +703,9 @@ class Blockchain(util.PrintError):
             if not proof_was_provided:
                 self.verify_chunk(base_height, hexdata)
             self.save_chunk(base_height, hexdata)
+            HEADERS_SAVED.inc(header_count)
             return CHUNK_ACCEPTED
         except VerifyError as e:
             self.print_error('verify_chunk failed: {}'.format(e))
+            CHUNKS_BAD.inc()
             return CHUNK_BAD
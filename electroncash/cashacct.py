@@ -30,13 +30,16 @@ inherits from address.py's own ScriptOutput), so always import this file
 carefully if also importing address.py.
 '''
 
+import json
+import operator
+import os
 import re
 import requests
 import threading
 import queue
 import random
 import time
-from collections import defaultdict, namedtuple
+from collections import OrderedDict, defaultdict, namedtuple
 from typing import List, Tuple, Dict
 from . import bitcoin
 from . import util
@@ -816,6 +819,206 @@ class ProcessedBlock:
         return hash(tuple(l))
 
 
+class ResolveCache(util.PrintError):
+    ''' On-disk cache of verified Cash Account resolutions, shared by all the
+    wallets using the same config directory (see ResolveCache.shared()).
+
+    Entries are keyed by (lowercased name, number) and hold the Info and
+    minimal collision hash of every registration of that name in that block,
+    so that lookups of any collision prefix for it are answered from the one
+    entry. The cache also remembers the ProcessedBlock hash and status hash
+    of every block an entry came from, so that a block coming back from a
+    lookup server with different contents (a reorg or a bad server) drops
+    the entries for it.
+
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted beyond `maxlen`. Invalidation on reorg is by block height (see
+    CashAcct.undo_verifications_hook). '''
+
+    FILENAME = 'cashacct_resolve.json'
+    VERSION = 1
+    MAXLEN = 5000
+    TTL = 7 * 24 * 3600.0  # seconds
+
+    _shared = dict()  # path -> ResolveCache
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, config_path):
+        ''' Returns the ResolveCache instance for the config directory
+        `config_path`, creating it (and loading it from disk) on first use. '''
+        path = os.path.join(config_path, 'cache', cls.FILENAME)
+        with cls._shared_lock:
+            inst = cls._shared.get(path)
+            if inst is None:
+                inst = cls._shared[path] = cls(path)
+                inst.load()
+            return inst
+
+    def __init__(self, path=None, *, maxlen=MAXLEN, ttl=TTL):
+        ''' path=None makes a memory-only cache. '''
+        self.path = path
+        self.maxlen = maxlen
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (lname, number) -> (time, [(Info, minimal_chash), ...]); LRU order
+        self.blocks = dict()  # height -> (block_hash, status_hash)
+        self.dirty = False
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0, 'invalidated': 0}
+
+    def diagnostic_name(self):
+        return __class__.__name__
+
+    def get(self, name, number, collision_prefix=None) -> List[Tuple[Info, str]]:
+        ''' Returns the list of (Info, minimal_chash) cached for name#number,
+        narrowed down to `collision_prefix` if specified. Returns None on a
+        cache miss. '''
+        key = (name.lower(), number)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry[0] > self.ttl:
+                self._drop(key)
+                self.stats['expired'] += 1
+                entry = None
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            results = entry[1]
+        return [(info, min_chash) for info, min_chash in results
+                if not collision_prefix or info.collision_hash.startswith(collision_prefix)]
+
+    def get_minimal_chash(self, name, number, collision_hash) -> str:
+        ''' Returns the cached minimal collision hash for the given
+        registration, or None. Does not count as a hit or a miss. '''
+        with self.lock:
+            entry = self.entries.get((name.lower(), number))
+            if entry is None or time.time() - entry[0] > self.ttl:
+                return None
+            for info, min_chash in entry[1]:
+                if info.collision_hash == collision_hash:
+                    return min_chash
+
+    def put(self, name, number, results, pb=None):
+        ''' Caches `results`, the list of (Info, minimal_chash) for every
+        verified registration of name#number, optionally along with the
+        ProcessedBlock they came from. '''
+        if not all(isinstance(info.address, Address) for info, _ in results):
+            return  # we only know how to save these
+        key = (name.lower(), number)
+        with self.lock:
+            if pb is not None and pb.hash and pb.status_hash:
+                self.check_block(pb, _locked=True)
+                self.blocks[pb.height] = (pb.hash, pb.status_hash)
+            self.entries[key] = (time.time(), list(results))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxlen:
+                self._drop(next(iter(self.entries)))
+                self.stats['evicted'] += 1
+            self.dirty = True
+
+    def check_block(self, pb, *, _locked=False) -> bool:
+        ''' Compares `pb`, a freshly processed block, to what we last saw at
+        its height. If it differs, drops the entries for that block and
+        returns False. '''
+        if not pb.status_hash:
+            return True
+        if not _locked:
+            with self.lock:
+                return self.check_block(pb, _locked=True)
+        known = self.blocks.get(pb.height)
+        if known is None or known == (pb.hash, pb.status_hash):
+            return True
+        self.print_error(f"block at height {pb.height} changed, dropping its entries")
+        self._invalidate(lambda height: height == pb.height)
+        return False
+
+    def invalidate_from_height(self, height):
+        ''' Drops everything at or above block `height` (chain reorg). '''
+        with self.lock:
+            self._invalidate(lambda h: h >= height)
+
+    def _invalidate(self, pred):
+        number_pred = lambda number: pred(num2bh(number))
+        for key in [key for key in self.entries if number_pred(key[1])]:
+            self._drop(key)
+            self.stats['invalidated'] += 1
+        for height in [height for height in self.blocks if pred(height)]:
+            del self.blocks[height]
+            self.dirty = True
+
+    def _drop(self, key):
+        del self.entries[key]
+        self.dirty = True
+
+    def get_block_hash(self, height) -> str:
+        with self.lock:
+            return (self.blocks.get(height) or (None,))[0]
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return dict(self.stats, entries=len(self.entries), blocks=len(self.blocks))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.blocks.clear()
+            self.dirty = True
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                d = json.load(f)
+            if d.get('version') != self.VERSION:
+                return
+            now = time.time()
+            entries, blocks = OrderedDict(), dict()
+            for lname, number, t, results in d.get('entries', []):
+                if now - t > self.ttl:
+                    continue
+                entries[(lname, number)] = (t, [(Info(name, Address.from_string(addr), number, chash, emoji, txid),
+                                                 min_chash)
+                                                for name, addr, chash, emoji, txid, min_chash in results])
+            for height, block_hash, status_hash in d.get('blocks', []):
+                blocks[height] = (block_hash, status_hash)
+        except Exception as e:
+            self.print_error(f"failed to load {self.path}:", repr(e))
+            return
+        with self.lock:
+            self.entries, self.blocks = entries, blocks
+            while len(self.entries) > self.maxlen:
+                self.entries.popitem(last=False)
+            self.dirty = False
+
+    def save(self):
+        ''' Writes the cache to disk, if it changed since the last save. '''
+        if not self.path:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            d = {
+                'version': self.VERSION,
+                'entries': [[lname, number, t, [[info.name, info.address.to_storage_string(), info.collision_hash,
+                                                 info.emoji, info.txid, min_chash]
+                                                for info, min_chash in results]]
+                            for (lname, number), (t, results) in self.entries.items()],
+                'blocks': [[height, *tup] for height, tup in self.blocks.items()],
+            }
+            self.dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(d, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            self.print_error(f"failed to save {self.path}:", repr(e))
+
+
 class CashAcct(util.PrintError, verifier.SPVDelegate):
     ''' Class implementing cash account subsystem such as verification, etc. '''
 
@@ -830,6 +1033,7 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
         self.wallet = wallet
         self.network = None
         self.verifier = None
+        self.resolve_cache = None  # shared ResolveCache, set up in start()
         self.lock = threading.Lock()  # note, this lock is subordinate to wallet.lock and should always be taken AFTER wallet.lock and never before
 
         self._init_data()
@@ -841,7 +1045,7 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
         self.wallet_reg_tx = dict() # dict of txid -> RegTx
         self.ext_reg_tx = dict() # dict of txid -> RegTx
 
-        self.v_tx = dict() # dict of txid -> VerifTx
+        self.v_tx = util.HeightIndexedDict(operator.attrgetter('block_height')) # dict of txid -> VerifTx
         self.v_by_addr = defaultdict(set) # dict of addr -> set of txid
         self.v_by_name = defaultdict(set) # dict of lowercased name -> set of txid
 
@@ -863,6 +1067,7 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
         if not self.network:
             assert not self.verifier
             self.network = network
+            self.resolve_cache = ResolveCache.shared(network.config.path)
             # our own private verifier, we give it work via the delegate methods
             self.verifier = verifier.SPV(self.network, self)
             self.network.add_jobs([self.verifier])
@@ -876,6 +1081,7 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
             self.verifier.release()
             self.verifier = None
             self.network = None
+            self.resolve_cache.save()
 
     def fmt_info(self, info : Info, minimal_chash: str = None, emoji=False) -> str:
         ''' Given an Info object, returns a string of the form:
@@ -961,10 +1167,11 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
         form: name#number[.123], will verify the block it is on and do other
         magic. It will return a list of tuple of (Info, minimal_chash).
 
-        This goes out to the network each time, so use it in GUI code that
-        really needs to know verified CashAccount tx's (eg before sending funds),
-        but not in advisory GUI code, since it can be slow (on the order of less
-        than a second to several seconds depending on network speed).
+        Results are kept in the shared on-disk resolve_cache, otherwise this
+        goes out to the network, so use it in GUI code that really needs to
+        know verified CashAccount tx's (eg before sending funds), but not in
+        advisory GUI code, since it can be slow (on the order of less than a
+        second to several seconds depending on network speed).
 
         timeout is a timeout in seconds. If timer expires None is returned.
 
@@ -977,6 +1184,9 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
             return
         name, number, chash = tup
         specified_chash = chash or ''
+        cached = self._get_cached_resolution(name, number, specified_chash)
+        if cached is not None:
+            return cached or None
         done = threading.Event()
         pb = None
         def done_cb(thing):
@@ -1002,19 +1212,38 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
 
         d = self._calc_minimal_chashes_for_sorted_lcased_tups(sorted(t[1:] for t in matches))
 
-        ret = []
+        results = []
         empty_dict = dict()
         for txid, lname, chash in matches:
             min_chash = d.get(lname, empty_dict).get(chash, None)
             if min_chash is None:
                 self.print_error(f"resolve_verify: WARNING! Internal Error! Did not find calculated minimal chash for {lname}.{chash}. FIXME!")
                 min_chash = chash
-            rtx = pb.reg_txs[txid]
-            if rtx.script.collision_hash.startswith(specified_chash):
-                info = Info.from_regtx(rtx)
-                ret.append((info, min_chash))
+            results.append((Info.from_regtx(pb.reg_txs[txid]), min_chash))
+        if self.resolve_cache:
+            self.resolve_cache.put(name, number, results, pb)
+        ret = [(info, min_chash) for info, min_chash in results if info.collision_hash.startswith(specified_chash)]
         return ret or None
 
+    def _get_cached_resolution(self, name, number, collision_prefix) -> List[Tuple[Info, str]]:
+        ''' Returns the resolve_cache results for name#number.collision_prefix,
+        or None on a cache miss. Entries whose block no longer matches our
+        chain's header at that height are dropped. '''
+        cache, network = self.resolve_cache, self.network
+        if not cache:
+            return None
+        ret = cache.get(name, number, collision_prefix)
+        if ret is None or not network:
+            return ret
+        height = num2bh(number)
+        block_hash = cache.get_block_hash(height)
+        header = network.blockchain().read_header(height)
+        if header and block_hash != blockchain.hash_header(header):
+            self.print_error(f"resolve_cache: block {height} is not on our chain, dropping cached entries")
+            cache.invalidate_from_height(height)
+            return None
+        return ret
+
 
     def get_minimal_chash(self, name, number, collision_hash, *,
                           success_cb = None, skip_caches = False, only_cached = False) -> str:
@@ -1043,6 +1272,10 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
         if not skip_caches:
             with self.lock:
                 found = self.minimal_ch_cache.get(key)
+                if found is None and self.resolve_cache:
+                    found = self.resolve_cache.get_minimal_chash(name, number, collision_hash)
+                    if found is not None:
+                        self.minimal_ch_cache.put(key, found)
                 if found is None:
                     # See if we have the block cached
                     pb_cached = self.processed_blocks.get(num2bh(number))
@@ -1236,6 +1469,9 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
 
         self.wallet.storage.put('cash_accounts_data', data)
 
+        if self.resolve_cache:
+            self.resolve_cache.save()
+
         if write:
             self.wallet.storage.write()
 
@@ -1284,6 +1520,26 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
             if txid not in self.v_tx:
                 self.ext_unverif[txid] = num2bh(script.number)
 
+    def add_ext_txs(self, regtxs) -> int:
+        ''' Like add_ext_tx() above, but for an iterable of RegTx, added under
+        a single acquisition of the lock. The verifier still requests their
+        proofs one tx at a time, as usual. Returns the number of tx's that
+        were new to us. '''
+        regtxs = list(regtxs)
+        for rtx in regtxs:
+            if not isinstance(rtx.script, ScriptOutput) or not rtx.script.is_complete():
+                raise ArgumentError("Please pass only 'is_complete' scripts to add_ext_txs")
+        ctr = 0
+        with self.lock:
+            for txid, script in regtxs:
+                if txid in self.wallet_reg_tx or txid in self.ext_reg_tx:
+                    continue
+                ctr += 1
+                self.ext_reg_tx[txid] = self.RegTx(txid, script)
+                if txid not in self.v_tx:
+                    self.ext_unverif[txid] = num2bh(script.number)
+        return ctr
+
     def has_tx(self, txid: str) -> bool:
         ''' Returns true if we know about a complete tx, whether verified or not. '''
         with self.lock:
@@ -1412,6 +1668,8 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
                     verify_txs = True
             # finally, inform interested GUI code about the invalidations so that
             # it may re-enqueue some refreshes of the minimal collision hashes
+            if self.resolve_cache:
+                self.resolve_cache.check_block(pb)
             for info, long_chash in minimal_ch_removed:
                 if debug:
                     self.print_error("triggering ca_updated_minimal_chash for", info, long_chash)
@@ -1740,6 +1998,10 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
         its verifier. We need to be told what set of tx_hash was undone. '''
         if not txs: return
         with self.lock:
+            heights = [self.v_tx[txid].block_height for txid in txs if txid in self.v_tx]
+            if heights and self.resolve_cache:
+                # The shared cache outlives this wallet, so be precise about what goes
+                self.resolve_cache.invalidate_from_height(min(heights))
             for txid in txs:
                 self._rm_vtx(txid)  # this is safe as a no-op if txid was not relevant
                 self._find_script(txid, False, giveto='w')
@@ -1846,16 +2108,18 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
         verifications when a reorg has happened. Returns a set of tx_hash. '''
         txs = set()
         with self.lock:
-            for txid, vtx in self.v_tx.copy().items():
+            for txid in self.v_tx.keys_from_height(height):
                 if txid in self.wallet_reg_tx:
                     # wallet verifier will take care of this one
                     continue
-                if vtx.block_height >= height:
-                    header = bchain.read_header(vtx.block_height)
-                    if not header or vtx.block_hash != blockchain.hash_header(header):
-                        self._rm_vtx(txid)
-                        self.ext_unverif[txid] = vtx.block_height  # re-enqueue for verification with private verifier...? TODO: how to detect tx's dropped out of new chain?
-                        txs.add(txid)
+                vtx = self.v_tx[txid]
+                header = bchain.read_header(vtx.block_height)
+                if not header or vtx.block_hash != blockchain.hash_header(header):
+                    self._rm_vtx(txid)
+                    self.ext_unverif[txid] = vtx.block_height  # re-enqueue for verification with private verifier...? TODO: how to detect tx's dropped out of new chain?
+                    txs.add(txid)
+            if txs and self.resolve_cache:
+                self.resolve_cache.invalidate_from_height(height)
         return txs
 
     def verification_failed(self, tx_hash, reason):
@@ -1896,67 +2160,212 @@ class CashAcct(util.PrintError, verifier.SPVDelegate):
     ###############################################
 
     def scan_servers_for_registrations(self, start=100, stop=None, progress_cb=None, error_cb=None, timeout=timeout,
-                                       add_only_mine=True, debug=debug):
-        ''' This is slow and not particularly useful.  Will maybe delete this
-        code soon. I used it for testing to populate wallet.
+                                       add_only_mine=True, debug=debug, *, window=None,
+                                       resume=True):
+        ''' Scans the lookup servers for registrations in block numbers
+        [start, stop) (stop defaults to the chain tip), adding those found (to
+        our address only, if add_only_mine) and having them verified. See
+        RegistrationScanner for details and the meaning of `window` (block numbers
+        looked up concurrently) and `resume`.
 
         progress_cb is called with (progress : float, num_added : int, number : int) as args!
         error_cb is called with no arguments to indicate failure.
 
         Upon completion, either progress_cb(1.0 ..) will be called to indicate
         successful completion of the task.  Or, error_cb() will be called to
-        indicate error abort (usually due to timeout).
+        indicate error abort.
 
         Returned object can be used to stop the process.  obj.stop() is the
         method.
         '''
         if not self.network:
             return
-        cancel_evt = threading.Event()
-        stop = num2bh(stop) if stop is not None else stop
-        start = num2bh(max(start or 0, 100))
-        def stop_height():
-            return stop or self.wallet.get_local_height()+1
-        def progress(h, added):
-            if progress_cb:
-                progress_cb(max((h-start)/(stop_height() - start), 0.0), added, bh2num(h))
-        def thread_func():
-            q = queue.Queue()
-            h = start
-            added = 0
-            while self.network and not cancel_evt.is_set() and h < stop_height():
-                num = bh2num(h)
-                lookup_asynch_all(number=num,
-                                  success_cb = lambda res,server: q.put(res),
-                                  error_cb = q.put,
-                                  timeout=timeout, debug=debug)
-                try:
-                    thing = q.get(timeout=timeout)
-                    if isinstance(thing, Exception):
-                        e = thing
-                        if debug:
-                            self.print_error(f"Height {h} got exception in lookup: {repr(e)}")
-                    elif isinstance(thing, tuple):
-                        block_hash, res = thing
-                        for rtx in res:
-                            if rtx.txid not in self.wallet_reg_tx and rtx.txid not in self.ext_reg_tx and (not add_only_mine or self.wallet.is_mine(rtx.script.address)):
-                                self.add_ext_tx(rtx.txid, rtx.script)
-                                added += 1
-                    progress(h, added)
-                except queue.Empty:
-                    self.print_error("Could not complete request, timed out!")
-                    if error_cb:
-                        error_cb()
+        scanner = RegistrationScanner(self, start, stop, window=window, progress_cb=progress_cb, error_cb=error_cb,
+                                      timeout=timeout, add_only_mine=add_only_mine, resume=resume, debug=debug)
+        scanner.start()
+        return scanner
+
+
+class RegistrationScanner(util.PrintError):
+    ''' Scans the lookup servers for the registrations in a range of block
+    numbers [start, stop), `window` block numbers at a time, each one being
+    asked of a different server (falling back to the others on failure).
+
+    Registrations are deduplicated by txid and are handed to
+    CashAcct.add_ext_txs in batches. Progress (the lowest block number below which every
+    block has been scanned) is checkpointed to wallet storage, so that a
+    later scan of the same range resumes where this one left off.
+
+    Note a block with no registrations looks just like a lookup failure to us
+    (the lookup servers return an error for those), so failed blocks are
+    skipped rather than aborting the scan. '''
+
+    WINDOW = 8  # default number of block numbers looked up concurrently
+    CHECKPOINT_KEY = 'cash_accounts_scan_checkpoint'
+    CHECKPOINT_INTERVAL = 50  # save the checkpoint every this many blocks
+    BATCH_SIZE = 50  # hand registrations to the verifier at least this often
+
+    def __init__(self, cashacct, start=100, stop=None, *, window=None, server_list=None, progress_cb=None,
+                 error_cb=None, timeout=timeout, add_only_mine=True, resume=True, debug=debug):
+        self.cashacct = cashacct
+        self.wallet = cashacct.wallet
+        self.start_number = max(start or 0, 100)
+        self.stop_number = stop
+        self.window = max(1, int(window or self.WINDOW))
+        self.servers = list(server_list or servers)
+        assert self.servers, "No servers hard-coded in cashacct.py. FIXME!"
+        random.shuffle(self.servers)
+        self.progress_cb = progress_cb
+        self.error_cb = error_cb
+        self.timeout = timeout
+        self.add_only_mine = add_only_mine
+        self.debug = debug
+        self.cancel_evt = threading.Event()
+        self.thread = None
+
+        self.cond = threading.Condition()
+        self.next_number = self.start_number  # next block number to hand to a worker
+        self.frontier = self.start_number  # all block numbers below this are done
+        self.done = set()  # block numbers >= frontier that are done
+        self.failed = []  # block numbers where every server failed
+        self.seen = set()  # txids already handled
+        self.pending = []  # RegTx's not yet given to cashacct
+        self.num_added = 0
+        self.last_checkpoint = self.start_number
+        if resume:
+            cp = self.wallet.storage.get(self.CHECKPOINT_KEY)
+            if (isinstance(cp, dict) and cp.get('start') == self.start_number and cp.get('stop') == self.stop_number
+                    and isinstance(cp.get('next'), int) and cp['next'] > self.start_number):
+                self.print_error(f"resuming scan at number {cp['next']}")
+                self.next_number = self.frontier = self.last_checkpoint = cp['next']
+
+    def diagnostic_name(self):
+        return f'{self.cashacct.diagnostic_name()}.{__class__.__name__}'
+
+    def get_stop_number(self) -> int:
+        if self.stop_number is not None:
+            return self.stop_number
+        return bh2num(self.wallet.get_local_height() + 1)
+
+    def start(self):
+        self.thread = threading.Thread(name=self.diagnostic_name(), daemon=True, target=self.run)
+        self.thread.start()
+
+    def is_alive(self):
+        return bool(self.thread and self.thread.is_alive())
+
+    def stop(self):
+        self.cancel_evt.set()
+        with self.cond:
+            self.cond.notify_all()
+        if self.is_alive() and threading.current_thread() is not self.thread:
+            self.thread.join()
+
+    def run(self):
+        ''' Does the whole scan in the calling thread, using `window` worker
+        threads. Returns True on successful completion. '''
+        try:
+            workers = [threading.Thread(name=f"{self.diagnostic_name()} worker {i}", daemon=True, target=self._worker)
+                       for i in range(self.window)]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+            self._flush()
+            if self.cancel_evt.is_set():
+                return False
+            self._checkpoint(force=True)
+            if self.failed:
+                self.print_error(f"{len(self.failed)} block numbers could not be looked up"
+                                 " (this is normal for blocks without registrations)")
+            self._progress()
+            return True
+        except Exception as e:
+            self.print_error("scan failed:", repr(e))
+            if self.error_cb:
+                self.error_cb()
+            return False
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                # Don't get more than a few windows ahead of the slowest lookup
+                while (not self.cancel_evt.is_set() and self.next_number < self.get_stop_number()
+                       and self.next_number >= self.frontier + 4 * self.window):
+                    self.cond.wait(1.0)
+                if self.cancel_evt.is_set() or self.next_number >= self.get_stop_number():
                     return
-                h += 1
-            progress(h, added)
-        t = threading.Thread(daemon=True, target=thread_func)
-        t.start()
-        class ScanStopper(namedtuple("ScanStopper", "thread, event")):
-            def is_alive(self):
-                return self.thread.is_alive()
-            def stop(self):
-                if self.is_alive():
-                    self.event.set()
-                    self.thread.join()
-        return ScanStopper(t, cancel_evt)
+                number = self.next_number
+                self.next_number += 1
+            res = self._lookup(number)
+            self._on_result(number, res)
+
+    def _lookup(self, number):
+        ''' Returns the list of RegTx for `number`, or None if no server could
+        provide it. Start with a different server for each number to spread
+        the load. '''
+        n = len(self.servers)
+        exc = []
+        for i in range(n):
+            if self.cancel_evt.is_set():
+                return
+            server = self.servers[(number + i) % n]
+            res = lookup(server, number, timeout=self.timeout, exc=exc, debug=self.debug)
+            if res is not None:
+                return res[1]
+        if self.debug:
+            self.print_error(f"number {number}: all servers failed, last error: {exc and repr(exc[-1])}")
+
+    def _on_result(self, number, regtxs):
+        is_mine = self.wallet.is_mine
+        with self.cond:
+            if regtxs is None:
+                self.failed.append(number)
+            for rtx in regtxs or ():
+                if rtx.txid in self.seen:
+                    continue  # dupe: we already have it from another server
+                self.seen.add(rtx.txid)
+                if not self.add_only_mine or is_mine(rtx.script.address):
+                    self.pending.append(rtx)
+            self.done.add(number)
+            advanced = False
+            while self.frontier in self.done:
+                self.done.discard(self.frontier)
+                self.frontier += 1
+                advanced = True
+            if advanced:
+                self.cond.notify_all()
+            flush = len(self.pending) >= self.BATCH_SIZE or (advanced and self.pending)
+        if flush:
+            self._flush()
+        if advanced:
+            self._checkpoint()
+            self._progress()
+
+    def _flush(self):
+        with self.cond:
+            pending, self.pending = self.pending, []
+        if pending:
+            ctr = self.cashacct.add_ext_txs(pending)
+            with self.cond:
+                self.num_added += ctr
+
+    def _checkpoint(self, force=False):
+        with self.cond:
+            frontier = self.frontier
+            if not force and frontier - self.last_checkpoint < self.CHECKPOINT_INTERVAL:
+                return
+            self.last_checkpoint = frontier
+        # Only blocks whose registrations were already handed to cashacct get checkpointed
+        self._flush()
+        self.wallet.storage.put(self.CHECKPOINT_KEY, {'start': self.start_number, 'stop': self.stop_number,
+                                                       'next': frontier})
+
+    def _progress(self):
+        if not self.progress_cb:
+            return
+        with self.cond:
+            frontier, added = self.frontier, self.num_added
+        span = self.get_stop_number() - self.start_number
+        progress = min(max((frontier - self.start_number) / span, 0.0), 1.0) if span > 0 else 1.0
+        self.progress_cb(progress, added, frontier)
@@ -37,6 +37,7 @@ from decimal import Decimal as PyDecimal  # Qt 5.12 also exports Decimal
 from functools import wraps
 
 from . import bitcoin
+from . import metrics
 from . import rpa
 from . import util
 from .address import Address, AddressError
@@ -48,6 +49,7 @@ from .transaction import Transaction, multisig_script, OPReturn
 from .util import bfh, bh2u, format_satoshis, json_decode, print_error, standardize_path, to_bytes
 from .paymentrequest import PR_PAID, PR_UNCONFIRMED, PR_UNPAID, PR_UNKNOWN, PR_EXPIRED
 from .simple_config import SimpleConfig
+from .token_index import CAPABILITY_NAMES
 from .version import PACKAGE_VERSION
 
 known_commands = {}
@@ -68,6 +70,19 @@ def assertOutpoint(out: str):
     assert len(prevout_hash) == 32, f"{prevout_hash.hex()} should be a 32-byte hash"
     assert int(prevout_n) >= 0, f"invalid output index {prevout_n}"
 
+# Commands that only read wallet state. The daemon runs these concurrently with
+# any other command on the same wallet; all other wallet commands are run one
+# at a time per wallet.
+concurrent_commands = frozenset([
+    'addressconvert', 'commands', 'deserialize', 'get', 'getaddressbalance', 'getaddressbalances',
+    'getaddressesunspent', 'getaddresshistories', 'getaddresshistory', 'getaddressunspent', 'getalias',
+    'getbalance', 'getconfig', 'getfeerate', 'getinfo', 'getlockstats', 'getmerkle', 'getmetrics', 'getmpk',
+    'getpubkeys', 'getrequest', 'getservers', 'gettokenbalances', 'gettransaction', 'getwebhooks', 'help',
+    'history', 'is_synchronized', 'ismine', 'list_wallets', 'listaddresses', 'listcontacts', 'listrequests',
+    'listtokens', 'listunspent', 'searchcontacts', 'serialize', 'validateaddress', 'verifymessage',
+    'version',
+])
+
 class Command:
     def __init__(self, func, s):
         self.name = func.__name__
@@ -500,6 +515,41 @@ class Commands:
             out["unmatured"] = str(PyDecimal(x)/COIN)
         return out
 
+    @command('w')
+    def gettokenbalances(self):
+        """Return the CashToken balances of your wallet, by token category.
+        For each category: the fungible amount and the number of NFTs held
+        (in total and by capability). """
+        return self.wallet.get_token_balances()
+
+    @command('w')
+    def listtokens(self, category=None, capability=None):
+        """List the CashToken-bearing unspent outputs in your wallet. Results
+        may be restricted to one token category and/or to the NFTs having a
+        given capability. """
+        cap = None
+        if capability is not None:
+            caps = {name: cap for cap, name in CAPABILITY_NAMES.items()}
+            if capability not in caps:
+                raise ValueError('capability must be one of: ' + ', '.join(caps))
+            cap = caps[capability]
+        out = []
+        for x in self.wallet.get_token_utxos(category, cap):
+            td = x['token_data']
+            out.append({
+                'prevout_hash': x['prevout_hash'],
+                'prevout_n': x['prevout_n'],
+                'address': x['address'].to_ui_string(),
+                'value': str(PyDecimal(x['value'])/COIN),
+                'height': x['height'],
+                'category': td.id_hex,
+                'amount': td.amount,
+                'nft': {'capability': CAPABILITY_NAMES[td.get_capability()],
+                        'commitment': td.commitment.hex()} if td.has_nft() else None,
+            })
+        out.sort(key=lambda d: (d['category'], d['prevout_hash'], d['prevout_n']))
+        return out
+
     @command('n')
     def getaddressbalance(self, address):
         """Return the balance of any address. Note: This is a walletless
@@ -511,6 +561,82 @@ class Commands:
         out["unconfirmed"] =  str(PyDecimal(out["unconfirmed"])/COIN)
         return out
 
+    def _query_addresses(self, addresses, method, local_query):
+        """Answers `method` for each of `addresses`: from the wallet, with
+        local_query(Address), for the wallet's own addresses if it is
+        synchronized, and from the server for the rest. Those are all sent
+        at once, rather than one round trip per address. Returns a dict of
+        address string -> result, or -> {'error': message} for addresses the
+        server failed to answer."""
+        if isinstance(addresses, str):
+            addresses = (json.loads(addresses) if addresses.lstrip().startswith('[')
+                         else addresses.replace(',', ' ').split())
+        addresses = list(dict.fromkeys(addresses))
+        parsed = {a: Address.from_string(a) for a in addresses}
+        out = dict()
+        remote = []
+        wallet = self.wallet
+        use_wallet = wallet is not None and wallet.is_up_to_date()
+        for a, addr in parsed.items():
+            if use_wallet and wallet.is_mine(addr):
+                out[a] = local_query(addr)
+            else:
+                remote.append(a)
+        results = self.network.synchronous_get_many([(method, [parsed[a].to_scripthash_hex()]) for a in remote])
+        for a, res in zip(remote, results):
+            out[a] = {'error': str(res)} if isinstance(res, Exception) else res
+        return {a: out[a] for a in addresses}
+
+    @command('n')
+    def getaddressbalances(self, addresses):
+        """Return the balances of many addresses. The wallet's own addresses
+        are answered from the wallet, the others by the server. Note: results
+        from the server are not checked by SPV.
+        """
+        def local_balance(addr):
+            c, u, x = self.wallet.get_addr_balance(addr)
+            return {'confirmed': c + x, 'unconfirmed': u}
+        out = self._query_addresses(addresses, 'blockchain.scripthash.get_balance', local_balance)
+        for res in out.values():
+            if 'error' not in res:
+                res['confirmed'] = str(PyDecimal(res['confirmed'])/COIN)
+                res['unconfirmed'] = str(PyDecimal(res['unconfirmed'])/COIN)
+        return out
+
+    @command('n')
+    def getaddresshistories(self, addresses):
+        """Return the transaction histories of many addresses. The wallet's
+        own addresses are answered from the wallet, the others by the server.
+        Note: results from the server are not checked by SPV.
+        """
+        def local_history(addr):
+            return [{'tx_hash': tx_hash, 'height': height}
+                    for tx_hash, height in self.wallet.get_address_history(addr)]
+        return self._query_addresses(addresses, 'blockchain.scripthash.get_history', local_history)
+
+    @command('n')
+    def getaddressesunspent(self, addresses):
+        """Return the UTXO lists of many addresses. The wallet's own addresses
+        are answered from the wallet, the others by the server. Note: results
+        from the server are not checked by SPV.
+        """
+        def local_unspent(addr):
+            out = []
+            for x in self.wallet.get_addr_utxo(addr).values():
+                d = {'tx_hash': x['prevout_hash'], 'tx_pos': x['prevout_n'], 'height': x['height'],
+                     'value': x['value']}
+                td = x['token_data']
+                if td:
+                    # Same format as the server's
+                    d['token_data'] = {'category': td.id_hex, 'amount': str(td.amount)}
+                    if td.has_nft():
+                        d['token_data']['nft'] = {'capability': CAPABILITY_NAMES[td.get_capability()],
+                                                  'commitment': td.commitment.hex()}
+                out.append(d)
+            out.sort(key=lambda d: (d['height'] <= 0, d['height'], d['tx_hash'], d['tx_pos']))
+            return out
+        return self._query_addresses(addresses, 'blockchain.scripthash.listunspent', local_unspent)
+
     @command('n')
     def getmerkle(self, txid, height):
         """Get Merkle branch of a transaction included in a block. Electron Cash
@@ -834,9 +960,8 @@ class Commands:
     #    pass
 
     @command('w')
-    def listrequests(self, pending=False, expired=False, paid=False):
+    def listrequests(self, pending=False, expired=False, paid=False, offset=0, limit=None):
         """List the payment requests you made."""
-        out = self.wallet.get_sorted_requests(self.config)
         if pending:
             f = PR_UNPAID
         elif expired:
@@ -845,8 +970,8 @@ class Commands:
             f = PR_PAID
         else:
             f = None
-        if f is not None:
-            out = list(filter(lambda x: x.get('status')==f, out))
+        out = self.wallet.get_requests(self.config, status=f, offset=int(offset or 0),
+                                       limit=None if limit is None else int(limit))
         return list(map(self._format_request, out))
 
     @command('w')
@@ -860,21 +985,27 @@ class Commands:
         An address is considered as used if it has received a transaction, or if it is used in a payment request."""
         return self.wallet.get_unused_address().to_ui_string()
 
-    @command('w')
-    def addrequest(self, amount, memo='', expiration=None, force=False, payment_url=None, index_url=None):
-        """Create a payment request, using the first unused address of the wallet.
-        The address will be condidered as used after this operation.
-        If no payment is received, the address will be considered as unused if the payment request is deleted from the wallet."""
+    def _get_request_address(self, force, save=True):
         addr = self.wallet.get_unused_address()
         if addr is None:
             if not self.wallet.is_deterministic():
                 self.wallet.print_error("Unable to find an unused address. Please use a deteministic wallet to proceed, then run with the --force option to create new addresses.")
-                return False
+                return None
             if force:
-                addr = self.wallet.create_new_address(False)
+                addr = self.wallet.create_new_address(False, save=save)
             else:
                 self.wallet.print_error("Unable to find an unused address. Try running with the --force option to create new addresses.")
-                return False
+                return None
+        return addr
+
+    @command('w')
+    def addrequest(self, amount, memo='', expiration=None, force=False, payment_url=None, index_url=None):
+        """Create a payment request, using the first unused address of the wallet.
+        The address will be condidered as used after this operation.
+        If no payment is received, the address will be considered as unused if the payment request is deleted from the wallet."""
+        addr = self._get_request_address(force)
+        if addr is None:
+            return False
         amount = satoshis(amount)
         expiration = int(expiration) if expiration else None
         req = self.wallet.make_payment_request(addr, amount, memo, expiration, payment_url = payment_url, index_url = index_url)
@@ -882,6 +1013,36 @@ class Commands:
         out = self.wallet.get_payment_request(addr, self.config)
         return self._format_request(out)
 
+    @command('w')
+    def addrequests(self, count, amount, memo='', expiration=None, force=False, payment_url=None, index_url=None):
+        """Create `count` payment requests, like addrequest, each on its own
+        unused address. The wallet file is written once at the end, rather
+        than once per request. If the wallet runs out of unused addresses,
+        fewer requests are returned."""
+        count = int(count)
+        if count < 1:
+            raise ValueError('count must be positive')
+        amount = satoshis(amount)
+        expiration = int(expiration) if expiration else None
+        addrs = []
+        with self.wallet.lock:
+            try:
+                for _ in range(count):
+                    addr = self._get_request_address(force, save=False)
+                    if addr is None:
+                        break
+                    req = self.wallet.make_payment_request(addr, amount, memo, expiration,
+                                                           payment_url=payment_url, index_url=index_url)
+                    self.wallet.add_payment_request(req, self.config, save=False)
+                    addrs.append(addr)
+            finally:
+                if force and self.wallet.is_deterministic():
+                    self.wallet.save_addresses()
+                self.wallet.save_payment_requests()
+        if not addrs:
+            return False
+        return [self._format_request(self.wallet.get_payment_request(addr, self.config)) for addr in addrs]
+
     @command('wp')
     def signrequest(self, address, password=None):
         "Sign payment request with an OpenAlias"
@@ -905,24 +1066,53 @@ class Commands:
         for k in list(self.wallet.receive_requests.keys()):
             self.wallet.remove_payment_request(k, self.config)
 
+    def _get_webhooks(self):
+        webhooks = self.daemon and getattr(self.daemon, 'webhooks', None)
+        if not webhooks:
+            raise RuntimeError('Webhooks need the daemon to be running and online')
+        return webhooks
+
     @command('n')
     def notify(self, address, URL):
-        """Watch an address. Everytime the address changes, a http POST is sent to the URL."""
-        def callback(x):
-            import urllib.request
-            headers = {'content-type':'application/json'}
-            data = {'address':address, 'status':x.get('result')}
-            serialized_data = util.to_bytes(json.dumps(data))
-            try:
-                req = urllib.request.Request(URL, serialized_data, headers)
-                response_stream = urllib.request.urlopen(req, timeout=5)
-                util.print_error('Got Response for %s' % address)
-            except BaseException as e:
-                util.print_error(str(e))
-        h = Address.from_string(address).to_scripthash_hex()
-        self.network.send([('blockchain.scripthash.subscribe', [h])], callback)
+        """Watch an address. Everytime the address changes, a http POST is sent to the URL.
+        Watched addresses are remembered across daemon restarts. Use unnotify to stop."""
+        self._get_webhooks().subscribe(Address.from_string(address), URL, address)
         return True
 
+    @command('n')
+    def unnotify(self, address, URL=None):
+        """Stop watching an address for the URL given, or for all URLs"""
+        return self._get_webhooks().unsubscribe(Address.from_string(address), URL)
+
+    @command('n')
+    def getwebhooks(self):
+        """Watched addresses and their URLs, and webhook delivery statistics"""
+        webhooks = self._get_webhooks()
+        return {'subscriptions': webhooks.get_subscriptions(), 'stats': webhooks.get_stats()}
+
+    @command('')
+    def getlockstats(self):
+        """How long threads waited for and held the wallet and network locks,
+        in total and per call site, since startup. For diagnosing lock
+        contention. Only available if the daemon was started with the
+        'lock_stats' config key set."""
+        if not util.instrument_locks:
+            raise BaseException("Lock statistics are off. Use 'electron-cash setconfig lock_stats true' "
+                                "and restart the daemon")
+        locks = []
+        if self.wallet:
+            locks.append(self.wallet.lock)
+        if self.network:
+            locks += [self.network.lock, self.network.interface_lock]
+        return {lock.name: lock.get_stats() for lock in locks if isinstance(lock, util.InstrumentedRLock)}
+
+    @command('')
+    def getmetrics(self):
+        """Request counts, latencies and other counters of the network,
+        verifier and wallet code since startup. Only collected if the daemon
+        was started with the 'metrics' or 'metrics_port' config key set."""
+        return metrics.registry.to_dict()
+
     @command('wn')
     def is_synchronized(self):
         """ return wallet synchronization status """
@@ -955,13 +1145,17 @@ param_descriptions = {
     'encrypted': 'Encrypted message',
     'amount': 'Amount to be sent (in BCH). Type \'!\' to send the maximum available.',
     'requested_amount': 'Requested amount (in BCH).',
+    'count': 'Number of requests to create',
     'outputs': 'list of ["address", amount]',
+    'addresses': 'List of Bitcoin Cash addresses (JSON list, or separated by commas or spaces)',
     'redeem_script': 'redeem script (hexadecimal)',
 }
 
 command_options = {
     'addtransaction': (None, 'Whether transaction is to be used for broadcasting afterwards. Adds transaction to the wallet'),
     'balance':     ("-b", "Show the balances of listed addresses"),
+    'capability':  (None, "Show only NFTs with this capability: none, mutable or minting"),
+    'category':    (None, "Token category id (hexadecimal)"),
     'change':      (None, "Show only change addresses"),
     'change_addr': ("-c", "Change address. Default is a spare address, or the source address if it's not in the wallet"),
     'domain':      ("-D", "List of addresses"),
@@ -979,11 +1173,13 @@ command_options = {
     'index_url':   (None, 'Override the URL where you would like users to be shown the BIP70 Payment Request'),
     'labels':      ("-l", "Show the labels of listed addresses"),
     'language':    ("-L", "Default language for wordlist"),
+    'limit':       (None, "Maximum number of results"),
     'locktime':    (None, "Set locktime block number"),
     'memo':        ("-m", "Description of the request"),
     'nbits':       (None, "Number of bits of entropy"),
     'new_password':(None, "New Password"),
     'nocheck':     (None, "Do not verify aliases"),
+    'offset':      (None, "Number of results to skip"),
     'op_return':   (None, "Specify string data to add to the transaction as an OP_RETURN output"),
     'op_return_raw': (None, 'Specify raw hex data to add to the transaction as an OP_RETURN output (0x6a aka the OP_RETURN byte will be auto-prepended for you so do not include it)'),
     'paid':        (None, "Show only paid requests."),
@@ -999,6 +1195,7 @@ command_options = {
     'timeout':     (None, "Timeout in seconds to wait for the overall operation to complete. Defaults to 30.0."),
     'unsigned':    ("-u", "Do not sign transaction"),
     'unused':      (None, "Show only unused addresses"),
+    'URL':         (None, "Only stop notifications to this URL"),
     'use_net':     (None, "Go out to network for accurate fiat value and/or fee calculations for history. If not specified only the wallet's cache is used which may lead to inaccurate/missing fees and/or FX rates."),
     'wallet_path': (None, "Wallet path(create/restore commands)"),
     'year':        (None, "Show history for a given year"),
@@ -1010,6 +1207,9 @@ from .transaction import tx_from_str
 json_loads = lambda x: json.loads(x, parse_float=lambda x: str(PyDecimal(x)))
 arg_types = {
     'num': int,
+    'count': int,
+    'offset': int,
+    'limit': int,
     'nbits': int,
     'imax': int,
     'year': int,
@@ -1032,6 +1232,12 @@ config_variables = {
         'ssl_chain': 'Chain of SSL certificates, needed for signed requests. Put your certificate at the top and the root CA at the end',
         'url_rewrite': 'Parameters passed to str.replace(), in order to create the r= part of bitcoincash: URIs. Example: \"(\'file:///var/www/\',\'https://electron-cash.org/\')\"',
     },
+    'addrequests': {
+        'requests_dir': 'directory where bip70 files will be written.',
+        'ssl_privkey': 'Path to your SSL private key, needed to sign the requests.',
+        'ssl_chain': 'Chain of SSL certificates, needed for signed requests. Put your certificate at the top and the root CA at the end',
+        'url_rewrite': 'Parameters passed to str.replace(), in order to create the r= part of bitcoincash: URIs. Example: \"(\'file:///var/www/\',\'https://electron-cash.org/\')\"',
+    },
     'listrequests':{
         'url_rewrite': 'Parameters passed to str.replace(), in order to create the r= part of bitcoincash: URIs. Example: \"(\'file:///var/www/\',\'https://electron-cash.org/\')\"',
     }
@@ -24,12 +24,14 @@
 # SOFTWARE.
 import ast
 import os
+import threading
 import time
 import sys
+import weakref
 
 # from jsonrpc import JSONRPCResponseManager
 import jsonrpclib
-from .jsonrpc import VerifyingJSONRPCServer
+from .jsonrpc import ThreadedVerifyingJSONRPCServer
 
 from .version import PACKAGE_VERSION
 from .network import Network
@@ -37,9 +39,12 @@ from .util import (json_decode, DaemonThread, print_error, to_string,
                    standardize_path)
 from .wallet import Wallet
 from .storage import WalletStorage
-from .commands import known_commands, Commands
+from .commands import known_commands, concurrent_commands, Commands
 from .simple_config import SimpleConfig
 from .exchange_rate import FxThread
+from . import metrics
+from . import util
+from .webhooks import WebhookDispatcher
 
 
 def get_lockfile(config):
@@ -138,11 +143,36 @@ def get_rpc_credentials(config):
 
 class Daemon(DaemonThread):
 
+    # Default caps on the number of concurrent RPC calls to some methods. The
+    # 'rpc_method_limits' config key (a dict of method -> int) overrides these.
+    RPC_METHOD_LIMITS = {
+        'daemon': 1,
+        'gui': 1,
+        'history': 4,
+        'payto': 4,
+        'paytomany': 4,
+        'sweep': 2,
+    }
+
     def __init__(self, config, fd, is_gui, plugins, *, listen_jsonrpc=True):
         DaemonThread.__init__(self)
         self.plugins = plugins
         self.config = config
         self.listen_jsonrpc = listen_jsonrpc
+        # Before the network and wallets create their locks; see the `getlockstats` command
+        util.instrument_locks = bool(config.get('lock_stats'))
+        # Collection is off unless asked for, see metrics.py
+        self.metrics_server = None
+        if config.get('metrics') or config.get('metrics_port'):
+            metrics.registry.enabled = True
+        if config.get('metrics_port'):
+            try:
+                self.metrics_server = metrics.MetricsServer(config.get('metrics_host', '127.0.0.1'),
+                                                            int(config.get('metrics_port')))
+                self.metrics_server.start()
+            except (OSError, ValueError) as e:
+                self.print_error('failed to start the metrics server:', repr(e))
+                self.metrics_server = None
         if config.get('offline'):
             self.network = None
         else:
@@ -155,9 +185,18 @@ class Daemon(DaemonThread):
             # We only add the fx object to the network thread as a job if it is supported (if on mainnet).
             # On the testnets we don't offer exchange rate/fiat display (is_supported() == False).
             self.network.add_jobs([self.fx])
+        # Deliveries for the `notify` command, and its subscriptions from previous runs
+        self.webhooks = None
+        if self.network:
+            self.webhooks = WebhookDispatcher(config.path, self.network, workers=config.get('webhook_workers'),
+                                              max_queue=config.get('webhook_max_queue'))
+            self.webhooks.start()
         self.gui = None
         self.server = None
         self.wallets = {}
+        # wallet -> lock serializing the RPC commands that modify it (see _run_command)
+        self._wallet_cmd_locks = weakref.WeakKeyDictionary()
+        self._wallet_cmd_locks_lock = threading.Lock()
         if listen_jsonrpc:
             # Setup JSONRPC server
             self.init_server(config, fd, is_gui)
@@ -167,9 +206,13 @@ class Daemon(DaemonThread):
         port = config.get('rpcport', 0)
 
         rpc_user, rpc_password = get_rpc_credentials(config)
+        method_limits = dict(self.RPC_METHOD_LIMITS)
+        method_limits.update(config.get('rpc_method_limits', {}))
         try:
-            server = VerifyingJSONRPCServer((host, port), logRequests=False,
-                                            rpc_user=rpc_user, rpc_password=rpc_password)
+            server = ThreadedVerifyingJSONRPCServer((host, port), logRequests=False,
+                                                    rpc_user=rpc_user, rpc_password=rpc_password,
+                                                    method_limits=method_limits,
+                                                    max_concurrent_calls=config.get('rpc_max_concurrent_calls', 32))
         except Exception as e:
             self.print_error('Warning: cannot initialize RPC server on host', host, e)
             os.close(fd)
@@ -183,9 +226,48 @@ class Daemon(DaemonThread):
         server.register_function(self.run_daemon, 'daemon')
         self.cmd_runner = Commands(self.config, None, self.network, self)
         for cmdname in known_commands:
-            server.register_function(getattr(self.cmd_runner, cmdname), cmdname)
+            server.register_function(self._make_rpc_method(cmdname), cmdname)
         server.register_function(self.run_cmdline, 'run_cmdline')
 
+    def _make_rpc_method(self, cmdname):
+        def rpc_method(*args, **kwargs):
+            return self._run_command(self.cmd_runner, cmdname, *args, **kwargs)
+        rpc_method.__name__ = cmdname
+        return rpc_method
+
+    def _run_command(self, cmd_runner, cmdname, *args, **kwargs):
+        """ Runs a command for the (threaded) RPC server. Commands that only
+        read wallet state run right away; the others are run one at a time per
+        wallet, so that e.g. two concurrent `addrequest` calls can't be handed
+        the same address. Note this is not wallet.lock itself: commands may
+        wait on the network, which needs wallet.lock to make progress.
+
+        The RPC server's own cmd_runner has no wallet: those calls are for the
+        loaded wallet named by their `wallet` argument, if any, else for the
+        default wallet. """
+        if cmd_runner.wallet is None:
+            wallet = self._get_rpc_wallet(cmdname, kwargs.pop('wallet', None))
+            if wallet is not None:
+                cmd_runner = Commands(self.config, wallet, self.network, self)
+        func = getattr(cmd_runner, cmdname)
+        wallet = cmd_runner.wallet
+        if wallet is None or cmdname in concurrent_commands:
+            return func(*args, **kwargs)
+        with self._wallet_cmd_locks_lock:
+            lock = self._wallet_cmd_locks.get(wallet)
+            if lock is None:
+                lock = self._wallet_cmd_locks[wallet] = threading.RLock()
+        with lock:
+            return func(*args, **kwargs)
+
+    def _get_rpc_wallet(self, cmdname, path):
+        """ Returns the loaded wallet an RPC call to `cmdname` is for, or None """
+        if path is None:
+            if not known_commands[cmdname].requires_wallet:
+                return None
+            path = self.config.get_wallet_path()
+        return self.wallets.get(standardize_path(path))
+
     def ping(self):
         return True
 
@@ -321,9 +403,8 @@ class Daemon(DaemonThread):
         for x in cmd.options:
             kwargs[x] = (config_options.get(x) if x in ['password', 'new_password'] else config.get(x))
         cmd_runner = Commands(config, wallet, self.network, self)
-        func = getattr(cmd_runner, cmd.name)
         try:
-            result = func(*args, **kwargs)
+            result = self._run_command(cmd_runner, cmd.name, *args, **kwargs)
         except TypeError as e:
             raise Exception("Wrapping TypeError to prevent JSONRPC-Pelix from hiding traceback") from e
         return result
@@ -333,6 +414,10 @@ class Daemon(DaemonThread):
             self.server.handle_request() if self.server else time.sleep(0.1)
         for k, wallet in self.wallets.items():
             wallet.stop_threads()
+        if self.webhooks:
+            self.webhooks.stop()
+        if self.metrics_server:
+            self.metrics_server.stop()
         if self.network:
             self.print_error("shutting down network")
             self.network.stop()
@@ -1,4 +1,6 @@
-from datetime import datetime
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
 import inspect
 import requests
 import sys
@@ -9,13 +11,14 @@ from threading import Thread
 import time
 import csv
 import decimal
+import struct
 from decimal import Decimal as PyDecimal  # Qt 5.12 also exports Decimal
 from collections import defaultdict
 
 from . import networks
 from .bitcoin import COIN
 from .i18n import _
-from .util import PrintError, ThreadJob, print_error, inv_base_units
+from .util import PrintError, ThreadJob, print_error, inv_base_units, timestamp_to_datetime
 
 
 DEFAULT_ENABLED = True
@@ -42,6 +45,182 @@ def to_decimal(x):
     return PyDecimal(str(x))
 
 
+def _day_from_str(date_str):
+    ''' 'YYYY-MM-DD' -> proleptic Gregorian ordinal (date.toordinal()) '''
+    return datetime.strptime(date_str, '%Y-%m-%d').toordinal()
+
+
+def _timestamps_to_local_days(timestamps):
+    """ Maps unix timestamps to local-time day numbers (date.toordinal()), as
+    used for historical rate lookups. Local midnight always falls on a
+    multiple of 15 minutes UTC, so conversions are cached per 15 minutes. """
+    cache = {}
+    ret = []
+    for ts in timestamps:
+        day = None
+        if ts is not None:
+            key = int(ts // 900)
+            day = cache.get(key)
+            if day is None:
+                d_t = timestamp_to_datetime(ts)
+                day = cache[key] = d_t and d_t.toordinal()
+        ret.append(day)
+    return ret
+
+
+class HistoricalRates:
+    ''' Per-day historical exchange rates for one currency.
+
+    Rates are held in two parallel arrays sorted by day number (as returned by
+    date.toordinal()), so lookups are a binary search and no per-lookup date
+    formatting is needed. The on-disk cache is a short magic header followed
+    by fixed-size (day, rate) records, so it is read back with a single
+    struct pass (no JSON parsing) and new days can be appended to it (and
+    revised days patched in place) without rewriting the whole file.
+
+    Instances are not thread-safe. Writers should work on a copy() and then
+    publish it, which is what ExchangeBase does. '''
+
+    MAGIC = b'ECFXRT\x00\x01'
+    RECORD = struct.Struct('<id')  # day number, rate
+
+    def __init__(self):
+        self.days = array('i')
+        self.rates = array('d')
+        # Bookkeeping for incremental saves
+        self._saved_len = None  # number of records known to be on disk, or None if unknown
+        self._patched = set()  # indices < self._saved_len whose rate changed
+
+    def __len__(self):
+        return len(self.days)
+
+    def copy(self):
+        ret = __class__()
+        ret.days = array('i', self.days)
+        ret.rates = array('d', self.rates)
+        ret._saved_len = self._saved_len
+        ret._patched = set(self._patched)
+        return ret
+
+    @property
+    def last_day(self):
+        ''' The day number of the most recent rate, or None if empty. '''
+        return self.days[-1] if self.days else None
+
+    def get(self, day):
+        ''' Returns the rate (a float) for day number `day`, or None. '''
+        i = bisect_left(self.days, day)
+        if i < len(self.days) and self.days[i] == day:
+            return self.rates[i]
+
+    def get_many(self, days):
+        ''' Bulk version of get(). `days` may contain None entries. '''
+        known, rates = self.days, self.rates
+        n = len(known)
+        ret = []
+        prev_day, prev_rate = None, None
+        for day in days:
+            if day != prev_day:
+                # Callers typically pass runs of the same day (e.g. a
+                # wallet's history), so only search when the day changes.
+                prev_day, prev_rate = day, None
+                if day is not None:
+                    i = bisect_left(known, day)
+                    if i < n and known[i] == day:
+                        prev_rate = rates[i]
+            ret.append(prev_rate)
+        return ret
+
+    def merge(self, h):
+        ''' Merges `h`, a dict of 'YYYY-MM-DD' -> rate as returned by
+        ExchangeBase.request_history(), into this store. Entries that cannot
+        be parsed are skipped. '''
+        new = []
+        for date_str, rate in h.items():
+            try:
+                day, rate = _day_from_str(date_str), float(rate)
+            except (TypeError, ValueError):
+                continue
+            new.append((day, rate))
+        new.sort()
+        days, rates = self.days, self.rates
+        appended = []
+        for day, rate in new:
+            if not days or day > days[-1]:
+                if appended and appended[-1][0] == day:
+                    appended[-1] = (day, rate)
+                else:
+                    appended.append((day, rate))
+                continue
+            i = bisect_left(days, day)
+            if i < len(days) and days[i] == day:
+                if rates[i] != rate:
+                    rates[i] = rate
+                    if self._saved_len is not None and i < self._saved_len:
+                        self._patched.add(i)
+            else:
+                # A gap before the end got filled; the file must be rewritten.
+                days.insert(i, day)
+                rates.insert(i, rate)
+                self._saved_len = None
+        for day, rate in appended:
+            days.append(day)
+            rates.append(rate)
+
+    @classmethod
+    def from_dict(cls, h):
+        ret = cls()
+        ret.merge(h)
+        return ret
+
+    @classmethod
+    def load(cls, filename):
+        ''' Reads a file written by save(). Returns None if it is missing,
+        empty or malformed. '''
+        hdr_len, rec_size = len(cls.MAGIC), cls.RECORD.size
+        with open(filename, 'rb') as f:
+            data = f.read()
+        if data[:hdr_len] != cls.MAGIC:
+            return None
+        n = (len(data) - hdr_len) // rec_size  # a torn trailing record is ignored
+        ret = cls()
+        days, rates = ret.days, ret.rates
+        for day, rate in cls.RECORD.iter_unpack(memoryview(data)[hdr_len:hdr_len + n * rec_size]):
+            if days and day <= days[-1]:
+                return None
+            days.append(day)
+            rates.append(rate)
+        ret._saved_len = n
+        return ret or None
+
+    def save(self, filename):
+        ''' Writes this store to `filename`, appending to / patching the
+        existing file when it is known to hold a prefix of this store. Returns
+        the number of bytes written. '''
+        pack, hdr_len, rec_size = self.RECORD.pack, len(self.MAGIC), self.RECORD.size
+        n_saved = self._saved_len
+        if (n_saved is not None and n_saved <= len(self.days) and os.path.exists(filename)
+                and os.path.getsize(filename) == hdr_len + n_saved * rec_size):
+            wrote = 0
+            with open(filename, 'r+b') as f:
+                for i in sorted(self._patched):
+                    f.seek(hdr_len + i * rec_size)
+                    wrote += f.write(pack(self.days[i], self.rates[i]))
+                f.seek(hdr_len + n_saved * rec_size)
+                wrote += f.write(b''.join(pack(self.days[i], self.rates[i])
+                                          for i in range(n_saved, len(self.days))))
+        else:
+            tmp = filename + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(self.MAGIC)
+                f.write(b''.join(pack(d, r) for d, r in zip(self.days, self.rates)))
+            os.replace(tmp, filename)
+            wrote = hdr_len + len(self.days) * rec_size
+        self._saved_len = len(self.days)
+        self._patched.clear()
+        return wrote
+
+
 class ExchangeBase(PrintError):
 
     def __init__(self, on_quotes, on_history):
@@ -84,21 +263,36 @@ class ExchangeBase(PrintError):
         t.start()
 
     def read_historical_rates(self, ccy, cache_dir):
+        """ Returns a tuple of (HistoricalRates or None, timestamp) from the
+        cache file, converting a JSON cache file from older versions if that
+        is all we have. """
         filename = self._get_cache_filename(ccy, cache_dir)
         h, timestamp = None, 0.0
-        if os.path.exists(filename):
-            timestamp = os.stat(filename).st_mtime
-            try:
-                with open(filename, 'r', encoding='utf-8') as f:
-                    h = json.loads(f.read())
-                if h:
-                    self.print_error("read_historical_rates: returning cached history from", filename)
-            except Exception as e:
-                self.print_error("read_historical_rates: error", repr(e))
+        try:
+            if os.path.exists(filename):
+                timestamp = os.stat(filename).st_mtime
+                h = HistoricalRates.load(filename)
+            elif os.path.exists(self._get_legacy_cache_filename(ccy, cache_dir)):
+                legacy_filename = self._get_legacy_cache_filename(ccy, cache_dir)
+                timestamp = os.stat(legacy_filename).st_mtime
+                with open(legacy_filename, 'r', encoding='utf-8') as f:
+                    h = HistoricalRates.from_dict(json.loads(f.read()) or {})
+                if h and self._cache_historical_rates(h, ccy, cache_dir):
+                    os.utime(filename, (timestamp, timestamp))  # preserve its age
+                    os.remove(legacy_filename)
+            if h:
+                self.print_error("read_historical_rates: returning cached history from", filename)
+        except Exception as e:
+            self.print_error("read_historical_rates: error", repr(e))
+            h = None
         h = h or None
         return h, timestamp
 
     def _get_cache_filename(self, ccy, cache_dir):
+        return os.path.join(cache_dir, self.name() + '_' + ccy + '.rates')
+
+    def _get_legacy_cache_filename(self, ccy, cache_dir):
+        """ The JSON cache file used by older versions """
         return os.path.join(cache_dir, self.name() + '_' + ccy)
 
     @staticmethod
@@ -115,9 +309,8 @@ class ExchangeBase(PrintError):
         wroteBytes, filename = 0, '(none)'
         try:
             filename = self._get_cache_filename(ccy, cache_dir)
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(json.dumps(h))
-            wroteBytes = os.stat(filename).st_size
+            wroteBytes = h.save(filename)
+            os.utime(filename)  # even if nothing changed, the cache is now fresh
         except Exception as e:
             self.print_error("cache_historical_rates error:", repr(e))
             return False
@@ -128,17 +321,24 @@ class ExchangeBase(PrintError):
         h, timestamp = self.read_historical_rates(ccy, cache_dir)
         if not h or self._is_timestamp_old(timestamp):
             try:
-                self.print_error("requesting fx history for", ccy)
-                h = self.request_history(ccy)
+                # Only ask for the days we don't have yet (the last day we
+                # have is asked for again, as it may have been partial).
+                since = h and datetime.fromordinal(h.last_day)
+                self.print_error("requesting fx history for", ccy, "since", since.date() if since else "the beginning")
+                new = self.request_history(ccy, since=since)
                 self.print_error("received fx history for", ccy)
-                if not h:
+                if not new:
                     # Paranoia: No data; abort early rather than write out an
                     # empty file
                     raise RuntimeWarning(f"received empty history for {ccy}")
+                h = h.copy() if h else HistoricalRates()
+                h.merge(new)
                 self._cache_historical_rates(h, ccy, cache_dir)
+                timestamp = time.time()
             except Exception as e:
                 self.print_error("failed fx history:", repr(e))
-                return
+                if not h:
+                    return
         self.print_error("received history rates of length", len(h))
         self.history[ccy] = h
         self.history_timestamps[ccy] = timestamp
@@ -155,8 +355,20 @@ class ExchangeBase(PrintError):
     def history_ccys(self):
         return []
 
+    def request_history(self, ccy, since=None):
+        """ Returns a dict of 'YYYY-MM-DD' -> rate. If `since` (a datetime) is
+        specified, subclasses may return just the days from then on. """
+        raise NotImplementedError()
+
     def historical_rate(self, ccy, d_t):
-        return self.history.get(ccy, {}).get(d_t.strftime('%Y-%m-%d'))
+        h = self.history.get(ccy)
+        return h.get(d_t.toordinal()) if h else None
+
+    def historical_rates(self, ccy, days):
+        """ Bulk version of historical_rate(), taking day numbers as returned
+        by date.toordinal(). Returns a list of rates (or None). """
+        h = self.history.get(ccy)
+        return h.get_many(days) if h else [None] * len(days)
 
     def get_currencies(self):
         rates = self.get_rates('')
@@ -238,12 +450,18 @@ class CoinCap(ExchangeBase):
     def history_ccys(self):
         return ['USD']
 
-    def request_history(self, ccy):
+    def request_history(self, ccy, since=None):
         from datetime import datetime as dt
-        # Currently 2000 days is the maximum in 1 API call which needs to be fixed
-        # sometime before the year 2023...
+        if since:
+            start = int(since.replace(tzinfo=timezone.utc).timestamp() * 1000)
+            end = int(time.time() * 1000)
+            query = f"start={start}&end={end}"
+        else:
+            # Currently 2000 days is the maximum in 1 API call which needs to be fixed
+            # sometime before the year 2023...
+            query = "limit=2000"
         history = self.get_json('api.coincap.io',
-                               "/v2/assets/bitcoin-cash/history?interval=d1&limit=2000")
+                               "/v2/assets/bitcoin-cash/history?interval=d1&" + query)
         return dict([(dt.utcfromtimestamp(h['time']/1000).strftime('%Y-%m-%d'),
                         h['priceUsd'])
                      for h in history['data']])
@@ -265,8 +483,12 @@ class CoinGecko(ExchangeBase):
                 'TRY', 'TWD', 'USD', 'VEF', 'VND', 'XAG', 'XAU', 'XDR',
                 'ZAR']
 
-    def request_history(self, ccy):
-        history = self.get_json('api.coingecko.com', '/api/v3/coins/bitcoin-cash/market_chart?vs_currency=%s&days=max' % ccy)
+    def request_history(self, ccy, since=None):
+        if since:
+            days = '%d&interval=daily' % max(2, (datetime.utcnow() - since).days + 1)
+        else:
+            days = 'max'
+        history = self.get_json('api.coingecko.com', '/api/v3/coins/bitcoin-cash/market_chart?vs_currency=%s&days=%s' % (ccy, days))
 
         from datetime import datetime as dt
         return dict([(dt.utcfromtimestamp(h[0]/1000).strftime('%Y-%m-%d'), h[1])
@@ -514,3 +736,25 @@ class FxThread(ThreadJob):
         from .util import timestamp_to_datetime
         date = timestamp_to_datetime(timestamp)
         return self.history_rate(date)
+
+    def history_rates(self, timestamps):
+        """ Bulk version of timestamp_rate(). Returns a list of PyDecimal (or
+        None) rates, one per entry in `timestamps`. """
+        days = _timestamps_to_local_days(timestamps)
+        rates = self.exchange.historical_rates(self.ccy, days)
+        recent = datetime.today().toordinal() - 2
+        decimals = {}
+        ret = []
+        for day, rate in zip(days, rates):
+            if rate is None and day is not None and day >= recent:
+                # Frequently there is no rate for today, until tomorrow :)
+                # Use spot quotes in that case
+                rate = self.exchange.quotes.get(self.ccy)
+                self.history_used_spot = True
+            if rate is not None:
+                dec = decimals.get(rate)
+                if dec is None:
+                    dec = decimals[rate] = PyDecimal(rate)
+                rate = dec
+            ret.append(rate)
+        return ret
@@ -42,6 +42,7 @@ from .utils import Event
 
 ca_path = requests.certs.where()
 
+from . import metrics
 from . import util
 from . import x509
 from . import pem
@@ -49,6 +50,12 @@ from . import pem
 
 PING_INTERVAL = 300
 
+REQUESTS_SENT = metrics.counter('interface_requests_sent_total', 'Requests sent to servers', label='method')
+NOTIFICATIONS = metrics.counter('interface_notifications_total', 'Notifications received from servers',
+                                label='method')
+REQUEST_SECONDS = metrics.histogram('interface_request_seconds',
+                                    'Time from sending a request to reading its response', label='method')
+
 
 def Connection(server, queue, config_path, callback=None):
     """Makes asynchronous connections to a remote electrum server.
@@ -319,6 +326,8 @@ class Interface(util.PrintError):
         self.request_time = time.time()
         self.unsent_requests = []
         self.unanswered_requests = {}
+        # wire id -> time.monotonic() it was sent, only if metrics are enabled
+        self.request_sent_times = {}
         self.last_send = time.time()
 
         self.mode = None
@@ -420,6 +429,11 @@ class Interface(util.PrintError):
             if self.debug:
                 self.print_error("-->", request)
             self.unanswered_requests[request[2]] = request
+        if metrics.registry.enabled:
+            now = time.monotonic()
+            for method, _, wire_id in wire_requests:
+                REQUESTS_SENT.inc(label=method)
+                self.request_sent_times[wire_id] = now
         return True
 
     def ping_required(self):
@@ -488,9 +502,13 @@ class Interface(util.PrintError):
                         responses.append((None, None))  # Signal
                         break
                 # At this point the notification has a 'method' defined, so we know it's good.
+                NOTIFICATIONS.inc(label=response['method'])
                 responses.append((None, response))
             else:
                 request = self.unanswered_requests.pop(wire_id, None)
+                sent = self.request_sent_times.pop(wire_id, None)
+                if sent is not None and request:
+                    REQUEST_SECONDS.observe(time.monotonic() - sent, label=request[0])
                 if request:
                     responses.append((request, response))
                 else:
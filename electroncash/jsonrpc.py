@@ -25,6 +25,8 @@
 
 from jsonrpclib.SimpleJSONRPCServer import SimpleJSONRPCServer, SimpleJSONRPCRequestHandler
 from base64 import b64decode
+import socketserver
+import threading
 import time
 
 from . import util
@@ -48,12 +50,20 @@ class RPCAuthUnsupportedType(Exception):
 # based on http://acooke.org/cute/BasicHTTPA0.html by andrew cooke
 class VerifyingJSONRPCServer(SimpleJSONRPCServer):
 
+    # HTTP version spoken by the request handler; 'HTTP/1.1' enables keep-alive
+    protocol_version = 'HTTP/1.0'
+    # Seconds an idle connection is kept open for, when keep-alive is enabled
+    keep_alive_timeout = None
+
     def __init__(self, *args, rpc_user, rpc_password, **kargs):
 
         self.rpc_user = rpc_user
         self.rpc_password = rpc_password
 
         class VerifyingRequestHandler(SimpleJSONRPCRequestHandler):
+            protocol_version = self.protocol_version
+            timeout = self.keep_alive_timeout
+
             def parse_request(myself):
                 # first, call the original implementation which returns
                 # True if all OK so far
@@ -93,3 +103,34 @@ class VerifyingJSONRPCServer(SimpleJSONRPCServer):
                 and util.constant_time_compare(password, self.rpc_password)):
             time.sleep(0.050)
             raise RPCAuthCredentialsInvalid()
+
+
+class ThreadedVerifyingJSONRPCServer(socketserver.ThreadingMixIn, VerifyingJSONRPCServer):
+    """ Like VerifyingJSONRPCServer, but each connection is served by its own
+    thread and is kept alive between requests (HTTP/1.1). JSON-RPC batches
+    are supported (by jsonrpclib), their calls being run in order.
+
+    Since calls now run concurrently, at most `max_concurrent_calls` of them
+    run at any one time, and `method_limits` (a dict of method name -> int)
+    caps the number of concurrent calls to particular methods. """
+
+    protocol_version = 'HTTP/1.1'
+    keep_alive_timeout = 30.0
+    daemon_threads = True
+    block_on_close = False
+    request_queue_size = 128  # listen() backlog; the default of 5 drops connections from busy clients
+
+    def __init__(self, *args, method_limits=None, max_concurrent_calls=32, **kargs):
+        VerifyingJSONRPCServer.__init__(self, *args, **kargs)
+        self.call_semaphore = threading.BoundedSemaphore(max_concurrent_calls)
+        self.method_semaphores = {method: threading.BoundedSemaphore(limit)
+                                  for method, limit in (method_limits or {}).items()}
+
+    def _dispatch(self, method, params, config=None):
+        # Wait for the method's own limit first so as not to hold up other methods
+        sem = self.method_semaphores.get(method)
+        if sem is None:
+            with self.call_semaphore:
+                return super()._dispatch(method, params, config)
+        with sem, self.call_semaphore:
+            return super()._dispatch(method, params, config)
@@ -285,6 +285,7 @@ class Xpub:
         self.xpub = None
         self.xpub_receive = None
         self.xpub_change = None
+        self._xpub_hex = None  # (xpub, hex of its decoded bytes), for get_xpubkey()
 
     def dump(self):
         d = dict()
@@ -319,7 +320,11 @@ class Xpub:
                 hexstr = 'ffff' + bitcoin.int_to_hex(path_int, 4)
             return hexstr
         s = ''.join(map(encode_path_int, (c, i)))
-        return 'ff' + bh2u(bitcoin.DecodeBase58Check(self.xpub)) + s
+        if self._xpub_hex is None or self._xpub_hex[0] != self.xpub:
+            # Decoding the xpub is slow relative to the rest of this, and this
+            # is called for every input when preparing a transaction for signing
+            self._xpub_hex = (self.xpub, bh2u(bitcoin.DecodeBase58Check(self.xpub)))
+        return 'ff' + self._xpub_hex[1] + s
 
     @classmethod
     def parse_xpubkey(self, pubkey):
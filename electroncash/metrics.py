@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -*- mode: python3 -*-
+# Part of the Electron Cash SPV Wallet
+# License: MIT
+'''
+A small registry of counters, gauges and latency histograms for the hot paths
+of the network, wallet and verifier code.
+
+Metrics are module-level objects, created once at import time by the modules
+that update them, e.g.:
+
+    RESPONSES = metrics.counter('network_responses_total', 'Responses processed', label='method')
+    ...
+    RESPONSES.inc(label=method)
+
+Collection is off by default, in which case updating a metric only costs an
+attribute lookup. The daemon turns it on with the `metrics` config key, and
+serves the Prometheus text format over HTTP if `metrics_port` is set. The
+`getmetrics` command returns the current values as JSON.
+'''
+import bisect
+import functools
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+from . import util
+
+# Latency buckets, in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry, name, help, label=None):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.label = label  # name of the (single, optional) label
+        self.values = dict()  # label value (None if unlabeled) -> value
+
+    def reset(self):
+        self.values = dict()
+
+    def _to_json(self, value):
+        return value
+
+    def to_dict(self):
+        with self.registry.lock:
+            values = {k: self._to_json(v) for k, v in self.values.items()}
+        if self.label is None:
+            return values.get(None, self._to_json(self._zero()))
+        return values
+
+    def _zero(self):
+        return 0
+
+    def _labels(self, label_value, extra=None):
+        pairs = []
+        if self.label is not None:
+            pairs.append((self.label, label_value))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                              for k, v in pairs) + '}'
+
+    def to_prometheus(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        with self.registry.lock:
+            values = list(self.values.items())
+        if not values and self.label is None:
+            values = [(None, self._zero())]
+        for label_value, value in values:
+            lines.extend(self._sample_lines(label_value, value))
+        return lines
+
+    def _sample_lines(self, label_value, value):
+        return [f'{self.name}{self._labels(label_value)} {value}']
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, n=1, label=None):
+        if not self.registry.enabled:
+            return
+        with self.registry.lock:
+            self.values[label] = self.values.get(label, 0) + n
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value, label=None):
+        if not self.registry.enabled:
+            return
+        with self.registry.lock:
+            self.values[label] = value
+
+    def inc(self, n=1, label=None):
+        if not self.registry.enabled:
+            return
+        with self.registry.lock:
+            self.values[label] = self.values.get(label, 0) + n
+
+    def dec(self, n=1, label=None):
+        self.inc(-n, label)
+
+
+class Histogram(Metric):
+    ''' Values are [count per bucket..., count above the last bucket, sum] '''
+    type = 'histogram'
+
+    def __init__(self, registry, name, help, label=None, buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, label)
+        self.buckets = tuple(sorted(buckets))
+
+    def _zero(self):
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value, label=None):
+        if not self.registry.enabled:
+            return
+        i = bisect.bisect_left(self.buckets, value)
+        with self.registry.lock:
+            v = self.values.get(label)
+            if v is None:
+                v = self.values[label] = self._zero()
+            v[i] += 1
+            v[-1] += value
+
+    def time(self, label=None):
+        ''' Context manager observing the time spent in its block '''
+        return _Timer(self, label)
+
+    def _to_json(self, v):
+        count = sum(v[:-1])
+        cumulative = 0
+        buckets = OrderedDict()
+        for le, n in zip(self.buckets, v):
+            cumulative += n
+            buckets[str(le)] = cumulative
+        return {'count': count, 'sum': round(v[-1], 6), 'avg': round(v[-1] / count, 6) if count else None,
+                'buckets': buckets}
+
+    def _sample_lines(self, label_value, v):
+        lines = []
+        cumulative = 0
+        for le, n in zip(self.buckets + ('+Inf',), v):
+            cumulative += n
+            lines.append(f'{self.name}_bucket{self._labels(label_value, ("le", le))} {cumulative}')
+        lines.append(f'{self.name}_sum{self._labels(label_value)} {v[-1]}')
+        lines.append(f'{self.name}_count{self._labels(label_value)} {cumulative}')
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'label', 't0')
+
+    def __init__(self, histogram, label):
+        self.histogram = histogram
+        self.label = label
+
+    def __enter__(self):
+        self.t0 = time.perf_counter() if self.histogram.registry.enabled else None
+        return self
+
+    def __exit__(self, *exc):
+        if self.t0 is not None:
+            self.histogram.observe(time.perf_counter() - self.t0, self.label)
+
+
+class Registry:
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.metrics: Dict[str, Metric] = OrderedDict()
+        self.started = time.time()
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(self, name, *args, **kwargs)
+            assert isinstance(metric, cls), f'{name} is already registered as a {metric.type}'
+            return metric
+
+    def counter(self, name, help, label=None) -> Counter:
+        return self._get(Counter, name, help, label)
+
+    def gauge(self, name, help, label=None) -> Gauge:
+        return self._get(Gauge, name, help, label)
+
+    def histogram(self, name, help, label=None, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, label, buckets)
+
+    def reset(self):
+        with self.lock:
+            for metric in self.metrics.values():
+                metric.reset()
+            self.started = time.time()
+
+    def to_dict(self) -> dict:
+        return {'enabled': self.enabled, 'seconds': round(time.time() - self.started, 3),
+                'metrics': {name: metric.to_dict() for name, metric in list(self.metrics.items())}}
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.to_prometheus())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+counter = registry.counter
+gauge = registry.gauge
+histogram = registry.histogram
+
+
+def timed(histogram: Histogram, label=None):
+    ''' Decorator observing the run time of each call of the decorated function '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not histogram.registry.enabled:
+                return func(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - t0, label)
+        return wrapper
+    return decorator
+
+
+class MetricsServer(util.PrintError):
+    ''' Serves the registry in the Prometheus text format at /metrics '''
+
+    def __init__(self, host, port, registry=registry):
+        reg = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = reg.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.httpd.server_address[:2]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='MetricsServer', daemon=True)
+        self.thread.start()
+        self.print_error('serving metrics at http://{}:{}/metrics'.format(*self.address))
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
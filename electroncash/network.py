@@ -37,6 +37,7 @@ import json
 from typing import Dict, Iterable, Tuple
 
 import socks
+from . import metrics
 from . import util
 from . import bitcoin
 from .bitcoin import *
@@ -140,6 +141,11 @@ from .simple_config import SimpleConfig
 
 proxy_modes = ['socks4', 'socks5', 'http']
 
+RESPONSES = metrics.counter('network_responses_total', 'Responses and notifications processed', label='method')
+PROCESS_RESPONSE_SECONDS = metrics.histogram('network_process_response_seconds',
+                                             'Time to process a response, including its callbacks')
+INTERFACES = metrics.gauge('network_interfaces', 'Connected servers')
+
 
 def serialize_proxy(p):
     if not isinstance(p, dict):
@@ -255,9 +261,9 @@ class Network(util.DaemonThread):
         self.tor_controller.active_port_changed.append(self.on_tor_port_changed)
         self.tor_controller.start()
 
-        self.lock = threading.RLock()
+        self.lock = util.make_rlock('network')
         # locks: if you need to take multiple ones, acquire them in the order they are defined here!
-        self.interface_lock = threading.RLock()            # <- re-entrant
+        self.interface_lock = util.make_rlock('network.interface')                   # <- re-entrant
         self.pending_sends_lock = threading.Lock()
 
         self.pending_sends = []
@@ -780,6 +786,7 @@ class Network(util.DaemonThread):
             with self.interface_lock:
                 if interface.server in self.interfaces:
                     self.interfaces.pop(interface.server)
+                INTERFACES.set(len(self.interfaces))
                 if interface.server == self.default_server:
                     self.interface = None
                 interface.close()
@@ -792,12 +799,14 @@ class Network(util.DaemonThread):
         self.recent_servers = self.recent_servers[0:20]
         self.save_recent_servers()
 
+    @metrics.timed(PROCESS_RESPONSE_SECONDS)
     def process_response(self, interface, request, response, callbacks):
         if self.debug:
             self.print_error("<--", response)
         error = response.get('error')
         result = response.get('result')
         method = response.get('method')
+        RESPONSES.inc(label=method)
         params = response.get('params')
 
         # FIXME:
@@ -1106,6 +1115,7 @@ class Network(util.DaemonThread):
 
         with self.interface_lock:
             self.interfaces[server_key] = interface
+            INTERFACES.set(len(self.interfaces))
 
         # server.version should be the first message
         params = [version.PACKAGE_VERSION, version.PROTOCOL_VERSION]
@@ -1831,6 +1841,38 @@ class Network(util.DaemonThread):
             raise util.ServerError(r.get('error'))
         return r.get('result')
 
+    def synchronous_get_many(self, requests, timeout=30):
+        """Like synchronous_get(), for a list of (method, params) requests,
+        which are all sent at once and so go out to the server in pipelined
+        batches (see Interface.num_requests). Requests must be distinct.
+        Returns the results in the same order as `requests`, with an
+        exception instance in place of each result that failed or did not
+        arrive within `timeout` seconds."""
+        requests = list(requests)
+        if not requests:
+            return []
+        indexes = {self.get_index(method, params): i for i, (method, params) in enumerate(requests)}
+        assert len(indexes) == len(requests), "requests must be distinct"
+        results = [None] * len(requests)
+        q = queue.Queue()
+        self.send(requests, q.put)
+        deadline = time.time() + timeout
+        remaining = set(range(len(requests)))
+        try:
+            while remaining:
+                r = q.get(True, max(0.0, deadline - time.time()))
+                i = indexes.get(self.get_index(r.get('method'), r.get('params')))
+                if i is None or i not in remaining:
+                    continue
+                remaining.discard(i)
+                results[i] = util.ServerError(r['error']) if r.get('error') else r.get('result')
+        except queue.Empty:
+            # Stop getting called back for the requests still out
+            self.cancel_requests(q.put)
+            for i in remaining:
+                results[i] = util.TimeoutException('Server did not answer')
+        return results
+
     def get_raw_tx_for_txid(self, txid, timeout=30):
         """ Used by UI code to retrieve a transaction from the blockchain by
         txid.  (Qt Gui: Tools -> Load transaction -> From the blockchain)
@@ -23,17 +23,58 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+from collections import defaultdict
 from threading import Lock
+from typing import Dict, List, Optional, Set, Tuple
 import queue
 import time
 
 from electroncash.util import ThreadJob
 
 
+class _BlockWindow:
+    """Bookkeeping for one outstanding blockchain.reusable.get_history request
+    covering the inclusive block range [start, end]."""
+
+    __slots__ = ('start', 'count', 'got_history', 'pending_txids', 'requested_ts')
+
+    def __init__(self, start: int, count: int):
+        self.start = start
+        self.count = count
+        self.got_history = False
+        self.pending_txids: Set[str] = set()
+        self.requested_ts = time.time()
+
+    @property
+    def end(self) -> int:
+        return self.start + self.count - 1
+
+
 class RpaManager(ThreadJob):
     """Based loosely on the structure of the synchronizer class.
     External interface: __init__() and add() member functions."""
 
+    # The block window requested per blockchain.reusable.get_history call adapts to the density of the payloads
+    # we get back: sparse ranges (the common case) get big windows, dense ranges get small ones. Servers limit
+    # how many blocks they will scan per call, so MAX_WINDOW must stay at or below that limit.
+    MIN_WINDOW = 5
+    MAX_WINDOW = 60
+    INITIAL_WINDOW = 50
+    TARGET_TXS_PER_WINDOW = 200
+    # How many get_history windows may be in flight at once.
+    MAX_OUTSTANDING_WINDOWS = 4
+    # Back-pressure: no new windows are requested while this many raw txs are in flight or waiting in the queue.
+    MAX_PENDING_RAWTX = 1000
+    # A failed blockchain.transaction.get is retried on another interface this many times before giving up.
+    RAWTX_MAX_RETRIES = 3
+    # A blockchain.transaction.get that got no reply within this many seconds (e.g. because the interface it was
+    # sent to went away) is re-sent, and counts as a retry.
+    RAWTX_TIMEOUT = 30.0
+    # Phase 4 time budget per run() call, in seconds, to keep the network thread peppy.
+    PHASE_4_TIME_BUDGET = 0.1
+    # How often to log sync throughput while catching up, in seconds.
+    STATS_INTERVAL = 30.0
+
     def __init__(self, wallet, network):
         from electroncash.wallet import RpaWallet
         assert isinstance(wallet, RpaWallet)
@@ -47,12 +88,38 @@ class RpaManager(ThreadJob):
         # self.tx_heights is a dict that stores the height of each tx the rpa_manager encounters.
         self.tx_heights = dict()
 
-        # self.block_requests is a dict that stores the requests made for blocks from the server.
-        self.block_requests = dict()
+        # self.windows maps the start height of each outstanding get_history request to its _BlockWindow.
+        # It is used to ensure only 1 call is made at any given height.
+        self.windows: Dict[int, _BlockWindow] = dict()
+        # Windows whose get_history request failed, to be re-requested before anything new.
+        self.failed_windows: List[Tuple[int, int]] = []
+        self.window_size = self.INITIAL_WINDOW
+        # The next block height that has not been requested yet. Initialized lazily from wallet.rpa_height.
+        self.next_height: Optional[int] = None
+        # The server height as of the last time phase 1 found us caught up, used to re-scan the tip block once.
+        self._caught_up_height: Optional[int] = None
+
+        # Block ranges above wallet.rpa_height that have been completely processed. Windows can complete out of
+        # order, so wallet.rpa_height only advances once the ranges below are done. These are persisted so that a
+        # restart resumes mid-range rather than re-scanning them.
+        self.completed_ranges: List[Tuple[int, int]] = sorted(
+            (int(a), int(b)) for a, b in self.wallet.storage.get('rpa_completed_ranges', []))
+
+        # txid -> list of window start heights waiting on it (None for mempool results)
+        self.rawtx_requests: Dict[str, List[Optional[int]]] = dict()
+        self.rawtx_retries: Dict[str, int] = defaultdict(int)
+        self.rawtx_sent_ts: Dict[str, float] = dict()
+        self.last_stall_check = 0.0
 
         # To avoid downloading the same txn multiple times if mempool polling
         self.already_downloaded_txids = set()
 
+        # Throughput counters, see get_stats()
+        self.blocks_scanned = 0
+        self.txs_processed = 0
+        self.sync_start_ts: Optional[float] = None
+        self.last_stats_ts = 0.0
+
     def diagnostic_name(self):
         cn = super().diagnostic_name()
         wn = self.wallet.diagnostic_name() if self.wallet else "???"
@@ -68,6 +135,36 @@ class RpaManager(ThreadJob):
             self._up_to_date = b
             self.network.trigger_callback('wallet_updated', self.wallet)
 
+    def get_stats(self) -> dict:
+        """Returns a dict of sync progress and throughput counters. Safe to call from any thread."""
+        with self.lock:
+            elapsed = time.time() - self.sync_start_ts if self.sync_start_ts else 0.0
+            return {
+                'rpa_height': self.wallet.rpa_height,
+                'blocks_scanned': self.blocks_scanned,
+                'txs_processed': self.txs_processed,
+                'blocks_per_sec': self.blocks_scanned / elapsed if elapsed > 0.0 else 0.0,
+                'txs_per_sec': self.txs_processed / elapsed if elapsed > 0.0 else 0.0,
+                'window_size': self.window_size,
+                'outstanding_windows': len(self.windows),
+                'pending_rawtx': len(self.rawtx_requests) + self.rpa_q_rawtx.qsize(),
+            }
+
+    def _pending_rawtx_count(self) -> int:
+        return len(self.rawtx_requests) + self.rpa_q_rawtx.qsize()
+
+    def _skip_completed(self, height: int) -> Tuple[int, Optional[int]]:
+        """Returns the first height >= `height` not inside a completed range, and the start of the next completed
+        range after it (or None), so that a new window does not run into blocks that were already processed."""
+        for a, b in self.completed_ranges:
+            if b < height:
+                continue
+            if a <= height:
+                height = b + 1
+                continue
+            return height, a
+        return height, None
+
     def rpa_phase_1_mempool(self, polling=False):
         """Part of the normal peristent loop, but runs once every 10 seconds.  This is also called externally
         from the wallet wants to check the mempool (with polling=False).  We make the request similar to the
@@ -84,12 +181,6 @@ class RpaManager(ThreadJob):
         self.last_mempool_check = time.time()
 
     def rpa_phase_1(self):
-        # Check the rawtx queue first, because if it still has transactions to process from a previous run,
-        # we don't want to request more blocks from the server until we're caught up.
-        if not self.rpa_q_rawtx.empty():
-            self.up_to_date = False
-            return
-
         # Make sure the password is available.  If not, do nothing.
         if self.wallet.has_password() and self.wallet.rpa_pwd is None:
             return
@@ -100,48 +191,102 @@ class RpaManager(ThreadJob):
         if not server_height:
             return
 
-        rpa_height = self.wallet.rpa_height
-        if rpa_height is None:
-            self.wallet.rpa_height = rpa_height = server_height - 100
-
-        # Only request blocks if the rpa_height is lagging behind the tip.
-        if rpa_height < server_height:
-
-            number_of_blocks = 50
+        if self.next_height is None:
+            rpa_height = self.wallet.rpa_height
+            if rpa_height is None:
+                self.wallet.rpa_height = rpa_height = server_height - 100
+            # Start at rpa_height itself (rather than rpa_height + 1) so the last block we processed last time is
+            # scanned once more, in case it was reorged away.
+            self.next_height = rpa_height
+
+        while self.failed_windows and len(self.windows) < self.MAX_OUTSTANDING_WINDOWS:
+            start, count = self.failed_windows.pop(0)
+            self._request_window(start, count)
+
+        # Keep up to MAX_OUTSTANDING_WINDOWS requests in flight, but only while the raw tx pipeline downstream of
+        # them is not backed up.
+        while (len(self.windows) < self.MAX_OUTSTANDING_WINDOWS
+               and self._pending_rawtx_count() < self.MAX_PENDING_RAWTX):
+            start, next_completed = self._skip_completed(self.next_height)
+            if start > server_height:
+                self.next_height = start
+                break
+            if (self._caught_up_height is not None and start > self._caught_up_height
+                    and not self.windows and not self.failed_windows):
+                # We were at the tip and a new block arrived: re-scan the previous tip too, to catch a 1-block reorg.
+                start = self._caught_up_height
             # Only request enough blocks to get to the tip.  Otherwise, the next request will be too far ahead
-            if rpa_height + number_of_blocks > server_height:
-                number_of_blocks = server_height-rpa_height
-
-            # Define the "grind string" (the RPA prefix)
-            rpa_grind_string = self.wallet.get_grind_string()
-            params = [rpa_height, number_of_blocks + 1, rpa_grind_string]
-            requests = []
-
-            # self.block_requests is used to ensure only 1 call is made at any given height.
-            # Otherwise, a plethora of requests can be sent.
-            if rpa_height not in self.block_requests:
-                requests.append(('blockchain.reusable.get_history', params))
-                self.network.send(requests, self.rpa_phase_2)
-                self.block_requests[rpa_height]=1
-                self.up_to_date = False
-        else:
+            count = min(self.window_size, server_height - start + 1)
+            if next_completed is not None:
+                count = min(count, next_completed - start)
+            self._request_window(start, count)
+            self.next_height = start + count
+            self._caught_up_height = None
+
+        if self.windows or self.failed_windows or not self.rpa_q_rawtx.empty():
+            self.up_to_date = False
+        elif self.next_height > server_height:
+            self._caught_up_height = server_height
             self.up_to_date = True
 
+    def _request_window(self, start: int, count: int):
+        if start in self.windows:
+            return
+        # Define the "grind string" (the RPA prefix)
+        rpa_grind_string = self.wallet.get_grind_string()
+        params = [start, count, rpa_grind_string]
+        self.windows[start] = _BlockWindow(start, count)
+        if self.sync_start_ts is None:
+            self.sync_start_ts = time.time()
+        self.network.send([('blockchain.reusable.get_history', params)], self.rpa_phase_2)
+        self.up_to_date = False
+
+    def _adapt_window_size(self, n_txs: int, count: int):
+        """Steer the window size towards TARGET_TXS_PER_WINDOW given the density of the last payload."""
+        if n_txs:
+            ideal = count * self.TARGET_TXS_PER_WINDOW // n_txs
+        else:
+            ideal = count * 2
+        # Average with the current size to smooth out bursty blocks
+        ideal = (self.window_size + ideal) // 2
+        self.window_size = max(self.MIN_WINDOW, min(self.MAX_WINDOW, ideal))
+
     def rpa_phase_2(self, response):
         """This is the callback that gives us a payload of txids.  Iterate through them,
-        and request the full Raw TX for each."""
+        and request the full Raw TX for each, spread across all connected interfaces."""
 
         # Unpack the response
         payload = response.get('result')
         method = response.get('method')
         params = response.get('params')
 
+        window = None
+        if method == 'blockchain.reusable.get_history':
+            window = self.windows.get(params[0])
+            if window is None:
+                # Stale reply, e.g. a duplicate from a re-sent request
+                return
+
         # Payload can be empty if there was an error
         if payload is None:
             error = response.get('error')
             self.print_error(f"Got error reply for '{method}' with params: {params}. Error: {error}")
+            if window is not None:
+                # Retry this range later, in smaller pieces in case the server choked on its size.
+                del self.windows[window.start]
+                self.window_size = max(self.MIN_WINDOW, self.window_size // 2)
+                half = max(1, window.count // 2)
+                self.failed_windows.append((window.start, half))
+                if window.count > half:
+                    self.failed_windows.append((window.start + half, window.count - half))
             return
 
+        if window is not None:
+            window.got_history = True
+            self._adapt_window_size(len(payload), window.count)
+
+        wstart = window.start if window is not None else None
+        to_request = []
         for i in payload:
             txid = i['tx_hash']
             tx_height = i['height']
@@ -149,24 +294,34 @@ class RpaManager(ThreadJob):
                 # Skip known txns (mempool polling)
                 continue
             self.tx_heights[txid] = tx_height
-            rawtx_request = [('blockchain.transaction.get', [txid])]
-            self.network.send(rawtx_request, self.rpa_phase_3)
+            if window is not None:
+                window.pending_txids.add(txid)
+            waiters = self.rawtx_requests.get(txid)
+            if waiters is not None:
+                # Already in flight (e.g. the tx is in two overlapping windows)
+                waiters.append(wstart)
+                continue
+            self.rawtx_requests[txid] = [wstart]
+            to_request.append(txid)
 
-        # We will also implement a special queue item called "lastblock" which contains the literal strick "lastblock"
-        # instead of a rawtx.  This can pushed on the queue after all other items in the payload are pushed.  The FIFO
-        # structure of the network queue will then process this last, and this module can then update the rpa_height
-        # for the wallet.  This neatly handles all the cases where there are no transactions at certain blockheights,
-        # empty payloads, and so on.  This approach means we aren't looking at the heights of individual transactions.
-        # Instead we're concerned with the height of the entire payload with regards to bumping the wallet height.
+        for txid in to_request:
+            self._request_rawtx(txid)
 
-        # Put the lastblock item into the queue.  Only for block requests, not mempool.
-        if method == 'blockchain.reusable.get_history':
-            # Don't forget to subtract one from the blockheight plus the number of blocks.
-            last_block_in_payload = params[0] + params[1] - 1
-            # Put a special "last block" item in the queue.  We can do it here rather than using a callback, which
-            # happens for normal queue items
-            raw_tx_and_height_tuple = ("lastblock", last_block_in_payload)
-            self.rpa_q_rawtx.put(raw_tx_and_height_tuple)
+        # Once a window has no more pending raw txs, a special "lastblock" item is put on the queue after them, so
+        # that phase 4 knows the window's entire range is processed and can bump the wallet's rpa_height. This
+        # neatly handles all the cases where there are no transactions at certain blockheights, empty payloads,
+        # and so on.
+        if window is not None and not window.pending_txids:
+            self._finish_window(window)
+
+    def _request_rawtx(self, txid: str):
+        self.rawtx_sent_ts[txid] = time.time()
+        self.network.queue_request('blockchain.transaction.get', [txid], interface='random',
+                                   callback=self.rpa_phase_3)
+
+    def _finish_window(self, window: _BlockWindow):
+        self.windows.pop(window.start, None)
+        self.rpa_q_rawtx.put(("lastblock", (window.start, window.end)))
 
     def rpa_phase_3(self, response):
 
@@ -174,31 +329,73 @@ class RpaManager(ThreadJob):
         # We will store the transaction as a tuple consisting of the serialized tx, and the height.
 
         raw_tx = response.get('result')
+        method = response.get('method')
         params = response.get('params')
         error = response.get('error')
-        if error is not None:
-            self.print_error(f"Got error reply for '{method}' with params: {params}. Error: {error}")
-            return
         txid = params[0]
+        if txid not in self.rawtx_requests:
+            # Late reply to a request we already re-sent or gave up on
+            return
+        if error is not None or raw_tx is None:
+            self.print_error(f"Got error reply for '{method}' with params: {params}. Error: {error}")
+            if self.rawtx_retries[txid] < self.RAWTX_MAX_RETRIES:
+                self.rawtx_retries[txid] += 1
+                self._request_rawtx(txid)
+                return
+            self.print_error(f"Giving up on {txid} after {self.RAWTX_MAX_RETRIES} retries")
+            raw_tx = None
+        self.rawtx_retries.pop(txid, None)
+        self.rawtx_sent_ts.pop(txid, None)
         tx_height = self.tx_heights[txid]
-        raw_tx_and_height_tuple = (raw_tx, tx_height)
-        if tx_height <= 0:
-            self.already_downloaded_txids.add(txid)
-        self.rpa_q_rawtx.put(raw_tx_and_height_tuple)
+        if raw_tx is not None:
+            if tx_height <= 0:
+                self.already_downloaded_txids.add(txid)
+            self.rpa_q_rawtx.put((raw_tx, tx_height))
+        for wstart in self.rawtx_requests.pop(txid, ()):
+            window = self.windows.get(wstart) if wstart is not None else None
+            if window is None:
+                continue
+            window.pending_txids.discard(txid)
+            if window.got_history and not window.pending_txids:
+                self._finish_window(window)
+
+    def _retry_stalled_rawtx(self):
+        now = time.time()
+        if now - self.last_stall_check < self.RAWTX_TIMEOUT / 2:
+            return
+        self.last_stall_check = now
+        for txid, ts in list(self.rawtx_sent_ts.items()):
+            if now - ts < self.RAWTX_TIMEOUT:
+                continue
+            self.print_error(f"No reply for {txid} after {self.RAWTX_TIMEOUT} secs, re-sending")
+            self.rpa_phase_3({'method': 'blockchain.transaction.get', 'params': [txid], 'error': 'timeout'})
+
+    def _mark_range_done(self, start: int, end: int):
+        """Record that blocks [start, end] are fully processed, and advance wallet.rpa_height across all ranges
+        that are now contiguous with it."""
+        with self.lock:
+            self.blocks_scanned += end - start + 1
+        ranges = self.completed_ranges
+        ranges.append((start, end))
+        ranges.sort()
+        frontier = rpa_height = self.wallet.rpa_height
+        while ranges and ranges[0][0] <= frontier + 1:
+            frontier = max(frontier, ranges.pop(0)[1])
+        if frontier != rpa_height:
+            self.wallet.rpa_height = frontier
+        self.wallet.storage.put('rpa_completed_ranges', [list(r) for r in ranges])
 
     def rpa_phase_4(self):
 
         # The rawtx tuple unpacks into a a rawtx and a height.  There is a special value
-        # for rawtx: "lastblock", which also has a height, and is treated differently.
+        # for rawtx: "lastblock", which has a (start, end) range instead of a height, and is treated differently.
         # It signals that the payload chunk is completely processed and the rpa_height in the wallet can be bumped.
 
-        limit_iters = 20
-        iterct = 0
+        deadline = time.time() + self.PHASE_4_TIME_BUDGET
 
         while not self.rpa_q_rawtx.empty():
             rawtx_tuple = self.rpa_q_rawtx.get()
             rawtx = rawtx_tuple[0]
-            tx_height = rawtx_tuple[1]
 
             if rawtx != "lastblock":
                 password = self.wallet.rpa_pwd
@@ -206,18 +403,27 @@ class RpaManager(ThreadJob):
                 extracted_private_keys = self.wallet.extract_private_keys_from_transaction(rawtx, password)
                 for pk in extracted_private_keys:
                     self.wallet.import_private_key(pk, password)
+                with self.lock:
+                    self.txs_processed += 1
             else:
                 # last block
-                lastblock_height = tx_height
-                new_height = lastblock_height + 1
-                if new_height > 0:
-                    self.wallet.rpa_height = lastblock_height
-
-            iterct += 1
-            if iterct >= limit_iters:
-                # Don't iterate more than limit_iters, to keep things peppy
+                start, end = rawtx_tuple[1]
+                self._mark_range_done(start, end)
+
+            if time.time() >= deadline:
+                # Don't hog the network thread, to keep things peppy
                 break
 
+    def _maybe_print_stats(self):
+        now = time.time()
+        if self.up_to_date or now - self.last_stats_ts < self.STATS_INTERVAL:
+            return
+        self.last_stats_ts = now
+        stats = self.get_stats()
+        self.print_error("sync: height {rpa_height}, {blocks_per_sec:.1f} blocks/sec, {txs_per_sec:.1f} tx/sec,"
+                         " window {window_size}, {outstanding_windows} windows & {pending_rawtx} txs pending"
+                         .format(**stats))
+
     def run(self):
         """Called from the network proxy thread main loop."""
 
@@ -226,27 +432,30 @@ class RpaManager(ThreadJob):
         #
         # The RPA process consists of 4 distinct phases.
         #
-        # Phase 1:  First check if the "raw tx queue" (used by later phases) is empty.  If empty, then
-        # continue.  If the server network height is greater than the wallet's "rpa height",
-        # then make a network request for a chunk of blocks, with care to only request each chunk once.
+        # Phase 1:  Keep up to MAX_OUTSTANDING_WINDOWS requests for chunks of blocks in flight, as long as the
+        # network height is ahead of what we've requested, and as long as the raw tx pipeline isn't backed up
+        # (MAX_PENDING_RAWTX).  The size of each chunk adapts to how many transactions recent chunks contained.
+        # Each chunk start height is only ever requested once (unless the request failed).
         #
         # Phase 2:  This is the callback for the network request in phase 1.  Here we take the payload of transaction ids,
-        # iterate through it, and make a network request to fetch the full raw tx.  Theoretically,
-        # the full raw tx could have been returned along with the txid, but the server side developers
-        # decided it is better to a seperate call.  In the phase, we also put a "lastblock" item onto the queue
-        # that tells the system that the current chunk is complete.
+        # iterate through it, and make a network request to fetch the full raw tx, spread across all connected
+        # interfaces.  Theoretically, the full raw tx could have been returned along with the txid, but the server side
+        # developers decided it is better to a seperate call.
         #
         # Phase 3:  This is the callback for the network request in phase 2.  The Raw tx is put into a queue for processing.
-        # We use a queue structure so we can easily deteremine when all the callbacks have been completed.  Perhaps this phase
-        # could have been combined with phase 4 but this is a cleaner design to handle this as separate phase.
+        # Once all the raw txs of a chunk have arrived, a "lastblock" item is put onto the queue that tells the
+        # system that the chunk is complete.  We use a queue structure so we can easily deteremine when all the
+        # callbacks have been completed.
         #
         # Phaase 4: In this phase, we iterate through the raw transaction queue and process each transaction.  We attempt to
         # extract the private key from the transaction and if successful, import it into the wallet keystore.  When we encounter
-        # the "lastblock" item, we know the current chunk has finished processing, and we can update the rpa_height in the wallet,
-        # which will allow phase 1 to process the next chunk, and so on.
+        # the "lastblock" item, we know the chunk has finished processing.  Chunks may finish out of order, so the
+        # rpa_height in the wallet is only bumped once all chunks below it are done as well; the completed ranges
+        # above it are saved in the wallet so a restart can pick up where we left off.
         #
         # Note: only phase 1 and phase 4 are called directly from this run loop.  Phases 2 and 3 are executed as callbacks.
         self.rpa_phase_1()
         self.rpa_phase_1_mempool(polling=True)
         self.rpa_phase_4()
-
+        self._retry_stalled_rawtx()
+        self._maybe_print_stats()
@@ -294,12 +294,36 @@ class BlindSigner:
     """
     order = ecdsa.SECP256k1.generator.order()
 
-    def __init__(self):
-        k = ecdsa.util.randrange(self.order)
+    def __init__(self, nonce=None):
+        """ `nonce` may be a (k, R) tuple previously returned by gen_nonce(),
+        in order to skip the expensive R calculation here. Each nonce must
+        only ever be given to one BlindSigner (see security notes above). """
+        if nonce is None:
+            nonce = self.gen_nonce()
+        k, self.R = nonce
         # we store k in a list since .pop() is atomic.
         self._kcontainer = [k]
-        Rpoint = k * ecdsa.SECP256k1.generator
-        self.R = point_to_ser(Rpoint, comp=True)
+
+    @classmethod
+    def gen_nonce(cls):
+        """ Returns a new secret nonce k and its serialized point R = k*G,
+        as a (k, R) tuple of (int, bytes). This is the CPU-intense part of
+        creating a BlindSigner, so it can be done ahead of time (and in other
+        processes; the result is picklable). """
+        k = ecdsa.util.randrange(cls.order)
+        if seclib:
+            R_buf = create_string_buffer(64)
+            res = seclib.secp256k1_ec_pubkey_create(seclib.ctx, R_buf, int(k).to_bytes(32, 'big'))
+            assert res == 1, "should never fail since 0 < k < order"
+            R_serialized = create_string_buffer(33)
+            R_size = c_size_t(33)
+            res = seclib.secp256k1_ec_pubkey_serialize(seclib.ctx, R_serialized, byref(R_size), R_buf, secp256k1.SECP256K1_EC_COMPRESSED)
+            assert res == 1, "defined to never fail"
+            R = R_serialized.raw
+        else:
+            Rpoint = k * ecdsa.SECP256k1.generator
+            R = point_to_ser(Rpoint, comp=True)
+        return k, R
 
     def get_R(self):
         return self.R
@@ -1,3 +1,5 @@
+import struct
+
 from .. import bitcoin
 from .. import address  # for ScriptOutput, OpCodes, ScriptError, Script
 from .. import caches
@@ -621,7 +623,16 @@ class WalletData(util.PrintError):
     more information once we add validation.  See the .clear() method
     which describes each data item. '''
 
-    DATA_VERSION = 0.1  # used by load/save for data storage versioning
+    DATA_VERSION = 0.2  # used by load/save for data storage versioning
+    OLD_DATA_VERSIONS = (0.1,)  # versions that load() knows how to convert
+
+    # Storage record for one token txo: txid (bytes), n (BATON_FLAG set for a mint baton), index into the saved
+    # 'addresses' list, quantity (0 for a mint baton, since real quantities are unsigned 64-bit).
+    _txo_record = struct.Struct('<32sIIQ')
+    BATON_FLAG = 0x80000000
+
+    # Hex of the script prefix of every SLP OP_RETURN; rebuild() only parses txs whose raw hex contains it
+    _protocol_prefix_hex = ScriptOutput._protocol_prefix.hex()
 
     def __init__(self, wallet):
         assert wallet
@@ -639,20 +650,19 @@ class WalletData(util.PrintError):
         try:
             assert isinstance(data, dict), "missing or invalid 'slp' dictionary"
             ver = data['version']
-            assert ver == self.DATA_VERSION, f"incompatible or missing slp data version '{ver}', expected '{self.DATA_VERSION}'"
+            assert ver == self.DATA_VERSION or ver in self.OLD_DATA_VERSIONS, f"incompatible or missing slp data version '{ver}', expected '{self.DATA_VERSION}'"
+            self.clear()
             # dict of txid -> int
             self.validity = {k.lower():int(v) for k,v in data['validity'].items()}
-            # dict of "token_id_hex" -> dict of ["txo_name"] -> qty (int)
-            self.token_quantities = {k.lower() : { vv0.lower() : int(vv1) for vv0,vv1 in v} for k,v in data['token_quantities'].items()}
-            # build the mapping of prevouthash:n (str) -> token_id_hex (str) from self.token_quantities
-            self.txo_token_id = dict()
-            for token_id_hex, txo_dict in self.token_quantities.items():
-                for txo in txo_dict:
-                    self.txo_token_id[txo] = token_id_hex
-            # dict of Address -> set of txo_name
-            self.txo_byaddr = {address.Address.from_string(k) : {vv.lower() for vv in v} for k,v in data['txo_byaddr'].items()}
+            if ver == self.DATA_VERSION:
+                self._load_txos(data['addresses'], data['txos'])
+                self._dirty = False
+            else:
+                self._load_txos_v0_1(data['token_quantities'], data['txo_byaddr'])
+                # Leave self._dirty set so that the next save() writes the current format
             self.need_rebuild = False
-        except (ValueError, TypeError, AttributeError, address.AddressError, AssertionError, KeyError) as e:
+        except (ValueError, TypeError, AttributeError, address.AddressError, AssertionError, KeyError,
+                IndexError, struct.error) as e:
             # Note: We want TypeError/AttributeError/KeyError raised above on
             # missing keys since that indicates data inconsistency, hence why
             # the lookups above do not use .get() (thus ensuring the above
@@ -662,16 +672,69 @@ class WalletData(util.PrintError):
             self.need_rebuild = True
         return not self.need_rebuild
 
+    def _load_txos(self, addresses, txos):
+        addrs = [address.Address.from_string(a) for a in addresses]
+        for a in addrs:
+            self._address_index(a)
+        baton_flag = self.BATON_FLAG
+        for token_id_hex, blob in txos.items():
+            token_id_hex = self._intern_token_id(token_id_hex.lower())
+            for txid, n, addr_idx, qty in self._txo_record.iter_unpack(bytes.fromhex(blob)):
+                if n & baton_flag:
+                    n, qty = n & ~baton_flag, -1
+                self._add_txo_entry(token_id_hex, txid.hex(), n, addrs[addr_idx], qty)
+            # Unchanged since it was loaded, so the stored blob may be saved back as-is
+            self._saved_blobs[token_id_hex] = blob
+        self._dirty_tokens.clear()
+
+    def _load_txos_v0_1(self, token_quantities, txo_byaddr):
+        ''' Loads the txo data of the old list-of-lists data format. '''
+        addr_by_txo = dict()
+        for addr_str, txos in txo_byaddr.items():
+            addr = address.Address.from_string(addr_str)
+            for txo in txos:
+                addr_by_txo[txo.lower()] = addr
+        for token_id_hex, txo_qtys in token_quantities.items():
+            token_id_hex = self._intern_token_id(token_id_hex.lower())
+            for txo, qty in txo_qtys:
+                txid, n = txo.lower().rsplit(':', 1)
+                self._add_txo_entry(token_id_hex, txid, int(n), addr_by_txo[f"{txid}:{n}"], int(qty))
+
     def save(self):
-        '''Caller should hold locks'''
+        '''Caller should hold locks. Only token ids whose txos changed since
+        the last save are re-encoded, and if nothing at all changed the
+        wallet storage is not touched.'''
+        if not self._dirty:
+            return
         self.wallet.storage.put('slp_data_version', None)  # clear key of other older formats.
+        for token_id_hex in self._dirty_tokens:
+            txo_dict = self.token_quantities.get(token_id_hex)
+            if txo_dict:
+                self._saved_blobs[token_id_hex] = self._encode_txos(txo_dict)
+            else:
+                self._saved_blobs.pop(token_id_hex, None)
+        self._dirty_tokens.clear()
         data = {
             'validity' : self.validity,
-            'token_quantities' : {k:list([v0,v1] for v0,v1 in v.items()) for k,v in self.token_quantities.items()},
-            'txo_byaddr' : { k.to_storage_string() : list(v) for k,v in self.txo_byaddr.items() },
+            'addresses' : [a.to_storage_string() for a in self._addr_list],
+            'txos' : dict(self._saved_blobs),
             'version' : self.DATA_VERSION,
         }
         self.wallet.storage.put('slp', data)
+        self._dirty = False
+
+    def _encode_txos(self, txo_dict) -> str:
+        pack = self._txo_record.pack
+        baton_flag = self.BATON_FLAG
+        addr_of, addr_index = self._txo_addr, self._address_index
+        records = []
+        for txo, qty in txo_dict.items():
+            txid, n = txo.rsplit(':', 1)
+            n = int(n)
+            if qty < 0:
+                n, qty = n | baton_flag, 0
+            records.append(pack(bytes.fromhex(txid), n, addr_index(addr_of[txo]), qty))
+        return b''.join(records).hex()
 
     def clear(self):
         '''Caller should hold locks'''
@@ -680,14 +743,37 @@ class WalletData(util.PrintError):
         self.txo_byaddr = dict()  # [address] -> set of "prevouthash:n" for that address
         self.token_quantities = dict() # [token_id_hex] -> dict of ["prevouthash:n"] -> qty (-1 for qty indicates minting baton)
         self.txo_token_id = dict() # ["prevouthash:n"] -> "token_id_hex"
+        # The below are bookkeeping for rm_tx() and for the incremental save()
+        self._txo_addr = dict()  # ["prevouthash:n"] -> address
+        self._txos_by_txid = dict()  # [txid] -> set of "prevouthash:n"
+        self._token_ids = dict()  # interned token_id_hex strings
+        self._addr_list = list()  # Addresses in the order of their index in the saved data
+        self._addr_indices = dict()  # [address] -> index in self._addr_list
+        self._saved_blobs = dict()  # [token_id_hex] -> hex of that token's txo records, as last saved
+        self._dirty_tokens = set()  # token_id_hex whose records changed since the last save
+        self._dirty = True
 
     def rebuild(self):
         '''This takes wallet.lock'''
         with self.wallet.lock:
             self.clear()
+            prefix = self._protocol_prefix_hex
             for txid, tx in self.wallet.transactions.items():
+                if tx.raw is not None and prefix not in tx.raw:
+                    # Fast path: cannot possibly be an SLP tx, so skip deserializing it
+                    continue
                 self.add_tx(txid, Transaction(tx.raw))  # we take a copy of the transaction so prevent storing deserialized tx in wallet.transactions dict
 
+    def _intern_token_id(self, token_id_hex):
+        return self._token_ids.setdefault(token_id_hex, token_id_hex)
+
+    def _address_index(self, addr) -> int:
+        idx = self._addr_indices.get(addr)
+        if idx is None:
+            idx = self._addr_indices[addr] = len(self._addr_list)
+            self._addr_list.append(addr)
+        return idx
+
     #--- GETTERS / SETTERS from wallet
     def token_info_for_txo(self, txo) -> Tuple[str, int]:
         ''' Returns the (token_id_hex, quantity) tuple for a particular
@@ -727,35 +813,32 @@ class WalletData(util.PrintError):
         thread with locks held.
 
         Note: In the case where txid is not in our slp data, this returns
-        quickly.  Otherwise if txid is in the slp data, this is a somewhat slow
-        operation as it involves a linear search through all data structures to
-        eviscerate the tx in question.
-
-        TODO: characterize whether a speedup here is warranted. '''
+        quickly. Otherwise only the entries for the txo's of txid are
+        touched. '''
         try:
             del self.validity[txid]
         except KeyError:
             # The txid in question was not one we manage if it's missing
             # from self.validity. Short-cirtuit early return for performance.
             return
-        for txo in list(self.txo_token_id.keys()):
-            if txo.rsplit(':', 1)[0] == txid:
-                self.txo_token_id.pop(txo, None)
-        for addr, txo_set in self.txo_byaddr.copy().items():
-            for txo in list(txo_set):
-                if txo.rsplit(':', 1)[0] == txid:
-                    txo_set.discard(txo)  # this actually points to the real txo_set instance in the dict
-            if not txo_set:
-                self.txo_byaddr.pop(addr, None)
-        for tok_id, txo_dict in self.token_quantities.copy().items():
-            for txo in txo_dict.copy():
-                if txo.rsplit(':', 1)[0] == txid:
-                    txo_dict.pop(txo, None)  # this actually points to the real txo_dict instance in the token_quantities[tok_id] dict
-            if not txo_dict:
-                self.token_quantities.pop(tok_id, None)
-                # this token has no more relevant tx's -- pop it from
-                # the validity dict as well
-                self.validity.pop(tok_id, None)
+        self._dirty = True
+        for txo in self._txos_by_txid.pop(txid, ()):
+            tok_id = self.txo_token_id.pop(txo)
+            addr = self._txo_addr.pop(txo)
+            txo_set = self.txo_byaddr.get(addr)
+            if txo_set is not None:
+                txo_set.discard(txo)
+                if not txo_set:
+                    del self.txo_byaddr[addr]
+            txo_dict = self.token_quantities.get(tok_id)
+            if txo_dict is not None:
+                txo_dict.pop(txo, None)
+                self._dirty_tokens.add(tok_id)
+                if not txo_dict:
+                    del self.token_quantities[tok_id]
+                    # this token has no more relevant tx's -- pop it from
+                    # the validity dict as well
+                    self.validity.pop(tok_id, None)
 
     def add_tx(self, txid, tx):
         ''' Caller should hold wallet.lock.
@@ -781,31 +864,50 @@ class WalletData(util.PrintError):
             self.print_error(f"ERROR: tx {txid}; exc =", repr(e))
     #-- /Wallet hooks (rm_tx, add_tx)
 
-    def _add_token_qty(self, token_id_hex, txo_name, qty):
-        ''' No checks are done for address, etc. qty is just faithfully added
-        for a given token/txo_name combo. '''
-        d = self.token_quantities.get(token_id_hex, dict())
-        need_insert = not d
-        d[txo_name] = qty  # NB: negative quantity indicates mint baton
-        if need_insert: self.token_quantities[token_id_hex] = d
-
     def _add_txo(self, token_id_hex, txid, n, addr, token_qty):
         ''' Adds txid:n to requisite data structures, registering
         this token output, etc. '''
         if not isinstance(addr, address.Address) or not self.wallet.is_mine(addr):
             # ignore txo's for addresses that are not "mine", or that are not TYPE_ADDRESS
             return
-        name = f"{txid}:{n}"
         if txid not in self.validity:
             self.validity[txid] = 0
         if token_id_hex not in self.validity:
             self.validity[token_id_hex] = 0
-        s = self.txo_byaddr.get(addr, set())
-        need_insert = not s
+        self._add_txo_entry(self._intern_token_id(token_id_hex), txid, n, addr, token_qty)
+        self._dirty = True
+
+    def _add_txo_entry(self, token_id_hex, txid, n, addr, qty):
+        ''' No checks are done for address, etc. qty is just faithfully added
+        for a given token/txo_name combo. NB: negative quantity indicates mint
+        baton. '''
+        name = f"{txid}:{n}"
+        old_token_id = self.txo_token_id.get(name)
+        if old_token_id is not None and old_token_id != token_id_hex:
+            # Paranoia: a txo can only ever carry one token
+            self.token_quantities[old_token_id].pop(name, None)
+            self._dirty_tokens.add(old_token_id)
+        old_addr = self._txo_addr.get(name)
+        if old_addr is not None and old_addr != addr:
+            old_set = self.txo_byaddr[old_addr]
+            old_set.discard(name)
+            if not old_set:
+                del self.txo_byaddr[old_addr]
+        s = self.txo_byaddr.get(addr)
+        if s is None:
+            self.txo_byaddr[addr] = s = set()
         s.add(name)
-        if need_insert: self.txo_byaddr[addr] = s
+        self._txo_addr[name] = addr
         self.txo_token_id[name] = token_id_hex
-        self._add_token_qty(token_id_hex, name, token_qty)
+        d = self.token_quantities.get(token_id_hex)
+        if d is None:
+            self.token_quantities[token_id_hex] = d = dict()
+        d[name] = qty
+        txos = self._txos_by_txid.get(txid)
+        if txos is None:
+            self._txos_by_txid[txid] = txos = set()
+        txos.add(name)
+        self._dirty_tokens.add(token_id_hex)
 
     def _add_mint_baton(self, token_id_hex, txid, n, addr):
         self._add_txo(token_id_hex, txid, n, addr, -1)
@@ -36,6 +36,7 @@ import zlib
 from .address import Address
 from .util import PrintError, profiler, standardize_path
 from .plugins import run_hook, plugin_loaders
+from . import metrics
 from .keystore import bip44_derivation
 from . import bitcoin
 
@@ -49,6 +50,9 @@ FINAL_SEED_VERSION = 17     # electrum >= 2.7 will set this to prevent
 
 TMP_SUFFIX = ".tmp.{}".format(os.getpid())
 
+WRITE_SECONDS = metrics.histogram('storage_write_seconds', 'Time to serialize and save a wallet file')
+WRITE_BYTES = metrics.counter('storage_write_bytes_total', 'Bytes of wallet files written')
+
 
 def multisig_type(wallet_type):
     '''If wallet_type is mofn multi-sig, return [m, n],
@@ -180,6 +184,7 @@ class WalletStorage(PrintError):
                 self.data.pop(key)
 
     @profiler
+    @metrics.timed(WRITE_SECONDS)
     def write(self):
         if self._in_memory_only:
             return
@@ -219,6 +224,7 @@ class WalletStorage(PrintError):
             assert not os.path.exists(self.path)
         os.replace(temp_path, self.path)
         os.chmod(self.path, mode)
+        WRITE_BYTES.inc(len(s))
         self.raw = s
         self._file_exists = True
         self.print_error("saved", self.path)
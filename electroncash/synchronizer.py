@@ -37,9 +37,15 @@ import warnings
 from .address import Address
 from .transaction import Transaction
 from .util import ThreadJob, bh2u, Monotonic, profiler
+from . import metrics
 from . import networks
 from .bitcoin import InvalidXKeyFormat
 
+STATUSES = metrics.counter('synchronizer_statuses_total', 'Address status responses and notifications')
+HISTORY_REQUESTS = metrics.counter('synchronizer_history_requests_total', 'Address histories requested')
+HISTORY_SECONDS = metrics.histogram('synchronizer_history_seconds', 'Time to process an address history')
+TXS = metrics.counter('synchronizer_txs_total', 'Transactions received')
+TX_SECONDS = metrics.histogram('synchronizer_tx_seconds', 'Time to process a received transaction')
 
 class Synchronizer(ThreadJob):
     """The synchronizer keeps the wallet up-to-date with its set of
@@ -241,6 +247,7 @@ class Synchronizer(ThreadJob):
         params, result, error = self._parse_response(response)
         if error:
             return
+        STATUSES.inc()
         scripthash = params[0]
         addr = self.h2addr.get(scripthash, None)
         if not addr:
@@ -249,12 +256,14 @@ class Synchronizer(ThreadJob):
         if self.get_status(history) != result:
             if self.requested_histories.get(scripthash) is None:
                 self.requested_histories[scripthash] = result
+                HISTORY_REQUESTS.inc()
                 self.network.request_scripthash_history(scripthash, self._on_address_history)
         # remove addr from list only after it is added to requested_histories
         self.requested_hashes.discard(scripthash)  # Notifications won't be in
         # See if now the change address needs to be recategorized
         self._check_change_scripthash(scripthash)
 
+    @metrics.timed(HISTORY_SECONDS)
     def _on_address_history(self, response):
         if self.cleaned_up:
             return
@@ -288,6 +297,7 @@ class Synchronizer(ThreadJob):
         # Check that this scripthash is a candidate for purge
         self._check_change_scripthash(scripthash)
 
+    @metrics.timed(TX_SECONDS)
     def _tx_response(self, response, scripthash: Optional[str]):
         if self.cleaned_up:
             return
@@ -326,6 +336,7 @@ class Synchronizer(ThreadJob):
                 return
             del chk_txid
             # /Paranoia
+            TXS.inc()
             self.wallet.receive_tx_callback(tx_hash, tx, tx_height)
             self.print_error("received tx %s height: %d bytes: %d" %
                              (tx_hash, tx_height, len(tx.raw)))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -*- mode: python3 -*-
+# Part of the Electron Cash SPV Wallet
+# License: MIT
+"""
+Benchmark of signing preparation (wallet.add_input_sig_info() for every input
+of a large consolidation transaction) versus wallet size, for a watching-only
+standard wallet. Compares the wallet's address->derivation index to the old
+linear search through the receiving and change address lists.
+
+The address lists are filled with synthetic addresses rather than derived
+ones, since deriving tens of thousands of keys would dominate the run time
+and has nothing to do with what is being measured.
+
+Run from the top of the source tree with:
+
+    python3 -m electroncash.tests.bench_address_index [num_inputs] [wallet_size ...]
+"""
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from ..address import Address
+from ..storage import WalletStorage
+from ..wallet import Standard_Wallet
+from .. import keystore
+from .helpers import randbytes
+
+XPUB = 'xpub6CUzEfgtza7ZNtfDGYwHPnbPMPiQh93mAbP6v7C3ozUgkZq4tXSgYb9qqZ62oh8RCeexdSF7ZJmTzCm5bdWLB3zSMF8rNfuY8kccNAsdF4d'
+
+
+def linear_get_address_index(wallet, address):
+    """What get_address_index() used to do"""
+    try:
+        return False, wallet.receiving_addresses.index(address)
+    except ValueError:
+        pass
+    try:
+        return True, wallet.change_addresses.index(address)
+    except ValueError:
+        pass
+    raise Exception("Address {} not found".format(address))
+
+
+def make_wallet(tmpdir, size):
+    storage = WalletStorage(tmpdir + '/wallet_%d' % size)
+    storage.put('keystore', keystore.from_master_key(XPUB).dump())
+    wallet = Standard_Wallet(storage)
+    rng = random.Random(size)
+    addrs = [Address.from_P2PKH_hash(randbytes(rng, 20)) for _ in range(size)]
+    # Roughly the split of a long-lived wallet: a quarter of the addresses are change
+    wallet.receiving_addresses = addrs[:size * 3 // 4]
+    wallet.change_addresses = addrs[size * 3 // 4:]
+    wallet.invalidate_address_set_cache()
+    return wallet, addrs
+
+
+def prep(wallet, inputs):
+    t0 = time.perf_counter()
+    for address in inputs:
+        txin = {'type': 'p2pkh', 'address': address}
+        wallet.add_input_sig_info(txin, address)
+    return time.perf_counter() - t0
+
+
+def main(args):
+    num_inputs = int(args[0]) if args else 2000
+    sizes = [int(a) for a in args[1:]] or [1000, 10000, 40000]
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print(f"add_input_sig_info() for {num_inputs} inputs:")
+        for size in sizes:
+            wallet, addrs = make_wallet(tmpdir, size)
+            inputs = random.Random(0).choices(addrs, k=num_inputs)
+            t_index = prep(wallet, inputs)
+            wallet.get_address_index = lambda address: linear_get_address_index(wallet, address)
+            t_linear = prep(wallet, inputs)
+            print(f"  {size:7} addresses: linear {t_linear * 1e3:9.1f} ms, index {t_index * 1e3:7.1f} ms"
+                  f" ({t_linear / t_index:6.0f}x)")
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
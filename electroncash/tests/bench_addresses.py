@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -*- mode: python3 -*-
+# Part of the Electron Cash SPV Wallet
+# License: MIT
+"""
+Benchmark of looking up the balances of many addresses not in the wallet:
+one getaddressbalance call per address, which waits a server round trip
+each time, against one getaddressbalances call. The server is a local stub
+with a simulated round trip time, which answers requests in chunks of 100
+as the Interface sends them.
+
+Run from the top of the source tree with:
+
+    python3 -m electroncash.tests.bench_addresses [num_addresses] [rtt_ms]
+"""
+import sys
+import time
+
+from ..address import Address
+from ..commands import Commands
+from .test_commands import StubNetwork
+
+
+def main(args):
+    num_addresses = int(args[0]) if args else 1000
+    rtt = float(args[1]) / 1e3 if len(args) > 1 else 0.02
+    addrs = [Address.from_P2PKH_hash(i.to_bytes(20, 'big')).to_ui_string() for i in range(num_addresses)]
+    data = {Address.from_string(a).to_scripthash_hex(): {'blockchain.scripthash.get_balance':
+                                                         {'confirmed': i, 'unconfirmed': 0}}
+            for i, a in enumerate(addrs)}
+    cmds = Commands(None, None, StubNetwork(data, rtt=rtt))
+    print(f"Balances of {num_addresses} addresses, {rtt * 1e3:.0f} ms round trip:")
+
+    t0 = time.perf_counter()
+    one_by_one = {a: cmds.getaddressbalance(a) for a in addrs}
+    t1 = time.perf_counter()
+    print(f"  getaddressbalance x {num_addresses}: {t1 - t0:7.2f} s")
+
+    t0 = time.perf_counter()
+    batched = cmds.getaddressbalances(addrs)
+    t1 = time.perf_counter()
+    print(f"  getaddressbalances:{' ' * (len(str(num_addresses)) + 3)} {t1 - t0:7.2f} s")
+    assert batched == one_by_one
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -*- mode: python3 -*-
+# Part of the Electron Cash SPV Wallet
+# License: MIT
+"""
+Benchmark of wallet.get_balance() on a large wallet, as called by the GUI
+status bar and the `getbalance` command after every new transaction. Compares
+summing get_addr_balance() over every address (what get_balance() used to do)
+to the wallet's running totals, both in the steady state where a transaction
+touches a couple of addresses between calls, and right after a reorg.
+
+The address lists and histories are synthetic, since syncing a real wallet of
+that size has nothing to do with what is being measured.
+
+Run from the top of the source tree with:
+
+    python3 -m electroncash.tests.bench_balance [num_calls] [wallet_size ...]
+"""
+import random
+import shutil
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from ..address import Address
+from ..storage import WalletStorage
+from ..wallet import Standard_Wallet
+from .. import keystore
+from .helpers import randbytes
+
+XPUB = 'xpub6CUzEfgtza7ZNtfDGYwHPnbPMPiQh93mAbP6v7C3ozUgkZq4tXSgYb9qqZ62oh8RCeexdSF7ZJmTzCm5bdWLB3zSMF8rNfuY8kccNAsdF4d'
+HEIGHT = 800000
+
+
+def make_wallet(tmpdir, size):
+    storage = WalletStorage(tmpdir + '/wallet_%d' % size)
+    storage.put('keystore', keystore.from_master_key(XPUB).dump())
+    storage.put('stored_height', HEIGHT)
+    wallet = Standard_Wallet(storage)
+    rng = random.Random(size)
+    addrs = [Address.from_P2PKH_hash(randbytes(rng, 20)) for _ in range(size)]
+    wallet.receiving_addresses = addrs[:size * 3 // 4]
+    wallet.change_addresses = addrs[size * 3 // 4:]
+    wallet.invalidate_address_set_cache()
+    # Every address was used once: received a coin, most of which were spent since
+    for i, addr in enumerate(addrs):
+        tx_hash = randbytes(rng, 32).hex()
+        wallet._history[addr] = [(tx_hash, HEIGHT - size + i)]
+        wallet.txo[tx_hash] = {addr: [(0, 10000 + i, False)]}
+        if i % 4:
+            spend_hash = randbytes(rng, 32).hex()
+            wallet._history[addr].append((spend_hash, HEIGHT - size + i + 1))
+            wallet.txi[spend_hash] = {addr: [(tx_hash + ':0', 10000 + i)]}
+    return wallet, addrs, rng
+
+
+def new_tx(wallet, addrs, rng):
+    """What add_transaction() does to the wallet for a payment between two of our addresses"""
+    tx_hash = randbytes(rng, 32).hex()
+    for addr in rng.sample(addrs, 2):
+        wallet._history[addr].append((tx_hash, 0))
+        wallet.txo[tx_hash] = {addr: [(0, 5000, False)]}
+        wallet._invalidate_addr_bal_cache(addr)
+
+
+def old_get_balance(wallet):
+    """What get_balance() used to do"""
+    return wallet._sum_addr_balances(wallet.get_addresses(), False)[:3]
+
+
+def time_calls(wallet, addrs, rng, get_balance, num_calls, reorg=False):
+    res = None
+    t0 = time.perf_counter()
+    for _ in range(num_calls):
+        if reorg:
+            # What undo_verifications() used to do
+            wallet._addr_bal_cache = {}
+        new_tx(wallet, addrs, rng)
+        res = get_balance(wallet)
+    return (time.perf_counter() - t0) / num_calls, res
+
+
+def main(args):
+    num_calls = int(args[0]) if args else 20
+    sizes = [int(a) for a in args[1:]] or [5000, 20000, 50000]
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print(f"get_balance() after each of {num_calls} new transactions, ms per call")
+        print(f"{'addresses':>10} {'sum':>10} {'totals':>10} {'sum, reorg':>11} {'totals, first':>14}")
+        for size in sizes:
+            wallet, addrs, rng = make_wallet(tmpdir, size)
+            with mock.patch.object(wallet, 'get_local_height', return_value=HEIGHT):
+                t0 = time.perf_counter()
+                wallet.get_balance()
+                first = time.perf_counter() - t0
+                old, old_res = time_calls(wallet, addrs, rng, old_get_balance, num_calls)
+                new, new_res = time_calls(wallet, addrs, rng, lambda w: w.get_balance(), num_calls)
+                assert new_res == old_get_balance(wallet), (new_res, old_get_balance(wallet))
+                reorg, _ = time_calls(wallet, addrs, rng, old_get_balance, max(1, num_calls // 10), reorg=True)
+            print(f"{size:>10} {old * 1e3:>10.2f} {new * 1e3:>10.3f} {reorg * 1e3:>11.2f} {first * 1e3:>14.2f}")
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -*- mode: python3 -*-
+# Part of the Electron Cash SPV Wallet
+# License: MIT
+"""
+Throughput benchmark of payment request creation, as done by a point of sale
+backend, on a watching-only wallet with many receiving addresses. Compares:
+
+- the old path: addrequest with a scan of every receiving address for each
+  request, and a wallet file write per request
+- addrequest with the wallet's unused address cursor
+- one addrequests call creating all of the requests, with one write
+
+Run from the top of the source tree with:
+
+    python3 -m electroncash.tests.bench_requests [num_requests] [num_addresses]
+"""
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from .. import keystore
+from ..address import Address
+from ..commands import Commands
+from ..simple_config import SimpleConfig
+from ..storage import WalletStorage
+from ..wallet import Abstract_Wallet, Standard_Wallet
+from .helpers import randbytes
+
+XPUB = 'xpub6CUzEfgtza7ZNtfDGYwHPnbPMPiQh93mAbP6v7C3ozUgkZq4tXSgYb9qqZ62oh8RCeexdSF7ZJmTzCm5bdWLB3zSMF8rNfuY8kccNAsdF4d'
+
+
+def make_commands(tmpdir, name, num_addresses):
+    config = SimpleConfig({'electron_cash_path': tmpdir})
+    storage = WalletStorage(tmpdir + '/' + name)
+    storage.put('keystore', keystore.from_master_key(XPUB).dump())
+    wallet = Standard_Wallet(storage)
+    # Synthetic addresses rather than derived ones, which would take a while
+    rng = random.Random(1)
+    wallet.receiving_addresses = [Address.from_P2PKH_hash(randbytes(rng, 20)) for _ in range(num_addresses)]
+    wallet.invalidate_address_set_cache()
+    wallet.save_addresses()
+    storage.write()
+    return Commands(config, wallet, None)
+
+
+def run(label, func, num_requests):
+    t0 = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - t0
+    print(f"  {label:24} {elapsed:7.2f} s, {num_requests / elapsed:7.0f} requests/s")
+
+
+def main(args):
+    num_requests = int(args[0]) if args else 1000
+    num_addresses = int(args[1]) if len(args) > 1 else 5000
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print(f"Creating {num_requests} requests on a wallet of {num_addresses} receiving addresses:")
+
+        cmds = make_commands(tmpdir, 'legacy', num_addresses)
+        wallet = cmds.wallet
+        wallet.get_unused_address = lambda **kw: Abstract_Wallet.get_unused_address(wallet, **kw)
+        run('addrequest, old scan:', lambda: [cmds.addrequest('0.001') for _ in range(num_requests)], num_requests)
+
+        cmds = make_commands(tmpdir, 'single', num_addresses)
+        run('addrequest:', lambda: [cmds.addrequest('0.001') for _ in range(num_requests)], num_requests)
+
+        cmds = make_commands(tmpdir, 'batch', num_addresses)
+        run('addrequests:', lambda: cmds.addrequests(num_requests, '0.001'), num_requests)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
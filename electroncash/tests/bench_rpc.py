@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -*- mode: python3 -*-
+# Part of the Electron Cash SPV Wallet
+# License: MIT
+"""
+Load benchmark of the daemon's JSON-RPC server: requests/sec from many
+concurrent clients calling wallet commands on a watching-only wallet of many
+addresses, with a few clients making a slow call (`listaddresses`) in the
+mix. Compares the old single-threaded server (polled from the daemon loop,
+one connection per request) to the threaded keep-alive server.
+
+Run from the top of the source tree with:
+
+    python3 -m electroncash.tests.bench_rpc [num_clients] [seconds]
+"""
+import base64
+import http.client
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from ..address import Address
+from ..daemon import Daemon, get_lockfile
+from ..jsonrpc import VerifyingJSONRPCServer
+from ..simple_config import SimpleConfig
+from ..storage import WalletStorage
+from ..wallet import ImportedAddressWallet
+from .helpers import randbytes
+
+NUM_ADDRESSES = 2000
+NUM_SLOW_CLIENTS = 2
+RPC_USER, RPC_PASSWORD = 'user', 'bench'
+
+
+def make_daemon(tmpdir):
+    config = SimpleConfig({'offline': True, 'electron_cash_path': tmpdir, 'rpcuser': RPC_USER,
+                           'rpcpassword': RPC_PASSWORD, 'rpcport': 0})
+    fd = os.open(get_lockfile(config), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    daemon = Daemon(config, fd, False, None)
+    rng = random.Random(1)
+    addrs = [Address.from_P2PKH_hash(randbytes(rng, 20)) for _ in range(NUM_ADDRESSES)]
+    storage = WalletStorage(os.path.join(tmpdir, 'wallet'))
+    wallet = ImportedAddressWallet.from_text(storage, ' '.join(a.to_ui_string() for a in addrs))
+    daemon.add_wallet(wallet)
+    daemon.cmd_runner.wallet = wallet
+    return daemon, addrs
+
+
+def make_legacy_server(daemon):
+    """The pre-threading server, with the same methods registered"""
+    server = VerifyingJSONRPCServer(('127.0.0.1', 0), logRequests=False, rpc_user=RPC_USER,
+                                    rpc_password=RPC_PASSWORD)
+    server.timeout = 0.1
+    server.funcs.update(daemon.server.funcs)
+    stop = threading.Event()
+
+    def loop():
+        while not stop.is_set():
+            server.handle_request()
+    threading.Thread(target=loop, daemon=True).start()
+    return server, stop
+
+
+class Client:
+
+    def __init__(self, port, keep_alive):
+        self.port = port
+        self.keep_alive = keep_alive
+        self.conn = None
+        auth = base64.b64encode(f'{RPC_USER}:{RPC_PASSWORD}'.encode()).decode()
+        self.headers = {'Content-Type': 'application/json', 'Authorization': 'Basic ' + auth}
+
+    def call(self, method, params):
+        if self.conn is None or not self.keep_alive:
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        body = json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params})
+        self.conn.request('POST', '/', body, self.headers)
+        resp = self.conn.getresponse()
+        res = json.loads(resp.read())
+        if resp.will_close:
+            self.conn.close()
+            self.conn = None
+        assert 'error' not in res, res
+        return res['result']
+
+
+def run_load(port, addrs, num_clients, seconds, keep_alive):
+    counts = [0] * num_clients
+    errors = []
+    latencies = []
+    deadline = time.monotonic() + seconds
+
+    def fast_client(i):
+        client = Client(port, keep_alive)
+        rng = random.Random(i)
+        while time.monotonic() < deadline:
+            method, params = rng.choice([
+                ('getbalance', []),
+                ('ismine', [rng.choice(addrs).to_ui_string()]),
+                ('validateaddress', [rng.choice(addrs).to_ui_string()]),
+            ])
+            t0 = time.monotonic()
+            try:
+                client.call(method, params)
+            except (OSError, http.client.HTTPException):
+                # Connection refused or reset: the server's listen queue overflowed
+                errors.append(1)
+                client.conn = None
+                continue
+            latencies.append(time.monotonic() - t0)
+            counts[i] += 1
+
+    def slow_client():
+        client = Client(port, keep_alive)
+        while time.monotonic() < deadline:
+            try:
+                client.call('listaddresses', [])
+            except (OSError, http.client.HTTPException):
+                client.conn = None
+
+    threads = [threading.Thread(target=fast_client, args=(i,)) for i in range(num_clients)]
+    threads += [threading.Thread(target=slow_client) for _ in range(NUM_SLOW_CLIENTS)]
+    t0 = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - t0
+    latencies.sort()
+    return (sum(counts) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)],
+            len(errors))
+
+
+def report(label, rps, p50, p99, errors):
+    print(f"  {label:21} {rps:6.0f} req/s, p50 {p50 * 1e3:6.1f} ms, p99 {p99 * 1e3:7.1f} ms, {errors} errors")
+
+
+def main(args):
+    num_clients = int(args[0]) if args else 16
+    seconds = float(args[1]) if len(args) > 1 else 5.0
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print(f"Wallet of {NUM_ADDRESSES} addresses, {num_clients} clients + {NUM_SLOW_CLIENTS} slow ones,"
+              f" {seconds:.0f} s per run")
+        daemon, addrs = make_daemon(tmpdir)
+        legacy, legacy_stop = make_legacy_server(daemon)
+        res = run_load(legacy.socket.getsockname()[1], addrs, num_clients, seconds, keep_alive=False)
+        report('single-threaded:', *res)
+        legacy_stop.set()
+        daemon.start()
+        port = daemon.server.socket.getsockname()[1]
+        for keep_alive in (False, True):
+            res = run_load(port, addrs, num_clients, seconds, keep_alive=keep_alive)
+            report('threaded, keep-alive:' if keep_alive else 'threaded:', *res)
+        daemon.stop()
+        daemon.join()
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
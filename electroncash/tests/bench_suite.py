@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -*- mode: python3 -*-
+# Part of the Electron Cash SPV Wallet
+# License: MIT
+"""
+Offline benchmark suite for the core wallet operations, to catch performance
+regressions in wallet.py, transaction.py, blockchain.py and storage.py.
+
+A Standard_Wallet of the requested size is synthesized from a fixed seed: its
+transactions are real (parseable, with our own pubkeys in the inputs spending
+our coins), go through add_transaction() and the history callback the same
+way the synchronizer feeds them, and are saved to a wallet file. The
+benchmarks are then timed against that wallet:
+
+    wallet_open                 load the wallet file and construct the wallet
+    get_history                 wallet.get_history()
+    get_utxos                   wallet.get_utxos()
+    make_unsigned_transaction   coin selection and tx construction from every coin
+    sign_transaction            sign a tx spending SIGN_INPUTS coins
+    storage_write               serialize and save the wallet file
+    tx_deserialize              parse every transaction of the wallet
+    verify_chunk                check the hash chain of a chunk of 2016 headers (on
+                                regtest, since synthetic headers have no proof of work)
+    chunk_bits                  ASERT difficulty of each header of that chunk (mainnet)
+
+Everything is seeded, so two runs on the same machine are comparable. The
+results are printed as JSON (or written to the --output file), along with the
+commit and environment they were measured on; --compare prints the change
+against an earlier results file.
+
+Run from the top of the source tree with:
+
+    python3 -m electroncash.tests.bench_suite [--addresses N] [--txs N] [--tokens N]
+        [--repeat N] [--output FILE] [--compare FILE] [benchmark ...]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from .. import bitcoin, blockchain, ecc_fast, keystore, networks, token, util
+from ..address import Address
+from ..bitcoin import TYPE_ADDRESS, push_script
+from ..simple_config import SimpleConfig
+from ..storage import WalletStorage
+from ..transaction import Transaction
+from ..version import PACKAGE_VERSION
+from ..wallet import Wallet
+from .helpers import randbytes
+
+HEIGHT = 800000
+TIMESTAMP = 1689000000  # of the block at HEIGHT
+NUM_TOKEN_CATEGORIES = 20
+SIGN_INPUTS = 10
+CHUNK_BASE = 2016 * 400
+CHUNK_SIZE = 2016
+# A DER signature with a sighash byte; add_transaction() does not check signatures
+DUMMY_SIG = '30440220' + '11' * 32 + '0220' + '22' * 32 + '41'
+
+
+def txin(prevout_hash, prevout_n, pubkey):
+    return {'type': 'p2pkh', 'prevout_hash': prevout_hash, 'prevout_n': prevout_n, 'sequence': 0xfffffffe,
+            'scriptSig': push_script(DUMMY_SIG) + push_script(pubkey)}
+
+
+def external_address(rng):
+    return Address.from_P2PKH_hash(randbytes(rng, 20))
+
+
+def make_wallet(path, num_addresses, num_txs, num_tokens):
+    """Returns the wallet, and the raw transactions in it. Every other transaction
+    pays one of our receiving addresses from outside; the rest spend one of our
+    coins to an outside address, with change back to us. The first `num_tokens`
+    payments to us also carry a CashToken, fungible or NFT."""
+    storage = WalletStorage(path)
+    xprv, _ = bitcoin.bip32_root(bytes(range(32)), 'standard')
+    storage.put('keystore', keystore.from_xprv(xprv).dump())
+    storage.put('wallet_type', 'standard')
+    storage.put('stored_height', HEIGHT)
+    wallet = Wallet(storage)
+    num_change = max(1, num_addresses // 4)
+    for i in range(num_addresses - num_change):
+        wallet.create_new_address(for_change=False, save=False)
+    for i in range(num_change):
+        wallet.create_new_address(for_change=True, save=False)
+    wallet.save_addresses()
+    receiving, change = wallet.get_receiving_addresses(), wallet.get_change_addresses()
+
+    rng = random.Random(1)
+    token_ids = [randbytes(rng, 32) for _ in range(NUM_TOKEN_CATEGORIES)]
+    unspent = []  # (tx_hash, n, address, value) of our non-token coins
+    histories = defaultdict(list)
+    raw_txs = []
+    for i in range(num_txs):
+        height = HEIGHT - num_txs + 1 + i
+        token_datas = []
+        if i % 2 and unspent:
+            k = rng.randrange(len(unspent))
+            prev_hash, prev_n, addr, value = unspent[k]
+            unspent[k] = unspent[-1]
+            unspent.pop()
+            inputs = [txin(prev_hash, prev_n, wallet.get_public_key(addr))]
+            amount = rng.randrange(value // 4, value // 2)
+            ours = rng.choice(change)
+            outputs = [(TYPE_ADDRESS, external_address(rng), amount), (TYPE_ADDRESS, ours, value - amount - 250)]
+        else:
+            inputs = [txin(randbytes(rng, 32).hex(), rng.randrange(4), '02' + randbytes(rng, 32).hex())]
+            ours = rng.choice(receiving)
+            outputs = [(TYPE_ADDRESS, ours, rng.randrange(10000, 10000000)),
+                       (TYPE_ADDRESS, external_address(rng), rng.randrange(10000, 10000000))]
+            if num_tokens:
+                num_tokens -= 1
+                if rng.randrange(2):
+                    td = token.OutputData(id=rng.choice(token_ids), amount=rng.randrange(1, 10**9))
+                else:
+                    td = token.OutputData(id=rng.choice(token_ids), amount=0, commitment=i.to_bytes(4, 'little'),
+                                          bitfield=token.Structure.HasNFT | token.Structure.HasCommitmentLength)
+                outputs[0] = (TYPE_ADDRESS, ours, 800)
+                token_datas = [td]
+        tx = Transaction(Transaction.from_io(inputs, outputs, locktime=height - 1, token_datas=token_datas,
+                                             version=2).serialize())
+        tx_hash = tx.txid()
+        wallet.add_transaction(tx_hash, tx)
+        wallet.verified_tx[tx_hash] = (height, TIMESTAMP + 600 * (height - HEIGHT), 1)
+        for addr in set(wallet.txi.get(tx_hash, ())) | set(wallet.txo.get(tx_hash, ())):
+            histories[addr].append((tx_hash, height))
+        for n, (_, addr, value) in enumerate(tx.outputs()):
+            if wallet.is_mine(addr) and not (token_datas and n == 0):
+                unspent.append((tx_hash, n, addr, value))
+        raw_txs.append(tx.raw)
+    for addr, hist in histories.items():
+        wallet.receive_history_callback(addr, hist, {})
+    wallet.save_transactions()
+    wallet.save_verified_tx()
+    storage.write()
+    return wallet, raw_txs
+
+
+def make_chunk():
+    """CHUNK_SIZE headers from CHUNK_BASE, 10 minutes apart, each linked to the
+    previous one, and the header before them."""
+    anchor = networks.net.asert_daa.anchor
+    header = {'version': 0x20000000, 'prev_block_hash': '00' * 32, 'merkle_root': '33' * 32,
+              'timestamp': TIMESTAMP, 'bits': anchor.bits, 'nonce': 0, 'block_height': CHUNK_BASE - 1}
+    prev = bytes.fromhex(blockchain.serialize_header(header))
+    data = bytearray()
+    for i in range(CHUNK_SIZE):
+        header = dict(header, prev_block_hash=blockchain.hash_header(header), timestamp=header['timestamp'] + 600,
+                      nonce=i, block_height=CHUNK_BASE + i)
+        data += bytes.fromhex(blockchain.serialize_header(header))
+    return prev, bytes(data)
+
+
+class Suite:
+
+    def __init__(self, tmpdir, args):
+        self.tmpdir = tmpdir
+        self.path = os.path.join(tmpdir, 'wallet')
+        self.config = SimpleConfig({'electron_cash_path': tmpdir})
+        t0 = time.perf_counter()
+        self.wallet, self.raw_txs = make_wallet(self.path, args.addresses, args.txs, args.tokens)
+        self.setup_seconds = time.perf_counter() - t0
+        self.pay_to = external_address(random.Random(2))
+        coins = self.wallet.get_utxos()
+        self.pay_amount = sum(c['value'] for c in coins) // 3
+        self.sign_tx = self.wallet.make_unsigned_transaction(coins[:SIGN_INPUTS], [(TYPE_ADDRESS, self.pay_to, '!')],
+                                                             self.config)
+        self.chunk_prev, self.chunk = make_chunk()
+        self.chain = blockchain.Blockchain(self.config, 0, None)
+        open(self.chain.path(), 'wb').close()
+        self.chain.update_size()
+        self.chain.write(self.chunk_prev, (CHUNK_BASE - 1) * blockchain.HEADER_SIZE)
+
+    def bench_wallet_open(self, _):
+        Wallet(WalletStorage(self.path))
+
+    def bench_get_history(self, _):
+        self.wallet.get_history()
+
+    def bench_get_utxos(self, _):
+        self.wallet.get_utxos()
+
+    def setup_make_unsigned_transaction(self):
+        return self.wallet.get_utxos()
+
+    def bench_make_unsigned_transaction(self, coins):
+        self.wallet.make_unsigned_transaction(coins, [(TYPE_ADDRESS, self.pay_to, self.pay_amount)], self.config)
+
+    def setup_sign_transaction(self):
+        return Transaction(self.sign_tx.serialize())
+
+    def bench_sign_transaction(self, tx):
+        self.wallet.sign_transaction(tx, None)
+        assert tx.is_complete()
+
+    def setup_storage_write(self):
+        self.wallet.storage.modified = True
+
+    def bench_storage_write(self, _):
+        self.wallet.storage.write()
+
+    def bench_tx_deserialize(self, _):
+        for raw in self.raw_txs:
+            Transaction(raw).deserialize()
+
+    def setup_verify_chunk(self):
+        networks.set_regtest()
+
+    def bench_verify_chunk(self, _):
+        try:
+            self.chain.verify_chunk(CHUNK_BASE, self.chunk)
+        finally:
+            networks.set_mainnet()
+
+    def setup_chunk_bits(self):
+        return blockchain.HeaderChunk(CHUNK_BASE, self.chunk)
+
+    def bench_chunk_bits(self, chunk):
+        # The first 11 headers only provide the median time past for the others
+        for header in chunk.headers[11:]:
+            self.chain.get_bits(header, chunk)
+
+    def run(self, name, repeat):
+        setup = getattr(self, 'setup_' + name, lambda: None)
+        func = getattr(self, 'bench_' + name)
+        times = []
+        for _ in range(repeat):
+            arg = setup()
+            t0 = time.perf_counter()
+            func(arg)
+            times.append(time.perf_counter() - t0)
+        return {'runs': repeat, 'min_ms': round(min(times) * 1e3, 3),
+                'median_ms': round(statistics.median(times) * 1e3, 3),
+                'mean_ms': round(statistics.mean(times) * 1e3, 3)}
+
+
+BENCHMARKS = [name[len('bench_'):] for name in vars(Suite) if name.startswith('bench_')]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(base, results, out):
+    if base['params'] != results['params']:
+        print(f"warning: comparing runs with different parameters: {base['params']} vs {results['params']}",
+              file=out)
+    print(f"{'':26} {'base ms':>10} {'ms':>10} {'change':>8}", file=out)
+    for name, r in results['results'].items():
+        b = base['results'].get(name)
+        if b is None:
+            continue
+        change = (r['min_ms'] / b['min_ms'] - 1) * 100 if b['min_ms'] else 0.0
+        print(f"{name:26} {b['min_ms']:>10.2f} {r['min_ms']:>10.2f} {change:>+7.1f}%", file=out)
+
+
+def main(args):
+    parser = argparse.ArgumentParser(prog='python3 -m electroncash.tests.bench_suite',
+                                     description='Offline benchmarks of the core wallet operations')
+    parser.add_argument('benchmarks', nargs='*', metavar='benchmark',
+                        help='benchmarks to run (default: all of {})'.format(', '.join(BENCHMARKS)))
+    parser.add_argument('-a', '--addresses', type=int, default=1000, help='wallet addresses (default: 1000)')
+    parser.add_argument('-t', '--txs', type=int, default=5000, help='wallet transactions (default: 5000)')
+    parser.add_argument('-k', '--tokens', type=int, default=500, help='CashToken utxos (default: 500)')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='runs of each benchmark (default: 5)')
+    parser.add_argument('-o', '--output', help='write the results to this file instead of stdout')
+    parser.add_argument('-c', '--compare', help='print the change against the results in this file')
+    args = parser.parse_args(args)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error('unknown benchmarks: {}'.format(', '.join(sorted(unknown))))
+    util.set_verbosity(False)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print(f"Synthesizing a wallet of {args.addresses} addresses, {args.txs} txs, {args.tokens} tokens ...",
+              file=sys.stderr)
+        suite = Suite(tmpdir, args)
+        results = {
+            'version': PACKAGE_VERSION,
+            'commit': git_commit(),
+            'time': int(time.time()),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'fast_ecc': ecc_fast.is_using_fast_ecc(),
+            'params': {'addresses': args.addresses, 'txs': args.txs, 'tokens': args.tokens,
+                       'sign_inputs': SIGN_INPUTS, 'chunk_size': CHUNK_SIZE},
+            'setup_seconds': round(suite.setup_seconds, 3),
+            'results': {},
+        }
+        for name in args.benchmarks or BENCHMARKS:
+            r = results['results'][name] = suite.run(name, args.repeat)
+            print(f"  {name:26} {r['min_ms']:>10.2f} ms", file=sys.stderr)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), results, sys.stderr)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
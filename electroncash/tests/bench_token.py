@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -*- mode: python3 -*-
+# Part of the Electron Cash SPV Wallet
+# License: MIT
+"""
+Memory and load-time benchmark of the wallet's CashToken maps (ct_txo) for a
+synthetic wallet holding many token utxos. Compares parsing every stored
+token.OutputData on its own to the wallet's load path, which shares equal
+token data and interns category ids, and times saving the map back out.
+
+Run from the top of the source tree with:
+
+    python3 -m electroncash.tests.bench_token [num_utxos]
+"""
+import gc
+import random
+import sys
+import time
+import tracemalloc
+
+from .. import token
+from ..address import Address
+from ..wallet import Abstract_Wallet
+from .helpers import FakeStorage, FakeWallet, randbytes
+
+NUM_FT_CATEGORIES = 50
+NUM_NFT_CATEGORIES = 200
+NUM_ADDRESSES = 1000
+OUTPUTS_PER_TX = 10
+
+
+class TokenWallet(FakeWallet):
+    """Just enough of a wallet to run the Abstract_Wallet ct_txo load/save methods."""
+    to_Address_dict = Abstract_Wallet.to_Address_dict
+    from_Address_dict = Abstract_Wallet.from_Address_dict
+    load_ct_txo = Abstract_Wallet.load_ct_txo
+    save_ct_txo = Abstract_Wallet.save_ct_txo
+    _token_data_hexer = staticmethod(Abstract_Wallet._token_data_hexer)
+
+
+def make_storage(num_utxos):
+    rng = random.Random(1)
+    ft_ids = [randbytes(rng, 32) for _ in range(NUM_FT_CATEGORIES)]
+    nft_ids = [randbytes(rng, 32) for _ in range(NUM_NFT_CATEGORIES)]
+    addrs = [Address.from_P2PKH_hash(randbytes(rng, 20)).to_storage_string() for _ in range(NUM_ADDRESSES)]
+    ct_txo = {}
+    for i in range(num_utxos):
+        if i % 2:
+            td = token.OutputData(id=rng.choice(ft_ids), amount=rng.choice((1000, 5000, 10000, rng.randrange(1, 10**9))))
+        else:
+            bitfield = token.Structure.HasNFT | token.Structure.HasCommitmentLength
+            td = token.OutputData(id=rng.choice(nft_ids), amount=0, commitment=i.to_bytes(4, 'little'),
+                                  bitfield=bitfield)
+        tx_hash = (i // OUTPUTS_PER_TX).to_bytes(32, 'little').hex()
+        ct_txo.setdefault(tx_hash, {}).setdefault(rng.choice(addrs), {})[str(i % OUTPUTS_PER_TX)] = td.hex()
+    return FakeStorage(ct_txo=ct_txo, deepcopy=False)
+
+
+def copy_storage(storage):
+    # The wallet converts the loaded maps in place, so every run needs its own copy
+    return FakeStorage(ct_txo={tx_hash: {addr: dict(outputmap) for addr, outputmap in addrmap.items()}
+                               for tx_hash, addrmap in storage['ct_txo'].items()}, deepcopy=False)
+
+
+def measure(func, storage):
+    gc.collect()
+    arg = copy_storage(storage)
+    tracemalloc.start()
+    ret = func(arg)
+    mem = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del ret
+    # Timing without tracemalloc's overhead
+    gc.collect()
+    arg = copy_storage(storage)
+    t0 = time.perf_counter()
+    ret = func(arg)
+    t1 = time.perf_counter()
+    return ret, mem, t1 - t0
+
+
+def parse_each(storage):
+    """What loading used to do: parse every address and token on its own."""
+    ct_txo = {tx_hash: Abstract_Wallet.to_Address_dict(value) for tx_hash, value in storage['ct_txo'].items()}
+    for addrmap in ct_txo.values():
+        for outputmap in addrmap.values():
+            for n, hexdata in outputmap.copy().items():
+                del outputmap[n]
+                outputmap[int(n)] = token.OutputData.fromhex(hexdata)
+    return ct_txo
+
+
+def wallet_load(storage):
+    w = TokenWallet(storage=storage)
+    w.load_ct_txo()
+    return w
+
+
+def main(args):
+    num_utxos = int(args[0]) if args else 500_000
+    print(f"Building a synthetic wallet with {num_utxos} token utxos ...")
+    storage = make_storage(num_utxos)
+
+    _, mem_each, t_each = measure(parse_each, storage)
+    print(f"  parse each:   {t_each:6.2f} s, {mem_each / 2**20:7.1f} MiB ({mem_each / num_utxos:5.0f} bytes/utxo)")
+    w, mem_load, t_load = measure(wallet_load, storage)
+    print(f"  wallet load:  {t_load:6.2f} s, {mem_load / 2**20:7.1f} MiB ({mem_load / num_utxos:5.0f} bytes/utxo)")
+    tds = [td for addrmap in w.ct_txo.values() for outputmap in addrmap.values() for td in outputmap.values()]
+    print(f"  distinct token data objects: {len({id(td) for td in tds})},"
+          f" category id objects: {len({id(td.id) for td in tds})}")
+    t0 = time.perf_counter()
+    w.save_ct_txo()
+    t1 = time.perf_counter()
+    print(f"  wallet save:  {t1 - t0:6.2f} s")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
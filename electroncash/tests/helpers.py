@@ -0,0 +1,65 @@
+"""
+Helpers shared by the test and benchmark modules in this package.
+"""
+import copy
+import threading
+
+
+def randbytes(rng, n):
+    """`n` random bytes from the random.Random instance `rng` (Random.randbytes needs Python 3.9)"""
+    return rng.getrandbits(8 * n).to_bytes(n, 'big')
+
+
+def make_raw_tx(seed: int, outputs) -> str:
+    """Returns the hex of a transaction spending a made-up prevout to `outputs`, a list of (value, script)"""
+    def var_bytes(b):
+        assert len(b) < 253
+        return bytes((len(b),)) + b
+    raw = (b'\x01\x00\x00\x00' + b'\x01' + seed.to_bytes(32, 'little') + b'\x00\x00\x00\x00' + var_bytes(b'')
+           + b'\xff\xff\xff\xff' + bytes((len(outputs),)))
+    for value, script in outputs:
+        raw += value.to_bytes(8, 'little') + var_bytes(script)
+    return (raw + b'\x00\x00\x00\x00').hex()
+
+
+class FakeStorage(dict):
+    """A dict with the get/put semantics of WalletStorage: values are copied
+    going in and out (unless deepcopy=False), and putting None deletes. `puts`
+    counts the puts that changed something."""
+
+    def __init__(self, *args, deepcopy=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.deepcopy = deepcopy
+        self.puts = 0
+
+    def get(self, key, default=None):
+        v = super().get(key)
+        if v is None:
+            return default
+        return copy.deepcopy(v) if self.deepcopy else v
+
+    def put(self, key, value):
+        if value is None:
+            self.pop(key, None)
+        elif super().get(key) != value:
+            self.puts += 1
+            self[key] = copy.deepcopy(value) if self.deepcopy else value
+
+
+class FakeWallet:
+    """Just enough of a wallet for the parts that keep their data in the wallet's storage."""
+
+    def __init__(self, mine=(), storage=None):
+        self.mine = set(mine)
+        self.storage = FakeStorage() if storage is None else storage
+        self.lock = threading.RLock()
+        self.transactions = dict()
+
+    def is_mine(self, address):
+        return address in self.mine
+
+    def diagnostic_name(self):
+        return 'test'
+
+    def print_error(self, *args):
+        pass
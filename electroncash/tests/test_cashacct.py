@@ -24,11 +24,15 @@
 '''
 Cash Accounts tests.
 '''
-import unittest
+import os
 import random
+import tempfile
+import time
+import unittest
 
 from .. import cashacct
 from ..address import Address
+from .helpers import FakeWallet
 
 class TestCashAccounts(unittest.TestCase):
 
@@ -197,3 +201,105 @@ class TestCashAccounts(unittest.TestCase):
         d = cashacct.CashAcct._calc_minimal_chashes_for_sorted_lcased_tups(sorted(l))
         self.assertEqual(sum(len(v) for k,v in d.items()), len(set(l)))
         self.assertEqual(d[myname][my_collision_hash], '03')
+
+
+class TestResolveCache(unittest.TestCase):
+
+    NUMBER = 150
+
+    def make_results(self, name, chashes, number=NUMBER):
+        addr = Address.from_P2PKH_hash(b'\x01' * 20)
+        return [(cashacct.Info(name, addr, number, chash, None, '%064x' % i), chash[:i + 1])
+                for i, chash in enumerate(chashes)]
+
+    def make_pb(self, block_hash, number=NUMBER):
+        return cashacct.ProcessedBlock(hash=block_hash, height=cashacct.num2bh(number), reg_txs={})
+
+    def test_get_put_and_stats(self):
+        cache = cashacct.ResolveCache()
+        self.assertIsNone(cache.get('Alice', self.NUMBER))
+        results = self.make_results('Alice', ['1234567890', '1299999999'])
+        cache.put('Alice', self.NUMBER, results, self.make_pb('aa' * 32))
+        # Lookups are case-insensitive and any collision prefix is served by the one entry
+        self.assertEqual(cache.get('alice', self.NUMBER), results)
+        self.assertEqual(cache.get('ALICE', self.NUMBER, '12'), results)
+        self.assertEqual(cache.get('alice', self.NUMBER, '123'), results[:1])
+        self.assertEqual(cache.get('alice', self.NUMBER, '5'), [])
+        self.assertEqual(cache.get_minimal_chash('Alice', self.NUMBER, '1299999999'), '12')
+        self.assertIsNone(cache.get('alice', self.NUMBER + 1))
+        self.assertEqual(cache.get_block_hash(cashacct.num2bh(self.NUMBER)), 'aa' * 32)
+        stats = cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (4, 2, 1))
+
+    def test_expiry_and_size_bound(self):
+        cache = cashacct.ResolveCache(maxlen=3, ttl=60.0)
+        for i in range(5):
+            cache.put(f'name{i}', self.NUMBER, self.make_results(f'name{i}', ['1111111111']))
+        # The least recently used entries went first
+        self.assertIsNone(cache.get('name0', self.NUMBER))
+        self.assertIsNotNone(cache.get('name2', self.NUMBER))
+        cache.put('name5', self.NUMBER, self.make_results('name5', ['1111111111']))
+        self.assertIsNotNone(cache.get('name2', self.NUMBER))
+        self.assertIsNone(cache.get('name3', self.NUMBER))
+        self.assertEqual(cache.get_stats()['evicted'], 3)
+        # Backdate an entry past the ttl
+        t, results = cache.entries[('name4', self.NUMBER)]
+        cache.entries[('name4', self.NUMBER)] = (t - 61.0, results)
+        self.assertIsNone(cache.get('name4', self.NUMBER))
+        self.assertEqual(cache.get_stats()['expired'], 1)
+
+    def test_invalidation(self):
+        cache = cashacct.ResolveCache()
+        for number in (self.NUMBER, self.NUMBER + 10, self.NUMBER + 20):
+            cache.put('bob', number, self.make_results('bob', ['2222222222'], number), self.make_pb('bb' * 32, number))
+        # Same block again: nothing happens
+        self.assertTrue(cache.check_block(self.make_pb('bb' * 32, self.NUMBER)))
+        # The block at NUMBER changed contents
+        self.assertFalse(cache.check_block(self.make_pb('cc' * 32, self.NUMBER)))
+        self.assertIsNone(cache.get('bob', self.NUMBER))
+        self.assertIsNotNone(cache.get('bob', self.NUMBER + 10))
+        # Reorg
+        cache.invalidate_from_height(cashacct.num2bh(self.NUMBER + 15))
+        self.assertIsNotNone(cache.get('bob', self.NUMBER + 10))
+        self.assertIsNone(cache.get('bob', self.NUMBER + 20))
+        self.assertEqual(cache.get_stats()['invalidated'], 2)
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = cashacct.ResolveCache.shared(tmpdir)
+            self.assertIs(cache, cashacct.ResolveCache.shared(tmpdir))
+            results = self.make_results('Carol', ['3333333333', '3344444444'])
+            cache.put('Carol', self.NUMBER, results, self.make_pb('dd' * 32))
+            cache.save()
+            self.assertFalse(cache.dirty)
+            cache2 = cashacct.ResolveCache(cache.path)
+            cache2.load()
+            self.assertEqual(cache2.get('carol', self.NUMBER), results)
+            self.assertEqual(cache2.get_block_hash(cashacct.num2bh(self.NUMBER)), 'dd' * 32)
+            # Expired entries are not loaded
+            cache3 = cashacct.ResolveCache(cache.path, ttl=0.0)
+            time.sleep(0.01)
+            cache3.load()
+            self.assertIsNone(cache3.get('carol', self.NUMBER))
+            # Corrupt files are ignored
+            with open(cache.path, 'w') as f:
+                f.write('{')
+            cache4 = cashacct.ResolveCache(cache.path)
+            cache4.load()
+            self.assertEqual(cache4.get_stats()['entries'], 0)
+            self.assertTrue(os.path.exists(cache.path))
+
+    def test_cashacct_uses_cache(self):
+        ca = cashacct.CashAcct(FakeWallet())
+        ca.resolve_cache = cashacct.ResolveCache()
+        results = self.make_results('Dave', ['4444444444', '4455555555'])
+        ca.resolve_cache.put('Dave', self.NUMBER, results, self.make_pb('ee' * 32))
+        # No network needed on a hit
+        self.assertEqual(ca.resolve_verify(f'dave#{self.NUMBER}.444'), results[:1])
+        self.assertIsNone(ca.resolve_verify(f'dave#{self.NUMBER}.9'))
+        self.assertEqual(ca.get_minimal_chash('Dave', self.NUMBER, '4455555555', only_cached=True), '44')
+        # A reorg undoing a verification at that height drops the entry
+        txid = results[0][0].txid
+        ca.v_tx[txid] = ca.VerifTx(txid, cashacct.num2bh(self.NUMBER), 'ee' * 32)
+        ca.undo_verifications_hook({txid})
+        self.assertIsNone(ca.resolve_cache.get('dave', self.NUMBER))
@@ -0,0 +1,165 @@
+'''
+Tests for the concurrent Cash Accounts registration scanner, run against local
+stub lookup servers.
+'''
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .. import cashacct
+from ..address import Address
+from .helpers import FakeWallet, make_raw_tx
+
+
+class StubLookupServer:
+    """ Serves /lookup/<number> from a dict of number -> list of raw tx hex. Numbers
+    not in the dict get a 404, like the real servers do for blocks without registrations. """
+
+    def __init__(self, blocks, fail=()):
+        self.blocks = blocks
+        self.fail = set(fail)
+        self.requests = []
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                number = int(self.path.rsplit('/', 1)[-1])
+                outer.requests.append(number)
+                if number in outer.fail or number not in outer.blocks:
+                    self.send_error(404 if number not in outer.fail else 500)
+                    return
+                header = number.to_bytes(4, 'little').hex() * 20  # 80 bytes, one "block" per number
+                body = json.dumps({
+                    'block': cashacct.num2bh(number),
+                    'results': [{'transaction': raw, 'inclusion_proof': header} for raw in outer.blocks[number]],
+                }).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ScanWallet(FakeWallet):
+
+    def get_local_height(self):
+        return cashacct.num2bh(200)
+
+
+class TestRegistrationScanner(unittest.TestCase):
+
+    START, STOP = 100, 160
+
+    def setUp(self):
+        self.mine = [Address.from_P2PKH_hash(bytes((i,)) * 20) for i in range(1, 4)]
+        self.other = Address.from_P2PKH_hash(b'\xee' * 20)
+        self.blocks = {}
+        self.expected_mine, self.expected_all = set(), set()
+        self.numbers = {}  # txid -> number
+        seed = 0
+        for number in range(self.START, self.STOP, 3):
+            for i in range(2):
+                seed += 1
+                addr = self.mine[seed % 3] if seed % 4 else self.other
+                script = cashacct.ScriptOutput.create_registration(f'name{seed}', addr)
+                raw = make_raw_tx(seed, [(0, script.script), (1000, addr.to_script())])
+                self.blocks.setdefault(number, []).append(raw)
+                txid = cashacct.Transaction._txid(raw)
+                self.expected_all.add(txid)
+                self.numbers[txid] = number
+                if addr != self.other:
+                    self.expected_mine.add(txid)
+        # Both servers know every block, except for a few each that the other one must cover
+        numbers = sorted(self.blocks)
+        self.servers = [StubLookupServer(self.blocks, fail=numbers[0::5]),
+                        StubLookupServer(self.blocks, fail=numbers[2::5])]
+        self.wallet = ScanWallet(self.mine)
+        self.ca = cashacct.CashAcct(self.wallet)
+
+    def tearDown(self):
+        for s in self.servers:
+            s.close()
+
+    def scan(self, **kw):
+        kw.setdefault('window', 6)
+        progress = []
+        scanner = cashacct.RegistrationScanner(self.ca, self.START, self.STOP,
+                                               server_list=[s.url for s in self.servers], timeout=5.0,
+                                               progress_cb=lambda *a: progress.append(a), **kw)
+        self.assertTrue(scanner.run())
+        return scanner, progress
+
+    def test_scan_adds_only_mine_once(self):
+        scanner, progress = self.scan()
+        self.assertEqual(set(self.ca.ext_reg_tx), self.expected_mine)
+        self.assertEqual(set(self.ca.ext_unverif), self.expected_mine)
+        self.assertEqual(scanner.num_added, len(self.expected_mine))
+        # Blocks without registrations look like failures
+        self.assertEqual(sorted(scanner.failed), sorted(set(range(self.START, self.STOP)) - set(self.blocks)))
+        # Every number was asked of a server, and only retried on failure
+        requests = self.servers[0].requests + self.servers[1].requests
+        self.assertEqual(set(requests), set(range(self.START, self.STOP)))
+        self.assertLess(len(requests), 2 * (self.STOP - self.START))
+        # Progress is monotonic and ends at 1.0
+        self.assertEqual(progress[-1], (1.0, len(self.expected_mine), self.STOP))
+        self.assertEqual([p[0] for p in progress], sorted(p[0] for p in progress))
+        self.assertEqual(self.wallet.storage[scanner.CHECKPOINT_KEY],
+                         {'start': self.START, 'stop': self.STOP, 'next': self.STOP})
+
+    def test_scan_all_and_dedupe(self):
+        # Rescanning, with a different window, adds nothing new
+        self.scan(add_only_mine=False)
+        self.assertEqual(set(self.ca.ext_reg_tx), self.expected_all)
+        scanner, _ = self.scan(add_only_mine=False, window=1, resume=False)
+        self.assertEqual(scanner.num_added, 0)
+        self.assertEqual(set(self.ca.ext_reg_tx), self.expected_all)
+
+    def test_resume_from_checkpoint(self):
+        self.wallet.storage[cashacct.RegistrationScanner.CHECKPOINT_KEY] = {
+            'start': self.START, 'stop': self.STOP, 'next': 130}
+        self.scan()
+        requests = self.servers[0].requests + self.servers[1].requests
+        self.assertEqual(min(requests), 130)
+        self.assertEqual(set(self.ca.ext_reg_tx),
+                         {txid for txid in self.expected_mine
+                          if self.numbers[txid] >= 130})
+        # A checkpoint for a different range is ignored
+        for s in self.servers:
+            s.requests.clear()
+        self.wallet.storage[cashacct.RegistrationScanner.CHECKPOINT_KEY]['stop'] = self.STOP + 1
+        self.scan()
+        self.assertEqual(min(self.servers[0].requests + self.servers[1].requests), self.START)
+
+    def test_unreachable_blocks_are_not_fatal(self):
+        for s in self.servers:
+            s.fail.add(self.START)
+        scanner, progress = self.scan()
+        self.assertIn(self.START, scanner.failed)
+        self.assertEqual(progress[-1][0], 1.0)
+        self.assertEqual(set(self.ca.ext_reg_tx),
+                         {txid for txid in self.expected_mine
+                          if self.numbers[txid] != self.START})
+
+    def test_stop(self):
+        scanner = cashacct.RegistrationScanner(self.ca, self.START, None, window=2,
+                                               server_list=[s.url for s in self.servers], timeout=5.0)
+        scanner.start()
+        scanner.stop()
+        self.assertFalse(scanner.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,66 @@
+import threading
+import time
 import unittest
 from decimal import Decimal as PyDecimal
 
+from ..address import Address
 from ..commands import Commands
+from ..network import Network
+from .. import util
+from .helpers import FakeWallet
+
+
+class StubNetwork:
+    """Stands in for the Network, answering from a dict of scripthash -> {method: result}
+    as a server `rtt` seconds away would: the requests of each send() go out together,
+    in chunks of 100 like the Interface does, and each chunk is answered one round trip
+    later. Unknown scripthashes get an error."""
+    get_index = staticmethod(Network.get_index)
+    synchronous_get = Network.synchronous_get
+    synchronous_get_many = Network.synchronous_get_many
+
+    def __init__(self, data, rtt=0.0, chunk_size=100):
+        self.data = data
+        self.rtt = rtt
+        self.chunk_size = chunk_size
+        self.sends = []
+
+    def send(self, messages, callback):
+        messages = list(messages)
+        self.sends.append(len(messages))
+        chunks = [messages[i:i + self.chunk_size] for i in range(0, len(messages), self.chunk_size)]
+        threading.Thread(target=self._answer, args=(chunks, callback), daemon=True).start()
+
+    def _answer(self, chunks, callback):
+        time.sleep(self.rtt)
+        for chunk in chunks:
+            for method, params in chunk:
+                results = self.data.get(params[0])
+                if results is None:
+                    response = {'error': {'code': 1, 'message': 'unknown'}}
+                else:
+                    response = {'result': results[method]}
+                response.update(method=method, params=params)
+                callback(response)
+
+    def cancel_requests(self, callback):
+        pass
+
+
+class CommandsWallet(FakeWallet):
+
+    def is_up_to_date(self):
+        return True
+
+    def get_addr_balance(self, addr):
+        return 100000000, 5, 1
+
+    def get_address_history(self, addr):
+        return [('ab' * 32, 10)]
+
+    def get_addr_utxo(self, addr):
+        return {'ab' * 32 + ':1': {'prevout_hash': 'ab' * 32, 'prevout_n': 1, 'height': 10, 'value': 7,
+                                   'token_data': None}}
 
 
 class TestCommands(unittest.TestCase):
@@ -31,3 +90,47 @@ class TestCommands(unittest.TestCase):
         self.assertEqual("2asd", Commands._setconfig_normalize_value('rpcpassword', '2asd'))
         self.assertEqual("['file:///var/www/','https://electrum.org']",
             Commands._setconfig_normalize_value('rpcpassword', "['file:///var/www/','https://electrum.org']"))
+
+
+def addr(i):
+    return Address.from_P2PKH_hash(i.to_bytes(20, 'big'))
+
+
+class TestMultiAddressCommands(unittest.TestCase):
+
+    def setUp(self):
+        self.mine = [addr(i) for i in range(3)]
+        self.foreign = [addr(i) for i in range(100, 350)]
+        self.data = {a.to_scripthash_hex(): {
+            'blockchain.scripthash.get_balance': {'confirmed': i, 'unconfirmed': 0},
+            'blockchain.scripthash.get_history': [{'tx_hash': 'cd' * 32, 'height': i}],
+            'blockchain.scripthash.listunspent': [{'tx_hash': 'cd' * 32, 'tx_pos': 0, 'height': i, 'value': i}],
+        } for i, a in enumerate(self.foreign)}
+        self.network = StubNetwork(self.data)
+        self.cmds = Commands(None, CommandsWallet(self.mine), self.network)
+
+    def test_getaddressbalances(self):
+        unknown = addr(999).to_ui_string()
+        query = [a.to_ui_string() for a in self.foreign + self.mine] + [unknown]
+        out = self.cmds.getaddressbalances(query)
+        self.assertEqual(list(out), query)
+        self.assertEqual(out[self.foreign[2].to_ui_string()], {'confirmed': '2E-8', 'unconfirmed': '0'})
+        self.assertEqual(out[self.mine[0].to_ui_string()], {'confirmed': '1.00000001', 'unconfirmed': '5E-8'})
+        self.assertIn('error', out[unknown])
+        # The foreign addresses all went out in one go
+        self.assertEqual(self.network.sends, [len(self.foreign) + 1])
+
+    def test_histories_and_unspent(self):
+        query = ' '.join(a.to_ui_string() for a in (self.foreign[5], self.mine[1], self.foreign[5]))
+        out = self.cmds.getaddresshistories(query)
+        self.assertEqual(out, {self.foreign[5].to_ui_string(): [{'tx_hash': 'cd' * 32, 'height': 5}],
+                               self.mine[1].to_ui_string(): [{'tx_hash': 'ab' * 32, 'height': 10}]})
+        out = self.cmds.getaddressesunspent('["%s"]' % self.mine[1].to_ui_string())
+        self.assertEqual(out, {self.mine[1].to_ui_string(): [{'tx_hash': 'ab' * 32, 'tx_pos': 1, 'height': 10,
+                                                              'value': 7}]})
+
+    def test_synchronous_get_many_timeout(self):
+        self.network.rtt = 1.0
+        sh = self.foreign[0].to_scripthash_hex()
+        res = self.network.synchronous_get_many([('blockchain.scripthash.get_balance', [sh])], timeout=0.05)
+        self.assertIsInstance(res[0], util.TimeoutException)
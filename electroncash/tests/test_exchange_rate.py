@@ -0,0 +1,113 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from decimal import Decimal
+
+from ..exchange_rate import ExchangeBase, FxThread, HistoricalRates
+
+
+def day(date_str):
+    return datetime.strptime(date_str, '%Y-%m-%d').toordinal()
+
+
+class FakeExchange(ExchangeBase):
+
+    def __init__(self, history):
+        super().__init__(lambda: None, lambda: None)
+        self.server_history = history
+        self.requests = []
+
+    def history_ccys(self):
+        return ['USD']
+
+    def request_history(self, ccy, since=None):
+        self.requests.append(since)
+        return {k: v for k, v in self.server_history.items()
+                if since is None or day(k) >= since.toordinal()}
+
+
+class TestHistoricalRates(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.cache_dir, 'rates')
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_lookup(self):
+        h = HistoricalRates.from_dict({'2020-01-03': 300.5, '2020-01-01': '100', '2020-01-02': None})
+        self.assertEqual(2, len(h))
+        self.assertEqual(100.0, h.get(day('2020-01-01')))
+        self.assertIsNone(h.get(day('2020-01-02')))
+        self.assertEqual(300.5, h.get(day('2020-01-03')))
+        self.assertIsNone(h.get(day('2020-01-04')))
+        days = [day('2020-01-03'), day('2020-01-03'), None, day('2019-12-31'), day('2020-01-01')]
+        self.assertEqual([300.5, 300.5, None, None, 100.0], h.get_many(days))
+
+    def test_save_load_incremental(self):
+        h = HistoricalRates.from_dict({'2020-01-01': 1.0, '2020-01-02': 2.0})
+        h.save(self.filename)
+        size = os.path.getsize(self.filename)
+        h2 = HistoricalRates.load(self.filename)
+        self.assertEqual(list(h.days), list(h2.days))
+        self.assertEqual(list(h.rates), list(h2.rates))
+        # Revising the last day and adding a new one only appends a record
+        h2 = h2.copy()
+        h2.merge({'2020-01-02': 2.5, '2020-01-03': 3.0})
+        wrote = h2.save(self.filename)
+        self.assertEqual(2 * HistoricalRates.RECORD.size, wrote)
+        self.assertEqual(size + HistoricalRates.RECORD.size, os.path.getsize(self.filename))
+        h3 = HistoricalRates.load(self.filename)
+        self.assertEqual([1.0, 2.5, 3.0], list(h3.rates))
+        # Filling a gap rewrites the file
+        h3.merge({'2019-12-31': 0.5})
+        h3.save(self.filename)
+        self.assertEqual([0.5, 1.0, 2.5, 3.0], list(HistoricalRates.load(self.filename).rates))
+
+    def test_load_bad_file(self):
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            f.write('{"2020-01-01": 1.0}')
+        self.assertIsNone(HistoricalRates.load(self.filename))
+
+    def test_exchange_fetches_incrementally(self):
+        history = {'2020-01-01': 1.0, '2020-01-02': 2.0}
+        # An old-style JSON cache gets converted
+        exchange = FakeExchange(history)
+        with open(exchange._get_legacy_cache_filename('USD', self.cache_dir), 'w', encoding='utf-8') as f:
+            f.write(json.dumps(history))
+        old = time.time() - 48 * 3600
+        os.utime(exchange._get_legacy_cache_filename('USD', self.cache_dir), (old, old))
+        history['2020-01-03'] = 3.0
+        exchange.get_historical_rates_safe('USD', self.cache_dir)
+        self.assertEqual([datetime(2020, 1, 2)], exchange.requests)
+        self.assertFalse(os.path.exists(exchange._get_legacy_cache_filename('USD', self.cache_dir)))
+        self.assertEqual(3.0, exchange.historical_rate('USD', datetime(2020, 1, 3, 12)))
+        # The cache is fresh now, so a new instance doesn't hit the network
+        exchange2 = FakeExchange(history)
+        exchange2.get_historical_rates_safe('USD', self.cache_dir)
+        self.assertEqual([], exchange2.requests)
+        self.assertEqual(3, len(exchange2.history['USD']))
+
+
+class TestBulkHistoryRates(unittest.TestCase):
+
+    def test_history_rates_matches_timestamp_rate(self):
+        exchange = FakeExchange({})
+        exchange.history['USD'] = HistoricalRates.from_dict({'2020-01-01': 100.0, '2020-01-02': 200.0})
+        exchange.quotes = {'USD': Decimal('500')}
+        fx = FxThread.__new__(FxThread)
+        fx.exchange, fx.ccy, fx.history_used_spot = exchange, 'USD', False
+        timestamps = [datetime(2020, 1, 1, 10).timestamp(), datetime(2020, 1, 2, 23, 59).timestamp(),
+                      datetime(2020, 1, 5).timestamp(), time.time()]
+        rates = fx.history_rates(timestamps)
+        self.assertEqual([fx.timestamp_rate(ts) for ts in timestamps], rates)
+        self.assertEqual([Decimal(100), Decimal(200), None, Decimal(500)], rates)
+
+
+if __name__ == '__main__':
+    unittest.main()
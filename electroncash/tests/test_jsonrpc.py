@@ -0,0 +1,194 @@
+import base64
+import http.client
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from .. import commands
+from ..daemon import Daemon
+from ..jsonrpc import ThreadedVerifyingJSONRPCServer
+from ..simple_config import SimpleConfig
+from ..util import standardize_path
+from .helpers import FakeWallet
+
+
+class TestThreadedJSONRPCServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadedVerifyingJSONRPCServer(('127.0.0.1', 0), logRequests=False,
+                                                     rpc_user='user', rpc_password='secret',
+                                                     method_limits={'limited': 1})
+        self.active = {'slow': 0, 'limited': 0}
+        self.max_active = {'slow': 0, 'limited': 0}
+        self.lock = threading.Lock()
+        self.server.register_function(lambda: 'pong', 'ping')
+        self.server.register_function(lambda a, b: a + b, 'add')
+        self.server.register_function(lambda secs: self.sleeper('slow', secs), 'slow')
+        self.server.register_function(lambda secs: self.sleeper('limited', secs), 'limited')
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.port = self.server.socket.getsockname()[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def sleeper(self, name, secs):
+        with self.lock:
+            self.active[name] += 1
+            self.max_active[name] = max(self.max_active[name], self.active[name])
+        time.sleep(secs)
+        with self.lock:
+            self.active[name] -= 1
+        return secs
+
+    def post(self, conn, payload, password='secret'):
+        body = json.dumps(payload).encode()
+        auth = base64.b64encode(f'user:{password}'.encode()).decode()
+        conn.request('POST', '/', body, {'Content-Type': 'application/json', 'Authorization': 'Basic ' + auth})
+        resp = conn.getresponse()
+        data = resp.read()
+        return resp.status, json.loads(data) if resp.status == 200 else data
+
+    def call(self, method, params, conn=None):
+        conn = conn or http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+        status, res = self.post(conn, {'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params})
+        self.assertEqual(status, 200)
+        return res['result']
+
+    def test_keep_alive(self):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+        for i in range(5):
+            self.assertEqual(self.call('add', [i, 1], conn), i + 1)
+            sock = conn.sock
+            self.assertIsNotNone(sock)  # the connection was not closed by the server
+        self.assertIs(conn.sock, sock)
+
+    def test_batch(self):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+        status, res = self.post(conn, [{'jsonrpc': '2.0', 'id': i, 'method': 'add', 'params': [i, i]}
+                                       for i in range(10)] + [{'jsonrpc': '2.0', 'id': 10, 'method': 'nope'}])
+        self.assertEqual(status, 200)
+        by_id = {r['id']: r for r in res}
+        self.assertEqual([by_id[i]['result'] for i in range(10)], [2 * i for i in range(10)])
+        self.assertEqual(by_id[10]['error']['code'], -32601)
+
+    def test_slow_call_does_not_block_others(self):
+        t = threading.Thread(target=self.call, args=('slow', [1.0]))
+        t.start()
+        time.sleep(0.1)
+        t0 = time.monotonic()
+        self.assertEqual(self.call('ping', []), 'pong')
+        self.assertLess(time.monotonic() - t0, 0.5)
+        t.join()
+
+    def test_method_limits(self):
+        threads = [threading.Thread(target=self.call, args=(method, [0.2]))
+                   for method in ('limited', 'slow') for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.max_active['limited'], 1)
+        self.assertGreater(self.max_active['slow'], 1)
+
+    def test_auth(self):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=10)
+        status, _ = self.post(conn, {'jsonrpc': '2.0', 'id': 1, 'method': 'ping', 'params': []}, password='bad')
+        self.assertEqual(status, 401)
+
+
+class FakeCommands:
+
+    def __init__(self, wallet):
+        self.wallet = wallet
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    def _sleep(self):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.2)
+        with self.lock:
+            self.active -= 1
+
+    def addrequest(self, amount):
+        self._sleep()
+        return amount
+
+    def getbalance(self):
+        self._sleep()
+        return 0
+
+
+class TestDaemonRunCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        config = SimpleConfig({'offline': True, 'electron_cash_path': self.tmpdir})
+        self.daemon = Daemon(config, None, False, None, listen_jsonrpc=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def run_concurrently(self, cmd_runner, cmdname, *args):
+        threads = [threading.Thread(target=self.daemon._run_command, args=(cmd_runner, cmdname, *args))
+                   for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def test_wallet_commands_are_serialized(self):
+        cmd_runner = FakeCommands(FakeWallet())
+        self.run_concurrently(cmd_runner, 'addrequest', 1)
+        self.assertEqual(cmd_runner.max_active, 1)
+        # Read-only commands run concurrently
+        self.run_concurrently(cmd_runner, 'getbalance')
+        self.assertGreater(cmd_runner.max_active, 1)
+        # Different wallets don't wait for each other
+        runners = [FakeCommands(FakeWallet()) for _ in range(2)]
+        threads = [threading.Thread(target=self.daemon._run_command, args=(r, 'addrequest', 1)) for r in runners]
+        t0 = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertLess(time.monotonic() - t0, 0.35)
+
+    def test_rpc_calls_are_serialized_per_wallet(self):
+        self.daemon.cmd_runner = commands.Commands(self.daemon.config, None, None, self.daemon)
+        wallet = FakeWallet()
+        path = os.path.join(self.tmpdir, 'w1')
+        self.daemon.wallets[standardize_path(path)] = wallet
+        fake = FakeCommands(None)
+        seen = []
+
+        def addrequest(cmds, amount):
+            seen.append(cmds.wallet)
+            return fake.addrequest(amount)
+
+        rpc_addrequest = self.daemon._make_rpc_method('addrequest')
+        with mock.patch.object(commands.Commands, 'addrequest', addrequest):
+            threads = [threading.Thread(target=rpc_addrequest, args=(1,), kwargs={'wallet': path})
+                       for _ in range(2)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(seen, [wallet, wallet])
+        self.assertEqual(fake.max_active, 1)
+
+    def test_concurrent_commands_exist(self):
+        self.assertLessEqual(commands.concurrent_commands, set(commands.known_commands))
+
+
+if __name__ == '__main__':
+    unittest.main()
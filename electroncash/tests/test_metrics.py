@@ -0,0 +1,98 @@
+import json
+import unittest
+import urllib.error
+import urllib.request
+
+from .. import metrics
+
+
+class TestRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+        self.registry.enabled = True
+
+    def test_counter_and_gauge(self):
+        c = self.registry.counter('requests_total', 'Requests', label='method')
+        c.inc(label='a')
+        c.inc(3, label='a')
+        c.inc(label='b')
+        self.assertIs(self.registry.counter('requests_total', 'Requests', label='method'), c)
+        g = self.registry.gauge('connections', 'Connections')
+        self.assertEqual(g.to_dict(), 0)
+        g.set(5)
+        g.dec()
+        self.assertEqual(self.registry.to_dict()['metrics'], {'requests_total': {'a': 4, 'b': 1}, 'connections': 4})
+        with self.assertRaises(AssertionError):
+            self.registry.gauge('requests_total', 'Requests')
+        self.registry.reset()
+        self.assertEqual(self.registry.to_dict()['metrics'], {'requests_total': {}, 'connections': 0})
+
+    def test_histogram(self):
+        h = self.registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+        for v in (0.05, 0.1, 0.5, 2.0):
+            h.observe(v)
+        d = h.to_dict()
+        self.assertEqual((d['count'], d['sum'], d['avg']), (4, 2.65, 0.6625))
+        self.assertEqual(dict(d['buckets']), {'0.1': 2, '1.0': 3})
+        self.assertEqual(h.to_prometheus()[2:], [
+            'latency_seconds_bucket{le="0.1"} 2',
+            'latency_seconds_bucket{le="1.0"} 3',
+            'latency_seconds_bucket{le="+Inf"} 4',
+            'latency_seconds_sum 2.65',
+            'latency_seconds_count 4',
+        ])
+        json.dumps(self.registry.to_dict())
+
+    def test_disabled(self):
+        self.registry.enabled = False
+        c = self.registry.counter('c', 'C')
+        h = self.registry.histogram('h', 'H')
+        c.inc()
+        h.observe(1.0)
+        with h.time():
+            pass
+        calls = []
+        metrics.timed(h)(calls.append)(1)
+        self.assertEqual(calls, [1])
+        self.assertEqual((c.values, h.values), ({}, {}))
+
+    def test_timed(self):
+        h = self.registry.histogram('h', 'H', label='what')
+
+        @metrics.timed(h, label='f')
+        def f(x):
+            if x is None:
+                raise ValueError
+            return x * 2
+
+        self.assertEqual(f(2), 4)
+        with self.assertRaises(ValueError):
+            f(None)
+        with h.time('block'):
+            pass
+        self.assertEqual({k: v['count'] for k, v in h.to_dict().items()}, {'f': 2, 'block': 1})
+
+    def test_prometheus_labels(self):
+        c = self.registry.counter('errors_total', 'Errors', label='reason')
+        c.inc(label='bad "header"')
+        text = self.registry.to_prometheus()
+        self.assertIn('# TYPE errors_total counter\n', text)
+        self.assertIn('errors_total{reason="bad \\"header\\""} 1\n', text)
+
+    def test_server(self):
+        self.registry.counter('hits_total', 'Hits').inc(7)
+        server = metrics.MetricsServer('127.0.0.1', 0, registry=self.registry)
+        server.start()
+        try:
+            url = 'http://{}:{}'.format(*server.address)
+            with urllib.request.urlopen(url + '/metrics', timeout=10) as r:
+                self.assertIn('hits_total 7\n', r.read().decode())
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(url + '/other', timeout=10)
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
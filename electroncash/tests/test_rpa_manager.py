@@ -0,0 +1,143 @@
+import unittest
+from unittest import mock
+
+from ..rpa.rpa_manager import RpaManager
+from ..wallet import RpaWallet
+from .helpers import FakeStorage
+
+
+class FakeNetwork:
+
+    def __init__(self, server_height):
+        self.server_height = server_height
+        self.sent = []  # list of (method, params, callback)
+        self.queued = []  # list of (method, params, callback)
+
+    def get_server_height(self):
+        return self.server_height
+
+    def send(self, messages, callback):
+        for method, params in messages:
+            self.sent.append((method, params, callback))
+
+    def queue_request(self, method, params, interface=None, *, callback=None, max_qlen=None):
+        self.queued.append((method, params, callback))
+
+    def trigger_callback(self, *args):
+        pass
+
+
+def make_wallet(rpa_height, storage=None):
+    wallet = mock.Mock(spec=RpaWallet)
+    wallet.storage = storage if storage is not None else FakeStorage()
+    wallet.rpa_height = rpa_height
+    wallet.rpa_pwd = None
+    wallet.has_password.return_value = False
+    wallet.get_grind_string.return_value = 'ab'
+    wallet.extract_private_keys_from_transaction.return_value = []
+    wallet.diagnostic_name.return_value = 'test'
+    return wallet
+
+
+class TestRpaManager(unittest.TestCase):
+
+    def history_requests(self, network):
+        ret = [(params[0], params[1], cb) for method, params, cb in network.sent
+               if method == 'blockchain.reusable.get_history']
+        network.sent.clear()
+        return ret
+
+    def reply_history(self, start, count, cb, payload):
+        cb({'method': 'blockchain.reusable.get_history', 'params': [start, count, 'ab'], 'result': payload})
+
+    def test_pipelined_windows(self):
+        network = FakeNetwork(1000)
+        wallet = make_wallet(500)
+        mgr = RpaManager(wallet, network)
+        mgr.rpa_phase_1()
+        reqs = self.history_requests(network)
+        self.assertEqual(len(reqs), RpaManager.MAX_OUTSTANDING_WINDOWS)
+        # Windows are contiguous and start at the resume height
+        self.assertEqual(reqs[0][0], 500)
+        for (s1, c1, _), (s2, _, _) in zip(reqs, reqs[1:]):
+            self.assertEqual(s1 + c1, s2)
+        self.assertFalse(mgr.up_to_date)
+        # Nothing more is requested while the window limit is reached
+        mgr.rpa_phase_1()
+        self.assertEqual(self.history_requests(network), [])
+
+    def test_out_of_order_completion(self):
+        network = FakeNetwork(1000)
+        wallet = make_wallet(500)
+        mgr = RpaManager(wallet, network)
+        mgr.rpa_phase_1()
+        (s1, c1, cb1), (s2, c2, cb2) = self.history_requests(network)[:2]
+        # The second window finishes first: rpa_height may not move, but its range is remembered
+        self.reply_history(s2, c2, cb2, [])
+        mgr.rpa_phase_4()
+        self.assertEqual(wallet.rpa_height, 500)
+        self.assertEqual(wallet.storage['rpa_completed_ranges'], [[s2, s2 + c2 - 1]])
+        # The first window has a tx; its range completes only once the raw tx arrives
+        self.reply_history(s1, c1, cb1, [{'tx_hash': 'aa' * 32, 'height': s1 + 1}])
+        mgr.rpa_phase_4()
+        self.assertEqual(wallet.rpa_height, 500)
+        (method, params, cb), = network.queued
+        self.assertEqual((method, params), ('blockchain.transaction.get', ['aa' * 32]))
+        cb({'method': method, 'params': params, 'result': '00'})
+        mgr.rpa_phase_4()
+        wallet.extract_private_keys_from_transaction.assert_called_once_with('00', None)
+        self.assertEqual(wallet.rpa_height, s2 + c2 - 1)
+        self.assertEqual(wallet.storage['rpa_completed_ranges'], [])
+        stats = mgr.get_stats()
+        self.assertEqual(stats['txs_processed'], 1)
+        self.assertEqual(stats['blocks_scanned'], c1 + c2)
+
+    def test_resume_skips_completed_ranges(self):
+        network = FakeNetwork(1000)
+        storage = FakeStorage(rpa_completed_ranges=[[520, 600]])
+        wallet = make_wallet(500, storage)
+        mgr = RpaManager(wallet, network)
+        mgr.rpa_phase_1()
+        reqs = self.history_requests(network)
+        self.assertEqual(reqs[0][:2], (500, 20))
+        self.assertEqual(reqs[1][0], 601)
+
+    def test_failed_window_is_retried(self):
+        network = FakeNetwork(1000)
+        wallet = make_wallet(500)
+        mgr = RpaManager(wallet, network)
+        mgr.rpa_phase_1()
+        s1, c1, cb1 = self.history_requests(network)[0]
+        cb1({'method': 'blockchain.reusable.get_history', 'params': [s1, c1, 'ab'], 'error': 'busy'})
+        mgr.rpa_phase_1()
+        reqs = self.history_requests(network)
+        self.assertEqual(reqs[0][:2], (s1, c1 // 2))
+
+    def test_window_adapts_to_density(self):
+        network = FakeNetwork(100000)
+        wallet = make_wallet(500)
+        mgr = RpaManager(wallet, network)
+        mgr.rpa_phase_1()
+        s1, c1, cb1 = self.history_requests(network)[0]
+        payload = [{'tx_hash': '%064x' % i, 'height': s1} for i in range(RpaManager.TARGET_TXS_PER_WINDOW * 10)]
+        self.reply_history(s1, c1, cb1, payload)
+        self.assertLess(mgr.window_size, c1)
+        self.assertGreaterEqual(mgr.window_size, RpaManager.MIN_WINDOW)
+
+    def test_back_pressure(self):
+        network = FakeNetwork(100000)
+        wallet = make_wallet(500)
+        mgr = RpaManager(wallet, network)
+        mgr.rpa_phase_1()
+        reqs = self.history_requests(network)
+        s1, c1, cb1 = reqs[0]
+        payload = [{'tx_hash': '%064x' % i, 'height': s1} for i in range(RpaManager.MAX_PENDING_RAWTX)]
+        self.reply_history(s1, c1, cb1, payload)
+        for start, count, cb in reqs[1:]:
+            self.reply_history(start, count, cb, [])
+        mgr.rpa_phase_1()
+        self.assertEqual(self.history_requests(network), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,7 +9,8 @@ from .. import schnorr
 
 import hashlib
 import secrets
-from ..bitcoin import regenerate_key
+import ecdsa
+from ..bitcoin import regenerate_key, point_to_ser
 
 class TestSchnorr(unittest.TestCase):
 
@@ -91,6 +92,17 @@ class TestBlind(unittest.TestCase):
         finally:
             schnorr.seclib = saved
 
+    def test_gen_nonce(self):
+        k, R = schnorr.BlindSigner.gen_nonce()
+        self.assertEqual(R, point_to_ser(k * ecdsa.SECP256k1.generator, comp=True))
+        saved = schnorr.seclib
+        schnorr.seclib = None
+        try:
+            k, R = schnorr.BlindSigner.gen_nonce()
+            self.assertEqual(R, point_to_ser(k * ecdsa.SECP256k1.generator, comp=True))
+        finally:
+            schnorr.seclib = saved
+
     def test_jacobi(self):
         """ test the faster jacobi implementation against ecdsa package"""
         alist = [-2,-1,0,1,2,3,4] + [secrets.randbits(256) for _ in range(100)]
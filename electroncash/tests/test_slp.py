@@ -1,9 +1,11 @@
 import json
 import unittest
+from unittest import mock
 
 
 from .. import address
 from .. import slp
+from .helpers import FakeWallet, make_raw_tx
 
 
 script_tests_json = r'''
@@ -614,3 +616,130 @@ class SLPTests(unittest.TestCase):
 
         print("Completed %d OP_RETURN *build* tests"%ctr)
 
+
+
+class SLPWalletDataTests(unittest.TestCase):
+
+    NUM_TOKENS = 40
+    TXS_PER_TOKEN = 50
+
+    def setUp(self):
+        self.addrs = [address.Address.from_P2PKH_hash(bytes((i,)) * 20) for i in range(1, 6)]
+        self.other = address.Address.from_P2PKH_hash(b'\xee' * 20)
+        self.wallet = FakeWallet(self.addrs)
+        self.token_ids = [(i + 1).to_bytes(32, 'big').hex() for i in range(self.NUM_TOKENS)]
+        seed = 0
+        for t, token_id in enumerate(self.token_ids):
+            for i in range(self.TXS_PER_TOKEN):
+                seed += 1
+                op_return = slp.Build.SendOpReturnOutput_V1(token_id, [1000 + i, 2**64 - 1])[1]
+                outputs = [(0, op_return.script), (546, self.addrs[seed % 5].to_script()),
+                           (546, self.other.to_script())]
+                self.add_tx(make_raw_tx(seed, outputs))
+            # one mint baton per token
+            seed += 1
+            op_return = slp.Build.MintOpReturnOutput_V1(token_id, 2, 5)[1]
+            self.add_tx(make_raw_tx(seed, [(0, op_return.script), (546, self.addrs[0].to_script()),
+                                           (546, self.addrs[1].to_script())]))
+        # Plus plenty of non-SLP txs
+        for i in range(1000):
+            seed += 1
+            self.add_tx(make_raw_tx(seed, [(10000, self.addrs[i % 5].to_script())]))
+
+    def add_tx(self, raw):
+        tx = slp.Transaction(raw)
+        self.wallet.transactions[tx.txid()] = tx
+
+    def rebuilt(self):
+        data = slp.WalletData(self.wallet)
+        data.rebuild()
+        return data
+
+    def assertSameData(self, a, b):
+        self.assertEqual(a.validity, b.validity)
+        self.assertEqual(a.token_quantities, b.token_quantities)
+        self.assertEqual(a.txo_token_id, b.txo_token_id)
+        self.assertEqual(a.txo_byaddr, b.txo_byaddr)
+
+    def test_rebuild(self):
+        data = self.rebuilt()
+        self.assertEqual(set(self.token_ids), set(data.token_quantities))
+        for token_id in self.token_ids:
+            self.assertEqual(self.TXS_PER_TOKEN + 2, len(data.token_quantities[token_id]))
+            self.assertEqual(1, len(data.get_batons(token_id)))
+        txo = next(iter(data.get_addr_txo(self.addrs[1])))
+        self.assertIn(data.token_info_for_txo(txo)[1], (2**64 - 1, 5, -1) + tuple(range(1000, 1050)))
+        self.assertFalse(data.get_addr_txo(self.other))
+
+    def test_save_load_roundtrip(self):
+        data = self.rebuilt()
+        data.save()
+        data2 = slp.WalletData(self.wallet)
+        self.assertTrue(data2.load())
+        self.assertSameData(data, data2)
+        for token_id in data2.token_quantities:
+            self.assertIs(token_id, data2.txo_token_id[next(iter(data2.token_quantities[token_id]))])
+
+    def test_load_old_format(self):
+        data = self.rebuilt()
+        self.wallet.storage.put('slp', {
+            'validity': data.validity,
+            'token_quantities': {k: [[v0, v1] for v0, v1 in v.items()] for k, v in data.token_quantities.items()},
+            'txo_byaddr': {k.to_storage_string(): list(v) for k, v in data.txo_byaddr.items()},
+            'version': 0.1,
+        })
+        data2 = slp.WalletData(self.wallet)
+        self.assertTrue(data2.load())
+        self.assertSameData(data, data2)
+        data2.save()
+        self.assertEqual(slp.WalletData.DATA_VERSION, self.wallet.storage['slp']['version'])
+        data3 = slp.WalletData(self.wallet)
+        self.assertTrue(data3.load())
+        self.assertSameData(data, data3)
+
+    def test_load_bad_data(self):
+        self.wallet.storage.put('slp', {'validity': {}, 'addresses': [], 'txos': {'ab' * 32: '00' * 48},
+                                        'version': slp.WalletData.DATA_VERSION})
+        data = slp.WalletData(self.wallet)
+        self.assertFalse(data.load())
+        self.assertTrue(data.need_rebuild)
+
+    def test_rm_tx(self):
+        data = self.rebuilt()
+        data.save()
+        txid = next(txid for txid in self.wallet.transactions if txid in data.validity)
+        data.rm_tx(txid)
+        del self.wallet.transactions[txid]
+        self.assertSameData(self.rebuilt(), data)
+        data.save()
+        data2 = slp.WalletData(self.wallet)
+        self.assertTrue(data2.load())
+        self.assertSameData(data, data2)
+
+    def test_incremental_save(self):
+        data = self.rebuilt()
+        with mock.patch.object(data, '_encode_txos', wraps=data._encode_txos) as encode:
+            data.save()
+            self.assertEqual(self.NUM_TOKENS, encode.call_count)
+            puts = self.wallet.storage.puts
+            # Nothing changed: nothing is re-encoded and the storage is not touched at all
+            encode.reset_mock()
+            data.save()
+            self.assertEqual(0, encode.call_count)
+            self.assertEqual(puts, self.wallet.storage.puts)
+            # One new tx for one token: only that token's records are re-encoded
+            op_return = slp.Build.SendOpReturnOutput_V1(self.token_ids[0], [7])[1]
+            tx = slp.Transaction(make_raw_tx(10**6, [(0, op_return.script), (546, self.addrs[2].to_script())]))
+            data.add_tx(tx.txid(), tx)
+            blobs = dict(data._saved_blobs)
+            data.save()
+            self.assertEqual(1, encode.call_count)
+        self.assertEqual(puts + 1, self.wallet.storage.puts)
+        changed = {k for k, v in data._saved_blobs.items() if blobs.get(k) is not v}
+        self.assertEqual({self.token_ids[0]}, changed)
+
+    def test_rebuild_skips_non_slp_txs(self):
+        # The non-SLP txs are skipped without being deserialized
+        with mock.patch.object(slp.WalletData, 'add_tx') as add_tx:
+            self.rebuilt()
+        self.assertEqual(self.NUM_TOKENS * (self.TXS_PER_TOKEN + 1), add_tx.call_count)
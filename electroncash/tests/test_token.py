@@ -23,6 +23,8 @@
 
 """Test vector for CashTokens encoding/decoding"""
 
+import copy
+import pickle
 import random
 import unittest
 
@@ -1116,11 +1118,24 @@ class TestTokens(unittest.TestCase):
             else:
                 assert not token_data.has_nft()
                 self.assertEqual(token_data.get_capability(), token.Capability.NoCapability)
-            # Test id_hex setter
+            # Test that instances are immutable and hashable values
             rand_id = int.to_bytes(random.getrandbits(256), length=32, byteorder='little')
-            token_data.id_hex = rand_id_hex = rand_id[::-1].hex()
-            self.assertEqual(token_data.id, rand_id)
-            self.assertEqual(token_data.id_hex, rand_id_hex)
+            with self.assertRaises(AttributeError):
+                token_data.id = rand_id
+            with self.assertRaises(AttributeError):
+                token_data.amount += 1
+            rand_id_hex = rand_id[::-1].hex()
+            token_data2 = token.OutputData(id=rand_id_hex, amount=token_data.amount,
+                                           commitment=token_data.commitment, bitfield=token_data.bitfield)
+            self.assertEqual(token_data2.id, rand_id)
+            self.assertEqual(token_data2.id_hex, rand_id_hex)
+            self.assertNotEqual(token_data, token_data2)
+            token_data3 = token.OutputData.fromhex(token_data.hex())
+            self.assertEqual(token_data, token_data3)
+            self.assertEqual(hash(token_data), hash(token_data3))
+            self.assertIs(token_data.id, token_data3.id)  # category ids are interned
+            self.assertIs(token_data, copy.deepcopy(token_data))
+            self.assertEqual(token_data, pickle.loads(pickle.dumps(token_data)))
 
     def test_encode_decode_invalid(self):
         """Test that the invalid test cases fail to deserialize"""
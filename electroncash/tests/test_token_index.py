@@ -0,0 +1,96 @@
+import unittest
+
+from ..address import Address
+from ..token import Capability, OutputData, Structure
+from ..token_index import TokenIndex
+
+CAT_A = 'aa' * 32
+CAT_B = 'bb' * 32
+ADDR1 = Address.from_P2PKH_hash(b'\x01' * 20)
+ADDR2 = Address.from_P2PKH_hash(b'\x02' * 20)
+
+
+def ft(category, amount):
+    return OutputData(id=category, amount=amount)
+
+
+def nft(category, capability, commitment=b'', amount=0):
+    bitfield = Structure.HasNFT | capability
+    if commitment:
+        bitfield |= Structure.HasCommitmentLength
+    if amount:
+        bitfield |= Structure.HasAmount
+    return OutputData(id=category, amount=amount, commitment=commitment, bitfield=bitfield)
+
+
+class TestTokenIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.idx = TokenIndex()
+        self.idx.add_output('01' * 32 + ':0', ADDR1, ft(CAT_A, 100))
+        self.idx.add_output('01' * 32 + ':1', ADDR2, ft(CAT_A, 50))
+        self.idx.add_output('02' * 32 + ':0', ADDR1, nft(CAT_B, Capability.Minting))
+        self.idx.add_output('02' * 32 + ':1', ADDR2, nft(CAT_B, Capability.NoCapability, b'\x01', 7))
+
+    def test_balances(self):
+        idx = self.idx
+        self.assertEqual({CAT_A, CAT_B}, idx.get_categories())
+        self.assertEqual(150, idx.get_balance(CAT_A)['fungible_amount'])
+        bal = idx.get_balance(CAT_B)
+        self.assertEqual(7, bal['fungible_amount'])
+        self.assertEqual(2, bal['nft_count'])
+        self.assertEqual({'none': 1, 'mutable': 0, 'minting': 1}, bal['nfts'])
+        self.assertEqual({'02' * 32 + ':0'}, idx.get_utxo_names(capability=Capability.Minting))
+        self.assertEqual({'01' * 32 + ':1'}, idx.get_utxo_names(CAT_A, addresses=[ADDR2]))
+        self.assertEqual({ADDR1, ADDR2}, idx.get_addresses())
+        self.assertEqual({ADDR1, ADDR2}, idx.get_addresses(CAT_A))
+        self.assertEqual(set(), idx.get_addresses('cc' * 32))
+
+    def test_spend_and_undo(self):
+        idx = self.idx
+        spender = '03' * 32
+        idx.spend('01' * 32 + ':0', spender)
+        idx.spend('02' * 32 + ':0', spender)
+        self.assertEqual(50, idx.get_balance(CAT_A)['fungible_amount'])
+        self.assertEqual({ADDR2}, idx.get_addresses(CAT_A))
+        self.assertEqual({'none': 1, 'mutable': 0, 'minting': 0}, idx.get_balance(CAT_B)['nfts'])
+        # Removing the spending tx makes the coins unspent again
+        idx.remove_tx(spender)
+        self.assertEqual(150, idx.get_balance(CAT_A)['fungible_amount'])
+        self.assertEqual(1, idx.get_balance(CAT_B)['nfts']['minting'])
+
+    def test_spend_before_receive(self):
+        idx = self.idx
+        idx.spend('04' * 32 + ':0', '05' * 32)
+        idx.add_output('04' * 32 + ':0', ADDR1, ft(CAT_A, 1000))
+        self.assertEqual(150, idx.get_balance(CAT_A)['fungible_amount'])
+        # Removing the funding tx forgets both the coin and its spend
+        idx.remove_tx('04' * 32)
+        self.assertFalse(idx.spent)
+        self.assertFalse(idx.spends_by_tx)
+
+    def test_remove_funding_tx(self):
+        idx = self.idx
+        idx.remove_tx('02' * 32)
+        self.assertEqual({CAT_A}, idx.get_categories())
+        self.assertNotIn(CAT_B, idx.fungible_totals)
+        self.assertNotIn(CAT_B, idx.nfts)
+        idx.remove_tx('01' * 32)
+        self.assertFalse(idx.get_categories())
+        self.assertFalse(idx.by_address)
+        self.assertFalse(idx.fungible_totals)
+
+    def test_rebuild_matches_incremental(self):
+        ct_txo = {'01' * 32: {ADDR1: {0: ft(CAT_A, 100)}, ADDR2: {1: ft(CAT_A, 50)}},
+                  '02' * 32: {ADDR1: {0: nft(CAT_B, Capability.Minting)},
+                              ADDR2: {1: nft(CAT_B, Capability.NoCapability, b'\x01', 7)}}}
+        ct_txi = {'03' * 32: {ADDR1: {'01' * 32: {0: ft(CAT_A, 100)}}}}
+        idx = TokenIndex()
+        idx.rebuild(ct_txo, ct_txi)
+        self.idx.spend('01' * 32 + ':0', '03' * 32)
+        for attr in ('outputs', 'spent', 'by_category', 'by_address', 'fungible_totals'):
+            self.assertEqual(getattr(self.idx, attr), getattr(idx, attr))
+
+
+if __name__ == '__main__':
+    unittest.main()
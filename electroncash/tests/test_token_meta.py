@@ -0,0 +1,337 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .. import token_meta
+
+
+class FakeConfig:
+
+    def __init__(self, path):
+        self.path = path
+
+    def electrum_path(self):
+        return self.path
+
+
+class BytesTokenMeta(token_meta.TokenMeta):
+    """Icons are just bytes here"""
+
+    def _icon_to_bytes(self, icon):
+        return icon
+
+    def _bytes_to_icon(self, buf):
+        return buf
+
+    def gen_default_icon(self, token_id_hex):
+        return b'default'
+
+
+def token_id(i):
+    return i.to_bytes(32, 'big').hex()
+
+
+class TestIconStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'icons.dat')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_put_get_delete_reopen(self):
+        store = token_meta.IconStore(self.path)
+        for i in range(10):
+            store.put(token_id(i), bytes([i]) * (i + 1))
+        store.put(token_id(3), b'replaced')
+        store.put(token_id(4), None)
+        store.put(token_id(99), None)  # deleting something that isn't there is a no-op
+        self.assertEqual(store.get(token_id(3)), b'replaced')
+        self.assertIsNone(store.get(token_id(4)))
+        self.assertEqual(len(store), 9)
+        # Everything is in the one file, and survives reopening
+        self.assertEqual(os.listdir(self.tmpdir), ['icons.dat'])
+        store2 = token_meta.IconStore(self.path)
+        self.assertEqual(store2.index, store.index)
+        self.assertEqual(store2.dead_bytes, store.dead_bytes)
+        for i in range(10):
+            self.assertEqual(store2.get(token_id(i)), store.get(token_id(i)))
+
+    def test_truncated_tail(self):
+        store = token_meta.IconStore(self.path)
+        store.put(token_id(1), b'one')
+        store.put(token_id(2), b'two' * 100)
+        size = os.path.getsize(self.path)
+        with open(self.path, 'r+b') as f:
+            f.truncate(size - 10)
+        store2 = token_meta.IconStore(self.path)
+        self.assertEqual(store2.get(token_id(1)), b'one')
+        self.assertNotIn(token_id(2), store2)
+        # The partial record is gone, so new records can be appended
+        store2.put(token_id(3), b'three')
+        self.assertEqual(token_meta.IconStore(self.path).get(token_id(3)), b'three')
+
+    def test_compaction(self):
+        store = token_meta.IconStore(self.path)
+        store.MIN_COMPACT_BYTES = 1000
+        store.put(token_id(1), b'keep')
+        for _ in range(50):
+            store.put(token_id(2), b'x' * 100)
+        self.assertLess(os.path.getsize(self.path), 1500)
+        self.assertEqual(store.get(token_id(1)), b'keep')
+        self.assertEqual(store.get(token_id(2)), b'x' * 100)
+        self.assertEqual(token_meta.IconStore(self.path).index, store.index)
+
+    def test_token_meta_migrates_icon_files(self):
+        icons_path = os.path.join(self.tmpdir, 'cashtoken_meta', 'icons')
+        os.makedirs(icons_path)
+        for i in range(3):
+            with open(os.path.join(icons_path, token_id(i) + '.png'), 'wb') as f:
+                f.write(b'icon%d' % i)
+        tm = BytesTokenMeta(FakeConfig(self.tmpdir))
+        self.assertFalse(os.path.exists(icons_path))
+        self.assertEqual(tm.get_icon(token_id(1)), b'icon1')
+        self.assertEqual(tm.get_icon(token_id(5)), b'default')
+        tm.set_icon(token_id(5), b'new')
+        self.assertEqual(BytesTokenMeta(FakeConfig(self.tmpdir)).get_icon(token_id(5)), b'new')
+
+    def test_migration_leaves_other_files_alone(self):
+        icons_path = os.path.join(self.tmpdir, 'cashtoken_meta', 'icons')
+        os.makedirs(icons_path)
+        others = [token_id(1) + '.jpg', 'notes.png', token_id(2)]
+        for fname in others + [token_id(3) + '.png']:
+            with open(os.path.join(icons_path, fname), 'wb') as f:
+                f.write(b'x')
+        tm = BytesTokenMeta(FakeConfig(self.tmpdir))
+        self.assertEqual(tm.get_icon(token_id(3)), b'x')
+        self.assertEqual(sorted(os.listdir(icons_path)), sorted(others))
+        self.assertNotIn(token_id(1), tm.icons)
+
+
+class TestApplyDownloadedMetadata(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.tm = BytesTokenMeta(FakeConfig(self.tmpdir))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    @staticmethod
+    def make_md(**kwargs):
+        md = token_meta.DownloadedMetaData()
+        for k, v in kwargs.items():
+            setattr(md, k, v)
+        return md
+
+    def test_fills_in_missing(self):
+        tid = token_id(1)
+        self.assertTrue(self.tm.needs_metadata(tid))
+        md = self.make_md(name='Foo', symbol='FOO', decimals=2, icon=b'png', icon_ext='.png')
+        self.assertTrue(self.tm.apply_downloaded_metadata(tid, md))
+        self.assertFalse(self.tm.needs_metadata(tid))
+        self.assertEqual(self.tm.get_token_display_name(tid), 'Foo')
+        self.assertEqual(self.tm.get_token_ticker_symbol(tid), 'FOO')
+        self.assertEqual(self.tm.get_token_decimals(tid), 2)
+        self.assertEqual(self.tm.get_icon(tid), b'png')
+
+    def test_keeps_user_edits(self):
+        tid = token_id(2)
+        self.tm.set_token_display_name(tid, 'Mine')
+        self.tm.set_icon(tid, b'mine')
+        self.assertFalse(self.tm.needs_metadata(tid))
+        md = self.make_md(name='Foo', symbol='FOO', icon=b'png', icon_ext='.png')
+        self.assertTrue(self.tm.apply_downloaded_metadata(tid, md))
+        self.assertEqual(self.tm.get_token_display_name(tid), 'Mine')
+        self.assertEqual(self.tm.get_token_ticker_symbol(tid), 'FOO')
+        self.assertEqual(self.tm.get_icon(tid), b'mine')
+        self.assertFalse(self.tm.apply_downloaded_metadata(tid, md))
+
+
+class StubServer:
+    """Serves the documents in a dict of path -> bytes with an ETag, honoring If-None-Match"""
+
+    def __init__(self, docs, max_age=3600):
+        self.docs = docs
+        self.max_age = max_age
+        self.requests = []  # list of (path, status)
+        self.lock = threading.Lock()
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                doc = outer.docs.get(self.path)
+                etag = doc is not None and '"%s"' % hashlib.sha256(doc).hexdigest()[:16]
+                if doc is None:
+                    status = 404
+                elif self.headers.get('If-None-Match') == etag:
+                    status = 304
+                else:
+                    status = 200
+                with outer.lock:
+                    outer.requests.append((self.path, status))
+                time.sleep(0.01)
+                self.send_response(status)
+                if doc is not None:
+                    self.send_header('ETag', etag)
+                    self.send_header('Cache-Control', f'max-age={outer.max_age}')
+                body = doc if status == 200 else b''
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FakeFetcher(token_meta.MetadataFetcher):
+    """Genesis tx lookups are answered from a dict of token_id_hex -> BCMR OP_RETURN pushes. Those of the token
+    ids in `failing` fail as if the network were down."""
+
+    def __init__(self, genesis, *args, **kwargs):
+        super().__init__(None, *args, **kwargs)
+        self.genesis = genesis
+        self.failing = set()
+        self.genesis_lookups = []
+
+    def _lookup_genesis_pushes(self, token_id_hex):
+        self.genesis_lookups.append(token_id_hex)
+        time.sleep(0.01)
+        if token_id_hex in self.failing:
+            return False, None
+        return True, self.genesis.get(token_id_hex)
+
+
+class TestMetadataFetcher(unittest.TestCase):
+
+    NUM_TOKENS = 30
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.token_ids = [token_id(i + 1) for i in range(self.NUM_TOKENS)]
+        docs = {'/icon.png': b'\x89PNG icon'}
+        self.server = StubServer(docs)
+        # Two registries, each covering half the tokens; everyone shares the one icon
+        registries = [{'identities': {}}, {'identities': {}}]
+        for i, tid in enumerate(self.token_ids):
+            registries[i % 2]['identities'][tid] = {
+                '2023-01-01T00:00:00.000Z': {
+                    'name': f'Token {i}', 'description': 'A token',
+                    'token': {'category': tid, 'symbol': f'T{i}', 'decimals': i % 9},
+                    'uris': {'icon': self.server.url + '/icon.png'},
+                }
+            }
+        for n, reg in enumerate(registries):
+            docs[f'/registry{n}.json'] = json.dumps(reg).encode()
+        self.genesis = dict()
+        for i, tid in enumerate(self.token_ids):
+            path = f'/registry{i % 2}.json'
+            self.genesis[tid] = [hashlib.sha256(docs[path]).digest(), (self.server.url + path).encode()]
+        self.cache_path = os.path.join(self.tmpdir, 'bcmr_cache')
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.tmpdir)
+
+    def make_fetcher(self):
+        return FakeFetcher(self.genesis, token_meta.BCMRCache(self.cache_path), workers=8, timeout=5)
+
+    def test_bulk_fetch(self):
+        fetcher = self.make_fetcher()
+        done = []
+        res = fetcher.fetch(self.token_ids + [token_id(1000)], callback=lambda tid, md: done.append(tid))
+        self.assertEqual(len(done), self.NUM_TOKENS + 1)
+        self.assertIsNone(res[token_id(1000)])
+        for i, tid in enumerate(self.token_ids):
+            md = res[tid]
+            self.assertEqual((md.name, md.symbol, md.decimals), (f'Token {i}', f'T{i}', i % 9))
+            self.assertEqual((md.icon, md.icon_ext), (b'\x89PNG icon', '.png'))
+        # Each document was downloaded exactly once, even though many workers wanted it at the same time
+        self.assertEqual(sorted(self.server.requests),
+                         [('/icon.png', 200), ('/registry0.json', 200), ('/registry1.json', 200)])
+        self.assertEqual(len(fetcher.genesis_lookups), self.NUM_TOKENS + 1)
+
+        # A new fetcher, with the cache reloaded from disk, needs nothing from the network
+        self.server.requests.clear()
+        fetcher2 = self.make_fetcher()
+        res2 = fetcher2.fetch(self.token_ids)
+        self.assertEqual([res2[tid].name for tid in self.token_ids], [res[tid].name for tid in self.token_ids])
+        self.assertEqual(self.server.requests, [])
+        self.assertEqual(fetcher2.genesis_lookups, [])
+
+    def test_revalidation(self):
+        fetcher = self.make_fetcher()
+        fetcher.fetch(self.token_ids)
+        # Expire everything; the server says our copies are still good
+        cache = fetcher.cache
+        for entry in cache.docs.values():
+            entry['expires'] = time.time() - 1
+        self.server.requests.clear()
+        res = fetcher.fetch(self.token_ids[:4])
+        self.assertEqual(res[self.token_ids[0]].name, 'Token 0')
+        self.assertEqual(sorted(self.server.requests),
+                         [('/icon.png', 304), ('/registry0.json', 304), ('/registry1.json', 304)])
+        self.assertEqual(fetcher.stats['not_modified'], 3)
+        self.assertTrue(all(entry['expires'] > time.time() for entry in cache.docs.values()))
+
+    def test_negative_genesis_lookups_expire(self):
+        cache = token_meta.BCMRCache(self.cache_path)
+        cache.put_genesis_pushes(token_id(7), None)
+        self.assertEqual(cache.get_genesis_pushes(token_id(7)), (True, None))
+        cache.genesis[token_id(7)][0] -= cache.NEGATIVE_TTL + 1
+        self.assertEqual(cache.get_genesis_pushes(token_id(7)), (False, None))
+        cache.put_genesis_pushes(token_id(8), [b'\x01' * 32, b'example.com'])
+        self.assertEqual(cache.get_genesis_pushes(token_id(8)), (True, [b'\x01' * 32, b'example.com']))
+        cache.prune()
+        self.assertEqual(list(cache.genesis), [token_id(8)])
+
+    def test_failed_genesis_lookups_are_not_cached(self):
+        fetcher = self.make_fetcher()
+        tid = self.token_ids[0]
+        fetcher.failing.add(tid)
+        self.assertIsNone(fetcher.fetch([tid])[tid])
+        self.assertEqual(fetcher.cache.get_genesis_pushes(tid), (False, None))
+        # The network is back
+        fetcher.failing.clear()
+        self.assertEqual(fetcher.fetch([tid])[tid].name, 'Token 0')
+        self.assertEqual(fetcher.genesis_lookups, [tid, tid])
+
+    def test_docs_are_pruned(self):
+        fetcher = self.make_fetcher()
+        fetcher.fetch(self.token_ids)
+        cache = fetcher.cache
+        icon_url = self.server.url + '/icon.png'
+        icon_file = cache._doc_filepath(icon_url)
+        self.assertTrue(os.path.exists(icon_file))
+        # Long expired
+        cache.docs[icon_url]['expires'] -= cache.DEFAULT_TTL + cache.MAX_DOC_AGE
+        cache.dirty = True
+        cache.save()
+        self.assertEqual(len(cache.docs), 2)
+        self.assertFalse(os.path.exists(icon_file))
+        # Too many: the one expiring first goes
+        cache.MAX_DOCS = 1
+        first = min(cache.docs, key=lambda url: cache.docs[url]['expires'])
+        cache.save()
+        self.assertEqual(len(cache.docs), 1)
+        self.assertNotIn(first, cache.docs)
+        self.assertEqual(token_meta.BCMRCache(self.cache_path).docs, cache.docs)
+
+
+if __name__ == '__main__':
+    unittest.main()
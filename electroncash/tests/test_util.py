@@ -1,5 +1,10 @@
+import copy
+import operator
+import threading
+import time
 import unittest
-from ..util import format_satoshis
+from .. import util
+from ..util import format_satoshis, HeightIndexedDict, InstrumentedRLock
 from ..web import parse_URI
 
 class TestUtil(unittest.TestCase):
@@ -110,3 +115,90 @@ class TestUtil(unittest.TestCase):
 
     def test_parse_URI_parameter_polution(self):
         self.assertRaises(Exception, parse_URI, 'bitcoincash:15mKKb2eos1hWa6tisdPwwDC1a5J1y9nma?amount=0.0003&label=test&amount=30.0')
+
+
+class TestHeightIndexedDict(unittest.TestCase):
+
+    def test_index_follows_mutations(self):
+        d = HeightIndexedDict(operator.itemgetter(0), {'a': (5, 'x'), 'b': (7, 'y')})
+        d['c'] = (7, 'z')
+        d.setdefault('d', (3, 'w'))
+        d.update(e=(9, 'v'))
+        self.assertEqual(['b', 'c', 'e'], sorted(d.keys_from_height(6)))
+        self.assertEqual(['d', 'a'], d.keys_from_height(0)[:2])
+        d['e'] = (1, 'moved')
+        self.assertEqual(['b', 'c'], sorted(d.keys_from_height(6)))
+        del d['b']
+        self.assertEqual((7, 'z'), d.pop('c'))
+        self.assertIsNone(d.pop('c', None))
+        with self.assertRaises(KeyError):
+            d.pop('c')
+        self.assertEqual([], d.keys_from_height(6))
+        self.assertEqual([1, 3, 5], d._heights)
+        # Copies are indexed too, and compare equal to plain dicts
+        for d2 in (d.copy(), copy.deepcopy(d)):
+            self.assertIsInstance(d2, HeightIndexedDict)
+            self.assertEqual(['d', 'a'], d2.keys_from_height(2))
+            self.assertEqual({'a': (5, 'x'), 'd': (3, 'w'), 'e': (1, 'moved')}, d2)
+        d.clear()
+        self.assertEqual([], d.keys_from_height(0))
+        self.assertEqual({}, d)
+
+
+class TestInstrumentedRLock(unittest.TestCase):
+
+    def test_stats(self):
+        lock = InstrumentedRLock('test')
+        taken = threading.Event()
+
+        def holder():
+            with lock:
+                taken.set()
+                time.sleep(0.1)
+
+        def reentrant():
+            with lock:
+                with lock:
+                    self.assertTrue(lock.is_owned())
+                self.assertTrue(lock.is_owned())
+            self.assertFalse(lock.is_owned())
+
+        t = threading.Thread(target=holder)
+        t.start()
+        taken.wait()
+        self.assertFalse(lock.is_owned())
+        self.assertFalse(lock.acquire(blocking=False))
+        self.assertFalse(lock.acquire(timeout=0.01))
+        reentrant()  # waits for the holder
+        t.join()
+        stats = lock.get_stats()
+        # Failed attempts and re-entering don't count
+        self.assertEqual((2, 1), (stats['acquisitions'], stats['contended']))
+        self.assertGreater(stats['hold_max_ms'], 90)
+        self.assertGreater(stats['wait_max_ms'], 30)
+        sites = {site.split()[0]: st for site, st in stats['sites'].items()}
+        self.assertEqual(['holder', 'reentrant'], list(sites))
+        self.assertEqual((1, 0, stats['hold_max_ms']),
+                         (sites['holder']['acquisitions'], sites['holder']['contended'], sites['holder']['hold_max_ms']))
+        self.assertEqual((1, 1, stats['wait_max_ms']), (sites['reentrant']['acquisitions'],
+                                                        sites['reentrant']['contended'], sites['reentrant']['wait_max_ms']))
+        lock.reset_stats()
+        stats = lock.get_stats()
+        self.assertEqual(({}, 0), (stats['sites'], stats['acquisitions']))
+
+    def test_make_rlock(self):
+        self.assertFalse(util.instrument_locks)
+        lock = util.make_rlock('test')
+        self.assertNotIsInstance(lock, InstrumentedRLock)
+        with lock:
+            self.assertTrue(lock._is_owned())
+        self.assertFalse(lock._is_owned())
+        util.instrument_locks = True
+        try:
+            lock = util.make_rlock('test')
+        finally:
+            util.instrument_locks = False
+        self.assertIsInstance(lock, InstrumentedRLock)
+        with lock:
+            self.assertTrue(lock._is_owned())
+        self.assertEqual('test', lock.name)
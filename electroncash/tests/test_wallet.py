@@ -2,8 +2,10 @@ import shutil
 import tempfile
 import sys
 import unittest
+from unittest import mock
 import os
 import json
+import time
 
 from io import StringIO
 from ..storage import WalletStorage, FINAL_SEED_VERSION
@@ -11,6 +13,7 @@ from .. import wallet
 from ..wallet import create_new_wallet, restore_wallet_from_text
 from ..simple_config import SimpleConfig
 from ..address import Address
+from ..verifier import SPV
 
 
 class FakeSynchronizer(object):
@@ -136,4 +139,384 @@ class TestCreateRestoreWallet(WalletTestCase):
         self.assertEqual(Address.from_string('qzrseeup3rhehuaf9e6nr3sgm6t5eegufu96l404mu'), addr0)
         self.assertEqual('Kz7FS9Adyj6RgSVGx5YLjZPanUhuze4yvcziZ1qLA24a3GJJZvBr',
                          wallet.export_private_key(addr0, password=None))
-        self.assertEqual(1, len(wallet.get_receiving_addresses()))
\ No newline at end of file
+        self.assertEqual(1, len(wallet.get_receiving_addresses()))
+
+class TestAddressChangeTracker(WalletTestCase):
+
+    def test_tracker_reports_changed_addresses(self):
+        text = 'xpub6CUzEfgtza7ZNtfDGYwHPnbPMPiQh93mAbP6v7C3ozUgkZq4tXSgYb9qqZ62oh8RCeexdSF7ZJmTzCm5bdWLB3zSMF8rNfuY8kccNAsdF4d'
+        wallet = restore_wallet_from_text(text, path=self.wallet_path, config=self.config)['wallet']
+        addr0, addr1, addr2 = wallet.get_receiving_addresses()[:3]
+        tracker = wallet.create_address_change_tracker()
+        # Everything is "changed" the first time
+        self.assertIsNone(tracker.pop())
+        self.assertEqual(set(), tracker.pop())
+        wallet.set_label(addr0, 'hello')
+        wallet.set_label('ab' * 32, 'a tx label')
+        wallet.set_frozen_state([addr1], True)
+        self.assertEqual({addr0, addr1}, tracker.pop())
+        wallet._invalidate_addr_bal_cache(addr2)
+        self.assertEqual({addr2}, tracker.pop())
+        wallet.clear_history()
+        self.assertIsNone(tracker.pop())
+        # Trackers are only weakly referenced by the wallet
+        del tracker
+        self.assertEqual(0, len(wallet._addr_change_trackers))
+
+
+class TestAddressIndex(WalletTestCase):
+
+    def test_get_address_index(self):
+        text = 'xpub6CUzEfgtza7ZNtfDGYwHPnbPMPiQh93mAbP6v7C3ozUgkZq4tXSgYb9qqZ62oh8RCeexdSF7ZJmTzCm5bdWLB3zSMF8rNfuY8kccNAsdF4d'
+        wallet = restore_wallet_from_text(text, path=self.wallet_path, config=self.config)['wallet']
+        for _ in range(5):
+            wallet.create_new_address(for_change=False)
+            wallet.create_new_address(for_change=True)
+
+        def check():
+            for i, addr in enumerate(wallet.get_receiving_addresses()):
+                self.assertEqual((False, i), wallet.get_address_index(addr))
+            for i, addr in enumerate(wallet.get_change_addresses()):
+                self.assertEqual((True, i), wallet.get_address_index(addr))
+        check()
+        # Kept up to date incrementally as addresses are created
+        lens = wallet._address_index_lens
+        addr = wallet.create_new_address(for_change=True)
+        self.assertEqual((True, len(wallet.get_change_addresses()) - 1), wallet.get_address_index(addr))
+        self.assertEqual((lens[0], lens[1] + 1), wallet._address_index_lens)
+        # Truncating the lists, as wallet.rebuild_history() and change_gap_limit() do,
+        # forgets the removed addresses, and regrowing them finds them again
+        removed = wallet.get_receiving_addresses()[-1]
+        wallet.receiving_addresses = wallet.receiving_addresses[:-1]
+        with self.assertRaises(Exception):
+            wallet.get_address_index(removed)
+        check()
+        self.assertEqual(removed, wallet.create_new_address(for_change=False))
+        check()
+        # Reloading from storage
+        wallet.save_addresses()
+        wallet.load_addresses()
+        check()
+        with self.assertRaises(Exception):
+            wallet.get_address_index(Address.from_string('qr2q6aadv6nxmqwjt8qmax76yqp09mlqzq5jsz5fe9'))
+
+
+class TestUnusedAddressAllocator(WalletTestCase):
+
+    def setUp(self):
+        super().setUp()
+        text = 'xpub6CUzEfgtza7ZNtfDGYwHPnbPMPiQh93mAbP6v7C3ozUgkZq4tXSgYb9qqZ62oh8RCeexdSF7ZJmTzCm5bdWLB3zSMF8rNfuY8kccNAsdF4d'
+        self.wallet = restore_wallet_from_text(text, path=self.wallet_path, config=self.config)['wallet']
+        self.addrs = self.wallet.get_receiving_addresses()
+
+    def check(self, **kwargs):
+        expected = wallet.Abstract_Wallet.get_unused_address(self.wallet, **kwargs)
+        self.assertEqual(expected, self.wallet.get_unused_address(**kwargs))
+        return expected
+
+    def add_request(self, addr):
+        req = self.wallet.make_payment_request(addr, 1000, 'memo')
+        self.wallet.add_payment_request(req, self.config, save=False)
+
+    def test_allocation_follows_requests_and_history(self):
+        w, addrs = self.wallet, self.addrs
+        self.assertEqual(addrs[0], self.check())
+        for addr in addrs[:5]:
+            self.add_request(addr)
+        self.assertEqual(addrs[5], self.check())
+        # History, out of order
+        w._history[addrs[5]] = [('ab' * 32, 100)]
+        w._history[addrs[7]] = [('ab' * 32, 100)]
+        self.assertEqual(addrs[6], self.check())
+        self.add_request(addrs[6])
+        self.assertEqual(addrs[8], self.check())
+        # Frozen addresses are skipped only if asked to
+        w.set_frozen_state([addrs[8]], True)
+        self.assertEqual(addrs[8], self.check())
+        self.assertEqual(addrs[9], self.check(frozen_ok=False))
+        # Deleting a request or losing history frees the address up again
+        w.remove_payment_request(addrs[2], self.config, save=False)
+        self.assertEqual(addrs[2], self.check())
+        self.add_request(addrs[2])
+        w.receive_history_callback(addrs[5], [], {})
+        self.assertEqual(addrs[5], self.check())
+        w.clear_history()
+        self.assertEqual(addrs[5], self.check())
+        # Running out
+        for addr in addrs:
+            if addr not in w.receive_requests:
+                self.add_request(addr)
+        self.assertIsNone(self.check())
+        new_addr = w.create_new_address(for_change=False)
+        self.assertEqual(new_addr, self.check())
+
+    def test_addrequests(self):
+        from ..commands import Commands
+        cmds = Commands(self.config, self.wallet, None)
+        writes = []
+        orig_write = self.wallet.storage.write
+        self.wallet.storage.write = lambda: (writes.append(1), orig_write())
+        reqs = cmds.addrequests(5, '0.001', memo='pos')
+        self.assertEqual([r['address'] for r in reqs], [a.to_ui_string() for a in self.addrs[:5]])
+        self.assertEqual({r['amount'] for r in reqs}, {100000})
+        self.assertEqual(len(writes), 1)
+        # Out of addresses: only what is available, unless forced to make more
+        n = len(self.addrs)
+        self.assertEqual(len(cmds.addrequests(n, '0.001')), n - 5)
+        self.assertFalse(cmds.addrequests(1, '0.001'))
+        reqs = cmds.addrequests(3, '0.001', force=True)
+        self.assertEqual(len(reqs), 3)
+        self.assertEqual(n + 3, len(self.wallet.get_receiving_addresses()))
+        self.assertEqual(n + 3, len(self.wallet.storage.get('addresses')['receiving']))
+        self.assertEqual(n + 3, len(self.wallet.storage.get('payment_requests')))
+
+
+class TestPaymentRequests(WalletTestCase):
+
+    def setUp(self):
+        super().setUp()
+        text = 'xpub6CUzEfgtza7ZNtfDGYwHPnbPMPiQh93mAbP6v7C3ozUgkZq4tXSgYb9qqZ62oh8RCeexdSF7ZJmTzCm5bdWLB3zSMF8rNfuY8kccNAsdF4d'
+        self.wallet = restore_wallet_from_text(text, path=self.wallet_path, config=self.config)['wallet']
+        self.addrs = self.wallet.get_receiving_addresses()[:10]
+        # Added out of order; every third one has expired
+        for i in reversed(range(10)):
+            req = self.wallet.make_payment_request(self.addrs[i], 1000, 'memo %d' % i, 60 if i % 3 else 1)
+            if not i % 3:
+                req['time'] -= 10
+            self.wallet.add_payment_request(req, self.config, save=False)
+        # Pay addrs[1] with an unverified tx
+        self.received = {self.addrs[1]: {'aa' * 32 + ':0': (0, 1000, False, None)}}
+        self.io_calls = []
+        orig_get_addr_io = self.wallet.get_addr_io
+
+        def get_addr_io(address):
+            self.io_calls.append(address)
+            if address in self.received:
+                return self.received[address], {}
+            return orig_get_addr_io(address)
+        self.wallet.get_addr_io = get_addr_io
+
+    def test_get_requests(self):
+        w = self.wallet
+        self.assertEqual([r['address'] for r in w.get_requests(self.config)], self.addrs)
+        self.assertEqual([r['address'] for r in w.get_sorted_requests(self.config)], self.addrs)
+        self.assertEqual([r['address'] for r in w.get_requests(self.config, offset=3, limit=4)], self.addrs[3:7])
+        self.assertEqual([r['address'] for r in w.get_requests(self.config, status=wallet.PR_EXPIRED)],
+                         [self.addrs[i] for i in (0, 3, 6, 9)])
+        self.assertEqual([r['address'] for r in w.get_requests(self.config, status=wallet.PR_UNPAID, limit=2)],
+                         [self.addrs[2], self.addrs[4]])
+        self.assertEqual([r['address'] for r in w.get_requests(self.config, status=wallet.PR_UNCONFIRMED)],
+                         [self.addrs[1]])
+        w.remove_payment_request(self.addrs[2], self.config, save=False)
+        self.assertEqual([r['address'] for r in w.get_requests(self.config, status=wallet.PR_UNPAID, limit=2)],
+                         [self.addrs[4], self.addrs[5]])
+
+    def test_status_cache(self):
+        w = self.wallet
+        w.get_requests(self.config)
+        self.io_calls.clear()
+        w.get_requests(self.config)
+        self.assertEqual(self.io_calls, [])
+        # Verification changes the status, without changing the address's history
+        w.transactions['aa' * 32] = mock_tx = mock.Mock()
+        mock_tx.outputs.return_value = [(0, self.addrs[1], 1000)]
+        w.verified_tx['aa' * 32] = (w.get_local_height() - 1, 0, 0)
+        w._update_request_statuses_touched_by_tx('aa' * 32)
+        self.assertEqual(wallet.PR_PAID, w.get_request_status(self.addrs[1])[0])
+        self.assertEqual(self.io_calls, [self.addrs[1]])
+        # As does the address's history changing
+        del self.received[self.addrs[1]]
+        w._invalidate_addr_bal_cache(self.addrs[1])
+        self.assertEqual(wallet.PR_UNPAID, w.get_request_status(self.addrs[1])[0])
+
+    def test_expiry_sweep(self):
+        w = self.wallet
+        w.network = mock.Mock()
+        self.assertEqual(sorted(w.sweep_expired_requests()), sorted(self.addrs[i] for i in (0, 3, 6, 9)))
+        self.assertEqual(w.network.trigger_callback.call_count, 4)
+        w.network.trigger_callback.assert_called_with('payment_received', w, mock.ANY, wallet.PR_EXPIRED)
+        self.assertEqual(w.sweep_expired_requests(), [])
+        # The rest expire in a minute, except for the paid one
+        self.assertEqual(sorted(w.sweep_expired_requests(time.time() + 61)),
+                         sorted(self.addrs[i] for i in (2, 4, 5, 7, 8)))
+        w.network = None
+
+
+class TestBalanceTotals(WalletTestCase):
+
+    def setUp(self):
+        super().setUp()
+        text = 'xpub6CUzEfgtza7ZNtfDGYwHPnbPMPiQh93mAbP6v7C3ozUgkZq4tXSgYb9qqZ62oh8RCeexdSF7ZJmTzCm5bdWLB3zSMF8rNfuY8kccNAsdF4d'
+        self.wallet = restore_wallet_from_text(text, path=self.wallet_path, config=self.config)['wallet']
+        self.wallet.check_balance_totals = True
+        self.addrs = self.wallet.get_receiving_addresses()
+        self.height = 1000
+        self.wallet.get_local_height = lambda: self.height
+
+    # These make the same changes to the wallet's data as add_transaction() and
+    # receive_history_callback() do.
+    def receive(self, addr, tx_hash, height, v, is_cb=False):
+        w = self.wallet
+        w._history.setdefault(addr, []).append((tx_hash, height))
+        w.txo.setdefault(tx_hash, {}).setdefault(addr, []).append((0, v, is_cb))
+        w._invalidate_addr_bal_cache(addr)
+        return tx_hash + ':0'
+
+    def spend(self, addr, tx_hash, height, prevout, v):
+        w = self.wallet
+        w._history.setdefault(addr, []).append((tx_hash, height))
+        w.txi.setdefault(tx_hash, {}).setdefault(addr, []).append((prevout, v))
+        w._invalidate_addr_bal_cache(addr)
+
+    def test_running_totals(self):
+        w, addrs = self.wallet, self.addrs
+        self.assertEqual((0, 0, 0, 0), w.get_balance(tokens=True))
+        coin = self.receive(addrs[0], 'a0' * 32, 900, 1000)
+        self.receive(addrs[1], 'a1' * 32, 0, 200)
+        self.receive(addrs[2], 'a2' * 32, 950, 50000, is_cb=True)
+        self.assertEqual((1000, 200, 50000), w.get_balance())
+        self.spend(addrs[0], 'b0' * 32, 0, coin, 1000)
+        self.assertEqual((1000, -800, 50000), w.get_balance())
+        # The spend confirms
+        w._history[addrs[0]][-1] = ('b0' * 32, 990)
+        w._invalidate_addr_bal_cache(addrs[0])
+        self.assertEqual((0, 200, 50000), w.get_balance())
+        # Only the invalidated addresses are looked at again...
+        w.check_balance_totals = False
+        with mock.patch.object(w, 'get_addr_balance', wraps=w.get_addr_balance) as get_addr_balance:
+            w._invalidate_addr_bal_cache(addrs[1])
+            w.get_balance()
+            self.assertEqual([mock.call(addrs[1], tokens=True)], get_addr_balance.call_args_list)
+            get_addr_balance.reset_mock()
+            # ...plus the coinbase ones when the height changes, which matures the coinbase coin
+            self.height = 1100
+            self.assertEqual((50000, 200, 0), w.get_balance())
+            self.assertEqual([mock.call(addrs[2], tokens=True)], get_addr_balance.call_args_list)
+        w.check_balance_totals = True
+        # Frozen addresses and coins
+        w.set_frozen_state([addrs[1]], True)
+        self.assertEqual((50000, 0, 0), w.get_balance(exclude_frozen_addresses=True))
+        self.assertEqual((0, 200, 0), w.get_frozen_balance())
+        coin = self.receive(addrs[3], 'a3' * 32, 1050, 7)
+        w.set_frozen_coin_state([coin], True)
+        self.assertEqual((50007, 200, 0), w.get_balance())
+        self.assertEqual((50000, 200, 0), w.get_balance(exclude_frozen_coins=True))
+        self.assertEqual((7, 200, 0), w.get_frozen_balance())
+        # A reorg undoes a verification
+        header = {'timestamp': 1}
+        w.verified_tx['a3' * 32] = (1050, 0, 0)
+        w.txo['a3' * 32] = {addrs[3]: [(0, 7, False)]}
+        self.assertEqual({'a3' * 32}, w.undo_verifications(mock.Mock(read_header=lambda h: header), 1000))
+        self.assertIn(addrs[3], w._bal_totals_dirty)
+        self.assertEqual((50007, 200, 0), w.get_balance())
+        w.clear_history()
+        self.assertEqual((0, 0, 0), w.get_balance())
+
+    def test_utxo_snapshots(self):
+        w, addrs = self.wallet, self.addrs
+        coin = self.receive(addrs[0], 'a0' * 32, 900, 1000)
+        self.receive(addrs[1], 'a1' * 32, 0, 200)
+        # Not cached when computed without the lock held
+        self.assertEqual([coin], list(w.get_addr_utxo(addrs[0])))
+        self.assertNotIn(addrs[0], w._addr_utxo_cache)
+        utxos = w.get_utxos()
+        self.assertEqual({coin, 'a1' * 32 + ':0'}, {'%s:%d' % (x['prevout_hash'], x['prevout_n']) for x in utxos})
+        self.assertIn(addrs[0], w._addr_utxo_cache)
+        # Callers get their own coin dicts, with the current frozen state
+        utxos[0]['value'] = 0
+        w.set_frozen_coin_state([coin], True)
+        with mock.patch.object(w, 'get_addr_io', side_effect=AssertionError):
+            x, = w.get_utxos([addrs[0]])
+            self.assertEqual((1000, True), (x['value'], x['is_frozen_coin']))
+        # Spending it replaces the snapshot, and unfreezes the spent coin
+        self.spend(addrs[0], 'b0' * 32, 0, coin, 1000)
+        self.assertEqual([], w.get_utxos([addrs[0]]))
+        self.assertFalse(w.is_frozen_coin(coin))
+
+
+class TestUndoVerifications(WalletTestCase):
+
+    TIP = 10000
+    NUM_BLOCKS = 2000  # with 2 txs each
+
+    def setUp(self):
+        super().setUp()
+        text = 'xpub6CUzEfgtza7ZNtfDGYwHPnbPMPiQh93mAbP6v7C3ozUgkZq4tXSgYb9qqZ62oh8RCeexdSF7ZJmTzCm5bdWLB3zSMF8rNfuY8kccNAsdF4d'
+        self.wallet = w = restore_wallet_from_text(text, path=self.wallet_path, config=self.config)['wallet']
+        self.addrs = w.get_receiving_addresses()
+        self.headers = dict()
+        self.tx_addr = dict()
+        for height in range(self.TIP - self.NUM_BLOCKS + 1, self.TIP + 1):
+            self.headers[height] = {'timestamp': height}
+            for n in range(2):
+                tx_hash = '%032x%032x' % (height, n)
+                addr = self.addrs[(height * 2 + n) % len(self.addrs)]
+                w.verified_tx[tx_hash] = (height, height, n + 1)
+                w.txo[tx_hash] = {addr: [(0, 1000, False)]}
+                self.tx_addr[tx_hash] = addr
+        self.blockchain = mock.Mock()
+        self.blockchain.read_header.side_effect = self.headers.get
+
+    def reorg(self, fork_height, timestamp):
+        """Replaces the blocks from fork_height to the tip with new ones"""
+        for height in range(fork_height, self.TIP + 1):
+            self.headers[height] = {'timestamp': timestamp}
+
+    def test_repeated_shallow_reorgs(self):
+        w = self.wallet
+        w.network = mock.Mock()
+        w.network.get_local_height.return_value = self.TIP
+        tracker = w.create_address_change_tracker()
+        tracker.pop()
+        for i in range(50):
+            depth = 1 + i % 3
+            fork_height = self.TIP - depth + 1
+            self.reorg(fork_height, -i)
+            self.blockchain.read_header.reset_mock()
+            w.network.trigger_callback.reset_mock()
+            expected = {'%032x%032x' % (h, n) for h in range(fork_height, self.TIP + 1) for n in range(2)}
+            # The blockchain reports its base height a couple of blocks below the fork
+            self.assertEqual(expected, w.undo_verifications(self.blockchain, fork_height - 2))
+            # Only the blocks from the fork point up were looked at, once each
+            self.assertLessEqual(self.blockchain.read_header.call_count, depth + 2)
+            # Listeners were told precisely what changed
+            self.assertEqual({self.tx_addr[tx_hash] for tx_hash in expected}, tracker.pop())
+            self.assertEqual({('verified2', w, tx_hash, 0, 0, 0) for tx_hash in expected},
+                             {c.args for c in w.network.trigger_callback.call_args_list})
+            # The synchronizer re-adds the txs with their heights on the new chain
+            self.assertEqual({}, w.get_unverified_txs())
+            for tx_hash in expected:
+                height = int(tx_hash[:32], 16)
+                w.add_unverified_tx(tx_hash, height)
+                w.add_verified_tx(tx_hash, (height, -i, 1), None)
+            self.assertEqual({}, w.get_unverified_txs())
+        self.assertEqual(self.NUM_BLOCKS * 2, len(w.verified_tx))
+        # Nothing to undo
+        self.assertEqual(set(), w.undo_verifications(self.blockchain, self.TIP - 10))
+
+    def test_reorg_moves_tx(self):
+        w = self.wallet
+        network = mock.Mock()
+        network.get_local_height.return_value = self.TIP
+        network.blockchain.return_value = self.blockchain
+        network.interface.blockchain = self.blockchain
+        self.blockchain.get_base_height.return_value = self.TIP - 2
+        w.network = network
+        w.verifier = spv = SPV(network, w)
+        tx_hash = '%032x%032x' % (self.TIP, 0)
+        self.reorg(self.TIP - 1, -1)
+        spv.undo_verifications()
+        self.assertNotIn(tx_hash, w.verified_tx)
+        # The synchronizer sees the tx in the block below, but our first
+        # request for it is made before the new height arrives and fails
+        w.add_unverified_tx(tx_hash, self.TIP)
+        network.get_merkle_for_transaction.return_value = 1
+        spv.run()
+        self.assertIn(tx_hash, spv.requested_merkle)
+        spv.verify_merkle({'params': [tx_hash, self.TIP], 'error': 'tx not in block'})
+        self.assertFalse(spv.is_up_to_date())
+        # Once the new height arrives, the verifier asks again, at that height
+        network.get_merkle_for_transaction.reset_mock()
+        w.add_unverified_tx(tx_hash, self.TIP - 1)
+        spv.run()
+        network.get_merkle_for_transaction.assert_any_call(tx_hash, self.TIP - 1, spv.verify_merkle)
@@ -0,0 +1,240 @@
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ..address import Address
+from ..webhooks import WebhookDispatcher
+
+
+class StubServer:
+    """Records the JSON POSTed to it. The first `fail` requests get a `fail_status` error,
+    and every response is delayed by `delay` seconds."""
+
+    def __init__(self, fail=0, fail_status=500, delay=0.0):
+        self.fail = fail
+        self.fail_status = fail_status
+        self.delay = delay
+        self.posts = []  # list of (client port, json)
+        self.cond = threading.Condition()
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                time.sleep(outer.delay)
+                with outer.cond:
+                    if outer.fail > 0:
+                        outer.fail -= 1
+                        status = outer.fail_status
+                    else:
+                        status = 200
+                        outer.posts.append((self.client_address[1], body))
+                        outer.cond.notify_all()
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/hook'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def wait_for(self, n, timeout=10.0):
+        with self.cond:
+            self.cond.wait_for(lambda: len(self.posts) >= n, timeout)
+            return list(self.posts)
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FakeNetwork:
+
+    def __init__(self):
+        self.subscribed = []
+        self.unsubscribed = []
+
+    def subscribe_to_scripthashes(self, scripthashes, callback):
+        self.callback = callback
+        self.subscribed.extend(scripthashes)
+
+    def unsubscribe_from_scripthashes(self, scripthashes, callback):
+        self.unsubscribed.extend(scripthashes)
+
+    def notify(self, address, status):
+        self.callback({'method': 'blockchain.scripthash.subscribe', 'params': [address.to_scripthash_hex()],
+                       'result': status})
+
+
+def addr(i):
+    return Address.from_P2PKH_hash(bytes((i,)) * 20)
+
+
+class TestWebhookDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.servers = []
+        self.dispatchers = []
+
+    def tearDown(self):
+        for d in self.dispatchers:
+            d.stop()
+        for s in self.servers:
+            s.close()
+        shutil.rmtree(self.tmpdir)
+
+    def make_server(self, **kwargs):
+        server = StubServer(**kwargs)
+        self.servers.append(server)
+        return server
+
+    def make_dispatcher(self, network=None, **kwargs):
+        d = WebhookDispatcher(self.tmpdir, network, timeout=5, **kwargs)
+        d.BACKOFF_BASE = 0.05
+        self.dispatchers.append(d)
+        return d
+
+    def wait_stats(self, d, key, n):
+        deadline = time.monotonic() + 5
+        while d.get_stats()[key] < n and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return d.get_stats()
+
+    def test_delivery_reuses_connection(self):
+        server = self.make_server()
+        network = FakeNetwork()
+        d = self.make_dispatcher(network, workers=1)
+        d.start()
+        d.subscribe(addr(1), server.url)
+        for i in range(5):
+            network.notify(addr(1), f'status{i}')
+            server.wait_for(i + 1)
+        posts = server.wait_for(5)
+        self.assertEqual([body for _, body in posts],
+                         [{'address': addr(1).to_ui_string(), 'status': f'status{i}'} for i in range(5)])
+        self.assertEqual(len({port for port, _ in posts}), 1)
+        stats = self.wait_stats(d, 'delivered', 5)
+        self.assertEqual((stats['delivered'], stats['failed'], stats['subscriptions']), (5, 0, 1))
+
+    def test_retry_with_backoff(self):
+        server = self.make_server(fail=2)
+        d = self.make_dispatcher()
+        d.start()
+        t0 = time.monotonic()
+        d.enqueue(server.url, 'address', 'status')
+        self.assertEqual(server.wait_for(1)[0][1]['status'], 'status')
+        # 0.05 s, then 0.1 s
+        self.assertGreater(time.monotonic() - t0, 0.15)
+        stats = self.wait_stats(d, 'delivered', 1)
+        self.assertEqual((stats['delivered'], stats['retried'], stats['failed']), (1, 2, 0))
+
+    def test_client_errors_are_not_retried(self):
+        server = self.make_server(fail=1, fail_status=404)
+        d = self.make_dispatcher()
+        d.start()
+        d.enqueue(server.url, 'address', 'status')
+        stats = self.wait_stats(d, 'failed', 1)
+        self.assertEqual((stats['delivered'], stats['retried'], stats['failed']), (0, 0, 1))
+        self.assertEqual(server.posts, [])
+
+    def test_unexpected_errors_are_retried(self):
+        server = self.make_server()
+        d = self.make_dispatcher(workers=1)
+        real_deliver, calls = d.deliver, []
+
+        def deliver(delivery):
+            calls.append(delivery)
+            if len(calls) == 1:
+                raise ValueError('boom')
+            return real_deliver(delivery)
+
+        d.deliver = deliver
+        d.start()
+        d.enqueue(server.url, 'address', 'status')
+        self.assertEqual(server.wait_for(1)[0][1]['status'], 'status')
+        stats = self.wait_stats(d, 'delivered', 1)
+        self.assertEqual((stats['delivered'], stats['retried'], stats['failed'], stats['in_flight']), (1, 1, 0, 0))
+        self.assertEqual(len(calls), 2)
+
+    def test_coalesce_and_drop(self):
+        server = self.make_server()
+        d = self.make_dispatcher(max_queue=3)
+        # Not started yet, so everything stays queued
+        d.enqueue(server.url, 'a', 'old')
+        d.enqueue(server.url, 'a', 'new')
+        for name in 'bcde':
+            d.enqueue(server.url, name, 'status')
+        stats = d.get_stats()
+        self.assertEqual((stats['queued'], stats['coalesced'], stats['dropped'], stats['pending']), (6, 1, 2, 3))
+        d.start()
+        server.wait_for(3)
+        self.wait_stats(d, 'delivered', 3)
+        # The oldest were dropped
+        self.assertEqual(sorted((body['address'], body['status']) for _, body in server.posts),
+                         [('c', 'status'), ('d', 'status'), ('e', 'status')])
+
+    def test_slow_endpoint_does_not_block_network_thread(self):
+        server = self.make_server(delay=0.5)
+        network = FakeNetwork()
+        d = self.make_dispatcher(network, workers=2)
+        d.start()
+        for i in range(10):
+            d.subscribe(addr(i), server.url)
+        t0 = time.monotonic()
+        for i in range(10):
+            network.notify(addr(i), 'status')
+        self.assertLess(time.monotonic() - t0, 0.1)
+        stats = d.get_stats()
+        self.assertEqual(stats['in_flight'] + stats['pending'], 10)
+
+    def test_subscriptions_persist(self):
+        server = self.make_server()
+        network = FakeNetwork()
+        d = self.make_dispatcher(network)
+        d.subscribe(addr(1), server.url)
+        d.subscribe(addr(1), server.url + '2')
+        d.subscribe(addr(2), server.url)
+        self.assertEqual(network.subscribed, [addr(1).to_scripthash_hex(), addr(2).to_scripthash_hex()])
+        self.assertTrue(d.unsubscribe(addr(2)))
+        self.assertFalse(d.unsubscribe(addr(2)))
+        self.assertTrue(d.unsubscribe(addr(1), server.url + '2'))
+        self.assertEqual(network.unsubscribed, [addr(2).to_scripthash_hex()])
+        # A new dispatcher, as after a daemon restart, picks up where we left off
+        network2 = FakeNetwork()
+        d2 = self.make_dispatcher(network2)
+        self.assertEqual(d2.get_subscriptions(), {addr(1).to_ui_string(): [server.url]})
+        d2.start()
+        self.assertEqual(network2.subscribed, [addr(1).to_scripthash_hex()])
+        network2.notify(addr(1), 'status')
+        self.assertEqual(server.wait_for(1)[0][1], {'address': addr(1).to_ui_string(), 'status': 'status'})
+
+    def test_posts_address_as_given(self):
+        server = self.make_server()
+        network = FakeNetwork()
+        d = self.make_dispatcher(network)
+        d.start()
+        legacy = addr(1).to_full_string(Address.FMT_LEGACY)
+        cashaddr = addr(1).to_full_string(Address.FMT_CASHADDR)
+        d.subscribe(addr(1), server.url, legacy)
+        d.subscribe(addr(1), server.url + '2', cashaddr)
+        self.assertEqual(d.get_subscriptions(), {legacy: [server.url], cashaddr: [server.url + '2']})
+        network.notify(addr(1), 'status')
+        self.assertEqual(sorted(body['address'] for _, body in server.wait_for(2)), sorted([legacy, cashaddr]))
+        # and still after a restart
+        d2 = self.make_dispatcher()
+        self.assertEqual(d2.get_subscriptions(), d.get_subscriptions())
+
+
+if __name__ == '__main__':
+    unittest.main()
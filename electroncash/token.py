@@ -32,7 +32,20 @@ class Capability(IntEnum):
     Minting = 0x02
 
 
+# Category id bytes -> the one shared instance of those bytes, and its (reversed) hex. Wallets holding many tokens
+# of the same category would otherwise keep a separate copy of the 32-byte id (and of its hex) for every utxo.
+_interned_ids = dict()
+_interned_id_hexes = dict()
+
+
+def intern_id(id: bytes) -> bytes:
+    """Returns the interned instance of category id `id` (which must be 32 bytes, in wire byte order)"""
+    return _interned_ids.setdefault(id, id)
+
+
 class OutputData:
+    """The CashToken data carried by a transaction output. Instances are immutable (and thus hashable): to "modify"
+    one, create a new instance."""
     __slots__ = ("id", "bitfield", "amount", "commitment")
 
     def __init__(self, id: Union[bytes, str] = b'\x00' * 32, amount: int = 1, commitment: Union[bytes, str] = b'',
@@ -53,10 +66,20 @@ class OutputData:
             bitfield = bitfield[0]
         assert len(id) == 32 and (isinstance(id, bytes) and isinstance(commitment, bytes) and isinstance(bitfield, int)
                                   and isinstance(amount, int))
-        self.id = id
-        self.amount = amount
-        self.commitment = commitment
-        self.bitfield = bitfield
+        self._set(id, int(bitfield), amount, commitment)
+
+    def _set(self, id: bytes, bitfield: int, amount: int, commitment: bytes):
+        setter = object.__setattr__
+        setter(self, "id", intern_id(id))
+        setter(self, "bitfield", bitfield)
+        setter(self, "amount", amount)
+        setter(self, "commitment", commitment)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"token.OutputData is immutable (cannot set '{name}')")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"token.OutputData is immutable (cannot delete '{name}')")
 
     def __eq__(self, other) -> bool:
         if not isinstance(other, OutputData):
@@ -64,6 +87,18 @@ class OutputData:
         return (self.id, self.bitfield, self.amount, self.commitment) == (other.id, other.bitfield, other.amount,
                                                                           other.commitment)
 
+    def __hash__(self) -> int:
+        return hash((self.id, self.bitfield, self.amount, self.commitment))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return self.__class__, (self.id, self.amount, self.commitment, self.bitfield)
+
     def __repr__(self) -> str:
         return f"<token.OutputData(id={self.id_hex}, bitfield={self.bitfield:02x}, amount={self.amount}, " \
                f"commitment={self.commitment[:MAX_CONSENSUS_COMMITMENT_LENGTH].hex()})>"
@@ -73,10 +108,8 @@ class OutputData:
         """Convenience: Attempts to parse hexdata (which should already have PREFIX_BYTE chopped off) as if it were a
         serialized token as one would get from self.tohex(). Returns None on parse failure, or a valid
         token.OutputData instance on success."""
-        ret = OutputData()
         try:
-            ret.deserialize(buffer=bytes.fromhex(hexdata))
-            return ret
+            return cls.deserialize(buffer=bytes.fromhex(hexdata))
         except SerializationError:
             return None
 
@@ -85,28 +118,30 @@ class OutputData:
 
     @property
     def id_hex(self) -> str:
-        return self.id[::-1].hex()
-
-    @id_hex.setter
-    def id_hex(self, hex: str):
-        b = bytes.fromhex(hex)
-        assert len(b) == 32
-        self.id = b[::-1]
+        ret = _interned_id_hexes.get(self.id)
+        if ret is None:
+            ret = _interned_id_hexes.setdefault(self.id, self.id[::-1].hex())
+        return ret
 
-    def deserialize(self, *, buffer: Optional[bytes] = None, ds: Optional[BCDataStream] = None):
+    @classmethod
+    def deserialize(cls, *, buffer: Optional[bytes] = None, ds: Optional[BCDataStream] = None) -> object:
+        """Parses the serialized token data from `buffer` or from the current position of `ds`, and returns a new
+        token.OutputData instance. Raises SerializationError on failure."""
         assert bool(buffer is not None) + bool(ds is not None) == 1  # Exactly one of these must be valid
         if ds is None:
             ds = BCDataStream(buffer)
-        self.id = ds.read_bytes(32, strict=True)
-        self.bitfield = struct.unpack("<B", ds.read_bytes(1, strict=True))[0]
-        if self.has_commitment_length():
-            self.commitment = ds.read_bytes(strict=True)
+        id = ds.read_bytes(32, strict=True)
+        bitfield = struct.unpack("<B", ds.read_bytes(1, strict=True))[0]
+        if bitfield & Structure.HasCommitmentLength:
+            commitment = ds.read_bytes(strict=True)
         else:
-            self.commitment = b''
-        if self.has_amount():
-            self.amount = ds.read_compact_size(strict=True)
+            commitment = b''
+        if bitfield & Structure.HasAmount:
+            amount = ds.read_compact_size(strict=True)
         else:
-            self.amount = 0
+            amount = 0
+        self = cls.__new__(cls)
+        self._set(id, bitfield, amount, commitment)
         if (not self.is_valid_bitfield() or (self.has_amount() and not self.amount)
                 or self.amount < 0 or self.amount > 2**63-1
                 or (self.has_commitment_length() and not self.commitment)
@@ -114,6 +149,7 @@ class OutputData:
             # Bad bitfield or 0 serialized amount or bad amount or empty serialized commitment is
             # a deserialization error
             raise SerializationError('Unable to parse token data or token data is invalid')
+        return self
 
     def serialize(self) -> bytes:
         ds = BCDataStream()
@@ -180,12 +216,11 @@ def unwrap_spk(wrapped_spk: bytes) -> Tuple[Optional[OutputData], bytes]:
     assert len(PREFIX_BYTE) == 1
     if not wrapped_spk or wrapped_spk[0] != PREFIX_BYTE[0]:
         return None, wrapped_spk
-    token_data = OutputData()
     ds = BCDataStream(wrapped_spk)
     pfx = ds.read_bytes(1, strict=True)  # consume prefix byte
     assert pfx == PREFIX_BYTE
     try:
-        token_data.deserialize(ds=ds)  # unserialize token_data from buffer after prefix_byte
+        token_data = OutputData.deserialize(ds=ds)  # unserialize token_data from buffer after prefix_byte
     except SerializationError:
         # Unable to deserialize or parse token data. This is ok. Just return all the bytes as the full scriptPubKey
         return None, wrapped_spk
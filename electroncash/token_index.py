@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -*- mode: python3 -*-
+# Part of the Electron Cash SPV Wallet
+# License: MIT
+"""Per-wallet index of the CashToken-bearing coins the wallet holds.
+
+The wallet's `ct_txo` / `ct_txi` dicts are keyed by tx_hash, so answering
+"what tokens do I have" used to mean walking every address's full io. This
+index is keyed by token category instead, and is kept up to date as
+transactions are added to / removed from the wallet.
+
+All methods must be called with wallet.lock held."""
+
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from .address import Address
+from . import token
+
+# Capability names as used by the `listtokens` / `gettokenbalances` commands
+CAPABILITY_NAMES = {
+    token.Capability.NoCapability: 'none',
+    token.Capability.Mutable: 'mutable',
+    token.Capability.Minting: 'minting',
+}
+
+
+class TokenIndex:
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        # "prevout_hash:n" -> (Address, token.OutputData) for every token output of ours
+        self.outputs: Dict[str, Tuple[Address, token.OutputData]] = dict()
+        # tx_hash -> set of "prevout_hash:n" of the above, for removal
+        self.outputs_by_tx: Dict[str, Set[str]] = defaultdict(set)
+        # "prevout_hash:n" -> spending tx_hash, for token outputs spent by a wallet tx
+        self.spent: Dict[str, str] = dict()
+        # spending tx_hash -> set of "prevout_hash:n" it spends
+        self.spends_by_tx: Dict[str, Set[str]] = defaultdict(set)
+        # The indexes below only ever contain unspent outputs
+        self.by_category: Dict[str, Set[str]] = defaultdict(set)
+        self.by_address: Dict[Address, Set[str]] = defaultdict(set)
+        self.fungible_totals: Dict[str, int] = defaultdict(int)
+        # category -> capability -> set of "prevout_hash:n"
+        self.nfts: Dict[str, Dict[int, Set[str]]] = defaultdict(lambda: defaultdict(set))
+
+    def rebuild(self, ct_txo: dict, ct_txi: dict):
+        """ (Re)build the whole index from the wallet's ct_txo and ct_txi dicts. """
+        self.clear()
+        for tx_hash, addrmap in ct_txo.items():
+            for addr, outputmap in addrmap.items():
+                for n, token_data in outputmap.items():
+                    if token_data:
+                        self.add_output(f'{tx_hash}:{n}', addr, token_data)
+        for tx_hash, addrmap in ct_txi.items():
+            for prevout_hash_map in addrmap.values():
+                for prevout_hash, token_data_map in prevout_hash_map.items():
+                    for prevout_n in token_data_map:
+                        self.spend(f'{prevout_hash}:{prevout_n}', tx_hash)
+
+    # -- Mutation
+
+    def add_output(self, ser: str, addr: Address, token_data: token.OutputData):
+        if ser in self.outputs:
+            # Already indexed (the same tx may be added more than once)
+            return
+        self.outputs[ser] = (addr, token_data)
+        self.outputs_by_tx[ser.split(':', 1)[0]].add(ser)
+        if ser not in self.spent:
+            self._link(ser, addr, token_data)
+
+    def spend(self, ser: str, spending_tx_hash: str):
+        if self.spent.get(ser) == spending_tx_hash:
+            return
+        self.spent[ser] = spending_tx_hash
+        self.spends_by_tx[spending_tx_hash].add(ser)
+        entry = self.outputs.get(ser)
+        if entry is not None:
+            self._unlink(ser, *entry)
+
+    def remove_tx(self, tx_hash: str):
+        """ Forget tx_hash's token outputs and undo the spends it made. """
+        for ser in self.spends_by_tx.pop(tx_hash, ()):
+            if self.spent.get(ser) != tx_hash:
+                continue
+            del self.spent[ser]
+            entry = self.outputs.get(ser)
+            if entry is not None:
+                self._link(ser, *entry)
+        for ser in self.outputs_by_tx.pop(tx_hash, ()):
+            addr, token_data = self.outputs.pop(ser)
+            spender = self.spent.pop(ser, None)
+            if spender is None:
+                self._unlink(ser, addr, token_data)
+            else:
+                # The spend goes back to being "pruned" in the wallet
+                spends = self.spends_by_tx.get(spender)
+                if spends is not None:
+                    spends.discard(ser)
+                    if not spends:
+                        del self.spends_by_tx[spender]
+
+    def _link(self, ser, addr, token_data):
+        category = token_data.id_hex
+        self.by_category[category].add(ser)
+        self.by_address[addr].add(ser)
+        self.fungible_totals[category] += token_data.amount
+        if token_data.has_nft():
+            self.nfts[category][token_data.get_capability()].add(ser)
+
+    def _unlink(self, ser, addr, token_data):
+        category = token_data.id_hex
+        _discard(self.by_category, category, ser)
+        _discard(self.by_address, addr, ser)
+        total = self.fungible_totals[category] - token_data.amount
+        if total or category in self.by_category:
+            self.fungible_totals[category] = total
+        else:
+            del self.fungible_totals[category]
+        if token_data.has_nft():
+            caps = self.nfts[category]
+            _discard(caps, token_data.get_capability(), ser)
+            if not caps:
+                del self.nfts[category]
+
+    # -- Queries
+
+    def get_categories(self) -> Set[str]:
+        return set(self.by_category)
+
+    def get_addresses(self, category: Optional[str] = None) -> Set[Address]:
+        """ Returns the set of addresses holding unspent tokens (of `category`, if specified). """
+        if category is None:
+            return set(self.by_address)
+        return {self.outputs[ser][0] for ser in self.by_category.get(category, ())}
+
+    def get_utxo_names(self, category: Optional[str] = None, capability: Optional[int] = None,
+                       addresses: Optional[Iterable[Address]] = None) -> Set[str]:
+        """ Returns the "prevout_hash:n" names of the unspent token outputs matching all of the
+        specified filters. If `capability` is specified, only NFTs with that capability match. """
+        if capability is not None:
+            if category is not None:
+                names = set(self.nfts.get(category, {}).get(capability, ()))
+            else:
+                names = set()
+                for caps in self.nfts.values():
+                    names.update(caps.get(capability, ()))
+        elif category is not None:
+            names = set(self.by_category.get(category, ()))
+        else:
+            names = set().union(*self.by_category.values())
+        if addresses is not None:
+            addrs = set(addresses)
+            names = {ser for ser in names if self.outputs[ser][0] in addrs}
+        return names
+
+    def get_output(self, ser: str) -> Optional[Tuple[Address, token.OutputData]]:
+        return self.outputs.get(ser)
+
+    def get_balance(self, category: str) -> dict:
+        """ Returns a dict of the fungible amount and the NFT counts (by capability name) held
+        for `category`. """
+        caps = self.nfts.get(category, {})
+        return {
+            'fungible_amount': self.fungible_totals.get(category, 0),
+            'nft_count': sum(len(s) for s in caps.values()),
+            'nfts': {name: len(caps.get(cap, ())) for cap, name in CAPABILITY_NAMES.items()},
+            'utxo_count': len(self.by_category.get(category, ())),
+        }
+
+
+def _discard(d, key, item):
+    s = d.get(key)
+    if s is not None:
+        s.discard(item)
+        if not s:
+            del d[key]
@@ -6,20 +6,131 @@
 # License: MIT
 """ Encapsulation and handling of token metadata """
 
+import concurrent.futures
 import hashlib
 import json
 import os
 import requests
+import struct
 import threading
+import time
 
 from abc import ABCMeta, abstractmethod
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from electroncash import address, token, util
 from electroncash.simple_config import SimpleConfig
 from electroncash.transaction import Transaction
 
 
+class IconStore(util.PrintError):
+    """All the token icons in a single, append-only file of records:
+
+        token_id (32 bytes) | length (uint32 LE) | icon bytes
+
+    A length of 0xffffffff is a deletion. The index of token_id -> (offset, length) is rebuilt by skipping
+    over the record headers when the file is opened, and a truncated last record (e.g. from a crash) is
+    discarded. The file is rewritten without the dead records once they make up most of it."""
+
+    _header = struct.Struct("<32sI")
+    DELETED = 0xffffffff
+    MIN_COMPACT_BYTES = 64 * 1024
+
+    def __init__(self, path: str):
+        util.PrintError.__init__(self)
+        self.path = path
+        self.lock = threading.RLock()
+        self.index: Dict[str, tuple] = dict()  # token_id_hex -> (offset, length)
+        self.dead_bytes = 0
+        self.load()
+
+    def load(self):
+        with self.lock:
+            self.index.clear()
+            self.dead_bytes = 0
+            if not os.path.exists(self.path):
+                return
+            hsize = self._header.size
+            with open(self.path, "r+b") as f:
+                end = f.seek(0, os.SEEK_END)
+                pos = 0
+                while pos + hsize <= end:
+                    f.seek(pos)
+                    token_id, length = self._header.unpack(f.read(hsize))
+                    datalen = 0 if length == self.DELETED else length
+                    if pos + hsize + datalen > end:
+                        break
+                    old = self.index.pop(token_id.hex(), None)
+                    if old is not None:
+                        self.dead_bytes += hsize + old[1]
+                    if length == self.DELETED:
+                        self.dead_bytes += hsize
+                    else:
+                        self.index[token_id.hex()] = (pos + hsize, length)
+                    pos += hsize + datalen
+                if pos != end:
+                    self.print_error(f"Discarding {end - pos} bytes of truncated data at the end of {self.path}")
+                    f.truncate(pos)
+
+    def __contains__(self, token_id_hex: str) -> bool:
+        return token_id_hex in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def get(self, token_id_hex: str) -> Optional[bytes]:
+        with self.lock:
+            entry = self.index.get(token_id_hex)
+            if entry is None:
+                return None
+            offset, length = entry
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                return f.read(length)
+
+    def put(self, token_id_hex: str, buf: Optional[bytes]):
+        """Stores buf as the icon for token_id_hex, or deletes its icon if buf is None"""
+        with self.lock:
+            if buf is None and token_id_hex not in self.index:
+                return
+            hsize = self._header.size
+            with open(self.path, "ab") as f:
+                pos = f.seek(0, os.SEEK_END)
+                f.write(self._header.pack(bytes.fromhex(token_id_hex),
+                                          self.DELETED if buf is None else len(buf)))
+                if buf is not None:
+                    f.write(buf)
+            old = self.index.pop(token_id_hex, None)
+            if old is not None:
+                self.dead_bytes += hsize + old[1]
+            if buf is None:
+                self.dead_bytes += hsize
+            else:
+                self.index[token_id_hex] = (pos + hsize, len(buf))
+            live_bytes = sum(hsize + length for _, length in self.index.values())
+            if self.dead_bytes > max(self.MIN_COMPACT_BYTES, live_bytes):
+                self.compact()
+
+    def compact(self):
+        """Rewrites the file with only the live records"""
+        with self.lock:
+            tmp = self.path + ".tmp"
+            index = dict()
+            hsize = self._header.size
+            with open(self.path, "rb") as fin, open(tmp, "wb") as fout:
+                for token_id_hex, (offset, length) in self.index.items():
+                    fin.seek(offset)
+                    pos = fout.tell()
+                    fout.write(self._header.pack(bytes.fromhex(token_id_hex), length))
+                    fout.write(fin.read(length))
+                    index[token_id_hex] = (pos + hsize, length)
+                fout.flush()
+                os.fsync(fout.fileno())
+            os.replace(tmp, self.path)
+            self.index = index
+            self.dead_bytes = 0
+
+
 class TokenMeta(util.PrintError, metaclass=ABCMeta):
 
     def __init__(self, config: SimpleConfig):
@@ -28,13 +139,42 @@ class TokenMeta(util.PrintError, metaclass=ABCMeta):
         self.lock = threading.RLock()
         self.path = os.path.join(config.electrum_path(), "cashtoken_meta")
         self.make_dir(self.path)
-        self.icons_path = os.path.join(self.path, "icons")
-        self.make_dir(self.icons_path)
+        self.icons = IconStore(os.path.join(self.path, "icons.dat"))
+        self._migrate_icon_files(os.path.join(self.path, "icons"))
         self._icon_cache: Dict[str, Any] = dict()
+        self._bcmr_cache: Optional[BCMRCache] = None
         self.d: Dict[str, Any] = dict()
         self.dirty = False  # True if we wrote some keys to self.d, but they are not yet saved to disk
         self.load()
 
+    def _migrate_icon_files(self, icons_path: str):
+        """Older versions kept each icon in its own file in icons_path. Move them into self.icons."""
+        if not os.path.isdir(icons_path):
+            return
+        ext = "." + self._icon_ext
+        for fname in os.listdir(icons_path):
+            filepath = os.path.join(icons_path, fname)
+            token_id_hex, fext = os.path.splitext(fname)
+            try:
+                if fext != ext or len(bytes.fromhex(token_id_hex)) != 32 or token_id_hex in self.icons:
+                    continue  # Not one of ours, or already migrated: leave it alone
+                with open(filepath, "rb") as f:
+                    self.icons.put(token_id_hex, f.read(1_000_000))  # Read up to 1MB
+                os.remove(filepath)
+            except (ValueError, OSError) as e:
+                self.print_error(f"Failed to migrate icon file {filepath}: {e!r}")
+        try:
+            os.rmdir(icons_path)
+        except OSError:
+            pass
+
+    def get_metadata_fetcher(self, wallet, *, workers=8, timeout=30) -> 'MetadataFetcher':
+        """Returns a MetadataFetcher for `wallet`, using our on-disk BCMRCache"""
+        with self.lock:
+            if self._bcmr_cache is None:
+                self._bcmr_cache = BCMRCache(os.path.join(self.path, "bcmr_cache"))
+        return MetadataFetcher(wallet, self._bcmr_cache, workers=workers, timeout=timeout)
+
     def load(self):
         with self.lock:
             metafile = os.path.join(self.path, "metadata.json")
@@ -73,7 +213,7 @@ class TokenMeta(util.PrintError, metaclass=ABCMeta):
         icon = self._icon_cache.get(token_id_hex)
         if icon:
             return icon
-        buf = self._read_icon_file(self._icon_filepath(token_id_hex))
+        buf = self.icons.get(token_id_hex)
         if buf:
             icon = self._bytes_to_icon(buf)
         if not icon:
@@ -82,13 +222,9 @@ class TokenMeta(util.PrintError, metaclass=ABCMeta):
         self._icon_cache[token_id_hex] = icon
         return icon
 
-    def _icon_filepath(self, token_id_hex: str) -> str:
-        return os.path.join(self.icons_path, token_id_hex) + "." + self._icon_ext
-
     def set_icon(self, token_id_hex: str, icon: Any):
-        fname = self._icon_filepath(token_id_hex)
         buf = (icon is not None and self._icon_to_bytes(icon)) or None
-        self._write_icon_file(fname, buf)
+        self.icons.put(token_id_hex, buf)
         if icon is not None:
             self._icon_cache[token_id_hex] = icon
 
@@ -97,13 +233,6 @@ class TokenMeta(util.PrintError, metaclass=ABCMeta):
         """Reimplement in subclasses to define the icon file extension. Default is "png" """
         return "png"
 
-    def _read_icon_file(self, filepath: str) -> Optional[bytes]:
-        with self.lock:
-            if not os.path.exists(filepath):
-                return None
-            with open(filepath, "rb") as f:
-                return f.read(1_000_000)  # Read up to 1MB
-
     @abstractmethod
     def _icon_to_bytes(self, icon: Any) -> bytes:
         """Reimplement in subclasses to take whatever icon format the platform expects and spit out bytes"""
@@ -119,16 +248,38 @@ class TokenMeta(util.PrintError, metaclass=ABCMeta):
         """Reimplement in subclasses to generate a default icon for a token_id if the icon file is missing"""
         pass
 
-    def _write_icon_file(self, filepath: str, buf: Optional[bytes]):
+    def _downloaded_icon(self, buf: bytes, ext: Optional[str]) -> Any:
+        """Returns an icon made from downloaded image data (with file extension `ext`, e.g. ".svg"), or None if
+        it can't be used. Reimplement in subclasses that can do better than _bytes_to_icon"""
+        return self._bytes_to_icon(buf)
+
+    def needs_metadata(self, token_id_hex: str) -> bool:
+        """Returns True if we have no name, ticker or decimals for this category, e.g. it was never downloaded
+        nor edited"""
+        return (self.get_token_display_name(token_id_hex) is None
+                and self.get_token_ticker_symbol(token_id_hex) is None
+                and self.get_token_decimals(token_id_hex) is None)
+
+    def apply_downloaded_metadata(self, token_id_hex: str, md: 'DownloadedMetaData') -> bool:
+        """Stores the downloaded metadata of a category, without overwriting anything already set (e.g. by the
+        user). Returns True if anything was stored; the caller should then save()"""
+        changed = False
         with self.lock:
-            try:
-                os.remove(filepath)
-            except OSError:
-                pass
-            if buf is None:
-                return
-            with open(filepath, "wb") as f:
-                f.write(buf)
+            if md.name and self.get_token_display_name(token_id_hex) is None:
+                self.set_token_display_name(token_id_hex, md.name)
+                changed = True
+            if md.symbol and self.get_token_ticker_symbol(token_id_hex) is None:
+                self.set_token_ticker_symbol(token_id_hex, md.symbol)
+                changed = True
+            if md.decimals and self.get_token_decimals(token_id_hex) is None:
+                self.set_token_decimals(token_id_hex, md.decimals)
+                changed = True
+            if md.icon and token_id_hex not in self.icons:
+                icon = self._downloaded_icon(md.icon, md.icon_ext)
+                if icon is not None:
+                    self.set_icon(token_id_hex, icon)
+                    changed = True
+        return changed
 
     def get_token_display_name(self, token_id_hex: str) -> Optional[str]:
         """Returns None if not found or if empty, otherwise returns the display name if found and not empty"""
@@ -301,6 +452,12 @@ def try_to_get_bcmr_op_return_pushes(wallet, token_id_hex, timeout=30) -> Option
     tx = try_to_find_genesis_tx(wallet, token_id_hex, timeout)
     if not tx:
         return None
+    return get_bcmr_op_return_pushes(tx, token_id_hex)
+
+
+def get_bcmr_op_return_pushes(tx: Transaction, token_id_hex: str) -> Optional[List[bytes]]:
+    """Returns the pushes following the BCMR prefix of the first well-formed BCMR OP_RETURN output of the genesis
+    tx `tx`, or None if there is none."""
     for i, (_, script, _) in enumerate(tx.outputs()):
         if isinstance(script, address.ScriptOutput) and script.is_opreturn():
             try:
@@ -340,102 +497,403 @@ class DownloadedMetaData:
                f" symbol={self.symbol}, icon_ext={self.icon_ext} icon={icon_thing} bytes>"
 
 
+def _normalize_url(u: str) -> str:
+    """Rewrites ipfs:// urls to use a public gateway, and defaults to https:// for urls without a scheme"""
+    if u.lower().startswith("ipfs://"):
+        parts = u[7:].split('/', 1)
+        last_part = '/' + '/'.join(parts[1:]) if len(parts) >= 2 else ''
+        cid = parts[0]
+        ret = f"https://dweb.link/ipfs/{cid}{last_part}"
+        util.print_error(f"Rewrote \"{u}\" -> \"{ret}\"")
+        return ret
+    if not u.lower().startswith(("https://", "http://")):
+        u = "https://" + u
+    return u
+
+
+def _registry_urls(pushes: List[bytes]) -> List[str]:
+    """Returns the registry urls from the BCMR OP_RETURN pushes (the first push is the registry hash)"""
+    ret = []
+    for url in pushes[1:]:
+        try:
+            ret.append(_normalize_url(url.decode("utf-8")))
+        except UnicodeError:
+            util.print_error(f"Failed to decode url: {url!r} as utf-8, skipping...")
+    return ret
+
+
+def _parse_registry(content: bytes, token_id_hex: str, shasum: bytes, url: str):
+    """Parses a downloaded BCMR json document, returning a tuple of (DownloadedMetaData, icon_url) for
+    token_id_hex (icon_url may be None), or None if the document has nothing for it."""
+    sha = hashlib.sha256()
+    sha.update(bytes(content))
+    digest = sha.digest()
+    if digest != shasum and digest[::-1] != shasum:
+        util.print_error(f"Warning: hash mismatch for json document at {url}, proceeding anyway...")
+    try:
+        jdoc = json.loads(content.decode("utf-8"))
+    except (json.JSONDecodeError, UnicodeError) as e:
+        util.print_error(f"Got exception decoding from {url}: {e!r}")
+        return None
+    identities = jdoc.get("identities", {}) if isinstance(jdoc, dict) else None
+    if not identities or not isinstance(identities, dict):
+        util.print_error(f"Bad identity found from {url}")
+        return None
+    for identity, d in identities.items():
+        if isinstance(d, list):
+            # Support broken spec
+            d = {-i:val for i, val in enumerate(d)}
+        if not isinstance(d, dict) or not d:
+            util.print_error(f"Expected dict in identity {identity} from {url}")
+            return None
+        times = sorted(d.keys(), reverse=True)
+        for t in times:
+            dd = d[t]
+            tok = dd.get("token", {})
+            if not tok or not isinstance(tok, dict):
+                util.print_error(f"Expected a 'token' dict in identity {identity}:{t}  from {url}")
+                continue
+            cat = tok.get("category", "")
+            if cat != token_id_hex:
+                util.print_error(f"Skipping category {cat}")
+                continue
+            decimals = tok.get("decimals", 0)
+            try:
+                decimals = int(decimals)
+            except (ValueError, TypeError):
+                pass
+            decimals = min(max(0, decimals), 19) if isinstance(decimals, int) else 0
+            name = dd.get("name", "")
+            name = name[:30] if isinstance(name, str) else ""
+            description = dd.get("description", "")
+            description = description[:80] if isinstance(description, str) else ""
+            symbol = tok.get("symbol", "")
+            symbol = symbol[:4] if isinstance(symbol, str) else ""
+
+            md = DownloadedMetaData()
+            md.decimals = decimals
+            md.symbol = symbol
+            md.name = name
+            md.description = description
+
+            icon_url = None
+            uris = dd.get("uris", {})
+            if uris and isinstance(uris, dict):
+                icon_url = uris.get("icon")
+                if icon_url and isinstance(icon_url, str):
+                    icon_url = _normalize_url(icon_url)
+                else:
+                    icon_url = None
+            return md, icon_url
+
+
 def try_to_download_metadata(wallet, token_id_hex, timeout=30) -> Optional[DownloadedMetaData]:
     """Synchronously find the genesis tx, download metadata if it has properly formed BCMR, and return
-    an object describing what was found. May return None on timeout or other error."""
+    an object describing what was found. May return None on timeout or other error.
+
+    See MetadataFetcher for resolving many token ids at once, with caching."""
     pushes = try_to_get_bcmr_op_return_pushes(wallet, token_id_hex, timeout=timeout)
     if not pushes or len(pushes) < 2:
         return None
 
     shasum = pushes[0]
-    for url in pushes[1:]:
-        try:
-            url = url.decode("utf-8")
-        except UnicodeError as e:
-            util.print_error(f"Failed to decode url: {url!r} as utf-8, skipping...")
-
-        def rewrite_if_ipfs(u: str) -> str:
-            if u.lower().startswith("ipfs://"):
-                parts = u[7:].split('/', 1)
-                last_part = '/' + '/'.join(parts[1:]) if len(parts) >= 2 else ''
-                cid = parts[0]
-                ret = f"https://dweb.link/ipfs/{cid}{last_part}"
-                util.print_error(f"Rewrote \"{u}\" -> \"{ret}\"")
-                return ret
-            else:
-                return u
-
-        url = rewrite_if_ipfs(url)
-        if not url.lower().startswith("https://"):
-            url = "https://" + url
+    for url in _registry_urls(pushes):
         r = requests.get(url, timeout=timeout)
         if r.ok:
             util.print_error(f"Downloaded {len(r.content)} bytes from {url}")
-            sha = hashlib.sha256()
-            sha.update(bytes(r.content))
-            digest = sha.digest()
-            if digest != shasum and digest[::-1] != shasum:
-                util.print_error(f"Warning: hash mismatch for json document at {url}, proceeding anyway...")
-            try:
-                jdoc = json.loads(r.content.decode("utf-8"))
-            except (json.JSONDecodeError, UnicodeError) as e:
-                util.print_error(f"Got exception decoding from {url}: {e!r}")
+            res = _parse_registry(r.content, token_id_hex, shasum, url)
+            if not res:
                 continue
-            identities = jdoc.get("identities", {})
-            if not identities and not isinstance(identities, dict):
-                util.print_error(f"Bad identity found from {url}")
-                continue
-            for identity, d in identities.items():
-                if isinstance(d, list):
-                    # Support broken spec
-                    d = {-i:val for i, val in enumerate(d)}
-                if not isinstance(d, dict) or not d:
-                    util.print_error(f"Expected dict in identity {identity} from {url}")
-                    break
-                times = sorted(d.keys(), reverse=True)
-                for t in times:
-                    dd = d[t]
-                    tok = dd.get("token", {})
-                    if not tok or not isinstance(tok, dict):
-                        util.print_error(f"Expected a 'token' dict in identity {identity}:{t}  from {url}")
-                        continue
-                    cat = tok.get("category", "")
-                    if cat != token_id_hex:
-                        util.print_error(f"Skipping category {cat}")
-                        continue
-                    decimals = tok.get("decimals", 0)
-                    try:
-                        decimals = int(decimals)
-                    except (ValueError, TypeError):
-                        pass
-                    decimals = min(max(0, decimals), 19) if isinstance(decimals, int) else 0
-                    name = dd.get("name", "")
-                    name = name[:30] if isinstance(name, str) else ""
-                    description = dd.get("description", "")
-                    description = description[:80] if isinstance(description, str) else ""
-                    symbol = tok.get("symbol", "")
-                    symbol = symbol[:4] if isinstance(symbol, str) else ""
-
-                    md = DownloadedMetaData()
-                    md.decimals = decimals
-                    md.symbol = symbol
-                    md.name = name
-                    md.description = description
-
-                    uris = dd.get("uris", {})
-                    if uris and isinstance(uris, dict):
-                        icon_url = uris.get("icon")
-                        if icon_url and isinstance(icon_url, str):
-
-                            icon_url = rewrite_if_ipfs(icon_url)
-                            r2 = requests.get(icon_url, timeout=timeout)
-                            if r2.ok:
-                                util.print_error(f"Downloaded {len(r2.content)} bytes from {icon_url}")
-                                md.icon = r2.content
-                                md.icon_ext = os.path.splitext(icon_url)[-1]
-                            else:
-                                util.print_error(f"Got error downloading icon from {icon_url}: {r2.status_code}"
-                                                 f" {r2.reason}")
-                    return md
+            md, icon_url = res
+            if icon_url:
+                r2 = requests.get(icon_url, timeout=timeout)
+                if r2.ok:
+                    util.print_error(f"Downloaded {len(r2.content)} bytes from {icon_url}")
+                    md.icon = r2.content
+                    md.icon_ext = os.path.splitext(icon_url)[-1]
+                else:
+                    util.print_error(f"Got error downloading icon from {icon_url}: {r2.status_code}"
+                                     f" {r2.reason}")
+            return md
         else:
             util.print_error(f"Got error requesting url {url}: {r.status_code} {r.reason}")
+
+
+class BCMRCache(util.PrintError):
+    """On-disk cache of what MetadataFetcher finds on the network: the BCMR OP_RETURN pushes of each token's
+    genesis tx, and the documents (registries and icons) downloaded from the urls therein, along with their
+    HTTP validators (ETag / Last-Modified) and expiry time. Documents are kept as individual files in `path`,
+    the rest in `path`/index.json."""
+
+    DEFAULT_TTL = 24 * 3600  # seconds, used if the server does not tell us (via Cache-Control: max-age)
+    MIN_TTL = 60
+    MAX_TTL = 7 * 24 * 3600
+    NEGATIVE_TTL = 3600  # how long to remember that a token has no BCMR OP_RETURN
+    MAX_DOCS = 1000  # beyond this many, the documents that expired the longest ago are deleted on save()
+    MAX_DOC_AGE = 30 * 24 * 3600  # documents expired for longer than this are deleted on save()
+
+    def __init__(self, path: str):
+        util.PrintError.__init__(self)
+        self.path = path
+        util.make_dir(path)
+        self.lock = threading.RLock()
+        self.genesis: Dict[str, list] = dict()  # token_id_hex -> [time, [push hex, ...] or None]
+        self.docs: Dict[str, dict] = dict()  # url -> {'file', 'etag', 'last_modified', 'expires'}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        indexfile = os.path.join(self.path, "index.json")
+        if not os.path.exists(indexfile):
+            return
+        try:
+            with open(indexfile, "rt", encoding='utf-8') as f:
+                d = json.load(f)
+            genesis, docs = d.get("genesis", {}), d.get("docs", {})
+            if not isinstance(genesis, dict) or not isinstance(docs, dict):
+                raise ValueError("bad index")
+        except (OSError, json.JSONDecodeError, TypeError, ValueError, AttributeError) as e:
+            self.print_error(f"Error loading {indexfile}: {e!r}")
+            return
+        with self.lock:
+            self.genesis, self.docs = genesis, docs
+
+    def prune(self):
+        """Forgets expired negative genesis lookups, and deletes the documents that expired more than MAX_DOC_AGE
+        ago, then the ones that expired the longest ago until at most MAX_DOCS are left."""
+        now = time.time()
+        with self.lock:
+            for token_id_hex in [k for k, (t, pushes) in self.genesis.items()
+                                 if pushes is None and now - t > self.NEGATIVE_TTL]:
+                del self.genesis[token_id_hex]
+                self.dirty = True
+            by_expiry = sorted(self.docs, key=lambda url: self.docs[url]["expires"])
+            excess = max(0, len(by_expiry) - self.MAX_DOCS)
+            for i, url in enumerate(by_expiry):
+                if i >= excess and now - self.docs[url]["expires"] <= self.MAX_DOC_AGE:
+                    break
+                del self.docs[url]
+                self.dirty = True
+                try:
+                    os.remove(self._doc_filepath(url))
+                except OSError:
+                    pass
+
+    def save(self):
+        with self.lock:
+            self.prune()
+            if not self.dirty:
+                return
+            indexfile = os.path.join(self.path, "index.json")
+            indexfile_tmp = indexfile + ".tmp"
+            try:
+                jdata = json.dumps({"genesis": self.genesis, "docs": self.docs})
+                with open(indexfile_tmp, "wt", encoding='utf-8') as f:
+                    f.write(jdata)
+                os.replace(indexfile_tmp, indexfile)
+            except (TypeError, ValueError, OSError) as e:
+                self.print_error(f"Unable to save data to {indexfile}: {e!r}")
+            self.dirty = False
+
+    def get_genesis_pushes(self, token_id_hex: str):
+        """Returns a tuple of (found, pushes). found is False if we know nothing (or our negative result has
+        expired), otherwise pushes is the cached list of BCMR OP_RETURN pushes, or None if there were none."""
+        with self.lock:
+            entry = self.genesis.get(token_id_hex)
+        if not entry:
+            return False, None
+        t, pushes = entry
+        if pushes is None:
+            if time.time() - t > self.NEGATIVE_TTL:
+                return False, None
+            return True, None
+        return True, [bytes.fromhex(p) for p in pushes]
+
+    def put_genesis_pushes(self, token_id_hex: str, pushes: Optional[List[bytes]]):
+        with self.lock:
+            self.genesis[token_id_hex] = [time.time(), [p.hex() for p in pushes] if pushes is not None else None]
+            self.dirty = True
+
+    def _doc_filepath(self, url: str) -> str:
+        return os.path.join(self.path, hashlib.sha256(url.encode("utf-8")).hexdigest()[:40])
+
+    def get_doc(self, url: str):
+        """Returns a tuple of (entry, content) for url, or (None, None) if not cached. entry is the dict of
+        the validators and expiry time of the cached content."""
+        with self.lock:
+            entry = self.docs.get(url)
+            if entry is None:
+                return None, None
+            try:
+                with open(self._doc_filepath(url), "rb") as f:
+                    return dict(entry), f.read()
+            except OSError:
+                del self.docs[url]
+                self.dirty = True
+                return None, None
+
+    @classmethod
+    def _ttl(cls, headers) -> float:
+        ttl = cls.DEFAULT_TTL
+        for directive in headers.get("Cache-Control", "").lower().split(","):
+            directive = directive.strip()
+            if directive in ("no-cache", "no-store"):
+                ttl = 0
+            elif directive.startswith("max-age="):
+                try:
+                    ttl = int(directive[8:])
+                except ValueError:
+                    pass
+        return min(max(ttl, cls.MIN_TTL), cls.MAX_TTL)
+
+    def put_doc(self, url: str, content: bytes, headers):
+        with self.lock:
+            with open(self._doc_filepath(url), "wb") as f:
+                f.write(content)
+            self.docs[url] = {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified"),
+                              "expires": time.time() + self._ttl(headers)}
+            self.dirty = True
+
+    def refresh_doc(self, url: str, headers):
+        """Call this when the server says our cached copy is still good (HTTP 304)"""
+        with self.lock:
+            entry = self.docs.get(url)
+            if entry is not None:
+                entry["expires"] = time.time() + self._ttl(headers)
+                if headers.get("ETag"):
+                    entry["etag"] = headers["ETag"]
+                self.dirty = True
+
+
+class MetadataFetcher(util.PrintError):
+    """Resolves the BCMR metadata of many token ids at once, using a pool of `workers` threads. Genesis
+    lookups and downloaded documents are cached in a BCMRCache, with downloads revalidated via conditional
+    requests once expired, and the same url is never downloaded by two workers at the same time (many tokens
+    usually share a registry)."""
+
+    def __init__(self, wallet, cache: BCMRCache, *, workers=8, timeout=30):
+        util.PrintError.__init__(self)
+        self.wallet = wallet
+        self.cache = cache
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self._url_locks: Dict[str, threading.Lock] = dict()
+        self._url_locks_lock = threading.Lock()
+        self._tls = threading.local()
+        self.stats = {"genesis_lookups": 0, "downloads": 0, "not_modified": 0, "cache_hits": 0, "errors": 0}
+
+    def fetch(self, token_ids: List[str], callback=None) -> Dict[str, Optional[DownloadedMetaData]]:
+        """Blocks until all of `token_ids` have been resolved, returning a dict of token_id_hex ->
+        DownloadedMetaData (or None if not available). If specified, callback(token_id_hex, result) is called
+        (from a worker thread) as each one completes."""
+        token_ids = list(dict.fromkeys(token_ids))
+        ret = dict()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.workers, len(token_ids) or 1),
+                                                   thread_name_prefix="MetadataFetcher") as executor:
+            futures = {executor.submit(self.fetch_one, token_id_hex): token_id_hex for token_id_hex in token_ids}
+            for fut in concurrent.futures.as_completed(futures):
+                token_id_hex = futures[fut]
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    self.print_error(f"Error fetching metadata for {token_id_hex}: {e!r}")
+                    res = None
+                ret[token_id_hex] = res
+                if callback:
+                    callback(token_id_hex, res)
+        self.cache.save()
+        return ret
+
+    def fetch_one(self, token_id_hex: str) -> Optional[DownloadedMetaData]:
+        pushes = self.get_bcmr_op_return_pushes(token_id_hex)
+        if not pushes or len(pushes) < 2:
+            return None
+        shasum = pushes[0]
+        for url in _registry_urls(pushes):
+            content = self._get(url)
+            if content is None:
+                continue
+            res = _parse_registry(content, token_id_hex, shasum, url)
+            if not res:
+                continue
+            md, icon_url = res
+            if icon_url:
+                md.icon = self._get(icon_url)
+                if md.icon is not None:
+                    md.icon_ext = os.path.splitext(icon_url)[-1]
+            return md
+
+    def get_bcmr_op_return_pushes(self, token_id_hex: str) -> Optional[List[bytes]]:
+        found, pushes = self.cache.get_genesis_pushes(token_id_hex)
+        if found:
+            return pushes
+        with self._lock_for("genesis:" + token_id_hex):
+            found, pushes = self.cache.get_genesis_pushes(token_id_hex)
+            if found:
+                return pushes
+            self._count("genesis_lookups")
+            found, pushes = self._lookup_genesis_pushes(token_id_hex)
+            if found:
+                self.cache.put_genesis_pushes(token_id_hex, pushes)
+            else:
+                # Could not get the genesis tx (no network, timeout, ...): try again next time
+                self._count("errors")
+            return pushes
+
+    def _lookup_genesis_pushes(self, token_id_hex: str) -> Tuple[bool, Optional[List[bytes]]]:
+        """Returns a tuple of (found, pushes), where found is False if the genesis tx could not be retrieved,
+        and pushes is None if it has no BCMR OP_RETURN."""
+        tx = try_to_find_genesis_tx(self.wallet, token_id_hex, timeout=self.timeout)
+        if not tx:
+            return False, None
+        return True, get_bcmr_op_return_pushes(tx, token_id_hex)
+
+    def _count(self, stat: str):
+        with self._url_locks_lock:
+            self.stats[stat] += 1
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._url_locks_lock:
+            lock = self._url_locks.get(key)
+            if lock is None:
+                lock = self._url_locks[key] = threading.Lock()
+            return lock
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._tls, "session", None)
+        if session is None:
+            session = self._tls.session = requests.Session()
+        return session
+
+    def _get(self, url: str) -> Optional[bytes]:
+        """Returns the content at url, from the cache if it is fresh, otherwise from the network (revalidating
+        our cached copy if we have one). Returns None on error."""
+        with self._lock_for(url):
+            entry, content = self.cache.get_doc(url)
+            if entry is not None and entry["expires"] > time.time():
+                self._count("cache_hits")
+                return content
+            headers = dict()
+            if entry is not None:
+                if entry.get("etag"):
+                    headers["If-None-Match"] = entry["etag"]
+                if entry.get("last_modified"):
+                    headers["If-Modified-Since"] = entry["last_modified"]
+            try:
+                r = self._session().get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                self.print_error(f"Got exception requesting url {url}: {e!r}")
+                self._count("errors")
+                return content  # a stale copy is better than nothing
+            if r.status_code == 304 and entry is not None:
+                self._count("not_modified")
+                self.cache.refresh_doc(url, r.headers)
+                return content
+            if not r.ok:
+                self.print_error(f"Got error requesting url {url}: {r.status_code} {r.reason}")
+                self._count("errors")
+                return None
+            self.print_error(f"Downloaded {len(r.content)} bytes from {url}")
+            self._count("downloads")
+            self.cache.put_doc(url, r.content, r.headers)
+            return r.content
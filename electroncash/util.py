@@ -22,6 +22,7 @@
 # SOFTWARE.
 
 import binascii
+import bisect
 import os, sys, re, json, time
 from collections import defaultdict
 from datetime import datetime
@@ -297,6 +298,209 @@ class Monotonic:
                 with lock: return incr()
             self.__call__ = incr_with_lock
 
+class InstrumentedRLock:
+    ''' A drop-in replacement for threading.RLock which keeps statistics of
+    how long threads waited for it and then held it, overall and per call site
+    (the function that took it), for diagnosing lock contention. Only the
+    outermost acquire/release of a re-entrant acquisition is timed. See
+    get_stats(). This costs about 10x a plain RLock per acquisition, so
+    the app's locks are only instrumented on request, see make_rlock(). '''
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._stats_lock:
+            # call site (code object) -> [acquisitions, contended, wait total, wait max, hold total, hold max]
+            self._sites = dict()
+            self._since = time.time()
+
+    def _acquire(self, blocking, timeout, frame_depth):
+        local = self._local
+        depth = getattr(local, 'depth', 0)
+        if depth:
+            # Re-entering; the RLock can't block us
+            self._lock.acquire()
+            local.depth = depth + 1
+            return True
+        t0 = time.perf_counter()
+        contended = not self._lock.acquire(False)
+        if contended and (not blocking or not self._lock.acquire(True, timeout)):
+            return False
+        local.acquired = time.perf_counter()
+        local.waited = local.acquired - t0 if contended else 0.0
+        local.contended = contended
+        local.site = sys._getframe(frame_depth).f_code
+        local.depth = 1
+        return True
+
+    def acquire(self, blocking=True, timeout=-1):
+        return self._acquire(blocking, timeout, 2)
+
+    def __enter__(self):
+        self._acquire(True, -1, 2)
+        return True
+
+    def release(self):
+        local = self._local
+        local.depth -= 1
+        if not local.depth:
+            held = time.perf_counter() - local.acquired
+            site, waited, contended = local.site, local.waited, local.contended
+            self._lock.release()
+            with self._stats_lock:
+                st = self._sites.get(site)
+                if st is None:
+                    st = self._sites[site] = [0, 0, 0.0, 0.0, 0.0, 0.0]
+                st[0] += 1
+                st[1] += contended
+                st[2] += waited
+                st[3] = max(st[3], waited)
+                st[4] += held
+                st[5] = max(st[5], held)
+        else:
+            self._lock.release()
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def is_owned(self) -> bool:
+        ''' True if the calling thread holds the lock '''
+        return getattr(self._local, 'depth', 0) > 0
+
+    # Same as threading.RLock (and used by threading.Condition)
+    _is_owned = is_owned
+
+    @staticmethod
+    def _site_name(code) -> str:
+        return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+    def get_stats(self, max_sites=20) -> dict:
+        ''' Returns the totals, and the `max_sites` call sites which held the
+        lock the longest in total, since creation or the last reset_stats().
+        Times are in milliseconds. '''
+        def to_dict(st):
+            return {'acquisitions': st[0], 'contended': st[1],
+                    'wait_total_ms': round(st[2] * 1e3, 3), 'wait_max_ms': round(st[3] * 1e3, 3),
+                    'hold_total_ms': round(st[4] * 1e3, 3), 'hold_max_ms': round(st[5] * 1e3, 3)}
+        with self._stats_lock:
+            sites = {site: list(st) for site, st in self._sites.items()}
+            since = self._since
+        totals = [0, 0, 0.0, 0.0, 0.0, 0.0]
+        for st in sites.values():
+            for i in (0, 1, 2, 4):
+                totals[i] += st[i]
+            for i in (3, 5):
+                totals[i] = max(totals[i], st[i])
+        ret = to_dict(totals)
+        ret.update(name=self.name, seconds=round(time.time() - since, 3),
+                   sites={self._site_name(site): to_dict(st)
+                          for site, st in sorted(sites.items(), key=lambda item: -item[1][4])[:max_sites]})
+        return ret
+
+
+# Whether make_rlock() returns InstrumentedRLocks. Set at startup (from the
+# 'lock_stats' config key, see daemon.py) before the locks are created.
+instrument_locks = False
+
+
+def make_rlock(name):
+    ''' Returns a re-entrant lock for the wallet or network: an
+    InstrumentedRLock called `name` if instrument_locks is set, otherwise a
+    plain threading.RLock. Both have _is_owned(). '''
+    if instrument_locks:
+        return InstrumentedRLock(name)
+    return threading.RLock()
+
+
+class HeightIndexedDict(dict):
+    ''' A dict whose values each carry a block height, as returned by
+    `height_of(value)`, which also keeps its keys bucketed by height. This
+    lets keys_from_height() find the entries at or above a height (those
+    affected by a reorg) without scanning the whole dict. Not thread-safe;
+    callers guard it with the same lock as they would a plain dict. '''
+
+    def __init__(self, height_of, *args, **kwargs):
+        super().__init__()
+        self.height_of = height_of
+        self._buckets = dict()  # height -> set of keys
+        self._heights = []  # sorted list of the keys of _buckets
+        self.update(*args, **kwargs)
+
+    def _index(self, key, value):
+        height = self.height_of(value)
+        bucket = self._buckets.get(height)
+        if bucket is None:
+            bucket = self._buckets[height] = set()
+            bisect.insort(self._heights, height)
+        bucket.add(key)
+
+    def _unindex(self, key, value):
+        height = self.height_of(value)
+        bucket = self._buckets[height]
+        bucket.discard(key)
+        if not bucket:
+            del self._buckets[height]
+            del self._heights[bisect.bisect_left(self._heights, height)]
+
+    def __setitem__(self, key, value):
+        if key in self:
+            self._unindex(key, self[key])
+        super().__setitem__(key, value)
+        self._index(key, value)
+
+    def __delitem__(self, key):
+        self._unindex(key, self[key])
+        super().__delitem__(key)
+
+    _marker = object()
+
+    def pop(self, key, default=_marker):
+        if key in self:
+            value = super().pop(key)
+            self._unindex(key, value)
+            return value
+        if default is self._marker:
+            raise KeyError(key)
+        return default
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._unindex(key, value)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        super().clear()
+        self._buckets.clear()
+        self._heights.clear()
+
+    def copy(self):
+        return type(self)(self.height_of, self)
+
+    def __reduce__(self):
+        return type(self), (self.height_of, dict(self))
+
+    def keys_from_height(self, height):
+        ''' Returns a list of the keys whose height is >= `height`, lowest
+        height first. '''
+        ret = []
+        for h in self._heights[bisect.bisect_left(self._heights, height):]:
+            ret.extend(self._buckets[h])
+        return ret
+
 _t0 = time.time()
 def print_error(*args):
     if not is_verbose: return
@@ -23,9 +23,15 @@
 from abc import ABC, abstractmethod
 from .util import ThreadJob, bh2u
 from .bitcoin import Hash, hash_decode, hash_encode
+from . import metrics
 from . import networks
 from .transaction import Transaction
 
+MERKLE_REQUESTS = metrics.counter('spv_merkle_requests_total', 'Merkle branches requested')
+VERIFIED = metrics.counter('spv_verified_total', 'Transactions verified')
+FAILED = metrics.counter('spv_failed_total', 'Transactions that failed verification', label='reason')
+VERIFY_SECONDS = metrics.histogram('spv_verify_merkle_seconds', 'Time to process a merkle branch response')
+
 class BadResponse(Exception): pass
 
 class SPVDelegate(ABC):
@@ -163,6 +169,7 @@ class SPV(ThreadJob):
                 # interface queue busy, will try again later
                 break
             self.print_error('requested merkle', tx_hash)
+            MERKLE_REQUESTS.inc()
             self.requested_merkle.add(tx_hash)
 
         if self.network.blockchain() != self.blockchain:
@@ -174,6 +181,11 @@ class SPV(ThreadJob):
         'misc_failure', 'tx_not_found'
     )
 
+    def _verification_failed(self, tx_hash, reason):
+        FAILED.inc(label=reason)
+        self.wallet.verification_failed(tx_hash, reason)
+
+    @metrics.timed(VERIFY_SECONDS)
     def verify_merkle(self, response):
         if self.cleaned_up:
             return  # we have been killed, this was just a delayed callback
@@ -196,7 +208,7 @@ class SPV(ThreadJob):
              # FIXME: tx will never verify now until switching blockchains or
              # app restart
             if tx_hash:
-                self.wallet.verification_failed(tx_hash, freason)
+                self._verification_failed(tx_hash, freason)
             self.print_error("verify_merkle:", str(e))
             return
 
@@ -208,7 +220,7 @@ class SPV(ThreadJob):
             merkle_root = self.hash_merkle_root(merkle['merkle'], tx_hash, pos)
         except Exception as e:
             self.print_error(f"exception while verifying tx {tx_hash}: {repr(e)}")
-            self.wallet.verification_failed(tx_hash, self.failure_reasons[4])
+            self._verification_failed(tx_hash, self.failure_reasons[4])
             return
 
         header = self.network.blockchain().read_header(tx_height)
@@ -219,13 +231,13 @@ class SPV(ThreadJob):
             self.print_error(
                 "merkle verification failed for {} (missing header {})"
                 .format(tx_hash, tx_height))
-            self.wallet.verification_failed(tx_hash, self.failure_reasons[1])
+            self._verification_failed(tx_hash, self.failure_reasons[1])
             return
         if header.get('merkle_root') != merkle_root:
             self.print_error(
                 "merkle verification failed for {} (merkle root mismatch {} != {})"
                 .format(tx_hash, header.get('merkle_root'), merkle_root))
-            self.wallet.verification_failed(tx_hash, self.failure_reasons[2])
+            self._verification_failed(tx_hash, self.failure_reasons[2])
             return
         # we passed all the tests
         self.merkle_roots[tx_hash] = merkle_root
@@ -233,6 +245,7 @@ class SPV(ThreadJob):
         # this proof again in case of verification failure from the same server
         self.requested_merkle.discard(tx_hash)
         self.print_error("verified %s" % tx_hash)
+        VERIFIED.inc()
         self.wallet.add_verified_tx(tx_hash, (tx_height, header.get('timestamp'), pos), header)
         if self.is_up_to_date() and self.wallet.is_up_to_date() and not self.qbusy:
             self.wallet.save_verified_tx(write=True)
@@ -35,13 +35,16 @@ import copy
 import errno
 import json
 import hashlib
+import heapq
 import itertools
 import math
+import operator
 import os
 import queue
 import random
 import threading
 import time
+import weakref
 from collections import defaultdict, namedtuple, OrderedDict
 from enum import Enum, auto
 from functools import partial
@@ -71,8 +74,10 @@ from .verifier import SPV, SPVDelegate
 from .rpa.rpa_manager import RpaManager
 from . import schnorr
 from . import ecc_fast
+from . import metrics
 from .blockchain import NULL_HASH_HEX
 from . import token
+from .token_index import TokenIndex
 
 
 from . import paymentrequest
@@ -94,6 +99,8 @@ TX_STATUS = [
     _('Not Verified'),
 ]
 
+ADD_TRANSACTION_SECONDS = metrics.histogram('wallet_add_transaction_seconds', 'Time to add a transaction to a wallet')
+
 del _
 from .i18n import _
 
@@ -259,6 +266,60 @@ class TokensBurnedError(RuntimeError):
      in that method."""
 
 
+class AddressChangeTracker:
+    """Accumulates the set of wallet addresses whose history, balance, label
+    or frozen state changed since the last call to pop(). Created via
+    Abstract_Wallet.create_address_change_tracker() and used by views (such as
+    the Qt address and coin lists) to refresh only the affected rows.
+
+    This class is thread-safe: the wallet notifies it from the network thread
+    while the consumer typically pops from the GUI thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._addrs = set()
+        self._all = True  # Nothing has been seen yet by the consumer
+
+    def add_many(self, addrs):
+        with self._lock:
+            if not self._all:
+                self._addrs.update(addrs)
+
+    def mark_all(self):
+        with self._lock:
+            self._all = True
+            self._addrs = set()
+
+    def pop(self) -> Optional[Set[Address]]:
+        """Returns the set of changed addresses and resets the tracker. A
+        return value of None means that everything should be considered
+        changed."""
+        with self._lock:
+            ret = None if self._all else self._addrs
+            self._all = False
+            self._addrs = set()
+            return ret
+
+
+class RequestExpirySweeper(util.ThreadJob):
+    """Run from the network thread, this periodically lets the wallet announce
+    the payment requests which expired since the last time, via the
+    'payment_received' callback, the same way as status changes due to
+    payments are announced. See Abstract_Wallet.sweep_expired_requests()."""
+
+    INTERVAL = 10.0  # seconds
+
+    def __init__(self, wallet):
+        self.wallet = wallet
+        self.next_time = 0
+
+    def run(self):
+        now = time.time()
+        if now >= self.next_time:
+            self.next_time = now + self.INTERVAL
+            self.wallet.sweep_expired_requests(now)
+
+
 class Abstract_Wallet(PrintError, SPVDelegate):
     """
     Wallet classes are created to handle various address generation methods.
@@ -266,6 +327,9 @@ class Abstract_Wallet(PrintError, SPVDelegate):
     """
 
     max_change_outputs = 3
+    # Set this to True (e.g. in tests) to have get_balance() check its running
+    # totals against a full recompute on every call.
+    check_balance_totals = False
 
     def __init__(self, storage):
         self.electrum_version = PACKAGE_VERSION
@@ -282,6 +346,8 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         # self.cashacct.load() is called later in this function to load data.
         self.cashacct = cashacct.CashAcct(self)
         self.slp = slp.WalletData(self)
+        # Unspent CashToken coins by category; see token_index.py
+        self.token_index = TokenIndex()
         finalization_print_error(self.cashacct)  # debug object lifecycle
         finalization_print_error(self.slp)  # debug object lifecycle
 
@@ -299,6 +365,18 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         # this dict, but simply add/remove items to/from it in 1-liners (which
         # Python's GIL makes thread-safe implicitly).
         self._addr_bal_cache = {}
+        # Cache of Address -> its unspent coins, as a dict of
+        # "prevout_hash:n" -> (height, value, is_coinbase, token_data), for
+        # get_addr_utxo. These are snapshots: entries are never modified, but
+        # dropped (by _invalidate_addr_bal_cache) when the address's history
+        # changes and recomputed on next use. Entries are only added with
+        # self.lock held, so a reader racing a writer can't cache stale data.
+        self._addr_utxo_cache = {}
+        # Running totals of get_addr_balance() over all the wallet's addresses,
+        # for get_balance(). See _get_balance_totals.
+        self._reset_balance_totals()
+        # Views interested in per-address changes (see create_address_change_tracker)
+        self._addr_change_trackers = weakref.WeakSet()
 
         # We keep a set of the wallet and receiving addresses so that is_mine()
         # checks are O(logN) rather than O(N). This creates/resets that cache.
@@ -343,8 +421,9 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         # without much purpose. 1 lock is sufficient. In particular data
         # structures that are touched by the network thread as well as the GUI
         # (such as self.transactions, history, etc) need to be synchronized
-        # using this mutex.
-        self.lock = threading.RLock()
+        # using this mutex. It keeps wait/hold statistics if the daemon was
+        # started with 'lock_stats' set; see the `getlockstats` command.
+        self.lock = util.make_rlock('wallet')
 
         # load requests
         requests = self.storage.get('payment_requests', {})
@@ -352,6 +431,17 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             req['address'] = Address.from_string(key)
         self.receive_requests = {req['address']: req
                                  for req in requests.values()}
+        # Address -> [(tx_height or 0 if unverified, value, txid), ...] of the coins received by the
+        # addresses of payment requests; see get_payment_status(). Entries are dropped when the
+        # address's history or the verification of its transactions changes.
+        self._request_received_cache = dict()
+        # The requests' addresses in display order, see get_requests(). None if it needs rebuilding.
+        self._request_order = None
+        # Heap of (expiry time, address) of requests with an expiration, see sweep_expired_requests()
+        self._request_expiry_heap = []
+        for req in self.receive_requests.values():
+            self._push_request_expiry(req)
+        self.request_expiry_sweeper = None
 
         # Transactions pending verification.  A map from tx hash to transaction
         # height.  Access is contended so a lock is needed. Client code should
@@ -359,7 +449,8 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         self.unverified_tx = defaultdict(int)
 
         # Verified transactions.  Each value is a (height, timestamp, block_pos) tuple.  Access with self.lock.
-        self.verified_tx = storage.get('verified_tx3', {})
+        # Indexed by height, for undo_verifications.
+        self.verified_tx = util.HeightIndexedDict(operator.itemgetter(0), storage.get('verified_tx3', {}))
 
         # save wallet type the first time
         if self.storage.get('wallet_type') is None:
@@ -391,9 +482,19 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         finalization_print_error(self, "[{}/{}] finalized".format(type(self).__name__, self.diagnostic_name()))
 
     @classmethod
-    def to_Address_dict(cls, d):
-        '''Convert a dict of strings to a dict of Adddress objects.'''
-        return {Address.from_string(text): value for text, value in d.items()}
+    def to_Address_dict(cls, d, memo=None):
+        '''Convert a dict of strings to a dict of Adddress objects. Optional
+        arg `memo` is a dict of string -> Address used to avoid re-parsing
+        the same address strings over and over.'''
+        if memo is None:
+            return {Address.from_string(text): value for text, value in d.items()}
+        ret = {}
+        for text, value in d.items():
+            addr = memo.get(text)
+            if addr is None:
+                addr = memo[text] = Address.from_string(text)
+            ret[addr] = value
+        return ret
 
     @classmethod
     def from_Address_dict(cls, d):
@@ -485,21 +586,25 @@ class Abstract_Wallet(PrintError, SPVDelegate):
 
     @profiler
     def load_transactions(self):
+        # The same few address strings appear over and over in the maps below; parse each one just once
+        addr_memo = dict()
         txi = self.storage.get('txi', {})
-        self.txi = {tx_hash: self.to_Address_dict(value)
+        self.txi = {tx_hash: self.to_Address_dict(value, addr_memo)
                     for tx_hash, value in txi.items()
                     # skip empty entries to save memory and disk space
                     if value}
         # Map of tx_hash -> map of address -> list of tuple(prevout_n, value, iscoinbase)
         txo = self.storage.get('txo', {})
-        self.txo = {tx_hash: self.to_Address_dict(value)
+        self.txo = {tx_hash: self.to_Address_dict(value, addr_memo)
                     for tx_hash, value in txo.items()
                     # skip empty entries to save memory and disk space
                     if value}
         # Populates self.ct_txi: Map of tx_hash -> map of address -> map of "prevout_hash" -> map of n -> token_data
-        bad_ct_entry_ctr = self.load_ct_txi()
+        token_memo = dict()
+        bad_ct_entry_ctr = self.load_ct_txi(token_memo, addr_memo)
         # Populates self.ct_txo: Map of tx_hash -> map of address -> map of prevout_n -> token.OutputData
-        bad_ct_entry_ctr += self.load_ct_txo()
+        bad_ct_entry_ctr += self.load_ct_txo(token_memo, addr_memo)
+        del token_memo, addr_memo
         # Detect if user opened wallet in older EC and we need to rebuild ct_txi and ct_txo
         ct_txid_hash = self.storage.get('ct_txid_hash', None) if not bad_ct_entry_ctr else None
         self.tx_fees = self.storage.get('tx_fees', {})
@@ -524,21 +629,30 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             # This code is here to detect case where user opened same wallet in an older version of
             # electron cash which does not track CashTokens
             self.rebuild_ct_txi_txo()
+        self.token_index.rebuild(self.ct_txo, self.ct_txi)
 
     @profiler
-    def load_ct_txo(self) -> int:
-        """Populates self.ct_txo from storage key 'ct_txo'. """
+    def load_ct_txo(self, memo=None, addr_memo=None) -> int:
+        """Populates self.ct_txo from storage key 'ct_txo'. Optional arg `memo` is a dict of hexdata ->
+        token.OutputData that is shared with load_ct_txi() so that equal token data share one instance.
+        Likewise, `addr_memo` is passed to to_Address_dict()."""
         ct_txo = self.storage.get('ct_txo', {})
-        self.ct_txo = {tx_hash: self.to_Address_dict(value)
+        if addr_memo is None:
+            addr_memo = dict()
+        self.ct_txo = {tx_hash: self.to_Address_dict(value, addr_memo)
                        for tx_hash, value in ct_txo.items()
                        # skip empty entries to save memory and disk space
                        if value}
         # Convert hex data values to token.OutputData
         bad_ct_entry_ctr = 0
+        if memo is None:
+            memo = dict()
         for tx_hash, addrmap in self.ct_txo.items():
             for addr, outputmap in addrmap.items():
                 for n, hexdata in outputmap.copy().items():
-                    token_data = token.OutputData.fromhex(hexdata)
+                    token_data = memo.get(hexdata)
+                    if token_data is None:
+                        token_data = memo[hexdata] = token.OutputData.fromhex(hexdata)
                     if not token_data:
                         bad_ct_entry_ctr += 1
                         del outputmap[n]
@@ -552,37 +666,38 @@ class Abstract_Wallet(PrintError, SPVDelegate):
 
     @profiler
     def save_ct_txo(self):
-        ct_txo = {tx_hash: self.from_Address_dict(value)
+        to_hex = self._token_data_hexer()
+        # Convert token.OutputData values to hexdata
+        ct_txo = {tx_hash: {addr_txt: {n: to_hex(token_data) for n, token_data in outputmap.items()}
+                            for addr_txt, outputmap in self.from_Address_dict(value).items()}
                   for tx_hash, value in self.ct_txo.items()
                   # skip empty entries to save memory and disk space
                   if value}
-        ct_txo = copy.deepcopy(ct_txo)  # Take a deep copy since we mutate this below
-        # Convert token.OutputData values to hexdata
-        for tx_hash, addrmap in ct_txo.items():
-            for addr_txt, outputmap in addrmap.items():
-                for n, token_data in outputmap.copy().items():
-                    if not token_data:
-                        continue
-                    hexdata = token_data.hex()
-                    outputmap[n] = hexdata
         self.storage.put('ct_txo', ct_txo)
 
     @profiler
-    def load_ct_txi(self) -> int:
+    def load_ct_txi(self, memo=None, addr_memo=None) -> int:
         """Populates self.ct_txi:
-           Map of tx_hash -> map of address -> map of "prevout_hash" -> map of prevout_n -> token_data"""
+           Map of tx_hash -> map of address -> map of "prevout_hash" -> map of prevout_n -> token_data
+           See load_ct_txo() for the `memo` and `addr_memo` args."""
         ct_txi = self.storage.get('ct_txi', {})
-        self.ct_txi = {tx_hash: self.to_Address_dict(value)
+        if addr_memo is None:
+            addr_memo = dict()
+        self.ct_txi = {tx_hash: self.to_Address_dict(value, addr_memo)
                        for tx_hash, value in ct_txi.items()
                        # skip empty entries to save memory and disk space
                        if value}
         # Convert hex data values to token.OutputData
         bad_ct_entry_ctr = 0
+        if memo is None:
+            memo = dict()
         for tx_hash, addrmap in self.ct_txi.items():
             for addr, prevout_hash_map in addrmap.items():
                 for prevout_hash, token_data_map in prevout_hash_map.items():
                     for prevout_n, hexdata in token_data_map.copy().items():
-                        token_data = token.OutputData.fromhex(hexdata)
+                        token_data = memo.get(hexdata)
+                        if token_data is None:
+                            token_data = memo[hexdata] = token.OutputData.fromhex(hexdata)
                         if not token_data:
                             bad_ct_entry_ctr += 1
                             del token_data_map[prevout_n]
@@ -597,22 +712,32 @@ class Abstract_Wallet(PrintError, SPVDelegate):
 
     @profiler
     def save_ct_txi(self):
-        ct_txi = {tx_hash: self.from_Address_dict(value)
+        to_hex = self._token_data_hexer()
+        # Convert token.outputData values to hexdata
+        ct_txi = {tx_hash: {addr_txt: {prevout_hash: {prevout_n: to_hex(token_data)
+                                                      for prevout_n, token_data in token_data_map.items()}
+                                       for prevout_hash, token_data_map in prevout_hash_map.items()}
+                            for addr_txt, prevout_hash_map in self.from_Address_dict(value).items()}
                   for tx_hash, value in self.ct_txi.items()
                   # skip empty entries to save memory and disk space
                   if value}
-        ct_txi = copy.deepcopy(ct_txi)  # Take a deep copy since we mutate this below
-        # Convert token.outputData values to hexdata
-        for tx_hash, addrmap in ct_txi.items():
-            for addr, prevout_hash_map in addrmap.items():
-                for prevout_hash, token_data_map in prevout_hash_map.items():
-                    for prevout_n, token_data in token_data_map.copy().items():
-                        if not token_data:
-                            continue
-                        hexdata = token_data.hex()
-                        token_data_map[prevout_n] = hexdata  # Overwrite token_data with hex for storage
         self.storage.put('ct_txi', ct_txi)
 
+    @staticmethod
+    def _token_data_hexer():
+        """Returns a function that serializes token.OutputData to hex for storage, memoizing the result for
+        equal token data (e.g. the many utxos of one fungible token with the same amount)."""
+        memo = dict()
+
+        def to_hex(token_data):
+            if not token_data:
+                return token_data
+            ret = memo.get(token_data)
+            if ret is None:
+                ret = memo[token_data] = token_data.hex()
+            return ret
+        return to_hex
+
     @profiler
     def rebuild_ct_txi_txo(self):
         self.print_error("Rebuilding CashTokens-specific txi and txo maps ...")
@@ -728,7 +853,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
 
     def save_verified_tx(self, write=False):
         with self.lock:
-            self.storage.put('verified_tx3', self.verified_tx)
+            self.storage.put('verified_tx3', dict(self.verified_tx))
             self.cashacct.save()
             if write:
                 self.storage.write()
@@ -746,14 +871,20 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             self.txo = {}
             self.ct_txi = {}
             self.ct_txo = {}
+            self.token_index.clear()
             self.tx_fees = {}
             self.pruned_txo = {}
             self.pruned_txo_values = set()
             self.slp.clear()
             self.save_transactions()
             self._addr_bal_cache = {}
+            self._addr_utxo_cache = {}
+            self._request_received_cache = {}
+            self._reset_balance_totals()
+            self._notify_all_addresses_changed()
             self._history = {}
             self.tx_addr_hist = defaultdict(set)
+            self._address_may_be_unused()
             self.cashacct.on_clear_history()
 
     @profiler
@@ -804,6 +935,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             d = {}
         self.receiving_addresses = Address.from_strings(d.get('receiving', []))
         self.change_addresses = Address.from_strings(d.get('change', []))
+        self._rebuild_address_index()
 
     def synchronize(self):
         pass
@@ -857,6 +989,8 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                     changed = True
 
             if changed:
+                if Address.is_valid(name):
+                    self._notify_address_changed(Address.from_string(name))
                 run_hook('set_label', self, name, text)
                 if save:
                     self.save_labels()
@@ -875,6 +1009,9 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         address sets only grow and never shrink and thus the length check
         of is_mine below is sufficient."""
         self._recv_address_set_cached, self._change_address_set_cached = frozenset(), frozenset()
+        # Address -> (is_change, index), see get_address_index(). Rebuilt
+        # lazily on next use.
+        self._address_index, self._address_index_lens = dict(), None
 
     def is_mine(self, address):
         """Note this method assumes that the entire address set is
@@ -910,14 +1047,35 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             self._change_address_set_cached = frozenset(ca)
         return address in self._change_address_set_cached
 
+    def _rebuild_address_index(self):
+        ra, ca = self.receiving_addresses, self.change_addresses
+        index = {addr: (True, i) for i, addr in enumerate(ca)}
+        # Receiving addresses win if an address somehow appears in both lists,
+        # which is what the old linear search did.
+        index.update((addr, (False, i)) for i, addr in enumerate(ra))
+        self._address_index, self._address_index_lens = index, (len(ra), len(ca))
+
+    def _add_to_address_index(self, address, for_change):
+        """Called after `address` was appended to the receiving or change
+        list, to keep the index in step without rebuilding it. If the lists
+        were modified in some other way since the index was built, the index
+        is dropped and will be rebuilt on next use."""
+        nr, nc = len(self.receiving_addresses), len(self.change_addresses)
+        if self._address_index_lens != ((nr, nc - 1) if for_change else (nr - 1, nc)):
+            self._address_index, self._address_index_lens = dict(), None
+            return
+        self._address_index.setdefault(address, (for_change, (nc if for_change else nr) - 1))
+        self._address_index_lens = (nr, nc)
+
     def get_address_index(self, address):
+        # O(1) lookup, rather than a linear search through both address lists.
+        # As with is_mine(), the lengths are checked to catch lists which were
+        # reassigned or truncated without calling invalidate_address_set_cache().
+        if self._address_index_lens != (len(self.receiving_addresses), len(self.change_addresses)):
+            self._rebuild_address_index()
         try:
-            return False, self.receiving_addresses.index(address)
-        except ValueError:
-            pass
-        try:
-            return True, self.change_addresses.index(address)
-        except ValueError:
+            return self._address_index[address]
+        except KeyError:
             pass
         assert not isinstance(address, str)
         raise Exception("Address {} not found".format(address))
@@ -943,6 +1101,10 @@ class Abstract_Wallet(PrintError, SPVDelegate):
 
             # tx will be verified only if height > 0
             if tx_hash not in self.verified_tx:
+                if self.verifier and self.unverified_tx.get(tx_hash, tx_height) != tx_height:
+                    # A request at the old height may have failed (e.g. after
+                    # a reorg); let the verifier ask again at the new one.
+                    self.verifier.requested_merkle.discard(tx_hash)
                 self.unverified_tx[tx_hash] = tx_height
                 self.cashacct.add_unverified_tx_hook(tx_hash, tx_height)
 
@@ -975,20 +1137,34 @@ class Abstract_Wallet(PrintError, SPVDelegate):
     def undo_verifications(self, blockchain, height):
         '''Used by the verifier when a reorg has happened'''
         txs = set()
+        headers = dict()
         with self.lock:
-            for tx_hash, item in list(self.verified_tx.items()):
-                tx_height, timestamp, pos = item
-                if tx_height >= height:
-                    header = blockchain.read_header(tx_height)
-                    # fixme: use block hash, not timestamp
-                    if not header or header.get('timestamp') != timestamp:
-                        self.verified_tx.pop(tx_hash, None)
-                        txs.add(tx_hash)
+            # Only the txs in the blocks from the fork point up are looked at
+            for tx_hash in self.verified_tx.keys_from_height(height):
+                tx_height, timestamp, pos = self.verified_tx[tx_hash]
+                if tx_height not in headers:
+                    headers[tx_height] = blockchain.read_header(tx_height)
+                header = headers[tx_height]
+                # fixme: use block hash, not timestamp
+                if not header or header.get('timestamp') != timestamp:
+                    self.verified_tx.pop(tx_hash, None)
+                    txs.add(tx_hash)
             if txs: self.cashacct.undo_verifications_hook(txs)
-        if txs:
-            self._addr_bal_cache = {}  # this is probably not necessary -- as the receive_history_callback will invalidate bad cache items -- but just to be paranoid we clear the whole balance cache on reorg anyway as a safety measure
+            addrs = set()
+            for tx_hash in txs:
+                addrs.update(self.txi.get(tx_hash, ()))
+                addrs.update(self.txo.get(tx_hash, ()))
+        # This is probably not necessary -- as the receive_history_callback
+        # will invalidate bad cache items -- but just to be paranoid we
+        # invalidate the balances of every address the reorged txs touch.
+        # This also tells the address change trackers exactly what changed.
+        for addr in addrs:
+            self._invalidate_addr_bal_cache(addr)
         for tx_hash in txs:
             self._update_request_statuses_touched_by_tx(tx_hash)
+            if self.network:
+                # Listeners update their view of the tx as for a verification
+                self.network.trigger_callback('verified2', self, tx_hash, *self.get_tx_height(tx_hash))
         return txs
 
     def get_local_height(self):
@@ -1300,13 +1476,25 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                 sent[txi] = height
         return received, sent
 
-    def get_addr_utxo(self, address):
+    def _get_addr_unspent(self, address):
+        """ Returns the (cached) dict of "prevout_hash:n" -> (height, value,
+        is_coinbase, token_data) of the unspent coins of `address`. The
+        returned dict must not be modified. """
+        coins = self._addr_utxo_cache.get(address)
+        if coins is not None:
+            return coins
         coins, spent = self.get_addr_io(address)
         for txi in spent:
             coins.pop(txi)
             # cleanup/detect if the 'frozen coin' was spent and remove it from the frozen coin set
             self.frozen_coins.discard(txi)
             self.frozen_coins_tmp.discard(txi)
+        if self.lock._is_owned():
+            self._addr_utxo_cache[address] = coins
+        return coins
+
+    def get_addr_utxo(self, address):
+        coins = self._get_addr_unspent(address)
         out = {}
         for txo, v in coins.items():
             tx_height, value, is_cb, token_data = v
@@ -1331,6 +1519,93 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         received, sent = self.get_addr_io(address)
         return sum([v for height, v, is_cb, token_data in received.values()])
 
+    def create_address_change_tracker(self) -> AddressChangeTracker:
+        """Returns a new AddressChangeTracker that will be notified of
+        per-address changes for as long as the caller holds a reference to
+        it."""
+        tracker = AddressChangeTracker()
+        self._addr_change_trackers.add(tracker)
+        return tracker
+
+    def _notify_address_changed(self, *addrs):
+        for tracker in list(self._addr_change_trackers):
+            tracker.add_many(addrs)
+
+    def _notify_all_addresses_changed(self):
+        for tracker in list(self._addr_change_trackers):
+            tracker.mark_all()
+
+    def _invalidate_addr_bal_cache(self, address):
+        self._addr_bal_cache.pop(address, None)
+        self._addr_utxo_cache.pop(address, None)
+        self._bal_totals_dirty.add(address)
+        self._request_received_cache.pop(address, None)
+        self._notify_address_changed(address)
+
+    def _reset_balance_totals(self):
+        # Address -> its get_addr_balance(tokens=True) as last added to the totals
+        self._bal_totals_contrib = dict()
+        # [confirmed, unconfirmed, unmatured, token-locked], or None if they
+        # need to be recomputed from scratch
+        self._bal_totals = None
+        # Addresses whose contribution needs to be recomputed. Like
+        # _addr_bal_cache, this is added to without holding the lock.
+        self._bal_totals_dirty = set()
+        # Addresses holding coinbase coins, whose contribution depends on the
+        # local height, and the height their contribution was computed at
+        self._bal_totals_coinbase = set()
+        self._bal_totals_height = None
+
+    def _update_balance_total(self, address, bal):
+        totals = self._bal_totals
+        old = self._bal_totals_contrib.pop(address, None)
+        if old:
+            for i, v in enumerate(old):
+                totals[i] -= v
+        if any(bal):
+            self._bal_totals_contrib[address] = bal
+            for i, v in enumerate(bal):
+                totals[i] += v
+
+    def _get_balance_totals(self):
+        """ Returns the (confirmed, unconfirmed, unmatured, token-locked)
+        balance of the whole wallet. Rather than summing get_addr_balance()
+        over every address, this keeps running totals, and only recomputes the
+        contribution of the addresses invalidated by _invalidate_addr_bal_cache
+        since the last call (plus those holding coinbase coins, when the local
+        height changes). Must be called with self.lock held. """
+        height = self.get_local_height()
+        if self._bal_totals is None:
+            self._bal_totals_contrib.clear()
+            self._bal_totals_coinbase.clear()
+            self._bal_totals = [0, 0, 0, 0]
+            self._bal_totals_dirty.update(self.get_addresses())
+        elif height != self._bal_totals_height:
+            self._bal_totals_dirty.update(self._bal_totals_coinbase)
+        self._bal_totals_height = height
+        dirty = self._bal_totals_dirty
+        while dirty:
+            addr = dirty.pop()
+            if not self.is_mine(addr):
+                # Deleted from the wallet
+                self._bal_totals_coinbase.discard(addr)
+                self._update_balance_total(addr, ())
+                continue
+            bal = self.get_addr_balance(addr, tokens=True)
+            # get_addr_balance() only leaves out of its cache the addresses
+            # holding coinbase coins (or ones invalidated meanwhile, which
+            # are back in `dirty` and cost nothing extra).
+            if addr in self._addr_bal_cache:
+                self._bal_totals_coinbase.discard(addr)
+            else:
+                self._bal_totals_coinbase.add(addr)
+            self._update_balance_total(addr, bal)
+        totals = tuple(self._bal_totals)
+        if self.check_balance_totals:
+            expected = self._sum_addr_balances(self.get_addresses(), False)
+            assert totals == expected, f"balance totals {totals} != {expected}"
+        return totals
+
     def get_addr_balance(self, address, exclude_frozen_coins=False, *, tokens=False):
         """ Returns the balance of a bitcoin address as a tuple of:
             (confirmed_matured, unconfirmed, unmatured) if tokens == False or
@@ -1437,6 +1712,10 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                 domain = self.get_addresses()
             if exclude_frozen:
                 domain = set(domain) - self.frozen_addresses
+            if tokens_only:
+                # Only addresses currently holding tokens can contribute
+                token_addrs = self.token_index.get_addresses()
+                domain = [addr for addr in domain if addr in token_addrs]
             for addr in domain:
                 utxos = self.get_addr_utxo(addr)
                 len_before = len(coins)
@@ -1464,6 +1743,34 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                     addr_set_out.add(addr)
             return coins
 
+    def get_token_utxos(self, category=None, capability=None, domain=None, exclude_frozen=False):
+        """Returns the list of token-bearing utxo dicts (same format as get_utxos) for token category
+        `category` (hex, optional). If `capability` is specified (a token.Capability), only NFTs having
+        that capability are returned. """
+        with self.lock:
+            names = self.token_index.get_utxo_names(category, capability, domain)
+            if not names:
+                return []
+            addrs = {self.token_index.get_output(name)[0] for name in names}
+            if exclude_frozen:
+                addrs -= self.frozen_addresses
+            coins = []
+            for addr in addrs:
+                for name, x in self.get_addr_utxo(addr).items():
+                    if name not in names:
+                        continue
+                    if exclude_frozen and x['is_frozen_coin']:
+                        continue
+                    coins.append(x)
+            return coins
+
+    def get_token_balances(self) -> Dict[str, dict]:
+        """Returns a dict of token category (hex) -> dict of the fungible amount, NFT counts and utxo
+        count the wallet holds for that category. """
+        with self.lock:
+            return {category: self.token_index.get_balance(category)
+                    for category in self.token_index.get_categories()}
+
     def dummy_address(self):
         return self.get_receiving_addresses()[0]
 
@@ -1495,29 +1802,56 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         if not self.frozen_coins and not self.frozen_coins_tmp:
             # performance short-cut -- get the balance of the frozen address set only IFF we don't have any frozen coins
             return self.get_balance(self.frozen_addresses)
-        # otherwise, do this more costly calculation...
-        cc_no_f, uu_no_f, xx_no_f = self.get_balance(None, exclude_frozen_coins = True, exclude_frozen_addresses = True)
-        cc_all, uu_all, xx_all = self.get_balance(None, exclude_frozen_coins = False, exclude_frozen_addresses = False)
-        return (cc_all-cc_no_f), (uu_all-uu_no_f), (xx_all-xx_no_f)
+        # Otherwise, it's the balance of the frozen addresses, plus whatever
+        # frozen coins contribute to the balance of the other addresses.
+        with self.lock:
+            coin_addrs = set()
+            for ser in self.frozen_coins | self.frozen_coins_tmp:
+                prevout_hash, n = ser.rsplit(':', 1)
+                n = int(n)
+                for addr, l in self.txo.get(prevout_hash, {}).items():
+                    if any(n == txo_n for txo_n, *_ in l):
+                        coin_addrs.add(addr)
+            coin_addrs -= self.frozen_addresses
+            cc, uu, xx = self.get_balance(self.frozen_addresses)
+            for addr in coin_addrs:
+                if not self.is_mine(addr):
+                    continue
+                c, u, x = self.get_addr_balance(addr)
+                c_no_f, u_no_f, x_no_f = self.get_addr_balance(addr, exclude_frozen_coins=True)
+                cc += c - c_no_f
+                uu += u - u_no_f
+                xx += x - x_no_f
+            return cc, uu, xx
 
     def get_balance(self, domain=None, exclude_frozen_coins=False, exclude_frozen_addresses=False, *,
                     tokens=False):
         """If tokens=True, returns a 4-tuple: (confirmed, unconfirmed, unmatured, tokens), otherwise returns a
            3-tuple of just (confirmed, unconfirmed, unmatured) """
+        if domain is None and not exclude_frozen_coins:
+            with self.lock:
+                totals = self._get_balance_totals()
+                if exclude_frozen_addresses:
+                    totals = list(totals)
+                    for addr in self.frozen_addresses:
+                        for i, v in enumerate(self._bal_totals_contrib.get(addr, ())):
+                            totals[i] -= v
+            return tuple(totals[:3 + int(tokens)])
         if domain is None:
             domain = self.get_addresses()
         if exclude_frozen_addresses:
             domain = set(domain) - self.frozen_addresses
+        return self._sum_addr_balances(domain, exclude_frozen_coins)[:3 + int(tokens)]
+
+    def _sum_addr_balances(self, domain, exclude_frozen_coins):
         cc = uu = xx = toks = 0
         for addr in domain:
-            tup = self.get_addr_balance(addr, exclude_frozen_coins, tokens=tokens)
-            c, u, x = tup[:3]
-            tok = tup[3] if tokens else 0
+            c, u, x, tok = self.get_addr_balance(addr, exclude_frozen_coins, tokens=True)
             cc += c
             uu += u
             xx += x
             toks += tok
-        return (cc, uu, xx, toks)[:3 + int(tokens)]
+        return cc, uu, xx, toks
 
     def get_address_history(self, address):
         assert isinstance(address, Address)
@@ -1666,6 +2000,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         finally:
             self.print_error(f"{fname}: thread exiting")
 
+    @metrics.timed(ADD_TRANSACTION_SECONDS)
     def add_transaction(self, tx_hash, tx):
         if not tx.inputs():
             # bad tx came in off the wire -- all 0's or something, see #987
@@ -1698,6 +2033,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                     if ddd is None:
                         dd[prevout_hash] = ddd = {}
                     ddd[prevout_n] = token_data
+                    self.token_index.spend(ser, tx_hash)
                     self.print_error(f"Adding CashTokens txi: {tx_hash} -> {addr} -> {prevout_hash} -> {prevout_n} -> {token_data!r}")
 
             def find_in_self_txo(prevout_hash: str, prevout_n: int) -> tuple:
@@ -1753,7 +2089,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                         # the spend for when the receive tx will arrive into
                         # this function later.
                         put_pruned_txo(ser, tx_hash)
-                    self._addr_bal_cache.pop(addr, None)  # invalidate cache entry
+                    self._invalidate_addr_bal_cache(addr)  # invalidate cache entry
                     del dd, prevout_hash, prevout_n, ser
                 elif addr is None:
                     # Unknown/unparsed address.. may be a strange p2sh scriptSig
@@ -1764,7 +2100,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                     addr2, v, token_data = find_in_self_txo(prevout_hash, prevout_n)
                     if addr2 is not None and self.is_mine(addr2):
                         add_to_self_txi(tx_hash, addr2, ser, v, token_data)
-                        self._addr_bal_cache.pop(addr2, None)  # invalidate cache entry
+                        self._invalidate_addr_bal_cache(addr2)  # invalidate cache entry
                     else:
                         # Not found in self.txo. It may still be one of ours
                         # however since tx's can come in out of order due to
@@ -1823,8 +2159,9 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                         if ct_dd is None:
                             ct_d[addr] = ct_dd = {}
                         ct_dd[n] = token_data
+                        self.token_index.add_output(ser, addr, token_data)
                         self.print_error(f"Adding CashTokens txo: {tx_hash} -> {addr} -> {n} -> {token_data!r}")
-                    self._addr_bal_cache.pop(addr, None)  # invalidate cache entry
+                    self._invalidate_addr_bal_cache(addr)  # invalidate cache entry
                 # give v to txi that spends me
                 next_tx = pop_pruned_txo(ser)
                 if next_tx is not None and mine:
@@ -1851,6 +2188,9 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             # cheap no-op if this tx's outputs[0] is not an SLP script.
             self.slp.add_tx(tx_hash, tx)
 
+            # Let plugins that index wallet txs (e.g. CashFusion) update incrementally
+            run_hook('wallet_add_transaction', self, tx_hash, tx)
+
     def remove_transaction(self, tx_hash):
         with self.lock:
             self.print_error("removing tx from history", tx_hash)
@@ -1874,7 +2214,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                     for idx, (ser, v) in enumerate(l):
                         prev_hash, prev_n = ser.split(':')
                         if prev_hash == tx_hash:
-                            self._addr_bal_cache.pop(addr, None)  # invalidate cache entry
+                            self._invalidate_addr_bal_cache(addr)  # invalidate cache entry
                             del_idx.append(idx)
                             self.pruned_txo[ser] = next_tx
                             self.pruned_txo_values.add(next_tx)
@@ -1900,7 +2240,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             # invalidate addr_bal_cache for outputs involving this tx
             d = self.txo.get(tx_hash, {})  # tx_hash -> Address -> List[Tuple[N, value, is_cb]]
             for addr in d:
-                self._addr_bal_cache.pop(addr, None)  # invalidate cache entry
+                self._invalidate_addr_bal_cache(addr)  # invalidate cache entry
 
             try: self.txi.pop(tx_hash)
             except KeyError: self.print_error("tx was not in input history", tx_hash)
@@ -1908,11 +2248,13 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             except KeyError: self.print_error("tx was not in output history", tx_hash)
             self.ct_txi.pop(tx_hash, None)
             self.ct_txo.pop(tx_hash, None)
+            self.token_index.remove_tx(tx_hash)
 
             # do this with the lock held
             self.cashacct.remove_transaction_hook(tx_hash)
             # inform slp subsystem as well
             self.slp.rm_tx(tx_hash)
+            run_hook('wallet_remove_transaction', self, tx_hash)
 
     def receive_tx_callback(self, tx_hash, tx, tx_height):
         self.add_transaction(tx_hash, tx)
@@ -1923,6 +2265,9 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         tx = self.transactions.get(tx_hash)
         if tx is None:
             return
+        # The tx may have been verified or unverified, which doesn't touch the address's history
+        for _, addr, _ in tx.outputs():
+            self._request_received_cache.pop(addr, None)
         if self.network and self.network.callback_listener_count("payment_received") > 0:
             for _, addr, _ in tx.outputs():
                 status = self.get_request_status(addr)  # returns PR_UNKNOWN quickly if addr has no requests, otherwise returns tuple
@@ -1974,8 +2319,10 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                     # and self.txo dicts
                     self.remove_transaction(tx_hash)
                     removed_ct += 1
-            self._addr_bal_cache.pop(addr, None)  # unconditionally invalidate cache entry
+            self._invalidate_addr_bal_cache(addr)  # unconditionally invalidate cache entry
             self._history[addr] = hist
+            if old_hist and not hist:
+                self._address_may_be_unused(addr)
 
             for tx_hash, tx_height in hist:
                 # add it in case it was previously unconfirmed
@@ -2146,7 +2493,6 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         self.tx_fees, which gets saved to wallet storage. This is not very
         demanding on storage as even for very large wallets with huge histories,
         tx_fees does not use more than a few hundred kb of space. '''
-        from .util import timestamp_to_datetime
         # we save copies of tx's we deserialize to this temp dict because we do
         # *not* want to deserialize tx's in wallet.transactoins since that
         # wastes memory
@@ -2215,6 +2561,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         # grab history
         h = self.get_history(domain, reverse=True, receives_before_sends=receives_before_sends)
         out = []
+        fiat_todo = []  # list of (item, value, balance, fee)
 
         n, l = 0, max(1, float(len(h)))
         for tx_hash, height, conf, timestamp, value, balance in h:
@@ -2269,11 +2616,15 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                 item['input_addresses'] = input_addresses
                 item['output_addresses'] = output_addresses
             if fx is not None:
-                date = timestamp_to_datetime(timestamp_safe)
-                item['fiat_value'] = fx.historical_value_str(value, date)
-                item['fiat_balance'] = fx.historical_value_str(balance, date)
-                item['fiat_fee'] = fx.historical_value_str(fee, date)
+                fiat_todo.append((item, value, balance, fee))
             out.append(item)
+        if fiat_todo:
+            # Look up all the historical rates in one go
+            rates = fx.history_rates([item['timestamp'] for item, *_ in fiat_todo])
+            for (item, value, balance, fee), rate in zip(fiat_todo, rates):
+                item['fiat_value'] = fx.value_str(value, rate)
+                item['fiat_balance'] = fx.value_str(balance, rate)
+                item['fiat_fee'] = fx.value_str(fee, rate)
         if progress_callback:
             progress_callback(1.0)  # indicate done, just in case client code expects a 1.0 in order to detect completion
         return out
@@ -2931,6 +3282,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                 self.frozen_addresses |= set(addrs)
             else:
                 self.frozen_addresses -= set(addrs)
+            self._notify_address_changed(*addrs)
             frozen_addresses = [addr.to_storage_string()
                                 for addr in self.frozen_addresses]
             self.storage.put('frozen_addresses', frozen_addresses)
@@ -2964,11 +3316,13 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             self.frozen_coins_tmp.discard(utxo)
         apply_operation = add if freeze else discard
         original_size = len(self.frozen_coins)
+        changed_addrs = set()
         with self.lock:
             ok = 0
             for utxo in utxos:
                 if isinstance(utxo, str):
                     apply_operation(utxo)
+                    changed_addrs.update(self._get_prevout_addresses(utxo))
                     ok += 1
                 elif isinstance(utxo, dict):
                     # Note: we could do an is_mine check here for each coin dict here,
@@ -2980,13 +3334,23 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                     txo = "{}:{}".format(utxo['prevout_hash'], utxo['prevout_n'])
                     apply_operation(txo)
                     utxo['is_frozen_coin'] = bool(freeze)
+                    changed_addrs.add(utxo['address'])
                     ok += 1
             if original_size != len(self.frozen_coins):
                 # Performance optimization: only set storage if the perma-set
                 # changed.
                 self.storage.put('frozen_coins', list(self.frozen_coins))
+            self._notify_address_changed(*changed_addrs)
             return ok
 
+    def _get_prevout_addresses(self, prevout):
+        """Returns the wallet addresses that received output "prevout_hash:n"
+        (at most one, in practice). """
+        prevout_hash, n = prevout.rsplit(':', 1)
+        n = int(n)
+        return [addr for addr, l in self.txo.get(prevout_hash, {}).items()
+                if any(x[0] == n for x in l)]
+
     @profiler
     def prepare_for_verifier(self):
         # review transactions that are in the history
@@ -3021,6 +3385,8 @@ class Abstract_Wallet(PrintError, SPVDelegate):
                 my_jobs.append(self.rpa_manager)
             else:
                 self.rpa_manager = None
+            self.request_expiry_sweeper = RequestExpirySweeper(self)
+            my_jobs.append(self.request_expiry_sweeper)
             network.add_jobs(my_jobs)
             self.cashacct.start(self.network)  # start cashacct network-dependent subsystem, nework.add_jobs, etc
         else:
@@ -3048,6 +3414,9 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             if self.rpa_manager:
                 self.network.remove_jobs([self.rpa_manager])
             self.rpa_manager = None
+            if self.request_expiry_sweeper:
+                self.network.remove_jobs([self.request_expiry_sweeper])
+            self.request_expiry_sweeper = None
             self.stop_pruned_txo_cleaner_thread()
             # Now no references to the syncronizer or verifier
             # remain so they will be GC-ed
@@ -3309,6 +3678,11 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         if addrs:
             return addrs[0]
 
+    def _address_may_be_unused(self, address=None):
+        """Called when `address` may have become unused again, because its
+        history or its payment request went away. address=None means any
+        address may have. Reimplemented in Deterministic_Wallet."""
+
     def get_receiving_address(self, *, frozen_ok=True, preferred=True):
         """Returns a receiving address or None."""
         domain = self.get_unused_addresses(for_change=False, frozen_ok=frozen_ok, preferred=preferred)
@@ -3319,19 +3693,31 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         if domain:
             return domain[0]
 
+    def _get_request_received(self, address):
+        """Returns [(tx_height or 0 if unverified, value, txid), ...] for the
+        coins received by address. Cached for the addresses of payment
+        requests, so that listing many requests doesn't walk all of their
+        histories every time."""
+        ret = self._request_received_cache.get(address)
+        if ret is not None:
+            return ret
+        with self.lock:
+            received, sent = self.get_addr_io(address)
+            ret = []
+            for txo, x in received.items():
+                h, v, is_cb, token_data = x
+                txid, n = txo.split(':')
+                info = self.verified_tx.get(txid)
+                ret.append((info[0] if info else 0, v, txid))
+            if address in self.receive_requests:
+                self._request_received_cache[address] = ret
+        return ret
+
     def get_payment_status(self, address, amount):
         local_height = self.get_local_height()
-        received, sent = self.get_addr_io(address)
         l = []
-        for txo, x in received.items():
-            h, v, is_cb, token_data = x
-            txid, n = txo.split(':')
-            info = self.verified_tx.get(txid)
-            if info:
-                tx_height, timestamp, pos = info
-                conf = max(local_height - tx_height + 1, 0)
-            else:
-                conf = 0
+        for tx_height, v, txid in self._get_request_received(address):
+            conf = max(local_height - tx_height + 1, 0) if tx_height else 0
             l.append((conf, v, txid))
         tx_hashes = []
         vsum = 0
@@ -3473,7 +3859,13 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         addr_text = addr.to_storage_string()
         amount = req['amount']
         message = req['memo']
-        self.receive_requests[addr] = req
+        with self.lock:
+            old = self.receive_requests.get(addr)
+            self.receive_requests[addr] = req
+            self._request_received_cache.pop(addr, None)
+            if old is None:
+                self._request_order = None
+            self._push_request_expiry(req)
         if save:
             self.save_payment_requests()
         if set_address_label:
@@ -3504,7 +3896,11 @@ class Abstract_Wallet(PrintError, SPVDelegate):
             addr = Address.from_string(addr)
         if addr not in self.receive_requests:
             return False
-        r = self.receive_requests.pop(addr)
+        with self.lock:
+            r = self.receive_requests.pop(addr)
+            self._request_received_cache.pop(addr, None)
+            self._request_order = None
+        self._address_may_be_unused(addr)
         if clear_address_label_if_no_tx and not self.get_address_history(addr):
             memo = r.get('memo')
             # clear it only if the user didn't overwrite it with something else
@@ -3523,23 +3919,61 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         return True
 
     def get_sorted_requests(self, config):
-        m = map(lambda x: self.get_payment_request(x, config), self.receive_requests.keys())
+        return self.get_requests(config)
+
+    def _request_sort_key(self, addr):
         try:
-            def f(x):
-                try:
-                    addr = x['address']
-                    return self.get_address_index(addr) or addr
-                except:
-                    return addr
-            return sorted(m, key=f)
-        except TypeError:
-            # See issue #1231 -- can get inhomogenous results in the above
-            # sorting function due to the 'or addr' possible return.
+            index = self.get_address_index(addr)
+        except Exception:
             # This can happen if addresses for some reason drop out of wallet
             # while, say, the history rescan is running and it can't yet find
-            # an address index for an address.  In that case we will
-            # return an unsorted list to the caller.
-            return list(m)
+            # an address index for an address (see issue #1231).
+            index = None
+        if isinstance(index, tuple):
+            return 0, index, ''
+        # Imported wallets, where the "index" is a public key
+        return 1, (), addr.to_storage_string()
+
+    def get_requests(self, config, *, status=None, offset=0, limit=None):
+        """Returns the payment requests, as get_payment_request() does, in
+        address order. If status is not None, only those with that status are
+        returned. Of those, only `limit` are returned, starting at `offset`.
+        Only the requests returned are fully formatted, so paging through a
+        great many requests is cheap."""
+        with self.lock:
+            if self._request_order is None:
+                self._request_order = sorted(self.receive_requests, key=self._request_sort_key)
+            addrs = self._request_order
+            if status is not None:
+                addrs = [addr for addr in addrs if self.get_request_status(addr)[0] == status]
+            addrs = addrs[offset:None if limit is None else offset + limit]
+        return [self.get_payment_request(addr, config) for addr in addrs]
+
+    def _push_request_expiry(self, req):
+        exp, timestamp = req.get('exp'), req.get('time')
+        if exp and type(exp) is int and timestamp and type(timestamp) is int:
+            heapq.heappush(self._request_expiry_heap, (timestamp + exp, req['address']))
+
+    def sweep_expired_requests(self, now=None):
+        """Returns the addresses of the requests that expired since the last
+        call, announcing each with the 'payment_received' network callback.
+        Called periodically by a RequestExpirySweeper when online."""
+        now = time.time() if now is None else now
+        expired = []
+        with self.lock:
+            heap = self._request_expiry_heap
+            while heap and heap[0][0] < now:
+                expires, addr = heapq.heappop(heap)
+                req = self.receive_requests.get(addr)
+                if (not req or req.get('time', 0) + (req.get('exp') or 0) != expires
+                        or self.get_payment_status(addr, req.get('amount'))[0]):
+                    # Removed, replaced or paid since
+                    continue
+                expired.append(addr)
+        if expired and self.network:
+            for addr in expired:
+                self.network.trigger_callback('payment_received', self, addr, PR_EXPIRED)
+        return expired
 
     def get_fingerprint(self):
         raise NotImplementedError()
@@ -3573,7 +4007,7 @@ class Abstract_Wallet(PrintError, SPVDelegate):
         assert isinstance(address, Address)
         # paranoia, not really necessary -- just want to maintain the invariant that when we modify address history
         # below we invalidate cache.
-        self._addr_bal_cache.pop(address, None)
+        self._invalidate_addr_bal_cache(address)
         self.invalidate_address_set_cache()
         if address not in self._history:
             self._history[address] = []
@@ -3812,7 +4246,7 @@ class ImportedWalletBase(Simple_Wallet):
                 self.transactions.pop(tx_hash, None)
                 self.ct_txi.pop(tx_hash, None)
                 self.ct_txo.pop(tx_hash, None)
-                self._addr_bal_cache.pop(address, None)  # not strictly necessary, above calls also have this side-effect. but here to be safe. :)
+                self._invalidate_addr_bal_cache(address)  # not strictly necessary, above calls also have this side-effect. but here to be safe. :)
                 if self.verifier:
                     # TX is now gone. Toss its SPV proof in case we have it
                     # in memory. This allows user to re-add PK again and it
@@ -3829,7 +4263,7 @@ class ImportedWalletBase(Simple_Wallet):
                     for key in to_pop:
                         self.pruned_txo.pop(key, None)
 
-            self.storage.put('verified_tx3', self.verified_tx)
+            self.storage.put('verified_tx3', dict(self.verified_tx))
 
         self.save_transactions()
 
@@ -4179,12 +4613,16 @@ class RpaWallet(ImportedWalletBase):
 
     def rebuild_history(self):
         self.storage.put('rpa_height', rpa.determine_best_rpa_start_height())
+        self.storage.put('rpa_completed_ranges', None)
         super(RpaWallet, self).rebuild_history()
 
 
 class Deterministic_Wallet(Abstract_Wallet):
 
     def __init__(self, storage):
+        # All receiving addresses before this index are known to be used (they
+        # have history or a payment request). See get_unused_address().
+        self._unused_recv_cursor = 0
         Abstract_Wallet.__init__(self, storage)
         self.gap_limit = storage.get('gap_limit', 20)
 
@@ -4211,6 +4649,38 @@ class Deterministic_Wallet(Abstract_Wallet):
         """Reimplemented in MultiXPubWallet"""
         return False
 
+    def get_unused_address(self, *, for_change=False, frozen_ok=True, preferred=False):
+        """Reimplemented to avoid scanning all the receiving addresses every
+        time, which matters when many payment requests are being created.
+        Addresses get used up from the front of the list, so we keep a cursor
+        past the leading run of used ones, and only look from there on. The
+        cursor is moved back by _address_may_be_unused()."""
+        if for_change or (preferred and self.get_preferred_receiving_addresses() is not self.receiving_addresses):
+            return super().get_unused_address(for_change=for_change, frozen_ok=frozen_ok, preferred=preferred)
+        with self.lock:
+            addrs = self.receiving_addresses
+            n = len(addrs)
+            i = min(self._unused_recv_cursor, n)
+            while i < n and (addrs[i] in self.receive_requests or self.get_address_history(addrs[i])):
+                i += 1
+            self._unused_recv_cursor = i
+            for addr in itertools.islice(addrs, i, None):
+                if (addr not in self.receive_requests and not self.get_address_history(addr)
+                        and (frozen_ok or addr not in self.frozen_addresses)):
+                    return addr
+
+    def _address_may_be_unused(self, address=None):
+        with self.lock:
+            if address is None:
+                self._unused_recv_cursor = 0
+                return
+            try:
+                is_change, i = self.get_address_index(address)
+            except Exception:
+                return
+            if not is_change:
+                self._unused_recv_cursor = min(self._unused_recv_cursor, i)
+
     def change_gap_limit(self, value):
         '''This method is not called in the code, it is kept for console use'''
         with self.lock:
@@ -4264,6 +4734,7 @@ class Deterministic_Wallet(Abstract_Wallet):
             x = self.derive_pubkeys(for_change, n)
             address = self.pubkeys_to_address(x)
             addr_list.append(address)
+            self._add_to_address_index(address, for_change)
             if save:
                 self.save_addresses()
             self.add_address(address, for_change=for_change)
@@ -4299,7 +4770,7 @@ class Deterministic_Wallet(Abstract_Wallet):
             else:
                 addr_list = self.get_receiving_addresses()
                 limit = self.gap_limit
-            idx = addr_list.index(address)
+            idx = self.get_address_index(address)[1]
             if idx < limit:
                 return False
             for addr in addr_list[-limit:]:
@@ -4535,6 +5006,8 @@ class MultiXPubWallet(Deterministic_Wallet):
         # delete every address and regen
         del self.receiving_addresses[:]
         del self.change_addresses[:]
+        self._address_may_be_unused()
+        self._reset_balance_totals()
         while len(self.receiving_addresses) < saved_gap_limit:
             self.create_new_address(for_change=False, save=False)
         while len(self.change_addresses) < saved_gap_limit_for_change:
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -*- mode: python3 -*-
+# Part of the Electron Cash SPV Wallet
+# License: MIT
+'''
+Delivery of the webhooks registered with the `notify` command.
+
+Every time the status of a watched address changes, its URLs get a POST of
+{"address": ..., "status": ...}. The network thread only queues these; a
+pool of worker threads sends them, each over its own keep-alive session.
+Failed deliveries are retried with exponential backoff. The queue is
+bounded: a newer status for the same address and URL replaces one still
+waiting to be sent, and when the queue is full the oldest entry is dropped.
+Subscriptions are saved to a file in the config directory and restored by
+the daemon on startup.
+'''
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import requests
+
+from . import util
+from .address import Address
+
+
+class Delivery:
+    ''' One pending POST of an address's status to a URL '''
+    __slots__ = ('url', 'address', 'status', 'attempts', 'queued_time')
+
+    def __init__(self, url, address, status):
+        self.url = url
+        self.address = address
+        self.status = status
+        self.attempts = 0
+        self.queued_time = time.monotonic()
+
+    @property
+    def key(self):
+        return self.url, self.address
+
+
+class WebhookDispatcher(util.PrintError):
+    FILENAME = 'webhooks.json'
+    VERSION = 1
+    WORKERS = 4
+    MAX_QUEUE = 10000
+    MAX_ATTEMPTS = 6
+    BACKOFF_BASE = 2.0  # seconds before the first retry, doubled for each retry after that
+    BACKOFF_MAX = 300.0
+    TIMEOUT = 10.0
+
+    def __init__(self, config_path, network=None, *, workers=None, max_queue=None, timeout=None):
+        util.PrintError.__init__(self)
+        self.path = os.path.join(config_path, self.FILENAME) if config_path else None
+        self.network = network
+        self.workers = max(1, workers or self.WORKERS)
+        self.max_queue = max(1, max_queue or self.MAX_QUEUE)
+        self.timeout = timeout or self.TIMEOUT
+        self.cond = threading.Condition()
+        self._save_lock = threading.Lock()
+        # scripthash -> {url: the address string to post, as given to subscribe}
+        self.subscriptions: Dict[str, Dict[str, str]] = dict()
+        # (url, address) -> Delivery, for everything not yet sent or in flight
+        self.queued: Dict[Tuple[str, str], Delivery] = dict()
+        # The subset of `queued` that is ready to send, oldest first
+        self.ready: Dict[Tuple[str, str], Delivery] = OrderedDict()
+        # Heap of (due time, seq, Delivery) for the rest of `queued`, waiting to be retried
+        self.retries = []
+        self._seq = itertools.count()
+        self.in_flight = 0
+        self.stats = {'queued': 0, 'coalesced': 0, 'dropped': 0, 'delivered': 0, 'retried': 0, 'failed': 0}
+        self._latency_total = 0.0
+        self._tls = threading.local()
+        self.threads = []
+        self.stopping = False
+        self.load()
+
+    # --- subscriptions
+
+    def subscribe(self, address: Address, url: str, address_str: Optional[str] = None):
+        ''' Starts sending `address`'s status to `url`. The POSTs name the
+        address as `address_str` (the form the caller gave it in), by default
+        its ui string. '''
+        sh = address.to_scripthash_hex()
+        with self.cond:
+            urls = self.subscriptions.setdefault(sh, dict())
+            is_new = not urls
+            urls[url] = address_str or address.to_ui_string()
+        self.save()
+        if is_new and self.network:
+            self.network.subscribe_to_scripthashes([sh], self._on_status)
+
+    def unsubscribe(self, address: Address, url: Optional[str] = None) -> bool:
+        ''' Stops sending `address`'s status to `url`, or to any URL if url is None.
+        Returns False if there was no such subscription. '''
+        sh = address.to_scripthash_hex()
+        with self.cond:
+            if sh not in self.subscriptions:
+                return False
+            urls = self.subscriptions[sh]
+            if url is not None:
+                if url not in urls:
+                    return False
+                del urls[url]
+            else:
+                urls.clear()
+            is_last = not urls
+            if is_last:
+                del self.subscriptions[sh]
+        self.save()
+        if is_last and self.network:
+            self.network.unsubscribe_from_scripthashes([sh], self._on_status)
+        return True
+
+    def get_subscriptions(self) -> Dict[str, list]:
+        ret = dict()
+        with self.cond:
+            for urls in self.subscriptions.values():
+                for url, addr in urls.items():
+                    ret.setdefault(addr, []).append(url)
+        return {addr: sorted(urls) for addr, urls in ret.items()}
+
+    def _on_status(self, response):
+        ''' Network callback, called from the network thread '''
+        params = response.get('params')
+        if response.get('error') or not params:
+            return
+        with self.cond:
+            urls = self.subscriptions.get(params[0])
+            if urls:
+                for url, address in urls.items():
+                    self.enqueue(url, address, response.get('result'))
+
+    # --- the queue
+
+    def enqueue(self, url, address, status):
+        with self.cond:
+            self.stats['queued'] += 1
+            d = self.queued.get((url, address))
+            if d is not None:
+                # Not sent yet; only the latest status matters
+                d.status = status
+                self.stats['coalesced'] += 1
+                return
+            if len(self.queued) >= self.max_queue:
+                self.stats['dropped'] += 1
+                if not self.ready:
+                    # Everything queued is waiting for a retry, drop the newcomer
+                    return
+                key, _ = self.ready.popitem(last=False)
+                del self.queued[key]
+            d = Delivery(url, address, status)
+            self.queued[d.key] = self.ready[d.key] = d
+            self.cond.notify()
+
+    def _next(self) -> Optional[Delivery]:
+        ''' Blocks until a delivery is due. Returns None when stopping. '''
+        with self.cond:
+            while not self.stopping:
+                now = time.monotonic()
+                while self.retries and self.retries[0][0] <= now:
+                    _, _, d = heapq.heappop(self.retries)
+                    if self.queued.get(d.key) is d:
+                        self.ready[d.key] = d
+                if self.ready:
+                    key, d = self.ready.popitem(last=False)
+                    del self.queued[key]
+                    self.in_flight += 1
+                    return d
+                self.cond.wait(self.retries[0][0] - now if self.retries else None)
+
+    def _done(self, d: Delivery, ok: bool, retry: bool):
+        with self.cond:
+            self.in_flight -= 1
+            if ok:
+                self.stats['delivered'] += 1
+                self._latency_total += time.monotonic() - d.queued_time
+                return
+            d.attempts += 1
+            if not retry or d.attempts >= self.MAX_ATTEMPTS or d.key in self.queued:
+                # Given up on, or superseded by a newer status queued while this one was in flight
+                self.stats['failed'] += 1
+                return
+            self.stats['retried'] += 1
+            due = time.monotonic() + min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** (d.attempts - 1))
+            self.queued[d.key] = d
+            heapq.heappush(self.retries, (due, next(self._seq), d))
+            self.cond.notify()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._tls, 'session', None)
+        if session is None:
+            session = self._tls.session = requests.Session()
+        return session
+
+    def deliver(self, d: Delivery) -> Tuple[bool, bool]:
+        ''' POSTs `d`, returning (ok, whether to retry on failure) '''
+        try:
+            r = self._session().post(d.url, json={'address': d.address, 'status': d.status}, timeout=self.timeout)
+        except requests.RequestException as e:
+            self.print_error(f'{d.url}: {e!r}')
+            return False, True
+        if 200 <= r.status_code < 300:
+            return True, False
+        self.print_error(f'{d.url}: HTTP {r.status_code}')
+        # Other client errors are not going to go away by trying again
+        return False, r.status_code >= 500 or r.status_code in (408, 429)
+
+    def _worker(self):
+        while True:
+            d = self._next()
+            if d is None:
+                return
+            try:
+                ok, retry = self.deliver(d)
+            except Exception:
+                # A bug or a bad URL must not kill the worker or leak the in-flight slot
+                self.print_error(f'{d.url}: unexpected error delivering webhook\n{traceback.format_exc()}')
+                ok, retry = False, True
+            self._done(d, ok, retry)
+
+    def get_stats(self) -> dict:
+        with self.cond:
+            ret = dict(self.stats)
+            ret.update(pending=len(self.ready), waiting_retry=len(self.queued) - len(self.ready),
+                       in_flight=self.in_flight,
+                       subscriptions=sum(len(urls) for urls in self.subscriptions.values()),
+                       latency_avg=round(self._latency_total / ret['delivered'], 3) if ret['delivered'] else None)
+            return ret
+
+    # --- lifecycle
+
+    def start(self):
+        with self.cond:
+            self.stopping = False
+            scripthashes = list(self.subscriptions)
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f'Webhooks/{i}', daemon=True)
+            t.start()
+            self.threads.append(t)
+        if scripthashes and self.network:
+            self.print_error(f'resubscribing to {len(scripthashes)} addresses')
+            self.network.subscribe_to_scripthashes(scripthashes, self._on_status)
+
+    def stop(self, timeout=5.0):
+        ''' Stops the workers, abandoning anything not yet delivered. '''
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for t in self.threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        self.threads = []
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                d = json.load(f)
+            if d.get('version') != self.VERSION:
+                raise ValueError('unknown version')
+            subscriptions = dict()
+            for addr_str, urls in d['subscriptions'].items():
+                sh = Address.from_string(addr_str).to_scripthash_hex()
+                subscriptions.setdefault(sh, dict()).update((url, addr_str) for url in urls)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            self.print_error(f'failed to load {self.path}:', repr(e))
+            return
+        with self.cond:
+            self.subscriptions = subscriptions
+
+    def save(self):
+        if not self.path:
+            return
+        d = {'version': self.VERSION, 'subscriptions': self.get_subscriptions()}
+        with self._save_lock:
+            try:
+                tmp = self.path + '.tmp'
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(d, f)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                self.print_error(f'failed to save {self.path}:', repr(e))
@@ -65,6 +65,13 @@ class AddressList(MyTreeWidget, PrintError):
         self.monospace_font = QFont(MONOSPACE_FONT)
         assert self.wallet
         self.cleaned_up = False
+        # Rows are rebuilt only for the addresses this tracker reports as
+        # changed, see on_update()
+        self._addr_change_tracker = self.wallet.create_address_change_tracker()
+        self._addr_items = dict()  # Address -> (is_change, index, QTreeWidgetItem)
+        self._seq_items = dict()  # is_change -> (sequence QTreeWidgetItem, "Used"/"Empty" QTreeWidgetItem)
+        self._seq_addrs = dict()  # is_change -> list of Address as of the last update
+        self._update_signature = None
 
         # Cash Accounts support
         self._ca_cb_registered = False
@@ -117,6 +124,51 @@ class AddressList(MyTreeWidget, PrintError):
 
     @profiler
     def on_update(self):
+        if not self._ca_cb_registered and self.wallet.network:
+            self.wallet.network.register_callback(self._ca_updated_minimal_chash_callback, ['ca_updated_minimal_chash'])
+            self._ca_cb_registered = True
+        # Pop the changed set before reading wallet state so that anything
+        # that changes while we are in here is picked up next time.
+        changed = self._addr_change_tracker.pop()
+        # Note we take a shallow list-copy because we want to avoid
+        # race conditions with the wallet while iterating here. The wallet may
+        # touch/grow the returned lists at any time if a history comes (it
+        # basically returns a reference to its own internal lists). The wallet
+        # may then, in another thread such as the Synchronizer thread, grow
+        # the receiving or change addresses on Deterministic wallets.  While
+        # probably safe in a language like Python -- and especially since
+        # the lists only grow at the end, we want to avoid bad habits.
+        # The performance cost of the shallow copy below is negligible for 10k+
+        # addresses even on huge wallets because, I suspect, internally CPython
+        # does this type of operation extremely cheaply (probably returning
+        # some copy-on-write-semantics handle to the same list).
+        receiving_addresses = list(self.wallet.get_receiving_addresses())
+        change_addresses = list(self.wallet.get_change_addresses())
+
+        if self.parent.fx and self.parent.fx.get_fiat_address_config():
+            fx = self.parent.fx
+        else:
+            fx = None
+        signature = self._get_update_signature(fx, receiving_addresses, change_addresses)
+        if (changed is None or signature != self._update_signature
+                or not self._update_incrementally(changed, receiving_addresses, change_addresses, fx)):
+            self._update_fully(receiving_addresses, change_addresses, fx)
+        self._update_signature = signature
+
+    def _get_update_signature(self, fx, receiving_addresses, change_addresses):
+        ''' Returns a tuple of everything that affects the look of *all* rows
+        rather than that of a single address. If it differs from the last
+        update, the whole list is rebuilt. '''
+        beyond_limit = tuple(self.wallet.is_beyond_limit(addr_list[-1], is_change) if addr_list else None
+                             for is_change, addr_list in enumerate((receiving_addresses, change_addresses)))
+        synchronizer = self.wallet.synchronizer
+        num_retired = len(synchronizer.change_scripthashes_that_are_retired) if synchronizer else 0
+        num_cashaccts = sum(len(txids) for txids in self.wallet.cashacct.v_by_addr.values())
+        headers = tuple(self.headerItem().text(i) for i in range(self.columnCount()))
+        return (Address.FMT_UI, self.parent.decimal_point, self.parent.num_zeros,
+                fx and (fx.ccy, fx.exchange_rate()), headers, beyond_limit, num_retired, num_cashaccts)
+
+    def _update_fully(self, receiving_addresses, change_addresses, fx):
         def item_path(item): # Recursively builds the path for an item eg 'parent_name/item_name'
             return item.text(0) if not item.parent() else item_path(item.parent()) + "/" + item.text(0)
         def remember_expanded_items(root):
@@ -140,34 +192,16 @@ class AddressList(MyTreeWidget, PrintError):
                     new = bool(item_path(it) in expanded_item_names)
                     if old != new:
                         it.setExpanded(new)
-        if not self._ca_cb_registered and self.wallet.network:
-            self.wallet.network.register_callback(self._ca_updated_minimal_chash_callback, ['ca_updated_minimal_chash'])
-            self._ca_cb_registered = True
         had_item_count = self.topLevelItemCount()
         sels = self.selectedItems()
         addresses_to_re_select = {item.data(0, self.DataRoles.address) for item in sels}
         expanded_item_names = remember_expanded_items(self.invisibleRootItem())
         del sels  # avoid keeping reference to about-to-be delete C++ objects
         self.clear()
-        # Note we take a shallow list-copy because we want to avoid
-        # race conditions with the wallet while iterating here. The wallet may
-        # touch/grow the returned lists at any time if a history comes (it
-        # basically returns a reference to its own internal lists). The wallet
-        # may then, in another thread such as the Synchronizer thread, grow
-        # the receiving or change addresses on Deterministic wallets.  While
-        # probably safe in a language like Python -- and especially since
-        # the lists only grow at the end, we want to avoid bad habits.
-        # The performance cost of the shallow copy below is negligible for 10k+
-        # addresses even on huge wallets because, I suspect, internally CPython
-        # does this type of operation extremely cheaply (probably returning
-        # some copy-on-write-semantics handle to the same list).
-        receiving_addresses = list(self.wallet.get_receiving_addresses())
-        change_addresses = list(self.wallet.get_change_addresses())
+        self._addr_items.clear()
+        self._seq_items.clear()
+        self._seq_addrs.clear()
 
-        if self.parent.fx and self.parent.fx.get_fiat_address_config():
-            fx = self.parent.fx
-        else:
-            fx = None
         account_item = self
         sequences = [0,1] if change_addresses else [0]
         items_to_re_select = []
@@ -184,6 +218,8 @@ class AddressList(MyTreeWidget, PrintError):
             hidden_item = QTreeWidgetItem( [ _("Empty") if is_change else _("Used"), '', '', '', '', ''] )
             has_hidden = False
             addr_list = change_addresses if is_change else receiving_addresses
+            self._seq_items[is_change] = (seq_item, hidden_item)
+            self._seq_addrs[is_change] = addr_list
             # Cash Account support - we do this here with the already-prepared addr_list for performance reasons
             ca_list_all = self.wallet.cashacct.get_cashaccounts(addr_list)
             ca_by_addr = defaultdict(list)
@@ -192,64 +228,7 @@ class AddressList(MyTreeWidget, PrintError):
             del ca_list_all
             # / cash account
             for n, address in enumerate(addr_list):
-                num = len(self.wallet.get_address_history(address))
-                if is_change:
-                    is_hidden = self.wallet.is_empty(address)
-                else:
-                    is_hidden = self.wallet.is_used(address)
-                balance = sum(self.wallet.get_addr_balance(address))
-                address_text = address.to_ui_string()
-                # Cash Accounts
-                ca_info, ca_list = None, ca_by_addr.get(address)
-                if ca_list:
-                    # Add Cash Account emoji -- the emoji used is the most
-                    # recent cash account registration for said address
-                    ca_list.sort(key=lambda x: ((x.number or 0), str(x.collision_hash)))
-                    for ca in ca_list:
-                        # grab minimal_chash and stash in an attribute. this may kick off the network
-                        ca.minimal_chash = self.wallet.cashacct.get_minimal_chash(ca.name, ca.number, ca.collision_hash)
-                    ca_info = self._ca_get_default(ca_list)
-                    if ca_info:
-                        address_text = ca_info.emoji + " " + address_text
-                # /Cash Accounts
-                label = self.wallet.labels.get(address.to_storage_string(), '')
-                balance_text = self.parent.format_amount(balance, whitespaces=True)
-                columns = [address_text, str(n), label, balance_text, str(num)]
-                if fx:
-                    rate = fx.exchange_rate()
-                    fiat_balance = fx.value_str(balance, rate)
-                    columns.insert(4, fiat_balance)
-                address_item = SortableTreeWidgetItem(columns)
-                if ca_info:
-                    # Set Cash Accounts: tool tip.. this will read the minimal_chash attribute we added to this object above
-                    self._ca_set_item_tooltip(address_item, ca_info)
-                address_item.setTextAlignment(3, Qt.AlignRight | Qt.AlignVCenter)
-                address_item.setFont(3, self.monospace_font)
-                if fx:
-                    address_item.setTextAlignment(4, Qt.AlignRight | Qt.AlignVCenter)
-                    address_item.setFont(4, self.monospace_font)
-
-                # Set col0 address font to monospace
-                address_item.setFont(0, self.monospace_font)
-
-                # Set UserRole data items:
-                address_item.setData(0, self.DataRoles.address, address)
-                address_item.setData(0, self.DataRoles.can_edit_label, True) # label can be edited
-                if ca_list:
-                    # Save the list of cashacct infos, if any
-                    address_item.setData(0, self.DataRoles.cash_accounts, ca_list)
-
-                if self.wallet.is_frozen(address):
-                    address_item.setBackground(0, ColorScheme.BLUE.as_color(True))
-                    address_item.setToolTip(0, _("Address is frozen, right-click to unfreeze"))
-                if self.wallet.is_beyond_limit(address, is_change):
-                    address_item.setBackground(0, ColorScheme.RED.as_color(True))
-                if is_change and self.wallet.is_retired_change_addr(address):
-                    address_item.setForeground(0, ColorScheme.GRAY.as_color())
-                    old_tt = address_item.toolTip(0)
-                    if old_tt:
-                        old_tt += "\n"
-                    address_item.setToolTip(0, old_tt + _("Change address is retired"))
+                address_item, is_hidden = self._make_address_item(address, n, is_change, fx, ca_by_addr.get(address))
                 if is_hidden:
                     if not has_hidden:
                         seq_item.insertChild(0, hidden_item)
@@ -257,6 +236,7 @@ class AddressList(MyTreeWidget, PrintError):
                     hidden_item.addChild(address_item)
                 else:
                     seq_item.addChild(address_item)
+                self._addr_items[address] = (is_change, n, address_item)
                 if address in addresses_to_re_select:
                     items_to_re_select.append(address_item)
 
@@ -269,6 +249,142 @@ class AddressList(MyTreeWidget, PrintError):
         # Now, at the very end, enforce previous UI state with respect to what was expanded or not. See #1042
         restore_expanded_items(self.invisibleRootItem(), expanded_item_names)
 
+    def _update_incrementally(self, changed, receiving_addresses, change_addresses, fx):
+        ''' Replaces just the rows for the `changed` addresses and appends rows
+        for newly-created addresses. Returns False if the list changed in
+        a way that requires a full rebuild (e.g. an address was removed or the
+        change address group appeared). '''
+        sequences = [0,1] if change_addresses else [0]
+        if sequences != list(self._seq_items):
+            return False
+        todo = []
+        for is_change in sequences:
+            addr_list = change_addresses if is_change else receiving_addresses
+            old_list = self._seq_addrs[is_change]
+            # Deterministic wallets only ever append addresses. Anything else
+            # (deletions, imported wallets' sorted inserts) renumbers rows.
+            if len(addr_list) < len(old_list) or addr_list[:len(old_list)] != old_list:
+                return False
+            todo.extend((address, is_change, n) for n, address in enumerate(addr_list[len(old_list):], len(old_list)))
+            self._seq_addrs[is_change] = addr_list
+        for address in changed:
+            entry = self._addr_items.get(address)
+            if entry:
+                todo.append((address, entry[0], entry[1]))
+        new_items, new_groups, items_to_re_select = [], [], []
+        for address, is_change, n in todo:
+            seq_item, hidden_item = self._seq_items[is_change]
+            entry = self._addr_items.get(address)
+            if entry:
+                old_item = entry[2]
+                if old_item.isSelected():
+                    items_to_re_select.append(address)
+                (old_item.parent() or self.invisibleRootItem()).removeChild(old_item)
+            ca_list = self.wallet.cashacct.get_cashaccounts([address])
+            address_item, is_hidden = self._make_address_item(address, n, is_change, fx, ca_list)
+            if is_hidden:
+                if hidden_item.treeWidget() is None and (seq_item, hidden_item) not in new_groups:
+                    new_groups.append((seq_item, hidden_item))
+                new_items.append((hidden_item, address_item))
+            else:
+                new_items.append((seq_item, address_item))
+            self._addr_items[address] = (is_change, n, address_item)
+        if self.isSortingEnabled() and self.header().sortIndicatorSection() >= 0:
+            self.add_items_sorted(new_groups)
+            self.add_items_sorted(new_items)
+        else:
+            for seq_item, hidden_item in new_groups:
+                seq_item.insertChild(0, hidden_item)
+            for parent, address_item in new_items:
+                self._insert_in_address_order(parent, address_item)
+        for address in items_to_re_select:
+            self._addr_items[address][2].setSelected(True)
+        for seq_item, hidden_item in self._seq_items.values():
+            if hidden_item.treeWidget() is not None and not hidden_item.childCount():
+                (hidden_item.parent() or self.invisibleRootItem()).removeChild(hidden_item)
+        return True
+
+    def _insert_in_address_order(self, parent, address_item):
+        ''' Inserts address_item under parent ordered by address index, which
+        is the order of an unsorted list. '''
+        if parent is self:
+            parent = self.invisibleRootItem()
+        def index_of(item):
+            entry = self._addr_items.get(item.data(0, self.DataRoles.address))
+            return entry[1] if entry else -1  # the "Used"/"Empty" group comes first
+        n = index_of(address_item)
+        lo, hi = 0, parent.childCount()
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if index_of(parent.child(mid)) <= n:
+                lo = mid + 1
+            else:
+                hi = mid
+        parent.insertChild(lo, address_item)
+
+    def _make_address_item(self, address, n, is_change, fx, ca_list):
+        ''' Returns a tuple of (item, is_hidden) for `address`. `ca_list` is
+        the list of verified Cash Accounts for this address, if any. '''
+        num = len(self.wallet.get_address_history(address))
+        if is_change:
+            is_hidden = self.wallet.is_empty(address)
+        else:
+            is_hidden = self.wallet.is_used(address)
+        balance = sum(self.wallet.get_addr_balance(address))
+        address_text = address.to_ui_string()
+        # Cash Accounts
+        ca_info = None
+        if ca_list:
+            # Add Cash Account emoji -- the emoji used is the most
+            # recent cash account registration for said address
+            ca_list.sort(key=lambda x: ((x.number or 0), str(x.collision_hash)))
+            for ca in ca_list:
+                # grab minimal_chash and stash in an attribute. this may kick off the network
+                ca.minimal_chash = self.wallet.cashacct.get_minimal_chash(ca.name, ca.number, ca.collision_hash)
+            ca_info = self._ca_get_default(ca_list)
+            if ca_info:
+                address_text = ca_info.emoji + " " + address_text
+        # /Cash Accounts
+        label = self.wallet.labels.get(address.to_storage_string(), '')
+        balance_text = self.parent.format_amount(balance, whitespaces=True)
+        columns = [address_text, str(n), label, balance_text, str(num)]
+        if fx:
+            rate = fx.exchange_rate()
+            fiat_balance = fx.value_str(balance, rate)
+            columns.insert(4, fiat_balance)
+        address_item = SortableTreeWidgetItem(columns)
+        if ca_info:
+            # Set Cash Accounts: tool tip.. this will read the minimal_chash attribute we added to this object above
+            self._ca_set_item_tooltip(address_item, ca_info)
+        address_item.setTextAlignment(3, Qt.AlignRight | Qt.AlignVCenter)
+        address_item.setFont(3, self.monospace_font)
+        if fx:
+            address_item.setTextAlignment(4, Qt.AlignRight | Qt.AlignVCenter)
+            address_item.setFont(4, self.monospace_font)
+
+        # Set col0 address font to monospace
+        address_item.setFont(0, self.monospace_font)
+
+        # Set UserRole data items:
+        address_item.setData(0, self.DataRoles.address, address)
+        address_item.setData(0, self.DataRoles.can_edit_label, True) # label can be edited
+        if ca_list:
+            # Save the list of cashacct infos, if any
+            address_item.setData(0, self.DataRoles.cash_accounts, ca_list)
+
+        if self.wallet.is_frozen(address):
+            address_item.setBackground(0, ColorScheme.BLUE.as_color(True))
+            address_item.setToolTip(0, _("Address is frozen, right-click to unfreeze"))
+        if self.wallet.is_beyond_limit(address, is_change):
+            address_item.setBackground(0, ColorScheme.RED.as_color(True))
+        if is_change and self.wallet.is_retired_change_addr(address):
+            address_item.setForeground(0, ColorScheme.GRAY.as_color())
+            old_tt = address_item.toolTip(0)
+            if old_tt:
+                old_tt += "\n"
+            address_item.setToolTip(0, old_tt + _("Change address is retired"))
+        return address_item, is_hidden
+
 
     def create_menu(self, position):
         if self.picker:
@@ -493,4 +609,10 @@ class AddressList(MyTreeWidget, PrintError):
         self.parent.ca_address_default_changed_signal.emit(ca_info)  # eventually calls self.update
 
     def _ca_on_address_default_change(self, ignored):
+        self.update_all()
+
+    def update_all(self):
+        ''' Like update(), but rebuilds every row rather than just the rows
+        for the addresses the wallet reported as changed. '''
+        self._addr_change_tracker.mark_all()
         self.update()
@@ -24,10 +24,12 @@
 # SOFTWARE.
 
 from .util import *
+from decimal import Decimal as PyDecimal
 import electroncash.web as web
+from electroncash.bitcoin import COIN
 from electroncash.i18n import _, ngettext
-from electroncash.util import timestamp_to_datetime, PrintError, profiler, Weak
-from electroncash.plugins import run_hook
+from electroncash.util import PrintError, profiler
+from electroncash.plugins import run_hook, hooks as plugin_hooks
 
 
 TX_ICONS = [
@@ -44,26 +46,280 @@ TX_ICONS = [
 ]
 
 
-class HistoryList(MyTreeWidget, PrintError):
+class HistoryModel(QAbstractItemModel, PrintError):
+    """ Flat model of a wallet's history, as returned by wallet.get_history().
+
+    Rows are kept in display order (i.e. already sorted). The strings shown
+    for a row are only computed once the view asks for them, which in practice
+    means only for rows that are on-screen (or when searching/sorting). """
+
+    def __init__(self, main_window):
+        super().__init__()
+        self.main_window = main_window
+        self.headers = []
+        self.rows = []  # list of history tuples, see wallet.get_history()
+        self.row_index = {}  # tx_hash -> row
+        self._cells = {}  # tx_hash -> (status, [column texts]), lazily filled-in by data()
+        self._sort_spec = None  # (column, qt_sort_order) or None to keep history order
+        self._sort_dirty = False
+
+        self.monospaceFont = QFont(MONOSPACE_FONT)
+        self.withdrawalBrush = QBrush(QColor("#BC1E1E"))
+        self.invoiceIcon = QIcon(":icons/seal")
+        self.cashTokensIcon = QIcon(":icons/tab_token.svg")
+
+    def diagnostic_name(self):
+        return f"{super().diagnostic_name()}/{self.main_window.wallet.diagnostic_name()}"
+
+    # -- QAbstractItemModel interface
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or row < 0 or row >= len(self.rows) or column < 0 or column >= len(self.headers):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        if index is None:
+            # QObject.parent()
+            return super().parent()
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and 0 <= section < len(self.headers):
+            return self.headers[section]
+        return None
+
+    _flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemNeverHasChildren
+    _editable_flags = _flags | Qt.ItemIsEditable
+
+    def flags(self, index):
+        return self._editable_flags if index.column() == 3 else self._flags
+
+    def hasChildren(self, parent=QModelIndex()):
+        return not parent.isValid()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, col = index.row(), index.column()
+        tx_hash, height, conf, timestamp, value, balance, token_deltas, token_balances = self.rows[row]
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self.get_cells(row)[1][col]
+        elif role == Qt.UserRole:
+            return tx_hash if col == 0 else None
+        elif role == Qt.DecorationRole:
+            if col == 0:
+                return HistoryList.get_icon_for_status(self.get_cells(row)[0])
+            if col == 3:
+                if self.main_window.wallet.invoices.paid.get(tx_hash):
+                    return self.invoiceIcon
+                if token_deltas:
+                    return self.cashTokensIcon
+        elif role == Qt.ToolTipRole:
+            if col == 0:
+                return str(conf) + " confirmation" + ("s" if conf != 1 else "")
+            if col in (2, 3) and token_deltas and not self.main_window.wallet.invoices.paid.get(tx_hash):
+                num = len(token_deltas)
+                return ngettext("Transaction contains {num} CashToken category involving this wallet",
+                                "Transaction contains {num} CashToken categories involving this wallet",
+                                num).format(num=num)
+        elif role == Qt.FontRole:
+            if col != 2:
+                return self.monospaceFont
+        elif role == Qt.TextAlignmentRole:
+            if col > 3:
+                return Qt.AlignRight | Qt.AlignVCenter
+        elif role == Qt.ForegroundRole:
+            if col in (3, 4, 6) and value and value < 0:
+                return self.withdrawalBrush
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        spec = (column, order)
+        if spec == self._sort_spec and not self._sort_dirty:
+            return
+        self._sort_spec, self._sort_dirty = spec, False
+        if column < 0:
+            return
+        self.layoutAboutToBeChanged.emit()
+        from_list = self.persistentIndexList()
+        tx_hashes = [self.rows[index.row()][0] for index in from_list]
+        self.rows = self.sorted_rows(self.rows)
+        self._reindex()
+        self.changePersistentIndexList(from_list, [self.index(self.row_index[tx_hash], index.column())
+                                                   for tx_hash, index in zip(tx_hashes, from_list)])
+        self.layoutChanged.emit()
+
+    # -- HistoryModel
+    def set_headers(self, headers):
+        old_ct, new_ct = len(self.headers), len(headers)
+        if new_ct > old_ct:
+            self.beginInsertColumns(QModelIndex(), old_ct, new_ct - 1)
+            self.headers = list(headers)
+            self.endInsertColumns()
+        elif new_ct < old_ct:
+            self.beginRemoveColumns(QModelIndex(), new_ct, old_ct - 1)
+            self.headers = list(headers)
+            self.endRemoveColumns()
+        else:
+            self.headers = list(headers)
+        self._cells.clear()
+        if new_ct:
+            self.headerDataChanged.emit(Qt.Horizontal, 0, new_ct - 1)
+
+    def get_cells(self, row):
+        h_item = self.rows[row]
+        tx_hash = h_item[0]
+        ret = self._cells.get(tx_hash)
+        if ret is None:
+            tx_hash, height, conf, timestamp, value, balance = h_item[:6]
+            main_window = self.main_window
+            wallet = main_window.wallet
+            status, status_str = wallet.get_tx_status(tx_hash, height, conf, timestamp)
+            label = wallet.get_label(tx_hash)
+            v_str = main_window.format_amount(value, True, whitespaces=True)
+            balance_str = main_window.format_amount(balance, whitespaces=True)
+            entry = ['', tx_hash, status_str, label, v_str, balance_str]
+            fx = main_window.fx
+            if len(self.headers) > len(entry) and fx and fx.show_history():
+                rate = fx.timestamp_rate(time.time() if conf <= 0 else timestamp)
+                for amount in [value, balance]:
+                    text = fx.value_str(amount, rate)
+                    entry.append(text)
+            entry += [''] * (len(self.headers) - len(entry))
+            self._cells[tx_hash] = ret = (status, entry)
+        return ret
+
+    def tx_hash(self, row):
+        return self.rows[row][0]
+
+    def _sort_key_func(self, column, rows):
+        wallet = self.main_window.wallet
+        if column == 0:
+            # Same order as sorting by (status, conf): unconfirmed statuses
+            # are all below the confirmed ones.
+            return lambda r: (1, r[2]) if r[2] > 0 else (0, wallet.get_tx_status(*r[:4])[0])
+        if column == 2:
+            return lambda r: (r[2] <= 0, r[3] or 0)
+        if column == 3:
+            return lambda r: wallet.get_label(r[0])
+        if column in (4, 5):
+            return lambda r: r[column] or 0
+        if column in (6, 7):
+            fx = self.main_window.fx
+            rates = {}
+            if fx and fx.show_history():
+                now = time.time()
+                rates = dict(zip((r[0] for r in rows),
+                                 fx.history_rates([now if r[2] <= 0 else r[3] for r in rows])))
+            def fiat_key(r):
+                v = None
+                rate = rates.get(r[0])
+                if rate:
+                    v = PyDecimal(r[column - 2] or 0) / COIN * rate
+                return (v is not None, v or 0)
+            return fiat_key
+        return lambda r: r[0]
+
+    def sorted_rows(self, rows):
+        spec = self._sort_spec
+        if spec is None or spec[0] < 0:
+            return rows
+        column, order = spec
+        return sorted(rows, key=self._sort_key_func(column, rows), reverse=order == Qt.DescendingOrder)
+
+    def _reindex(self):
+        self.row_index = {h_item[0]: i for i, h_item in enumerate(self.rows)}
+
+    def set_history(self, history):
+        """ Replace the model's rows with `history` (in history order), using
+        incremental row removals/inserts for the part that differs from the
+        current rows, so that the selection and scroll position are kept. """
+        new_rows = self.sorted_rows(list(history))
+        old_rows = self.rows
+        old_ct, new_ct = len(old_rows), len(new_rows)
+        # Find the common prefix and suffix (by tx_hash) of the old and new rows
+        prefix = 0
+        limit = min(old_ct, new_ct)
+        while prefix < limit and old_rows[prefix][0] == new_rows[prefix][0]:
+            prefix += 1
+        suffix = 0
+        limit -= prefix
+        while suffix < limit and old_rows[old_ct - 1 - suffix][0] == new_rows[new_ct - 1 - suffix][0]:
+            suffix += 1
+        n_removed = old_ct - prefix - suffix
+        n_inserted = new_ct - prefix - suffix
+        self._cells.clear()
+        self._sort_dirty = False
+        if not prefix and not suffix and (old_ct or new_ct):
+            # Nothing in common (e.g. first update): just reset
+            self.beginResetModel()
+            self.rows = new_rows
+            self._reindex()
+            self.endResetModel()
+            return
+        if n_removed:
+            self.beginRemoveRows(QModelIndex(), prefix, prefix + n_removed - 1)
+            self.rows = old_rows[:prefix] + old_rows[prefix + n_removed:]
+            self.endRemoveRows()
+        if n_inserted:
+            self.beginInsertRows(QModelIndex(), prefix, prefix + n_inserted - 1)
+            self.rows = new_rows
+            self.endInsertRows()
+        self.rows = new_rows
+        self._reindex()
+        # NB: The balances, confirmations, labels, etc. of the other rows may
+        # have changed too, but we deliberately don't emit dataChanged for
+        # all of them: with 100k rows the proxy model would spend seconds
+        # mapping that range. Our cell cache was cleared above, so it's enough
+        # for the (only) view to repaint; see HistoryList.refresh_rows().
+
+    def emit_data_changed(self, first_row=0, last_row=None, first_col=0, last_col=None):
+        if last_row is None:
+            last_row = len(self.rows) - 1
+        if last_col is None:
+            last_col = len(self.headers) - 1
+        if last_row >= first_row and last_col >= first_col:
+            self.dataChanged.emit(self.index(first_row, first_col), self.index(last_row, last_col))
+
+    def invalidate_cells(self):
+        self._cells.clear()
+
+    def update_tx(self, tx_hash, height, conf, timestamp) -> bool:
+        """ Update the verification info of a single tx. Returns True if the
+        tx is in this model. """
+        row = self.row_index.get(tx_hash)
+        if row is None:
+            return False
+        self.rows[row] = (tx_hash, height, conf, timestamp) + tuple(self.rows[row][4:])
+        self._cells.pop(tx_hash, None)
+        self.emit_data_changed(row, row)
+        if self._sort_spec is not None and self._sort_spec[0] in (0, 2) and not self._sort_dirty:
+            # This row may need to move; re-sort once we are back in the event loop
+            self._sort_dirty = True
+            QTimer.singleShot(0, lambda: self.sort(*self._sort_spec))
+        return True
+
+
+class HistoryList(MyTableView, PrintError):
     filter_columns = [2, 3, 4]  # Date, Description, Amount
     filter_data_columns = [0]  # Allow search on tx_hash (string)
     statusIcons = {}
-    default_sort = MyTreeWidget.SortSpec(0, Qt.AscendingOrder)
+    default_sort = MyTableView.SortSpec(0, Qt.AscendingOrder)
 
     def __init__(self, parent):
-        super().__init__(parent, self.create_menu, [], 3, deferred_updates=True)
+        super().__init__(parent, self.create_menu, HistoryModel(parent), [], 3, deferred_updates=True)
         self.refresh_headers()
-        self.setColumnHidden(1, True)
         # force attributes to always be defined, even if None, at construction.
         self.wallet = self.parent.wallet
         self.cleaned_up = False
-
-        self.monospaceFont = QFont(MONOSPACE_FONT)
-        self.withdrawalBrush = QBrush(QColor("#BC1E1E"))
-        self.invoiceIcon = QIcon(":icons/seal")
-        self.cashTokensIcon = QIcon(":icons/tab_token.svg")
-        self._item_cache = Weak.ValueDictionary()
-        self.itemChanged.connect(self.item_changed)
+        # tx_hashes hidden by the "history_list_filter" plugin hook
+        self.hidden_txs = set()
 
         self.has_unknown_balances = False
 
@@ -79,6 +335,7 @@ class HistoryList(MyTreeWidget, PrintError):
         if fx and fx.show_history():
             headers.extend(['%s '%fx.ccy + _('Amount'), '%s '%fx.ccy + _('Balance')])
         self.update_headers(headers)
+        self.setColumnHidden(1, True)
 
     def get_domain(self):
         '''Replaced in address_dialog.py'''
@@ -91,22 +348,6 @@ class HistoryList(MyTreeWidget, PrintError):
             return
         super().update()
 
-    def clear(self):
-        self._item_cache.clear()
-        super().clear()
-
-    def insertTopLevelItem(self, index, item, tx_hash=None):
-        super().insertTopLevelItem(index, item)
-        tx_hash = tx_hash or item.data(0, Qt.UserRole)
-        if tx_hash:
-            self._item_cache[tx_hash] = item
-
-    def addTopLevelItem(self, item, tx_hash=None):
-        super().addTopLevelItem(item)
-        tx_hash = tx_hash or item.data(0, Qt.UserRole)
-        if tx_hash:
-            self._item_cache[tx_hash] = item
-
     @classmethod
     def get_icon_for_status(cls, status):
         ret = cls.statusIcons.get(status)
@@ -114,81 +355,69 @@ class HistoryList(MyTreeWidget, PrintError):
             cls.statusIcons[status] = ret = QIcon(":icons/" + TX_ICONS[status])
         return ret
 
+    def get_hidden_txs(self, history):
+        ''' Returns the set of tx_hashes in `history` that plugins want hidden,
+        as per the "history_list_filter" hook (e.g. CashFusion tx filtering). '''
+        if not plugin_hooks.get("history_list_filter"):
+            # short-circuit: this is the path taken most of the time
+            return set()
+        hidden = set()
+        for h_item in history:
+            tx_hash = h_item[0]
+            label = self.wallet.get_label(tx_hash)
+            should_skip = run_hook("history_list_filter", self, h_item[:6], label, multi=True) or []
+            if any(should_skip):
+                hidden.add(tx_hash)
+        return hidden
+
+    def filter_accepts_row(self, source_row):
+        # Same semantics as MyTableView.filter_accepts_row, but going straight
+        # to the model's cells rather than thru QModelIndex.data(), which is
+        # several times faster when searching 100k rows.
+        model = self.source_model
+        tx_hash = model.tx_hash(source_row)
+        if self.hidden_txs and tx_hash in self.hidden_txs:
+            return False
+        p = self.current_filter
+        if not p:
+            return True
+        entry = model.get_cells(source_row)[1]
+        return tx_hash == p or any(p in entry[column].lower() for column in self.filter_columns)
+
     @profiler
     def on_update(self):
         self.wallet = self.parent.wallet
         h = self.wallet.get_history(self.get_domain(), reverse=True, receives_before_sends=True,
                                     include_tokens=True, include_tokens_balances=False)
-        sels = self.selectedItems()
-        current_tx = sels[0].data(0, Qt.UserRole) if sels else None
-        del sels #  make sure not to hold stale ref to C++ list of items which will be deleted in clear() call below
-        self.clear()
-        self.has_unknown_balances = False
         fx = self.parent.fx
         if fx: fx.history_used_spot = False
-        for h_item in h:
-            tx_hash, height, conf, timestamp, value, balance, token_deltas, token_balances = h_item
-            label = self.wallet.get_label(tx_hash)
-            should_skip = run_hook("history_list_filter", self, h_item[:6], label, multi=True) or []
-            if any(should_skip):
-                # For implementation of fast plugin filters (such as CashShuffle
-                # shuffle tx filtering), we short-circuit return. This is
-                # faster than using the MyTreeWidget filter definted in .util
-                continue
-            if value is None or balance is None:
-                # Workaround to the fact that sometimes the wallet doesn't
-                # know the actual balance for history items while it's
-                # downloading history, and we want to flag that situation
-                # and redraw the GUI sometime later when it finishes updating.
-                # This flag is checked in main_window.py, TxUpadteMgr class.
-                self.has_unknown_balances = True
-            status, status_str = self.wallet.get_tx_status(tx_hash, height, conf, timestamp)
-            has_invoice = self.wallet.invoices.paid.get(tx_hash)
-            icon = self.get_icon_for_status(status)
-            v_str = self.parent.format_amount(value, True, whitespaces=True)
-            balance_str = self.parent.format_amount(balance, whitespaces=True)
-            entry = ['', tx_hash, status_str, label, v_str, balance_str]
-            if fx and fx.show_history():
-                date = timestamp_to_datetime(time.time() if conf <= 0 else timestamp)
-                for amount in [value, balance]:
-                    text = fx.historical_value_str(amount, date)
-                    entry.append(text)
-            item = SortableTreeWidgetItem(entry)
-            if icon: item.setIcon(0, icon)
-            item.setToolTip(0, str(conf) + " confirmation" + ("s" if conf != 1 else ""))
-            item.setData(0, SortableTreeWidgetItem.DataRole, (status, conf))
-            if has_invoice:
-                item.setIcon(3, self.invoiceIcon)
-            elif token_deltas:
-                item.setIcon(3, self.cashTokensIcon)
-                num = len(token_deltas)
-                item.setToolTip(3, ngettext("Transaction contains {num} CashToken category involving this wallet",
-                                            "Transaction contains {num} CashToken categories involving this wallet",
-                                            num).format(num=num))
-                item.setToolTip(2, item.toolTip(3))
-            for i in range(len(entry)):
-                if i>3:
-                    item.setTextAlignment(i, Qt.AlignRight | Qt.AlignVCenter)
-                if i!=2:
-                    item.setFont(i, self.monospaceFont)
-            if value and value < 0:
-                item.setForeground(3, self.withdrawalBrush)
-                item.setForeground(4, self.withdrawalBrush)
-                item.setForeground(6, self.withdrawalBrush)
-            item.setData(0, Qt.UserRole, tx_hash)
-            self.addTopLevelItem(item, tx_hash)
-            if current_tx == tx_hash:
-                # Note that it's faster to setSelected once the item is in
-                # the tree. Also note that doing setSelected() on the item
-                # itself is much faster than doing setCurrentItem()
-                # which must do a linear search in the tree (wastefully)
-                item.setSelected(True)
-
-    def on_doubleclick(self, item, column):
-        if self.permit_edit(item, column):
-            super(HistoryList, self).on_doubleclick(item, column)
+        # Workaround to the fact that sometimes the wallet doesn't know the
+        # actual balance for history items while it's downloading history,
+        # and we want to flag that situation and redraw the GUI sometime later
+        # when it finishes updating. This flag is checked in main_window.py,
+        # TxUpadteMgr class.
+        self.has_unknown_balances = any(h_item[4] is None or h_item[5] is None for h_item in h)
+        hidden = self.get_hidden_txs(h)
+        refilter = hidden != self.hidden_txs
+        self.hidden_txs = hidden
+        self.source_model.set_history(h)
+        if refilter:
+            self.proxy_model.invalidateFilter()
+        self.refresh_rows()
+
+    def refresh_rows(self):
+        ''' Repaint the visible rows after the model's cell cache was cleared. '''
+        model = self.source_model
+        if model.headers:
+            # Lets the header re-fit the ResizeToContents columns
+            model.headerDataChanged.emit(Qt.Horizontal, 0, len(model.headers) - 1)
+        self.viewport().update()
+
+    def on_doubleclick(self, index):
+        if self.permit_edit(index):
+            super().on_doubleclick(index)
         else:
-            tx_hash = item.data(0, Qt.UserRole)
+            tx_hash = self.source_model.tx_hash(self.source_index(index).row())
             tx = self.wallet.transactions.get(tx_hash)
             if tx:
                 label = self.wallet.get_label(tx_hash) or None
@@ -197,69 +426,35 @@ class HistoryList(MyTreeWidget, PrintError):
     def update_labels(self):
         if self.should_defer_update_incr():
             return
-        root = self.invisibleRootItem()
-        child_count = root.childCount()
-        for i in range(child_count):
-            item = root.child(i)
-            txid = item.data(0, Qt.UserRole)
-            h_label = self.wallet.get_label(txid)
-            current_label = item.text(3)
-            item.setText(3, h_label)
-            if current_label != h_label:
-                self.item_changed(item, 3)
-
-    def item_changed(self, item, column):
-        # Run the label of the changed item thru the filter hook
-        if column != 3:
-            return
-
-        label = item.text(3)
-        # NB: 'h_item' parameter is None due to performance reasons
-        should_skip = run_hook("history_list_filter", self, None, label, multi=True) or []
-        if any(should_skip):
-            item.setHidden(True)
+        self.source_model.invalidate_cells()
+        self.refresh_rows()
+        # Run the labels thru the filter hook
+        hidden = self.get_hidden_txs(self.source_model.rows)
+        if hidden != self.hidden_txs:
+            self.hidden_txs = hidden
+            self.proxy_model.invalidateFilter()
 
     def update_item(self, tx_hash, height, conf, timestamp):
         if not self.wallet: return # can happen on startup if this is called before self.on_update()
-        item = self._item_cache.get(tx_hash)
-        if item:
-            idx = self.invisibleRootItem().indexOfChild(item)
-            was_cur = False
-            if idx > -1:
-                # We must take the child out of the view when updating.
-                # This is because otherwise for widgets with many thousands of
-                # items, this method becomes *horrendously* slow (500ms per
-                # call!)... but doing this hack makes it fast (~1ms per call).
-                was_cur = self.currentItem() is item
-                self.invisibleRootItem().takeChild(idx)
-            status, status_str = self.wallet.get_tx_status(tx_hash, height, conf, timestamp)
-            icon = self.get_icon_for_status(status)
-            if icon: item.setIcon(0, icon)
-            item.setData(0, SortableTreeWidgetItem.DataRole, (status, conf))
-            item.setText(2, status_str)
-            if idx > -1:
-                # Now, put the item back again
-                self.invisibleRootItem().insertChild(idx, item)
-                if was_cur:
-                    self.setCurrentItem(item)
-        elif self.should_defer_update_incr():
-            return False
-        return bool(item)  # indicate to client code whether an actual update occurred
+        if self.source_model.update_tx(tx_hash, height, conf, timestamp):
+            return True  # indicate to client code that an actual update occurred
+        self.should_defer_update_incr()  # counts as a missed update if we are hidden
+        return False
 
     def create_menu(self, position):
-        item = self.currentItem()
-        if not item:
+        index = self.currentIndex()
+        if not index.isValid():
             return
-        column = self.currentColumn()
-        tx_hash = item.data(0, Qt.UserRole)
+        column = index.column()
+        tx_hash = self.source_model.tx_hash(self.source_index(index).row())
         if not tx_hash:
             return
         if column == 0:
             column_title = "ID"
             column_data = tx_hash
         else:
-            column_title = self.headerItem().text(column)
-            column_data = item.text(column)
+            column_title = self.source_model.headerData(column, Qt.Horizontal)
+            column_data = index.data() or ''
 
         tx_URL = web.BE_URL(self.config, 'tx', tx_hash)
         height, conf, timestamp = self.wallet.get_tx_height(tx_hash)
@@ -272,16 +467,19 @@ class HistoryList(MyTreeWidget, PrintError):
 
         menu.addAction(_("&Copy {}").format(column_title), lambda: self.parent.app.clipboard().setText(column_data.strip()))
         if column in self.editable_columns:
-            # We grab a fresh reference to the current item, as it has been deleted in a reported issue.
-            menu.addAction(_("&Edit {}").format(column_title),
-                lambda: self.currentItem() and self.editItem(self.currentItem(), column))
+            def edit_label():
+                # We grab a fresh current index, as the rows may have changed in the meantime.
+                cur = self.currentIndex()
+                if cur.isValid():
+                    self.edit(cur.sibling(cur.row(), column))
+            menu.addAction(_("&Edit {}").format(column_title), edit_label)
         label = self.wallet.get_label(tx_hash) or None
         menu.addAction(_("&Details"), lambda: self.parent.show_transaction(tx, label))
         if pr_key:
-            menu.addAction(self.invoiceIcon, _("View invoice"), lambda: self.parent.show_invoice(pr_key))
+            menu.addAction(self.source_model.invoiceIcon, _("View invoice"), lambda: self.parent.show_invoice(pr_key))
         if tx_URL:
             menu.addAction(_("View on block explorer"), lambda: webopen(tx_URL))
 
-        run_hook("history_list_context_menu_setup", self, menu, item, tx_hash)  # Plugins can modify menu
+        run_hook("history_list_context_menu_setup", self, menu, index, tx_hash)  # Plugins can modify menu
 
         menu.exec_(self.viewport().mapToGlobal(position))
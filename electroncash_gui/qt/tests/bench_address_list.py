@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -*- mode: python3 -*-
+# Part of the Electron Cash SPV Wallet
+# License: MIT
+"""
+Headless benchmark of AddressList and UTXOList refresh latency after a single
+incoming transaction, for a large synthetic deterministic wallet. Uses Qt's
+"offscreen" platform, so no display is needed.
+
+Run from the top of the source tree with:
+
+    python3 -m electroncash_gui.qt.tests.bench_address_list [n_addresses ...]
+"""
+import os
+import sys
+import time
+import weakref
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtWidgets import QApplication, QWidget
+
+from electroncash.address import Address
+from electroncash.util import format_satoshis
+from electroncash.wallet import Abstract_Wallet
+
+
+class FakeCashAcct:
+    v_by_addr = {}
+
+    def get_cashaccounts(self, domain=None, inv=False):
+        return []
+
+
+class FakeStorage(dict):
+
+    def put(self, key, value):
+        self[key] = value
+
+
+class FakeWallet:
+    create_address_change_tracker = Abstract_Wallet.create_address_change_tracker
+    _notify_address_changed = Abstract_Wallet._notify_address_changed
+
+    network = None
+    synchronizer = None
+    gap_limit = 20
+
+    def __init__(self, n):
+        self._addr_change_trackers = weakref.WeakSet()
+        self.cashacct = FakeCashAcct()
+        self.storage = FakeStorage()
+        self.labels = {}
+        self.frozen_addresses = set()
+        self.receiving_addresses = []
+        self.change_addresses = []
+        self.history = {}
+        self.utxos = {}
+        self.num_txs = 0
+        for i in range(n):
+            addr = self.new_address(bool(i % 4 == 3))
+            if i < n - 2 * self.gap_limit:
+                self.receive(addr, notify=False)
+        self.num_txs = 0
+
+    def new_address(self, is_change):
+        i = len(self.receiving_addresses) + len(self.change_addresses)
+        addr = Address.from_P2PKH_hash(i.to_bytes(20, 'big'))
+        (self.change_addresses if is_change else self.receiving_addresses).append(addr)
+        self.labels[addr.to_storage_string()] = 'address %d' % i
+        return addr
+
+    def receive(self, addr, notify=True):
+        """ Simulates an incoming tx paying to addr. """
+        self.num_txs += 1
+        tx_hash = '%064x' % (len(self.history) + self.num_txs * 1000000)
+        self.history.setdefault(addr, []).append((tx_hash, 700000))
+        self.utxos.setdefault(addr, {})[tx_hash + ':0'] = {
+            'address': addr, 'value': 10000, 'prevout_n': 0, 'prevout_hash': tx_hash,
+            'height': 700000, 'coinbase': False, 'is_frozen_coin': False,
+            'slp_token': None, 'token_data': None}
+        if notify:
+            # A deterministic wallet tops up its gap limit after receiving
+            self.new_address(False)
+            self._notify_address_changed(addr)
+
+    def get_receiving_addresses(self):
+        return self.receiving_addresses
+
+    def get_change_addresses(self):
+        return self.change_addresses
+
+    def get_address_history(self, addr):
+        return self.history.get(addr, [])
+
+    def is_used(self, addr):
+        return addr in self.history
+
+    def is_empty(self, addr):
+        return not self.utxos.get(addr)
+
+    def get_addr_balance(self, addr):
+        return sum(x['value'] for x in self.utxos.get(addr, {}).values()), 0, 0
+
+    def is_frozen(self, addr):
+        return addr in self.frozen_addresses
+
+    def is_beyond_limit(self, addr, is_change):
+        return False
+
+    def is_retired_change_addr(self, addr):
+        return False
+
+    def get_local_height(self):
+        return 700100
+
+    def get_utxos(self, domain=None, *, addr_set_out=None, exclude_slp=True, exclude_tokens=True):
+        if domain is None:
+            domain = self.receiving_addresses + self.change_addresses
+        coins = []
+        for addr in domain:
+            coins.extend(self.utxos.get(addr, {}).values())
+        return coins
+
+    def get_label(self, tx_hash):
+        return self.labels.get(tx_hash, '')
+
+    def diagnostic_name(self):
+        return 'bench'
+
+
+class FakeGuiObject(QObject):
+    cashaddr_toggled_signal = pyqtSignal()
+
+
+class FakeMainWindow(QWidget):
+    ca_address_default_changed_signal = pyqtSignal(object)
+    fx = None
+    config = None
+    decimal_point = 8
+    num_zeros = 0
+
+    def __init__(self, wallet):
+        super().__init__()
+        self.wallet = wallet
+        self.gui_object = FakeGuiObject()
+
+    def format_amount(self, x, is_diff=False, whitespaces=False):
+        return format_satoshis(x, self.num_zeros, self.decimal_point, is_diff=is_diff, whitespaces=whitespaces)
+
+
+def timed(app, func):
+    t0 = time.perf_counter()
+    func()
+    app.processEvents()
+    return (time.perf_counter() - t0) * 1e3
+
+
+def bench_list(app, win, lst):
+    wallet = win.wallet
+    lst.resize(1000, 700)
+    lst.show()
+    results = []
+
+    def paint():
+        lst.viewport().repaint()
+
+    def full():
+        lst._addr_change_tracker.mark_all()
+        lst.on_update()
+        paint()
+
+    def incoming_tx():
+        wallet.receive(wallet.receiving_addresses[-2 * wallet.gap_limit])
+        lst.on_update()
+        paint()
+
+    results.append(('initial load', timed(app, full)))
+    results.append(('refresh, no change', timed(app, lambda: (lst.on_update(), paint()))))
+    results.append(('refresh, 1 incoming tx', timed(app, incoming_tx)))
+    results.append(('full rebuild (previous behaviour)', timed(app, full)))
+    lst.close()
+    return results
+
+
+def bench(app, n):
+    from ..address_list import AddressList
+    from ..utxo_list import UTXOList
+
+    wallet = FakeWallet(n)
+    win = FakeMainWindow(wallet)
+    results = [('AddressList: ' + name, ms) for name, ms in bench_list(app, win, AddressList(win))]
+    results += [('UTXOList: ' + name, ms) for name, ms in bench_list(app, win, UTXOList(win))]
+    app.processEvents()
+    return results
+
+
+def main():
+    ns = [int(a) for a in sys.argv[1:]] or [1000, 10000, 50000]
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    for n in ns:
+        print(f"Wallet with {n} addresses:")
+        for name, ms in bench(app, n):
+            print(f"    {name:46s} {ms:9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -*- mode: python3 -*-
+# Part of the Electron Cash SPV Wallet
+# License: MIT
+"""
+Headless benchmark of HistoryList refresh latency for a large synthetic
+wallet history. Uses Qt's "offscreen" platform, so no display is needed.
+
+Run from the top of the source tree with:
+
+    python3 -m electroncash_gui.qt.tests.bench_history_list [n_txs ...]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication, QTreeWidget, QWidget
+
+from electroncash.util import format_satoshis
+from electroncash.wallet import Abstract_Wallet
+
+
+class FakeWallet:
+    get_tx_status = Abstract_Wallet.get_tx_status
+
+    def __init__(self, n):
+        self.transactions = {}
+        self.tx_fees = {}
+        self.labels = {}
+        self.invoices = type('Invoices', (), {'paid': {}})()
+        self.history = []
+        self.tip = 800000
+        for i in range(n):
+            self.add_tx()
+
+    def add_tx(self, height=None):
+        i = len(self.history)
+        height = height or (self.tip - 100000 + i // 10)
+        tx_hash = '%064x' % i
+        value = 100000 if i % 3 else -50000
+        self.labels[tx_hash] = 'payment %d' % i
+        conf = self.tip - height + 1 if height > 0 else 0
+        self.history.insert(0, (tx_hash, height, conf, 1500000000 + i * 60, value, 0, {}, {}))
+
+    def get_history(self, domain, *, reverse, receives_before_sends, include_tokens, include_tokens_balances):
+        return list(self.history)
+
+    def get_addresses(self):
+        return []
+
+    def get_label(self, tx_hash):
+        return self.labels.get(tx_hash, '')
+
+    def diagnostic_name(self):
+        return 'bench'
+
+
+class FakeMainWindow(QWidget):
+    fx = None
+    config = None
+
+    def __init__(self, wallet):
+        super().__init__()
+        self.wallet = wallet
+
+    def format_amount(self, x, is_diff=False, whitespaces=False):
+        return format_satoshis(x, 0, 8, is_diff=is_diff, whitespaces=whitespaces)
+
+    def update_labels(self):
+        pass
+
+
+def timed(app, func):
+    t0 = time.perf_counter()
+    func()
+    app.processEvents()
+    return (time.perf_counter() - t0) * 1e3
+
+
+def legacy_rebuild(win, tree):
+    """ What HistoryList.on_update() used to do: rebuild one QTreeWidgetItem per tx. """
+    from ..util import SortableTreeWidgetItem
+    wallet = win.wallet
+    tree.clear()
+    for tx_hash, height, conf, timestamp, value, balance, *_ in wallet.get_history(
+            None, reverse=True, receives_before_sends=True, include_tokens=True, include_tokens_balances=False):
+        status, status_str = wallet.get_tx_status(tx_hash, height, conf, timestamp)
+        entry = ['', tx_hash, status_str, wallet.get_label(tx_hash),
+                 win.format_amount(value, True, whitespaces=True), win.format_amount(balance, whitespaces=True)]
+        item = SortableTreeWidgetItem(entry)
+        item.setData(0, SortableTreeWidgetItem.DataRole, (status, conf))
+        item.setData(0, Qt.UserRole, tx_hash)
+        tree.addTopLevelItem(item)
+
+
+def bench(app, n):
+    from ..history_list import HistoryList
+
+    wallet = FakeWallet(n)
+    win = FakeMainWindow(wallet)
+    hl = HistoryList(win)
+    hl.resize(1000, 700)
+    hl.show()
+    results = []
+
+    def paint():
+        hl.viewport().repaint()
+
+    results.append(('initial load', timed(app, lambda: (hl.on_update(), paint()))))
+    results.append(('refresh, no change', timed(app, lambda: (hl.on_update(), paint()))))
+
+    def new_tx():
+        wallet.add_tx(height=0)
+        hl.on_update()
+        paint()
+    results.append(('refresh, 1 new tx', timed(app, new_tx)))
+
+    def verify_100():
+        for h_item in wallet.history[1:101]:
+            hl.update_item(h_item[0], h_item[1], h_item[2] + 1, h_item[3])
+        paint()
+    results.append(('100 x update_item', timed(app, verify_100)))
+    results.append(('search filter', timed(app, lambda: (hl.filter('payment 12345'), paint()))))
+    results.append(('clear filter', timed(app, lambda: (hl.filter(''), paint()))))
+    results.append(('sort by amount', timed(app, lambda: (hl.sortByColumn(4, 0), paint()))))
+    hl.close()
+    hl.deleteLater()
+
+    tree = QTreeWidget(win)
+    tree.setColumnCount(6)
+    tree.setUniformRowHeights(True)
+    tree.resize(1000, 700)
+    tree.show()
+    results.append(('QTreeWidget rebuild (previous implementation)', timed(app, lambda: legacy_rebuild(win, tree))))
+    tree.close()
+    tree.deleteLater()
+    app.processEvents()
+    return results
+
+
+def main():
+    ns = [int(a) for a in sys.argv[1:]] or [1000, 10000, 100000]
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    for n in ns:
+        print(f"HistoryList with {n} txs:")
+        for name, ms in bench(app, n):
+            print(f"    {name:46s} {ms:9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
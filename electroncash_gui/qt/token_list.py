@@ -23,6 +23,8 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import threading
+import weakref
 from collections import defaultdict
 from enum import IntEnum
 from functools import wraps
@@ -68,6 +70,8 @@ class TokenList(MyTreeWidget, util.PrintError):
 
     amount_heading = _('Amount ({unit})')
 
+    sig_metadata_downloaded = QtCore.pyqtSignal(str, object)  # token_id_hex, DownloadedMetaData
+
     def __init__(self, parent: ElectrumWindow):
         assert isinstance(parent, ElectrumWindow)
         columns = [_('Category'), _('Fungible Amount'), _('NFTs'), '', '', _('Capability'), _('Num UTXOs'),
@@ -104,6 +108,8 @@ class TokenList(MyTreeWidget, util.PrintError):
         for col in (self.Col.nft_flags,):
             self.header().setSectionResizeMode(col, QtWidgets.QHeaderView.Interactive)
         self.setTextElideMode(QtCore.Qt.ElideRight)
+        self._metadata_requested: Set[str] = set()  # Categories we already tried to download metadata for
+        self.sig_metadata_downloaded.connect(self._on_metadata_downloaded)
 
     def diagnostic_name(self):
         return f"{super().diagnostic_name()}/{self.wallet.diagnostic_name()}"
@@ -440,6 +446,44 @@ class TokenList(MyTreeWidget, util.PrintError):
             # NB: Need to select the item at the end because otherwise weird bugs. See #1042.
             item.setSelected(True)
 
+        self.fetch_missing_metadata(tokens)
+
+    def fetch_missing_metadata(self, token_ids):
+        """Downloads the BCMR metadata of those categories that have none yet, all in one batch, in a thread.
+        Each category is tried once per session."""
+        if not self.wallet.network or not self.parent.config.get('token_meta_autofetch', True):
+            return
+        missing = [tid for tid in token_ids
+                   if tid not in self._metadata_requested and self.token_meta.needs_metadata(tid)]
+        if not missing:
+            return
+        self._metadata_requested.update(missing)
+        fetcher = self.token_meta.get_metadata_fetcher(self.wallet)
+        weak_self = weakref.ref(self)
+
+        def on_result(token_id_hex, md):
+            slf = weak_self()
+            if md and slf and not slf.cleaned_up:
+                try:
+                    slf.sig_metadata_downloaded.emit(token_id_hex, md)
+                except RuntimeError:
+                    pass  # C++ object deleted
+
+        def threadfunc():
+            try:
+                fetcher.fetch(missing, callback=on_result)
+            except Exception as e:
+                util.print_error(f"Error fetching token metadata: {e!r}")
+
+        self.print_error(f"fetching metadata for {len(missing)} token categories")
+        threading.Thread(target=threadfunc, name="TokenList/fetch_missing_metadata", daemon=True).start()
+
+    @if_not_dead
+    def _on_metadata_downloaded(self, token_id_hex: str, md):
+        if self.token_meta.apply_downloaded_metadata(token_id_hex, md):
+            self.token_meta.save()
+            self.parent.gui_object.token_metadata_updated_signal.emit(token_id_hex)
+
     @if_not_dead
     def create_menu(self, position):
         menu = QMenu()
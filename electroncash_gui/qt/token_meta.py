@@ -6,6 +6,8 @@
 # License: MIT
 """ Encapsulation and handling of token metadata -- Qt-specific functions """
 
+from typing import Optional
+
 from electroncash.token_meta import TokenMeta
 from .utils import qblockies
 
@@ -30,6 +32,13 @@ class TokenMetaQt(TokenMeta):
         icon = QIcon(pm)
         return icon
 
+    def _downloaded_icon(self, buf: bytes, ext: Optional[str]) -> Optional[QIcon]:
+        """Override: accepts any image format Qt can read, not just PNG"""
+        pm = QPixmap()
+        if not pm.loadFromData(QByteArray(buf)):
+            return None
+        return QIcon(pm)
+
     def gen_default_icon(self, token_id_hex: str) -> QIcon:
         img = qblockies.create(token_id_hex, size=12, scale=4, spotcolor=QColor(0, 0, 0))
         return QIcon(QPixmap.fromImage(img))
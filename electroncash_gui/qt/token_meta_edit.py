@@ -35,7 +35,7 @@ from PyQt5.QtGui import QFont
 
 from electroncash import token, util
 from electroncash.i18n import _
-from electroncash.token_meta import DownloadedMetaData, try_to_download_metadata
+from electroncash.token_meta import DownloadedMetaData
 from .main_window import ElectrumWindow
 from .util import HelpLabel, MessageBoxMixin, MONOSPACE_FONT, OnDestroyedMixin, PrintError
 from .token_meta import TokenMetaQt
@@ -247,9 +247,9 @@ class TokenMetaEditorForm(QtWidgets.QWidget, MessageBoxMixin, PrintError, OnDest
         self.lbl_dl_bcmr.setText(_("Checking for BCMR data from the network ..."))
         weak_self = weakref.ref(self)
 
-        def threadfunc(wallet, token_id):
+        def threadfunc(fetcher, token_id):
             try:
-                bcmr = try_to_download_metadata(wallet, token_id)
+                bcmr = fetcher.fetch([token_id]).get(token_id)
             except Exception as e:
                 util.print_error(repr(e))
                 bcmr = None
@@ -260,7 +260,8 @@ class TokenMetaEditorForm(QtWidgets.QWidget, MessageBoxMixin, PrintError, OnDest
                 else:
                     slf.sig_error_bcmr.emit()
 
-        t = threading.Thread(target=threadfunc, daemon=True, args=(self.window.wallet, self.token_id,))
+        fetcher = self.token_meta.get_metadata_fetcher(self.window.wallet)
+        t = threading.Thread(target=threadfunc, daemon=True, args=(fetcher, self.token_id,))
         t.start()
 
     def showEvent(self, evt: QtGui.QShowEvent):
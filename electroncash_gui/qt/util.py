@@ -778,6 +778,51 @@ class MyTreeWidget(QTreeWidget):
             self._forced_update = False
             # self.deferred_update_ct will be set right after on_update is called because some subclasses use @rate_limiter on the update() method
 
+    def add_items_sorted(self, items):
+        """ Adds `items`, an iterable of (parent, QTreeWidgetItem) pairs, each
+        at its sorted position under `parent` (which may be this widget).
+
+        With sorting enabled QTreeWidget schedules a re-sort of *all* rows on
+        every insert, which for SortableTreeWidgetItem means O(N log N) calls
+        into Python. This instead places each item with a binary search and
+        re-enables sorting without triggering a re-sort. """
+        header = self.header()
+        column, order = header.sortIndicatorSection(), header.sortIndicatorOrder()
+        if not self.isSortingEnabled() or column < 0:
+            for parent, item in items:
+                parent.addChild(item)
+            return
+        self.setSortingEnabled(False)
+        try:
+            for parent, item in items:
+                if parent is self:
+                    parent = self.invisibleRootItem()
+                # Upper bound, using the same comparisons as QTreeWidget's stable sort
+                lo, hi = 0, parent.childCount()
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    child = parent.child(mid)
+                    if order == Qt.AscendingOrder:
+                        after = not (item < child)
+                    else:
+                        after = not (child < item)
+                    if after:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                parent.insertChild(lo, item)
+        finally:
+            # setSortingEnabled(True) sorts by the current sort indicator, and
+            # a section of -1 makes that a no-op. The header's signals are
+            # blocked so the temporary indicator is not saved or acted upon.
+            was_blocked = header.blockSignals(True)
+            try:
+                header.setSortIndicator(-1, order)
+                self.setSortingEnabled(True)
+                header.setSortIndicator(column, order)
+            finally:
+                header.blockSignals(was_blocked)
+
     def get_leaves(self, root=None):
         if root is None:
             root = self.invisibleRootItem()
@@ -819,6 +864,219 @@ class MyTreeWidget(QTreeWidget):
             item.setHidden(no_match_text and no_match_data)
 
 
+class ElectrumViewItemDelegate(QStyledItemDelegate):
+    ''' Item delegate for MyTableView. Edits are handed to the view's
+    on_edited() rather than being written back into the model. '''
+
+    def setModelData(self, editor, model, index):
+        prior = index.data(Qt.EditRole) or ''
+        text = editor.text()
+        if text != prior:
+            self.parent().on_edited(model.mapToSource(index), text, prior)
+
+
+class MySortFilterProxyModel(QSortFilterProxyModel):
+    ''' The proxy model sitting between a MyTableView and its source model.
+
+    Filtering is delegated to the view's filter_accepts_row(). Sorting is
+    delegated to the source model's sort(), which can compute a sort key once
+    per row, rather than calling back into Python twice per comparison as
+    QSortFilterProxyModel.lessThan() would (far too slow for 100k rows). '''
+
+    def __init__(self, view):
+        super().__init__(view)
+        self._view = Weak.ref(view)
+        # Re-filtering happens on row inserts and on invalidateFilter() only,
+        # not on every dataChanged (which would re-filter every row).
+        self.setDynamicSortFilter(False)
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        view = self._view()
+        return view is None or view.filter_accepts_row(source_row)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        source_model = self.sourceModel()
+        if source_model is not None:
+            source_model.sort(column, order)
+
+
+class MyTableView(QTableView):
+    ''' A model/view counterpart of MyTreeWidget for flat lists that may grow
+    very large (e.g. the history of a wallet with 100k+ transactions). No
+    per-row widgets are created: rows live in `source_model` (a flat
+    QAbstractItemModel that also implements set_headers() and sort()) and are
+    presented through a MySortFilterProxyModel, so only rows that are actually
+    on-screen are ever asked for their data.
+
+    This is a QTableView dressed up to look like our tree widgets, rather than
+    a QTreeView: the latter re-lays out every row (calling into the Python
+    model several times per row) whenever a row is inserted.
+
+    Subclasses should implement on_update() in terms of incremental row
+    inserts/removals on the source model. '''
+
+    SortSpec = MyTreeWidget.SortSpec
+    default_sort : SortSpec = None
+
+    # Same meaning as in MyTreeWidget (used by filter_accepts_row below)
+    filter_columns = []
+    filter_data_columns = []
+    filter_data_role : int = Qt.UserRole
+
+    # Number of rows the header looks at to size ResizeToContents columns
+    # (Qt's default of 1000 is a lot of Python data() calls per column).
+    resize_contents_precision = 100
+
+    def __init__(self, parent, create_menu, source_model, headers, stretch_column=None,
+                 editable_columns=None,
+                 *, deferred_updates=False, save_sort_settings=False):
+        QTableView.__init__(self, parent)
+        self.parent = parent
+        self.config = self.parent.config
+        self.stretch_column = stretch_column
+        self.source_model = source_model
+        self.proxy_model = MySortFilterProxyModel(self)
+        self.proxy_model.setSourceModel(source_model)
+        self.setModel(self.proxy_model)
+        self.setShowGrid(False)
+        self.setWordWrap(False)
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        vh = self.verticalHeader()
+        vh.hide()
+        vh.setSectionResizeMode(QHeaderView.Fixed)
+        vh.setDefaultSectionSize(QFontMetrics(self.font()).height() + 6)
+        hh = self.horizontalHeader()
+        hh.setHighlightSections(False)
+        hh.setDefaultAlignment(Qt.AlignLeft | Qt.AlignVCenter)
+        hh.setResizeContentsPrecision(self.resize_contents_precision)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.customContextMenuRequested.connect(create_menu)
+        self.deferred_updates = deferred_updates
+        self.deferred_update_ct, self._forced_update = 0, False
+        self._save_sort_settings = save_sort_settings
+
+        # Control which columns are editable
+        self.pending_update = False
+        if editable_columns is None:
+            editable_columns = [stretch_column]
+        self.editable_columns = editable_columns
+        self.setItemDelegate(ElectrumViewItemDelegate(self))
+        self.doubleClicked.connect(self.on_doubleclick)
+        self.update_headers(headers)
+        self.current_filter = ""
+
+        self._setup_save_sort_mechanism()
+
+    def header(self):
+        ''' For parity with QTreeView/MyTreeWidget '''
+        return self.horizontalHeader()
+
+    _setup_save_sort_mechanism = MyTreeWidget._setup_save_sort_mechanism
+    should_defer_update_incr = MyTreeWidget.should_defer_update_incr
+
+    def update_headers(self, headers):
+        self.source_model.set_headers(headers)
+        self.header().setStretchLastSection(False)
+        for col in range(len(headers)):
+            sm = QHeaderView.Stretch if col == self.stretch_column else QHeaderView.ResizeToContents
+            self.header().setSectionResizeMode(col, sm)
+
+    def source_index(self, index):
+        ''' Maps an index of this view (a proxy model index) to the source model. '''
+        return self.proxy_model.mapToSource(index)
+
+    def keyPressEvent(self, event):
+        if (event.key() in {Qt.Key_F2, Qt.Key_Return}
+                and self.state() != QAbstractItemView.EditingState):
+            index = self.currentIndex()
+            if index.isValid():
+                self.on_activated(index)
+        else:
+            super().keyPressEvent(event)
+
+    def permit_edit(self, index):
+        return (index.column() in self.editable_columns
+                and self.on_permit_edit(index))
+
+    def on_permit_edit(self, index):
+        return True
+
+    def on_doubleclick(self, index):
+        if self.permit_edit(index):
+            self.edit(index)
+
+    def on_activated(self, index):
+        # on 'enter' we show the menu
+        pt = self.visualRect(index).bottomLeft()
+        pt.setX(50)
+        self.customContextMenuRequested.emit(pt)
+
+    def closeEditor(self, editor, hint):
+        super().closeEditor(editor, hint)
+        # Now do any pending updates
+        if self.pending_update:
+            self.pending_update = False
+            self.on_update()
+            self.deferred_update_ct = 0
+
+    def on_edited(self, source_index, text, prior):
+        '''Called only when the text actually changes'''
+        key = source_index.sibling(source_index.row(), 0).data(Qt.UserRole)
+        self.parent.wallet.set_label(key, text)
+        self.parent.update_labels()
+
+    def update(self):
+        # Defer updates if editing
+        if self.state() == QAbstractItemView.EditingState:
+            self.pending_update = True
+        else:
+            # Deferred update mode won't actually update the GUI if it's
+            # not on-screen, and will instead update it the next time it is
+            # shown.
+            if self.should_defer_update_incr():
+                return
+            self.on_update()
+            self.deferred_update_ct = 0
+
+    def on_update(self):
+        # Reimplemented in subclasses
+        pass
+
+    def showEvent(self, e):
+        super().showEvent(e)
+        if e.isAccepted() and self.deferred_update_ct:
+            self._forced_update = True
+            self.update()
+            self._forced_update = False
+
+    def filter(self, p):
+        if not self.filter_columns and not self.filter_data_columns:
+            return
+        p = p.lower()
+        if p != self.current_filter:
+            self.current_filter = p
+            self.proxy_model.invalidateFilter()
+
+    def filter_accepts_row(self, source_row):
+        ''' Called by the proxy model for each source row. Subclasses may
+        extend this to hide rows for other reasons than the search filter. '''
+        p = self.current_filter
+        if not p:
+            return True
+        model = self.source_model
+        for column in self.filter_columns:
+            if (model.index(source_row, column).data() or '').lower().find(p) != -1:
+                return True
+        for column in self.filter_data_columns:
+            # data matching must match the search string exactly, see MyTreeWidget
+            data = model.index(source_row, column).data(self.filter_data_role)
+            if isinstance(data, str) and data.strip().lower() == p:
+                return True
+        return False
+
+
 class OverlayControlMixin:
     STYLE_SHEET_COMMON = '''
     QPushButton { border-width: 1px; padding: 0px; margin: 0px; }
@@ -1072,17 +1330,37 @@ class SortableTreeWidgetItem(QTreeWidgetItem):
     DataRole = Qt.UserRole + 1
 
     def __lt__(self, other):
-        column = self.treeWidget().sortColumn()
+        column = (self.treeWidget() or other.treeWidget()).sortColumn()
         self_data = self.data(column, self.DataRole)
         other_data = other.data(column, self.DataRole)
         if None not in (self_data, other_data):
             # We have set custom data to sort by
             return self_data < other_data
+        self_text, other_text = self.text(column), other.text(column)
+        self_num = self._numeric_value(column, self_text)
+        other_num = (other._numeric_value(column, other_text) if isinstance(other, SortableTreeWidgetItem)
+                     else self._to_number(other_text))
+        if self_num is not None and other_num is not None:
+            return self_num < other_num
+        # If not, we will just do string comparison
+        return self_text < other_text
+
+    def _numeric_value(self, column, text):
+        """ Returns atof(text), or None if it is not a number. The result is
+        cached per column since a sort calls this O(N log N) times and
+        locale-aware parsing is comparatively slow. """
+        cache = self.__dict__.setdefault('_numeric_cache', {})
+        cached = cache.get(column)
+        if cached is None or cached[0] != text:
+            cached = cache[column] = (text, self._to_number(text))
+        return cached[1]
+
+    @staticmethod
+    def _to_number(text):
         try:
-            return atof(self.text(column)) < atof(other.text(column))
+            return atof(text)
         except ValueError:
-            # If not, we will just do string comparison
-            return self.text(column) < other.text(column)
+            return None
 
 class RateLimiter(PrintError):
     ''' Manages the state of a @rate_limited decorated function, collating
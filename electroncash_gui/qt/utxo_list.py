@@ -66,6 +66,14 @@ class UTXOList(MyTreeWidget):
         self.parent.ca_address_default_changed_signal.connect(self._ca_on_address_default_change)
         self.parent.gui_object.cashaddr_toggled_signal.connect(self.update)
         self.utxos = list()
+        # Rows are rebuilt only for the addresses this tracker reports as
+        # changed, see on_update()
+        self._addr_change_tracker = self.wallet.create_address_change_tracker()
+        self._utxo_items = dict()  # "prevout_hash:n" -> QTreeWidgetItem
+        self._utxos_by_name = dict()  # "prevout_hash:n" -> coin dict
+        self._names_by_addr = defaultdict(set)  # Address -> set of "prevout_hash:n"
+        self._immature = set()  # "prevout_hash:n" of immature coinbase coins
+        self._update_signature = None
         # cache some values to avoid constructing Qt objects for every pass through self.on_update (this is important for large wallets)
         self.monospaceFont = QFont(MONOSPACE_FONT)
         self.lightBlue = QColor('lightblue') if not ColorScheme.dark_scheme else QColor('blue')
@@ -111,103 +119,175 @@ class UTXOList(MyTreeWidget):
 
     @if_not_dead
     def on_update(self):
+        # Pop the changed set before reading wallet state so that anything
+        # that changes while we are in here is picked up next time.
+        changed = self._addr_change_tracker.pop()
         local_maturity_height = (self.wallet.get_local_height()+1) - COINBASE_MATURITY
+        signature = self._get_update_signature()
+        if changed is None or signature != self._update_signature:
+            self._update_fully(local_maturity_height)
+        else:
+            # Coinbase coins that matured since last time need to be redrawn
+            for name in [name for name in self._immature
+                         if self._utxos_by_name[name]['height'] <= local_maturity_height]:
+                changed.add(self._utxos_by_name[name]['address'])
+            if changed:
+                self._update_incrementally(changed, local_maturity_height)
+        self._update_signature = signature
+        self._update_utxo_count_display(len(self.utxos))
+
+    def _get_update_signature(self):
+        ''' Returns a tuple of everything that affects the look of *all* rows
+        rather than that of a single coin. If it differs from the last update,
+        the whole list is rebuilt. '''
+        num_cashaccts = (sum(len(txids) for txids in self.wallet.cashacct.v_by_addr.values())
+                         if self.show_cash_accounts else None)
+        # (the output point header is excluded as it shows the number of coins)
+        headers = tuple(self.headerItem().text(i) for i in range(self.columnCount()) if i != self.Col.output_point)
+        return Address.FMT_UI, self.parent.decimal_point, self.parent.num_zeros, headers, num_cashaccts
+
+    def _update_fully(self, local_maturity_height):
         prev_selection = self.get_selected() # cache previous selection, if any
         self.clear()
+        self._utxo_items.clear()
+        self._utxos_by_name.clear()
+        self._names_by_addr.clear()
+        self._immature.clear()
         ca_by_addr = defaultdict(list)
         if self.show_cash_accounts:
             addr_set = set()
             self.utxos = self.wallet.get_utxos(addr_set_out=addr_set, exclude_slp=False, exclude_tokens=False)
-            # grab all cash accounts so that we may add the emoji char
-            for info in self.wallet.cashacct.get_cashaccounts(addr_set):
-                ca_by_addr[info.address].append(info)
-                del info
-            for ca_list in ca_by_addr.values():
-                ca_list.sort(key=lambda info: ((info.number or 0), str(info.collision_hash)))  # sort the ca_lists by number, required by cashacct.get_address_default
-                del ca_list  # reference still exists inside ca_by_addr dict, this is just deleted here because we re-use this name below.
+            ca_by_addr = self._get_ca_by_addr(addr_set)
             del addr_set  # clean-up. We don't want the below code to ever depend on the existence of this cell.
         else:
             self.utxos = self.wallet.get_utxos(exclude_slp=False, exclude_tokens=False)
         for x in self.utxos:
-            address = x['address']
-            address_text = address.to_ui_string()
-            ca_info = None
-            ca_list = ca_by_addr.get(address)
-            tool_tip0 = None
-            if ca_list:
-                ca_info = self.wallet.cashacct.get_address_default(ca_list)
-                address_text = f'{ca_info.emoji} {address_text}'  # prepend the address emoji char
-                tool_tip0 = self.wallet.cashacct.fmt_info(ca_info, emoji=True)
-            height = x['height']
-            is_immature = x['coinbase'] and height > local_maturity_height
-            name = self.get_name(x)
-            name_short = self.get_name_short(x)
-            label = self.wallet.get_label(x['prevout_hash'])
-            amount = self.parent.format_amount(x['value'], is_diff=False, whitespaces=True)
-            utxo_item = SortableTreeWidgetItem([address_text, label, amount,
-                                                str(height), name_short])
-            if label:
-                utxo_item.setToolTip(1, label)  # just in case it doesn't fit horizontally, we also provide it as a tool tip where hopefully it won't be elided
-            if tool_tip0:
-                utxo_item.setToolTip(0, tool_tip0)
-            utxo_item.setToolTip(4, name)  # just in case they like to see lots of hex digits :)
-            utxo_item.DataRole = Qt.UserRole+100 # set this here to avoid sorting based on Qt.UserRole+1
-            utxo_item.setFont(0, self.monospaceFont)
-            utxo_item.setFont(2, self.monospaceFont)
-            utxo_item.setFont(4, self.monospaceFont)
-            utxo_item.setData(0, self.DataRoles.name, name)
-            a_frozen = self.wallet.is_frozen(address)
-            c_frozen = x['is_frozen_coin']
-            toolTipMisc = ''
-            slp_token = x['slp_token']
-            cash_token = x['token_data']
-            if is_immature:
-                for colNum in range(self.columnCount()):
-                    if colNum == self.Col.label:
-                        continue  # don't color the label column
-                    utxo_item.setForeground(colNum, self.immatureColor)
-                toolTipMisc = _('Coin is not yet mature')
-            elif slp_token:
-                utxo_item.setBackground(0, self.slpBG)
-                toolTipMisc = _('Coin contains an SLP token')
-            elif a_frozen and not c_frozen:
-                # address is frozen, coin is not frozen
-                # emulate the "Look" off the address_list .py's frozen entry
-                utxo_item.setBackground(0, self.lightBlue)
-                toolTipMisc = _("Address is frozen")
-            elif c_frozen and not a_frozen:
-                # coin is frozen, address is not frozen
-                utxo_item.setBackground(0, self.blue)
-                toolTipMisc = _("Coin is frozen")
-            elif c_frozen and a_frozen:
-                # both coin and address are frozen so color-code it to indicate that.
-                utxo_item.setBackground(0, self.lightBlue)
-                utxo_item.setForeground(0, self.cyanBlue)
-                toolTipMisc = _("Coin & Address are frozen")
-            elif cash_token:
-                utxo_item.setBackground(0, self.cashTokenBG)
-                toolTipMisc = _('Coin contains a CashToken')
-            # save the address-level-frozen and coin-level-frozen flags to the data item for retrieval later in create_menu() below.
-            utxo_item.setData(0, self.DataRoles.frozen_flags, "{}{}{}{}{}".format(
-                ("a" if a_frozen else ""), ("c" if c_frozen else ""), ("s" if slp_token else ""),
-                ("i" if is_immature else ""), ("t" if cash_token else "")))
-            # store the address
-            utxo_item.setData(0, self.DataRoles.address, address)
-            # store the ca_info for this address -- if any
-            if ca_info:
-                utxo_item.setData(0, self.DataRoles.cash_account, ca_info)
-            # store the slp_token
-            utxo_item.setData(0, self.DataRoles.slp_token, slp_token)
-            # store the cash token
-            utxo_item.setData(0, self.DataRoles.cash_token, cash_token)
-            if toolTipMisc:
-                utxo_item.setToolTip(0, toolTipMisc)
-            run_hook("utxo_list_item_setup", self, utxo_item, x, name)
+            name, utxo_item = self._make_utxo_item(x, ca_by_addr, local_maturity_height)
             self.addChild(utxo_item)
             if name in prev_selection:
                 # NB: This needs to be here after the item is added to the widget. See #979.
                 utxo_item.setSelected(True) # restore previous selection
-        self._update_utxo_count_display(len(self.utxos))
+
+    def _update_incrementally(self, changed, local_maturity_height):
+        ''' Replaces just the rows for the coins of the `changed` addresses. '''
+        prev_selection = self.get_selected() # cache previous selection, if any
+        root = self.invisibleRootItem()
+        for address in changed:
+            for name in self._names_by_addr.pop(address, ()):
+                del self._utxos_by_name[name]
+                self._immature.discard(name)
+                root.removeChild(self._utxo_items.pop(name))
+        addr_set = set()
+        coins = self.wallet.get_utxos(domain=changed, addr_set_out=addr_set, exclude_slp=False, exclude_tokens=False)
+        ca_by_addr = self._get_ca_by_addr(addr_set) if self.show_cash_accounts else {}
+        new_items = [self._make_utxo_item(x, ca_by_addr, local_maturity_height) for x in coins]
+        self.add_items_sorted((self, utxo_item) for name, utxo_item in new_items)
+        for name, utxo_item in new_items:
+            if name in prev_selection:
+                utxo_item.setSelected(True) # restore previous selection
+        self.utxos = list(self._utxos_by_name.values())
+
+    def _get_ca_by_addr(self, addr_set):
+        ca_by_addr = defaultdict(list)
+        # grab all cash accounts so that we may add the emoji char
+        for info in self.wallet.cashacct.get_cashaccounts(addr_set):
+            ca_by_addr[info.address].append(info)
+            del info
+        for ca_list in ca_by_addr.values():
+            ca_list.sort(key=lambda info: ((info.number or 0), str(info.collision_hash)))  # sort the ca_lists by number, required by cashacct.get_address_default
+            del ca_list  # reference still exists inside ca_by_addr dict, this is just deleted here because we re-use this name below.
+        return ca_by_addr
+
+    def _make_utxo_item(self, x, ca_by_addr, local_maturity_height):
+        ''' Returns a tuple of (name, item) for coin `x`. The item is not yet
+        added to the widget. '''
+        address = x['address']
+        address_text = address.to_ui_string()
+        ca_info = None
+        ca_list = ca_by_addr.get(address)
+        tool_tip0 = None
+        if ca_list:
+            ca_info = self.wallet.cashacct.get_address_default(ca_list)
+            address_text = f'{ca_info.emoji} {address_text}'  # prepend the address emoji char
+            tool_tip0 = self.wallet.cashacct.fmt_info(ca_info, emoji=True)
+        height = x['height']
+        is_immature = x['coinbase'] and height > local_maturity_height
+        name = self.get_name(x)
+        name_short = self.get_name_short(x)
+        label = self.wallet.get_label(x['prevout_hash'])
+        amount = self.parent.format_amount(x['value'], is_diff=False, whitespaces=True)
+        utxo_item = SortableTreeWidgetItem([address_text, label, amount,
+                                            str(height), name_short])
+        if label:
+            utxo_item.setToolTip(1, label)  # just in case it doesn't fit horizontally, we also provide it as a tool tip where hopefully it won't be elided
+        if tool_tip0:
+            utxo_item.setToolTip(0, tool_tip0)
+        utxo_item.setToolTip(4, name)  # just in case they like to see lots of hex digits :)
+        utxo_item.DataRole = Qt.UserRole+100 # set this here to avoid sorting based on Qt.UserRole+1
+        utxo_item.setFont(0, self.monospaceFont)
+        utxo_item.setFont(2, self.monospaceFont)
+        utxo_item.setFont(4, self.monospaceFont)
+        utxo_item.setData(0, self.DataRoles.name, name)
+        a_frozen = self.wallet.is_frozen(address)
+        c_frozen = x['is_frozen_coin']
+        toolTipMisc = ''
+        slp_token = x['slp_token']
+        cash_token = x['token_data']
+        if is_immature:
+            for colNum in range(self.columnCount()):
+                if colNum == self.Col.label:
+                    continue  # don't color the label column
+                utxo_item.setForeground(colNum, self.immatureColor)
+            toolTipMisc = _('Coin is not yet mature')
+        elif slp_token:
+            utxo_item.setBackground(0, self.slpBG)
+            toolTipMisc = _('Coin contains an SLP token')
+        elif a_frozen and not c_frozen:
+            # address is frozen, coin is not frozen
+            # emulate the "Look" off the address_list .py's frozen entry
+            utxo_item.setBackground(0, self.lightBlue)
+            toolTipMisc = _("Address is frozen")
+        elif c_frozen and not a_frozen:
+            # coin is frozen, address is not frozen
+            utxo_item.setBackground(0, self.blue)
+            toolTipMisc = _("Coin is frozen")
+        elif c_frozen and a_frozen:
+            # both coin and address are frozen so color-code it to indicate that.
+            utxo_item.setBackground(0, self.lightBlue)
+            utxo_item.setForeground(0, self.cyanBlue)
+            toolTipMisc = _("Coin & Address are frozen")
+        elif cash_token:
+            utxo_item.setBackground(0, self.cashTokenBG)
+            toolTipMisc = _('Coin contains a CashToken')
+        # save the address-level-frozen and coin-level-frozen flags to the data item for retrieval later in create_menu() below.
+        utxo_item.setData(0, self.DataRoles.frozen_flags, "{}{}{}{}{}".format(
+            ("a" if a_frozen else ""), ("c" if c_frozen else ""), ("s" if slp_token else ""),
+            ("i" if is_immature else ""), ("t" if cash_token else "")))
+        # store the address
+        utxo_item.setData(0, self.DataRoles.address, address)
+        # store the ca_info for this address -- if any
+        if ca_info:
+            utxo_item.setData(0, self.DataRoles.cash_account, ca_info)
+        # store the slp_token
+        utxo_item.setData(0, self.DataRoles.slp_token, slp_token)
+        # store the cash token
+        utxo_item.setData(0, self.DataRoles.cash_token, cash_token)
+        if toolTipMisc:
+            utxo_item.setToolTip(0, toolTipMisc)
+        run_hook("utxo_list_item_setup", self, utxo_item, x, name)
+        self._utxo_items[name] = utxo_item
+        self._utxos_by_name[name] = x
+        self._names_by_addr[address].add(name)
+        if is_immature:
+            self._immature.add(name)
+        return name, utxo_item
+
+    def update_all(self):
+        ''' Like update(), but rebuilds every row rather than just the rows
+        for the addresses the wallet reported as changed. Plugins that change
+        what their utxo_list_item_setup hook displays should call this. '''
+        self._addr_change_tracker.mark_all()
+        self.update()
 
     def _update_utxo_count_display(self, num_utxos: int):
         headerItem = self.headerItem()
@@ -382,7 +462,7 @@ class UTXOList(MyTreeWidget):
 
     def _ca_on_address_default_change(self, info):
         if self.show_cash_accounts:
-            self.update()
+            self.update_all()
 
     @property
     def show_cash_accounts(self):
@@ -27,14 +27,17 @@
 """
 Protobuf communications system and a generic server+client
 """
+import asyncio
 import queue
 import socket
 import sys
 import threading
 import traceback
+from collections import defaultdict
+from contextlib import suppress
 
 from . import fusion_pb2 as pb
-from .connection import Connection, BadFrameError
+from .connection import Connection, AsyncConnection, BadFrameError
 from .util import FusionError
 from .validation import ValidationError
 from google.protobuf.message import DecodeError
@@ -51,12 +54,35 @@ from electroncash.util import PrintError
 for mtype in pb.ClientMessage, pb.ServerMessage, pb.CovertMessage, pb.CovertResponse:
     mtype._messagedescriptor_names = {d.message_type : n for n,d in mtype.DESCRIPTOR.fields_by_name.items()}
 
-def send_pb(connection, pb_class, submsg, timeout=None):
+def _wrap_pb(pb_class, submsg):
     # Wrap the submessage into an outer message.
     # note - _messagedescriptor_names is patched in, see above
     fieldname = pb_class._messagedescriptor_names[submsg.DESCRIPTOR]
     msg = pb_class(**{fieldname: submsg})
-    msgbytes = msg.SerializeToString()
+    return msg.SerializeToString()
+
+def _unwrap_pb(blob, pb_class, expected_field_names):
+    msg = pb_class()
+    try:
+        length = msg.ParseFromString(blob)
+    except DecodeError as e:
+        raise FusionError('message decoding error') from e
+
+    if not msg.IsInitialized():
+        raise FusionError('incomplete message received')
+
+    mtype = msg.WhichOneof('msg')
+    if mtype is None:
+        raise FusionError('unrecognized message')
+    submsg = getattr(msg, mtype)
+
+    if mtype not in expected_field_names:
+        raise FusionError('got {} message, expecting {}'.format(mtype, expected_field_names))
+
+    return submsg, mtype
+
+def send_pb(connection, pb_class, submsg, timeout=None):
+    msgbytes = _wrap_pb(pb_class, submsg)
     try:
         connection.send_message(msgbytes, timeout=timeout)
     except ConnectionError as e:
@@ -83,24 +109,34 @@ def recv_pb(connection, pb_class, *expected_field_names, timeout=None):
             raise FusionError('Communications error: {}: {}'.format(type(exc).__name__, exc)) from exc
     # Other exceptions propagate up
 
-    msg = pb_class()
-    try:
-        length = msg.ParseFromString(blob)
-    except DecodeError as e:
-        raise FusionError('message decoding error') from e
-
-    if not msg.IsInitialized():
-        raise FusionError('incomplete message received')
+    return _unwrap_pb(blob, pb_class, expected_field_names)
 
-    mtype = msg.WhichOneof('msg')
-    if mtype is None:
-        raise FusionError('unrecognized message')
-    submsg = getattr(msg, mtype)
+async def send_pb_async(connection, pb_class, submsg, timeout=None):
+    """ Like send_pb, for an AsyncConnection. """
+    msgbytes = _wrap_pb(pb_class, submsg)
+    try:
+        await connection.send_message(msgbytes, timeout=timeout)
+    except ConnectionError as e:
+        raise FusionError('connection closed by remote') from e
+    except socket.timeout as e:
+        raise FusionError('timed out during send') from e
+    except OSError as exc:
+        raise FusionError('Communications error: {}: {}'.format(type(exc).__name__, exc)) from exc
 
-    if mtype not in expected_field_names:
-        raise FusionError('got {} message, expecting {}'.format(mtype, expected_field_names))
+async def recv_pb_async(connection, pb_class, *expected_field_names, timeout=None):
+    """ Like recv_pb, for an AsyncConnection. """
+    try:
+        blob = await connection.recv_message(timeout = timeout)
+    except ConnectionError as e:
+        raise FusionError('connection closed by remote') from e
+    except BadFrameError as e:
+        raise FusionError('corrupted communication: ' + e.args[0]) from e
+    except socket.timeout as e:
+        raise FusionError('timed out during receive') from e
+    except OSError as exc:
+        raise FusionError('Communications error: {}: {}'.format(type(exc).__name__, exc)) from exc
 
-    return submsg, mtype
+    return _unwrap_pb(blob, pb_class, expected_field_names)
 
 _last_net = None
 _last_genesis_hash = None
@@ -202,8 +238,11 @@ class ClientHandlerThread(threading.Thread, PrintError):
 
         self.addjob(self._killjob, reason)
 
-class GenericServer(threading.Thread, PrintError):
+class _ServerBase(threading.Thread, PrintError):
+    """ Listening socket and UPnP setup/teardown shared by GenericServer and
+    AsyncGenericServer. """
     client_default_timeout = 5
+    listen_backlog = 20
     noisy = True
 
     def diagnostic_name(self):
@@ -218,7 +257,8 @@ class GenericServer(threading.Thread, PrintError):
         if `upnp` is provided it should be a miniupnpc.UPnP object which has
         already been initialized with .discover() and .selectigd().
 
-        `clientclass` should be a subclass of `ClientHandlerThread`."""
+        `clientclass` should be a subclass of `ClientHandlerThread` (or of
+        `AsyncClientHandler`, for AsyncGenericServer)."""
         super().__init__()
         self.daemon = True
         self.clientclass = clientclass
@@ -228,7 +268,7 @@ class GenericServer(threading.Thread, PrintError):
         listensock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
         listensock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         listensock.bind((bindhost, port))
-        listensock.listen(20)
+        listensock.listen(self.listen_backlog)
         listensock.settimeout(1)
         self.listensock = listensock
 
@@ -271,6 +311,19 @@ class GenericServer(threading.Thread, PrintError):
         self.lock = threading.RLock()
         self.spawned_clients = WeakSet()
 
+    def _close_listener(self):
+        try:
+            self.listensock.close()
+        except:
+            pass
+        try:
+            self.upnp.deleteportmapping(self.port, 'TCP')
+        except:
+            pass
+
+class GenericServer(_ServerBase):
+    """ Server that runs a ClientHandlerThread for each connected client. """
+
     def stop(self, reason = None):
         with self.lock:
             self.stopping = True
@@ -304,15 +357,196 @@ class GenericServer(threading.Thread, PrintError):
         except:
             self.print_error('failed with exception')
             traceback.print_exc(file=sys.stderr)
+        self._close_listener()
+        self.print_error("stopped")
+
+    def new_client_job(self, client):
+        raise FusionError("client handler not implemented")
+
+
+class AsyncClientHandler(PrintError):
+    """The asyncio counterpart of ClientHandlerThread: each connection is
+    served by a task in the server's event loop (rather than by a thread),
+    which runs the server's `new_client_job` coroutine.
+
+    In case of ValidationError, this will call `send_error` before closing the
+    connection. You can implement this in subclasses.
+    """
+    noisy = True
+    Disconnect = ClientHandlerThread.Disconnect
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.dead = False
+        self.task = None
+        self.kill_reason = None
+        self.peername = None
+        # Set once the connection has been handed over to someone else (e.g.
+        # a thread, see BlockingConnection), who is then responsible for it.
+        self.detached = False
+
+    def diagnostic_name(self):
+        if self.peername is None:
+            try: self.peername = ':'.join(str(x) for x in self.connection.get_peername())
+            except: pass
+        peername = self.peername or '???'
+        return f'Client {peername}'
+
+    async def run(self, job):
         try:
-            self.listensock.close()
-        except:
+            try:
+                await job(self)
+            except ValidationError as e:
+                self.print_error(str(e))
+                await self.send_error(str(e))
+        except self.Disconnect:
             pass
+        except FusionError as exc:
+            if self.noisy:
+                self.print_error('failed: {}'.format(exc))
+        except asyncio.CancelledError:
+            # killed
+            if self.kill_reason is not None:
+                with suppress(Exception):
+                    await self.send_error(self.kill_reason)
+        except Exception:
+            self.print_error('failed with exception')
+            traceback.print_exc(file=sys.stderr)
+        finally:
+            self.dead = True
+            if not self.detached:
+                self.connection.close()
+
+    async def send_error(self, errormsg):
+        pass
+
+    def kill(self, reason = None):
+        """ Kill this connection, after sending `reason` as an error if it is
+        not None. Must be called from within the event loop; from other
+        threads use the server's .stop(). """
+        self.dead = True
+        self.kill_reason = reason
+        if self.task is not None:
+            self.task.cancel()
+
+
+class AsyncGenericServer(_ServerBase):
+    """Like GenericServer, but all clients are served from a single asyncio
+    event loop running in this server's thread, so that a very large number
+    of connections does not need a very large number of threads.
+
+    `clientclass` should be a subclass of `AsyncClientHandler`, and subclasses
+    should implement `new_client_job` as a coroutine.
+
+    If given, `max_connections` limits the number of simultaneous clients, and
+    `max_connections_per_ip` the number of simultaneous clients from any one IP
+    (localhost is exempt). Connections over the limits are closed immediately.
+    """
+    listen_backlog = 1024
+
+    def __init__(self, bindhost, port, clientclass, upnp = None, max_connections = None, max_connections_per_ip = None):
+        super().__init__(bindhost, port, clientclass, upnp = upnp)
+        self.max_connections = max_connections
+        self.max_connections_per_ip = max_connections_per_ip
+        self.connections_per_ip = defaultdict(int)
+        # unlike GenericServer this is a plain set; clients remove themselves once finished.
+        self.spawned_clients = set()
+        self.loop = None
+        self.stop_ev = None
+
+    def stop(self, reason = None):
+        """ Thread-safe. """
+        with self.lock:
+            self.stopping = True
+            loop = self.loop
+        if loop is not None:
+            with suppress(RuntimeError):  # loop already closed
+                loop.call_soon_threadsafe(self._stop_in_loop, reason)
+
+    def _stop_in_loop(self, reason):
+        if self.stop_ev is not None:
+            self.stop_ev.set()
+        for c in list(self.spawned_clients):
+            c.kill(reason = reason)
+
+    def run(self,):
+        self.print_error("started")
+        loop = asyncio.new_event_loop()
         try:
-            self.upnp.deleteportmapping(self.port, 'TCP')
+            with self.lock:
+                self.loop = loop
+            loop.run_until_complete(self._serve())
         except:
-            pass
+            self.print_error('failed with exception')
+            traceback.print_exc(file=sys.stderr)
+        finally:
+            with self.lock:
+                self.loop = None
+            loop.close()
+        self._close_listener()
         self.print_error("stopped")
 
-    def new_client_job(self, client):
+    async def _serve(self):
+        self.stop_ev = asyncio.Event()
+        if self.stopping:
+            return
+        self.listensock.setblocking(False)
+        server = await asyncio.start_server(self._handle_connection, sock = self.listensock)
+        try:
+            await self.stop_ev.wait()
+        finally:
+            server.close()
+            tasks = [c.task for c in self.spawned_clients if c.task is not None]
+            for c in list(self.spawned_clients):
+                c.kill()
+            if tasks:
+                await asyncio.wait(tasks, timeout = 5)
+            await self.wait_detached()
+            # anything else still running in the loop (e.g. I/O of detached clients) is abandoned
+            others = asyncio.all_tasks() - {asyncio.current_task()}
+            for t in others:
+                t.cancel()
+            if others:
+                await asyncio.wait(others, timeout = 1)
+
+    async def _handle_connection(self, reader, writer):
+        src = writer.get_extra_info('peername')
+        ip = src[0] if src else ''
+        with self.lock:
+            reject = (self.stopping
+                      or (self.max_connections is not None and len(self.spawned_clients) >= self.max_connections)
+                      or (self.max_connections_per_ip is not None and not ip.startswith('127.')
+                          and self.connections_per_ip[ip] >= self.max_connections_per_ip))
+            if not reject:
+                self.connections_per_ip[ip] += 1
+        if reject:
+            if self.noisy:
+                self.print_error(f'rejecting client: {ip} (over connection limit, or stopping)')
+            writer.close()
+            return
+        if self.noisy:
+            srcstr = ':'.join(str(x) for x in src)
+            self.print_error(f'new client: {srcstr}')
+            del srcstr
+        connection = AsyncConnection(reader, writer, self.client_default_timeout)
+        client = self.clientclass(connection)
+        client.noisy = self.noisy
+        client.task = asyncio.current_task()
+        self.spawned_clients.add(client)
+        try:
+            await client.run(self.new_client_job)
+        finally:
+            self.spawned_clients.discard(client)
+            with self.lock:
+                self.connections_per_ip[ip] -= 1
+                if not self.connections_per_ip[ip]:
+                    del self.connections_per_ip[ip]
+
+    async def wait_detached(self):
+        """ Called when stopping, before abandoning whatever else is still
+        running in the loop. Subclasses that detach clients can wait for them
+        here. """
+        pass
+
+    async def new_client_job(self, client):
         raise FusionError("client handler not implemented")
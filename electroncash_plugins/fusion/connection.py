@@ -35,7 +35,9 @@ This only implements a framing protocol:
     <8 byte magic><4 byte length (big endian) of message><message>
 """
 
+import asyncio
 import certifi
+import concurrent.futures
 import socket
 import socks
 import ssl
@@ -177,3 +179,104 @@ class Connection:
             self.socket.shutdown(socket.SHUT_RDWR)
         with suppress(OSError):
             self.socket.close()
+
+class AsyncConnection:
+    """ asyncio counterpart of Connection (same framing), for use by servers
+    running in an event loop. Unlike Connection, a timeout during receive
+    may leave a partially read frame behind, so the connection should be
+    abandoned after any timeout. """
+    MAX_MSG_LENGTH = Connection.MAX_MSG_LENGTH
+    magic = Connection.magic
+
+    def __init__(self, reader, writer, timeout):
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+
+    def get_peername(self):
+        return self.writer.get_extra_info('peername')
+
+    async def send_message(self, msg, timeout = None):
+        lengthbytes = len(msg).to_bytes(4, byteorder='big')
+        self.writer.write(self.magic + lengthbytes + msg)
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            await asyncio.wait_for(self.writer.drain(), timeout)
+        except asyncio.TimeoutError as e:
+            raise socket.timeout from e
+
+    async def _recv_message(self):
+        try:
+            header = await self.reader.readexactly(12)
+        except asyncio.IncompleteReadError as e:
+            if e.partial:
+                raise ConnectionError("Connection ended mid-message.") from e
+            raise ConnectionError("Connection ended while awaiting message.") from e
+        magic = header[:8]
+        if magic != self.magic:
+            raise BadFrameError("Bad magic in frame: {}".format(magic.hex()))
+        message_length = int.from_bytes(header[8:12], byteorder='big')
+        if message_length > self.MAX_MSG_LENGTH:
+            raise BadFrameError("Got a frame with msg_length={} > {} (max)".format(message_length, self.MAX_MSG_LENGTH))
+        try:
+            return await self.reader.readexactly(message_length)
+        except asyncio.IncompleteReadError as e:
+            raise ConnectionError("Connection ended mid-message.") from e
+
+    async def recv_message(self, timeout = None):
+        """ Read message, default timeout is self.timeout. """
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            return await asyncio.wait_for(self._recv_message(), timeout)
+        except asyncio.TimeoutError as e:
+            raise socket.timeout from e
+
+    def close(self):
+        with suppress(OSError, RuntimeError):
+            # RuntimeError if the event loop is already closed
+            self.writer.close()
+
+
+class BlockingConnection:
+    """ Blocking facade over an AsyncConnection, with the same interface as
+    Connection, so that a connection accepted by an event loop can be handed
+    over to a thread. The I/O itself keeps running in the event loop. """
+
+    def __init__(self, async_connection, loop):
+        self.async_connection = async_connection
+        self.loop = loop
+        self.timeout = async_connection.timeout
+        self.socket = async_connection.writer.get_extra_info('socket')
+
+    def _run(self, coro, timeout):
+        try:
+            fut = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        except RuntimeError as e:
+            coro.close()
+            raise ConnectionError("Event loop is closed.") from e
+        try:
+            # the coroutine enforces the timeout; this is only a backstop
+            return fut.result(None if timeout is None else timeout + 5)
+        except concurrent.futures.TimeoutError as e:
+            fut.cancel()
+            raise socket.timeout from e
+        except concurrent.futures.CancelledError as e:
+            raise ConnectionError("Connection was closed.") from e
+
+    def send_message(self, msg, timeout = None):
+        if timeout is None:
+            timeout = self.timeout
+        self._run(self.async_connection.send_message(msg, timeout), timeout)
+
+    def recv_message(self, timeout = None):
+        """ Read message, default timeout is self.timeout. """
+        if timeout is None:
+            timeout = self.timeout
+        return self._run(self.async_connection.recv_message(timeout), timeout)
+
+    def close(self):
+        """ Thread-safe. """
+        with suppress(RuntimeError):  # loop already closed
+            self.loop.call_soon_threadsafe(self.async_connection.close)
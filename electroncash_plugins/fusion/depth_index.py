@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+#
+# Electron Cash - a lightweight Bitcoin Cash client
+# CashFusion - an advanced coin anonymizer
+#
+# Copyright (C) 2020 Mark B. Lundeberg
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation files
+# (the "Software"), to deal in the Software without restriction,
+# including without limitation the rights to use, copy, modify, merge,
+# publish, distribute, sublicense, and/or sell copies of the Software,
+# and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS
+# BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+Per-wallet index of CashFusion "depth" for every wallet transaction.
+
+A wallet tx has depth -1 if it is not a CashFusion tx of ours, and depth
+d >= 0 if it is one and all of its wallet ancestors are CashFusion txs for d
+generations (i.e. `is_fuz_coin(require_depth=d)` is True for its coins).
+Depths are computed bottom-up without recursion and are kept up to date as
+transactions are added to / removed from the wallet, so that coin and address
+queries become simple dict lookups.
+
+All methods must be called with wallet.lock held.
+"""
+
+from collections import defaultdict
+from typing import Optional
+
+from electroncash.address import OpCodes
+from electroncash.bitcoin import TYPE_SCRIPT
+
+from .protocol import Protocol
+
+# We expect: OP_RETURN (4) FUZ\x00
+FUZ_PREFIX = bytes((OpCodes.OP_RETURN, len(Protocol.FUSE_ID))) + Protocol.FUSE_ID
+_FUZ_PREFIX_HEX = FUZ_PREFIX.hex()
+
+MAX_DEPTH = 900
+
+
+class FuzDepthIndex:
+
+    def __init__(self, wallet):
+        self.wallet = wallet
+        # txid -> tuple of parent txids (inputs that are from this wallet), only for fuz txs
+        self.parents = dict()
+        # parent txid -> set of fuz child txids; parents need not be known to the wallet
+        self.children = defaultdict(set)
+        # txid -> depth, only for fuz txs (absent == -1)
+        self.depths = dict()
+
+    def rebuild(self):
+        """ (Re)build the whole index from wallet.transactions. """
+        self.parents.clear()
+        self.children.clear()
+        self.depths.clear()
+        for txid, tx in self.wallet.transactions.items():
+            self._link(txid, tx)
+        # Iterative, memoized depth-first pass so that every parent's depth
+        # is known before its children are computed.
+        depths = self.depths
+        for txid in self.parents:
+            if txid in depths:
+                continue
+            stack = [txid]
+            while stack:
+                t = stack[-1]
+                if t in depths:
+                    stack.pop()
+                    continue
+                pending = [p for p in self.parents[t] if p in self.parents and p not in depths]
+                if pending:
+                    stack.extend(pending)
+                    continue
+                stack.pop()
+                depths[t] = self._compute(t)
+
+    def get_depth(self, txid) -> Optional[int]:
+        """ Returns the fusion depth of txid (-1 if not a fuz tx), or None if
+        the tx is not known to the wallet. """
+        if txid not in self.wallet.transactions:
+            return None
+        return self.depths.get(txid, -1)
+
+    def add_tx(self, txid, tx):
+        if txid in self.parents:
+            # Already indexed (the same tx may be added more than once)
+            return
+        self._link(txid, tx)
+        self._propagate(txid)
+
+    def remove_tx(self, txid):
+        parents = self.parents.pop(txid, None)
+        if parents is None:
+            return
+        for p in parents:
+            kids = self.children.get(p)
+            if kids is not None:
+                kids.discard(txid)
+                if not kids:
+                    del self.children[p]
+        self._propagate(txid)
+
+    def _link(self, txid, tx):
+        parents = self._fuz_parents(txid, tx)
+        if parents is None:
+            return
+        self.parents[txid] = parents
+        for p in parents:
+            self.children[p].add(txid)
+
+    def _fuz_parents(self, txid, tx) -> Optional[tuple]:
+        """ Returns the txids of tx's inputs that are from this wallet if tx is
+        a CashFusion tx, otherwise None. """
+        raw = tx.raw
+        if raw is not None and _FUZ_PREFIX_HEX not in raw:
+            # Fast path: skip deserializing the vast majority of txs
+            return None
+        if any(td is not None for td in tx.token_datas()):
+            # A CashToken-containing txn can never be CashFusion
+            return None
+        for typ, dest, amt in tx.outputs():
+            if amt == 0 and typ == TYPE_SCRIPT and dest.script.startswith(FUZ_PREFIX):
+                break
+        else:
+            return None
+        wallet = self.wallet
+        parents = set()
+        for inp in tx.inputs():
+            addr = inp.get('address', None)
+            if addr is not None and wallet.is_mine(addr):
+                parents.add(inp['prevout_hash'])
+        if not parents:
+            wallet.print_error(f"CashFusion: txid \"{txid}\" has a CashFusion-style OP_RETURN but none of the "
+                               f"inputs are from this wallet. This is UNEXPECTED!")
+            return None
+        return tuple(parents)
+
+    def _compute(self, txid) -> int:
+        parents = self.parents.get(txid)
+        if parents is None:
+            return -1
+        depths = self.depths
+        return min(MAX_DEPTH, 1 + min(depths.get(p, -1) for p in parents))
+
+    def _propagate(self, txid):
+        """ Recompute txid's depth and push any change down to its descendants. """
+        work = [txid]
+        while work:
+            t = work.pop()
+            new = self._compute(t)
+            if new == self.depths.get(t, -1):
+                continue
+            if new < 0:
+                del self.depths[t]
+            else:
+                self.depths[t] = new
+            work.extend(self.children.get(t, ()))
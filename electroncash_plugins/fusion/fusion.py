@@ -47,7 +47,7 @@ from .covert import CovertSubmitter, is_tor_port
 from .protocol import Protocol
 from .util import (FusionError, sha256, calc_initial_hash, calc_round_hash, size_of_input, size_of_output,
                    component_fee, gen_keypair, tx_from_components, rand_position)
-from .validation import validate_proof_internal, ValidationError, check_input_electrumx
+from .validation import validate_proof_internal, ValidationError, InputValidator
 
 from google.protobuf.message import DecodeError
 
@@ -1109,7 +1109,7 @@ class Fusion(threading.Thread, PrintError):
         self.print_error("receiving proofs")
         msg = self.recv('theirproofslist', timeout = 2 * Protocol.STANDARD_TIMEOUT)
         blames = []
-        count_inputs = 0
+        inputs_to_check = []
         for i, rp in enumerate(msg.proofs):
             try:
                 privkey = privkeys[rp.dst_key_idx]
@@ -1135,16 +1135,21 @@ class Fusion(threading.Thread, PrintError):
                 continue
 
             if inpcomp is not None:
-                count_inputs += 1
-                try:
-                    check_input_electrumx(self.network, inpcomp)
-                except ValidationError as e:
-                    self.print_error(f"found a bad input [{rp.src_commitment_idx}]: {e.args[0]} ({inpcomp.prev_txid[::-1].hex()}:{inpcomp.prev_index})")
-                    blames.append(pb.Blames.BlameProof(which_proof = i, session_key = skey, blame_reason = 'input does not match blockchain: ' + e.args[0],
-                                                       need_lookup_blockchain = True))
-                except Exception as e:
-                    self.print_error(f"verified an input internally, but was unable to check it against blockchain: {repr(e)}")
-        self.print_error(f"checked {len(msg.proofs)} proofs, {count_inputs} of them inputs")
+                inputs_to_check.append((i, rp, skey, inpcomp))
+
+        # Look up all the inputs at once, then check them.
+        input_validator = InputValidator(self.network)
+        input_validator.prefetch(inpcomp for _, _, _, inpcomp in inputs_to_check)
+        for i, rp, skey, inpcomp in inputs_to_check:
+            try:
+                input_validator.check(inpcomp)
+            except ValidationError as e:
+                self.print_error(f"found a bad input [{rp.src_commitment_idx}]: {e.args[0]} ({inpcomp.prev_txid[::-1].hex()}:{inpcomp.prev_index})")
+                blames.append(pb.Blames.BlameProof(which_proof = i, session_key = skey, blame_reason = 'input does not match blockchain: ' + e.args[0],
+                                                   need_lookup_blockchain = True))
+            except Exception as e:
+                self.print_error(f"verified an input internally, but was unable to check it against blockchain: {repr(e)}")
+        self.print_error(f"checked {len(msg.proofs)} proofs, {len(inputs_to_check)} of them inputs")
 
         self.print_error("sending blames")
         self.send(pb.Blames(blames = blames))
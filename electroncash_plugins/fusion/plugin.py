@@ -34,8 +34,8 @@ import weakref
 
 from typing import Optional, Tuple
 
-from electroncash.address import Address, OpCodes
-from electroncash.bitcoin import COINBASE_MATURITY, TYPE_SCRIPT
+from electroncash.address import Address
+from electroncash.bitcoin import COINBASE_MATURITY
 from electroncash.plugins import BasePlugin, hook, daemon_command
 from electroncash.i18n import _, ngettext, pgettext
 from electroncash.util import profiler, PrintError, InvalidPassword
@@ -43,8 +43,9 @@ from electroncash import Network, networks, Transaction
 
 from .conf import Conf, Global
 from .fusion import Fusion, can_fuse_from, can_fuse_to, is_tor_port, MIN_TX_COMPONENTS
-from .server import FusionServer
+from .server import AsyncFusionServer, FusionServer, Params as ServerParams
 from .covert import limiter
+from .depth_index import FuzDepthIndex, MAX_DEPTH
 from .protocol import Protocol
 from .util import get_coin_name
 
@@ -481,9 +482,11 @@ class FusionPlugin(BasePlugin):
             wallet._fusions = weakref.WeakSet()
             # fusions that were auto-started.
             wallet._fusions_auto = weakref.WeakSet()
-            # caache: stores a map of txid -> fusion_depth (or False if txid is not a fuz tx)
-            wallet._cashfusion_is_fuz_txid_cache = dict()
-            # cache: stores a map of address -> fusion_depth if the address has fuz utxos
+            # index: txid -> fusion_depth for all wallet txs, kept up to date by
+            # the wallet_add_transaction / wallet_remove_transaction hooks
+            wallet._cashfusion_depth_index = FuzDepthIndex(wallet)
+            wallet._cashfusion_depth_index.rebuild()
+            # cache: stores a map of address -> max fusion_depth of its utxos (-1 if none are fused)
             wallet._cashfusion_address_cache = dict()
             # all accesses to the above must be protected by wallet.lock
 
@@ -506,7 +509,7 @@ class FusionPlugin(BasePlugin):
                 fusions = list(wallet._fusions)
                 del wallet._fusions
                 del wallet._fusions_auto
-                del wallet._cashfusion_is_fuz_txid_cache
+                del wallet._cashfusion_depth_index
                 del wallet._cashfusion_address_cache
         except AttributeError:
             pass
@@ -660,7 +663,8 @@ class FusionPlugin(BasePlugin):
         if self.fusion_server:
             raise RuntimeError("server already running")
         donation_address = (isinstance(donation_address, Address) and donation_address) or None
-        self.fusion_server = FusionServer(self.config, network, bindhost, port, upnp = upnp, announcehost = announcehost, donation_address = donation_address)
+        server_class = AsyncFusionServer if ServerParams.server_asyncio else FusionServer
+        self.fusion_server = server_class(self.config, network, bindhost, port, upnp = upnp, announcehost = announcehost, donation_address = donation_address)
         self.fusion_server.start()
         return self.fusion_server.host, self.fusion_server.port
 
@@ -699,96 +703,19 @@ class FusionPlugin(BasePlugin):
         """ Returns True if the coin in question is definitely a CashFusion coin (uses heuristic matching),
         or False if the coin in question is not from a CashFusion tx. Returns None if the tx for the coin
         is not (yet) known to the wallet (None == inconclusive answer, caller may wish to try again later).
-        If require_depth is > 0, check recursively; will return True if all ancestors of the coin
-        up to require_depth are also CashFusion transactions belonging to this wallet.
+        If require_depth is > 0, will return True only if all wallet ancestors of the coin up to
+        require_depth are also CashFusion transactions belonging to this wallet.
+
+        This is a lookup in the wallet's FuzDepthIndex, which is maintained as transactions are
+        added to the wallet.
 
         Precondition: wallet must be a fusion wallet. """
 
-        require_depth = min(max(0, require_depth), 900)  # paranoia: clamp to [0, 900]
-
-        cache = wallet._cashfusion_is_fuz_txid_cache
-        assert isinstance(cache, dict)
-        txid = coin['prevout_hash']
-        # check cache, if cache hit, return answer and avoid the lookup below
-        cached_val = cache.get(txid, None)
-        if cached_val is not None:
-            # cache stores either False, or a depth for which the predicate is true
-            if cached_val is False:
-                return False
-            elif cached_val >= require_depth:
-                return True
-
-        my_addresses_seen = set()
-
-        def check_is_fuz_tx():
-            tx = wallet.transactions.get(txid, None)
-            if tx is None:
-                # Not found in wallet.transactions so its fuz status is as yet "unknown". Indicate this.
-                return None
-            inputs = tx.inputs()
-            outputs = tx.outputs()
-            token_datas = tx.token_datas()
-            if any(td is not None for td in token_datas):
-                # A CashToken-containing txn can never be CashFusion
-                return False
-            # We expect: OP_RETURN (4) FUZ\x00
-            fuz_prefix = bytes((OpCodes.OP_RETURN, len(Protocol.FUSE_ID))) + Protocol.FUSE_ID
-            # Step 1 - does it have the proper OP_RETURN lokad prefix?
-            for typ, dest, amt in outputs:
-                if amt == 0 and typ == TYPE_SCRIPT and dest.script.startswith(fuz_prefix):
-                    break  # lokad found, proceed to Step 2 below
-            else:
-                # Nope, lokad prefix not found
-                return False
-            # Step 2 - are at least 1 of the inputs from me? (DoS prevention measure)
-            for inp in inputs:
-                inp_addr = inp.get('address', None)
-                if inp_addr is not None and (inp_addr in my_addresses_seen or wallet.is_mine(inp_addr)):
-                    my_addresses_seen.add(inp_addr)
-                    if require_depth == 0:
-                        return True  # This transaction is a CashFusion tx
-                    # [Optional] Step 3 - Check if all ancestors up to required_depth are also fusions
-                    if not FusionPlugin.is_fuz_coin(wallet, inp, require_depth=require_depth-1):
-                        # require_depth specified and not all required_depth parents were CashFusion
-                        return False
-            if my_addresses_seen:
-                # require_depth > 0: This tx + all wallet ancestors were CashFusion transactions up to require_depth
-                return True
-            # Failure -- this tx has the lokad but no inputs are "from me".
-            wallet.print_error(f"CashFusion: txid \"{txid}\" has a CashFusion-style OP_RETURN but none of the "
-                               f"inputs are from this wallet. This is UNEXPECTED!")
-            return False
-        # /check_is_fuz_tx
-
-        answer = check_is_fuz_tx()
-        if isinstance(answer, bool):
-            # maybe cache the answer if it's a definitive answer True/False
-            if require_depth == 0:
-                # we got an answer for this coin's tx itself
-                if not answer:
-                    cache[txid] = False
-                elif not cached_val:
-                    # only set the cached val if it was missing previously, to avoid overwriting higher values
-                    cache[txid] = 0
-            elif answer and (cached_val is None or cached_val < require_depth):
-                # indicate true up to the depth we just checked
-                cache[txid] = require_depth
-            elif not answer and isinstance(cached_val, int) and cached_val >= require_depth:
-                # this should never happen
-                wallet.print_error(f"CashFusion: WARNING txid \"{txid}\" has inconsistent state in "
-                                   f"the _cashfusion_is_fuz_txid_cache")
-            if answer:
-                # remember this address as being a "fuzed" address and cache the positive reply
-                cache2 = wallet._cashfusion_address_cache
-                assert isinstance(cache2, dict)
-                addr = coin.get('address', None)
-                if addr:
-                    my_addresses_seen.add(addr)
-                for addr in my_addresses_seen:
-                    depth = cache2.get(addr, None)
-                    if depth is None or depth < require_depth:
-                        cache2[addr] = require_depth
-        return answer
+        require_depth = min(max(0, require_depth), MAX_DEPTH)  # paranoia: clamp to [0, 900]
+        depth = wallet._cashfusion_depth_index.get_depth(coin['prevout_hash'])
+        if depth is None:
+            return None
+        return depth >= require_depth
 
     @classmethod
     def get_coin_fuz_count(cls, wallet, coin, *, require_depth=0):
@@ -801,15 +728,10 @@ class FusionPlugin(BasePlugin):
         Precondition: wallet must be a fusion wallet. """
 
         require_depth = min(max(require_depth, 0), MAX_LIMIT_FUSE_DEPTH - 1)
-        cached_ct = wallet._cashfusion_is_fuz_txid_cache.get(coin['prevout_hash'])
-        if isinstance(cached_ct, int) and cached_ct >= require_depth:
-            return cached_ct + 1
-        ret = 0
-        for i in range(cached_ct or 0, require_depth + 1, 1):
-            ret = i
-            if not cls.is_fuz_coin(wallet, coin, require_depth=i):
-                break
-        return ret
+        depth = wallet._cashfusion_depth_index.get_depth(coin['prevout_hash'])
+        if depth is None:
+            return 0
+        return min(depth, require_depth) + 1
 
     @classmethod
     def is_fuz_address(cls, wallet, address, *, require_depth=0):
@@ -828,16 +750,32 @@ class FusionPlugin(BasePlugin):
         cache = wallet._cashfusion_address_cache
         assert isinstance(cache, dict)
         cached_val = cache.get(address, None)
-        if cached_val is not None and cached_val >= require_depth:
-            return True
-
-        utxos = wallet.get_addr_utxo(address)
-        for coin in utxos.values():
-            if cls.is_fuz_coin(wallet, coin, require_depth=require_depth):
-                if cached_val is None or cached_val < require_depth:
-                    cache[address] = require_depth
-                return True
-        return False
+        if cached_val is None:
+            # cache the maximal depth over all of this address's utxos (-1 if none are fused)
+            index = wallet._cashfusion_depth_index
+            cached_val = -1
+            for coin in wallet.get_addr_utxo(address).values():
+                depth = index.get_depth(coin['prevout_hash'])
+                if depth is not None and depth > cached_val:
+                    cached_val = depth
+            cache[address] = cached_val
+        return cached_val >= require_depth
+
+    @hook
+    def wallet_add_transaction(self, wallet, tx_hash, tx):
+        """ Called by the wallet with wallet.lock held. """
+        index = getattr(wallet, '_cashfusion_depth_index', None)
+        if index is not None:
+            index.add_tx(tx_hash, tx)
+            wallet._cashfusion_address_cache.clear()
+
+    @hook
+    def wallet_remove_transaction(self, wallet, tx_hash):
+        """ Called by the wallet with wallet.lock held. """
+        index = getattr(wallet, '_cashfusion_depth_index', None)
+        if index is not None:
+            index.remove_tx(tx_hash)
+            wallet._cashfusion_address_cache.clear()
 
     @staticmethod
     def on_wallet_transaction(event, *args):
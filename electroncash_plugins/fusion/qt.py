@@ -1490,7 +1490,7 @@ class WalletSettingsDialog(WindowModalDialog):
                 chk.setToolTip(tooltip)
             # Coins tab may need redisplay if we changed these settings
             if prevval != newval:
-                main_window.utxo_list.update()
+                main_window.utxo_list.update_all()
         self.refresh()
 
     def clicked_confirmed_only(self, checked):
@@ -30,12 +30,17 @@ support, however a server admin may run an SSL server proxy such as nginx for
 that purpose.
 """
 
+import asyncio
+import concurrent.futures
+import multiprocessing
 import secrets
 import sys
 import threading
 import time
 import traceback
-from collections import defaultdict
+import weakref
+from collections import defaultdict, deque
+from contextlib import suppress
 
 import electroncash.schnorr as schnorr
 from electroncash.address import Address
@@ -43,12 +48,14 @@ from electroncash import networks
 from electroncash.util import PrintError, ServerError, TimeoutException
 from . import fusion_pb2 as pb
 from . import compatibility
-from .comms import send_pb, recv_pb, ClientHandlerThread, GenericServer, get_current_genesis_hash
+from .comms import (send_pb, recv_pb, send_pb_async, recv_pb_async, ClientHandlerThread, GenericServer,
+                    AsyncClientHandler, AsyncGenericServer, get_current_genesis_hash)
+from .connection import BlockingConnection
 from .protocol import Protocol
 from .util import (FusionError, sha256, calc_initial_hash, calc_round_hash, gen_keypair, tx_from_components,
                    rand_position)
 from .validation import (check_playercommit, check_covert_component, validate_blame, ValidationError,
-                         check_input_electrumx)
+                         InputValidator)
 
 # Resistor "E series" values -- round numbers that are almost geometrically uniform
 E6  = [1.0, 1.5, 2.2, 3.3, 4.7, 6.8]
@@ -96,6 +103,17 @@ class Params:
     # But don't start a fusion if it has only been above min_clients for a short time (unless pool is full).
     start_time_min = 400
 
+    # How many precomputed blind nonces to keep in stock; enough for two full-size rounds.
+    blind_nonce_pool_size = 2 * max_clients * num_components
+
+    # Serve covert connections from an asyncio event loop, rather than with a thread per connection.
+    covert_asyncio = True
+    # Most covert connections to accept at once, per fusion. Each player makes num_components + spares connections.
+    covert_max_connections = 2 * max_clients * (num_components + Protocol.COVERT_CONNECT_SPARES)
+    # Serve clients waiting in the pools from an asyncio event loop, rather than with a thread per client.
+    # (Either way, the rounds of a fusion are run with a thread per player.)
+    server_asyncio = True
+
     # whether to print a lot of logs
     noisy = False
 
@@ -119,6 +137,91 @@ def clientjob_goodbye(client, text):
         client.send_error(text)
     raise client.Disconnect
 
+def _gen_blind_nonces(n):
+    # Runs in BlindNoncePool worker processes, so it must be a module-level function.
+    return [schnorr.BlindSigner.gen_nonce() for _ in range(n)]
+
+class BlindNoncePool(PrintError):
+    """ Keeps a stock of precomputed blind signing nonces (see
+    schnorr.BlindSigner.gen_nonce), refilled in the background by worker
+    processes, so that starting a round doesn't have to wait on
+    (players * num_components) elliptic curve multiplications.
+
+    Every nonce is handed out only once. If worker processes can't be used on
+    this platform, nonces are generated in the background thread instead. """
+    batch_size = 50
+
+    def __init__(self, target_size, max_workers = None):
+        self.target_size = target_size
+        self.nonces = deque()  # append / popleft are atomic
+        self.refill_ev = threading.Event()
+        self.stopping = False
+        try:
+            # 'spawn' since forking a process that is running many threads may deadlock the child
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers, mp_context = multiprocessing.get_context('spawn'))
+        except (ImportError, NotImplementedError, OSError, ValueError) as e:
+            self.print_error(f"worker processes unavailable ({e!r}), generating nonces in-thread")
+            self.executor = None
+        self.thread = threading.Thread(target = self._refill_loop, name = 'BlindNoncePool', daemon = True)
+        self.refill_ev.set()
+        self.thread.start()
+
+    def _generate(self, n):
+        """ Generate n nonces, split up among the worker processes if possible. """
+        batches = [self.batch_size] * (n // self.batch_size)
+        if n % self.batch_size:
+            batches.append(n % self.batch_size)
+        if self.executor is not None:
+            try:
+                return [nonce for batch in self.executor.map(_gen_blind_nonces, batches) for nonce in batch]
+            except (concurrent.futures.process.BrokenProcessPool, RuntimeError) as e:
+                # RuntimeError if shut down
+                if self.stopping:
+                    raise
+                self.print_error(f"worker processes failed ({e!r}), generating nonces in-thread")
+                self.executor = None
+        return _gen_blind_nonces(n)
+
+    def _refill_loop(self):
+        try:
+            while not self.stopping:
+                self.refill_ev.wait()
+                self.refill_ev.clear()
+                while not self.stopping and len(self.nonces) < self.target_size:
+                    want = min(self.target_size - len(self.nonces), self.batch_size * 8)
+                    self.nonces.extend(self._generate(want))
+        except Exception:
+            if not self.stopping:
+                self.print_error('failed with exception')
+                traceback.print_exc(file=sys.stderr)
+
+    def get_signers(self, n):
+        """ Returns a list of n new BlindSigner objects. Uses stocked nonces
+        first, and generates any shortfall on the spot. """
+        nonces = []
+        try:
+            while len(nonces) < n:
+                nonces.append(self.nonces.popleft())
+        except IndexError:
+            short = n - len(nonces)
+            self.print_error(f"pool ran dry, generating {short} nonces on demand")
+            nonces.extend(self._generate(short))
+        self.refill_ev.set()
+        return [schnorr.BlindSigner(nonce) for nonce in nonces]
+
+    def stop(self):
+        self.stopping = True
+        self.refill_ev.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait = False)
+        self.nonces.clear()
+
+def clientjob_blindsign(client, covert_priv):
+    # Sign in the client's own thread, so the controller is not held up by this.
+    scalars = [b.sign(covert_priv, e) for b,e in zip(client.blinds, client.blind_sig_requests)]
+    del client.blinds, client.blind_sig_requests
+    client.send(pb.BlindSigResponses(scalars = scalars))
+
 class ClientThread(ClientHandlerThread):
     """Basic thread per connected client."""
     def recv(self, *expected_msg_names, timeout=Protocol.STANDARD_TIMEOUT):
@@ -221,22 +324,45 @@ class WaitingPool:
         for client in moved:
             self.queue.remove(client)
 
-class FusionServer(GenericServer):
-    """Server for clients waiting to start a fusion. New clients get a
-    ClientThread made for them, and they are put into the waiting pools.
-    Once a Fusion thread is started, the ClientThreads are passed over to
-    a FusionController to run the rounds."""
-    def __init__(self, config, network, bindhost, port, upnp = None, announcehost = None, donation_address = None):
+class ClientAsync(AsyncClientHandler):
+    """ The asyncio counterpart of ClientThread, for clients waiting in the
+    pools of an AsyncFusionServer. """
+    async def recv(self, *expected_msg_names, timeout=Protocol.STANDARD_TIMEOUT):
+        submsg, mtype = await recv_pb_async(self.connection, pb.ClientMessage, *expected_msg_names, timeout=timeout)
+        return submsg
+
+    async def send(self, submsg, timeout=Protocol.STANDARD_TIMEOUT):
+        await send_pb_async(self.connection, pb.ServerMessage, submsg, timeout=timeout)
+
+    async def send_error(self, msg):
+        await self.send(pb.Error(message = msg), timeout=Protocol.STANDARD_TIMEOUT)
+
+    async def error(self, msg):
+        await self.send_error(msg)
+        raise FusionError(f'Rejected client: {msg}')
+
+class _JoinRejection(Exception):
+    """ Raised by FusionServerMixin methods when the waiting client should
+    get an error reply (client.error). """
+
+class FusionServerMixin:
+    """Server for clients waiting to start a fusion. New clients are put into
+    the waiting pools. Once a fusion is started, its clients are passed over
+    to a FusionController (with its own thread) to run the rounds.
+
+    The waiting pool handling is shared between the thread-per-client
+    FusionServer and the asyncio based AsyncFusionServer."""
+    def _init_fusion(self, config, network, announcehost, donation_address):
         assert network
         assert isinstance(donation_address, (Address, type(None)))
         compatibility.check()
-        super().__init__(bindhost, port, ClientThread, upnp = upnp)
         self.config = config
         self.network = network
         self.is_testnet = networks.net.TESTNET
         self.announcehost = announcehost
         self.donation_address = donation_address
         self.waiting_pools = {t: WaitingPool(Params.min_clients, Params.max_tier_client_tags) for t in Params.tiers}
+        self.nonce_pool = BlindNoncePool(Params.blind_nonce_pool_size)
         self.t_last_fuse = time.monotonic() # when the last fuse happened; as a placeholder, set this to startup time.
         self.reset_timer()
 
@@ -245,6 +371,7 @@ class FusionServer(GenericServer):
             super().run()
         finally:
             self.waiting_pools.clear() # gc clean
+            self.nonce_pool.stop()
 
     def reset_timer(self, ):
         """ Scan pools for the favoured fuse:
@@ -297,16 +424,17 @@ class FusionServer(GenericServer):
 
             # Kick off the fusion.
             rng.shuffle(chosen_clients)
-            fusion = FusionController(self. network, tier, chosen_clients, self.bindhost, upnp = self.upnp, announcehost = self.announcehost)
-            fusion.start()
+            self.launch_fusion(tier, chosen_clients)
             return len(chosen_clients)
 
-    def new_client_job(self, client):
-        client_ip = client.connection.socket.getpeername()[0]
+    def launch_fusion(self, tier, clients):
+        fusion = FusionController(self.network, tier, clients, self.bindhost, upnp = self.upnp, announcehost = self.announcehost,
+                                  nonce_pool = self.nonce_pool)
+        fusion.start()
 
-        msg = client.recv('clienthello')
+    def check_hello(self, client, msg):
         if msg.version != Protocol.VERSION:
-            client.error("Mismatched protocol version, please upgrade")
+            raise _JoinRejection("Mismatched protocol version, please upgrade")
 
         if msg.genesis_hash:
             if msg.genesis_hash != get_current_genesis_hash():
@@ -314,36 +442,30 @@ class FusionServer(GenericServer):
                 # missing. However, if the client declares the genesis_hash, we
                 # do indeed disallow them connecting if they are e.g. on testnet
                 # and we are mainnet, etc.
-                client.error("This server is on a different chain, please switch servers")
+                raise _JoinRejection("This server is on a different chain, please switch servers")
         else:
             client.print_error("👀 No genesis hash declared by client, we'll let them slide...")
 
-
-        if self.stopping:
-            return
-
+    def make_server_hello(self):
         donation_address = ''
         if isinstance(self.donation_address, Address):
             donation_address = self.donation_address.to_full_ui_string()
 
-        client.send(pb.ServerHello( num_components = Params.num_components,
-                                    component_feerate = Params.component_feerate,
-                                    min_excess_fee = Params.min_excess_fee,
-                                    max_excess_fee = Params.max_excess_fee,
-                                    tiers = Params.tiers,
-                                    donation_address = donation_address
-                                    ))
-
-        # We allow a long timeout for clients to choose their pool.
-        msg = client.recv('joinpools', timeout=120)
+        return pb.ServerHello( num_components = Params.num_components,
+                               component_feerate = Params.component_feerate,
+                               min_excess_fee = Params.min_excess_fee,
+                               max_excess_fee = Params.max_excess_fee,
+                               tiers = Params.tiers,
+                               donation_address = donation_address
+                               )
+
+    def check_joinpools(self, client, client_ip, msg):
+        """ Sets up client.tags, and returns the waiting pools the client asked
+        for (None if we are stopping). """
         if len(msg.tiers) == 0:
-            client.error("No tiers")
+            raise _JoinRejection("No tiers")
         if len(msg.tags) > 5:
-            client.error("Too many tags")
-
-        # Event for signalling us that a pool started.
-        start_ev = threading.Event()
-        client.start_ev = start_ev
+            raise _JoinRejection("Too many tags")
 
         if self.is_testnet or client_ip.startswith('127.'):
             # localhost is whitelisted to allow unlimited access
@@ -355,80 +477,252 @@ class FusionServer(GenericServer):
 
         for tag in msg.tags:
             if len(tag.id) > 20:
-                client.error("Tag id too long")
+                raise _JoinRejection("Tag id too long")
             if not (0 < tag.limit < 6):
-                client.error("Tag limit out of range")
+                raise _JoinRejection("Tag limit out of range")
             ip = '' if tag.no_ip else client_ip
             client.tags.append(ClientTag(ip, tag.id, tag.limit))
 
-        try:
-            mytierpools = {t: self.waiting_pools[t] for t in msg.tiers}
-        except KeyError:
+        mytierpools = dict()
+        for t in msg.tiers:
+            try:
+                mytierpools[t] = self.waiting_pools[t]
+            except KeyError:
+                if self.stopping:
+                    return None
+                raise _JoinRejection(f"Invalid tier selected: {t}")
+        return mytierpools
+
+    def add_to_pools(self, client, mytierpools):
+        """ Returns False if the client has nothing to wait for: we are
+        stopping, or its addition filled up a pool and started a fusion. """
+        mytiers = list(mytierpools)
+        rng.shuffle(mytiers) # shuffle the adding order so that if filling more than one pool, we don't have bias towards any particular tier
+        with self.lock:
             if self.stopping:
-                return
-            client.error(f"Invalid tier selected: {t}")
+                return False
+            # add this client to waiting pools
+            for pool in mytierpools.values():
+                res = pool.check_add(client)
+                if res is not None:
+                    raise _JoinRejection(res)
+            for t in mytiers:
+                pool = mytierpools[t]
+                pool.add(client)
+                if len(pool.pool) >= Params.max_clients:
+                    # pool filled up to the maximum size, so start immediately
+                    self.start_fuse(t)
+                    return False
+
+        # we have added to pools, which may have changed the favoured tier
+        self.reset_timer()
+        return True
+
+    def get_tier_statuses(self, client, mytierpools):
+        """ Returns the statuses to send to a waiting client, or None once the
+        client has stopped waiting (if it is time, this starts the fusion). """
+        inftime = float('inf')
+        with self.lock:
+            if self.stopping or client.start_ev.is_set():
+                return None
+            tnow = time.monotonic()
+
+            # scan through tiers and collect statuses, also check start times.
+            statuses = dict()
+            tfill_thresh = tnow - Params.start_time_max
+            for t, pool in mytierpools.items():
+                if client not in pool.pool:
+                    continue
+                status = pb.TierStatusUpdate.TierStatus(players = len(pool.pool), min_players = Params.min_clients)
+
+                remtime = inftime
+                if pool.fill_time is not None:
+                    # a non-favoured pool will start eventually
+                    remtime = pool.fill_time - tfill_thresh
+                if t == self.tier_best:
+                    # this is the favoured pool, can start at a special time
+                    remtime = min(remtime, self.tier_best_starttime - tnow)
+                if remtime <= 0:
+                    self.start_fuse(t)
+                    return None
+                elif remtime != inftime:
+                    status.time_remaining = round(remtime)
+                statuses[t] = status
+            return statuses
+
+    def leave_pools(self, client, mytierpools):
+        """ Remove client from waiting pools on failure (on success, we are
+        already removed; on stop we don't care.) """
+        with self.lock:
+            for t, pool in mytierpools.items():
+                if pool.remove(client):
+                    pool.try_move_from_queue()
+            if self.tier_best in mytierpools:
+                # we left from best pool, so it might not be best anymore.
+                self.reset_timer()
+
+class FusionServer(FusionServerMixin, GenericServer):
+    """Waiting server with a thread per connected client; see
+    FusionServerMixin. The ClientThreads are passed over as-is to the
+    FusionController."""
+    def __init__(self, config, network, bindhost, port, upnp = None, announcehost = None, donation_address = None):
+        super().__init__(bindhost, port, ClientThread, upnp = upnp)
+        self._init_fusion(config, network, announcehost, donation_address)
+
+    def new_client_job(self, client):
+        client_ip = client.connection.socket.getpeername()[0]
+
+        msg = client.recv('clienthello')
         try:
-            mytiers = list(mytierpools)
-            rng.shuffle(mytiers) # shuffle the adding order so that if filling more than one pool, we don't have bias towards any particular tier
-            with self.lock:
-                if self.stopping:
-                    return
-                # add this client to waiting pools
-                for pool in mytierpools.values():
-                    res = pool.check_add(client)
-                    if res is not None:
-                        client.error(res)
-                for t in mytiers:
-                    pool = mytierpools[t]
-                    pool.add(client)
-                    if len(pool.pool) >= Params.max_clients:
-                        # pool filled up to the maximum size, so start immediately
-                        self.start_fuse(t)
-                        return
-
-            # we have added to pools, which may have changed the favoured tier
-            self.reset_timer()
+            self.check_hello(client, msg)
+        except _JoinRejection as e:
+            client.error(e.args[0])
+
+        if self.stopping:
+            return
+
+        client.send(self.make_server_hello())
+
+        # We allow a long timeout for clients to choose their pool.
+        msg = client.recv('joinpools', timeout=120)
 
-            inftime = float('inf')
+        # Event for signalling us that a pool started.
+        client.start_ev = threading.Event()
+
+        try:
+            mytierpools = self.check_joinpools(client, client_ip, msg)
+        except _JoinRejection as e:
+            client.error(e.args[0])
+        if mytierpools is None:
+            return
+        try:
+            try:
+                if not self.add_to_pools(client, mytierpools):
+                    return
+            except _JoinRejection as e:
+                client.error(e.args[0])
 
             while True:
-                with self.lock:
-                    if self.stopping or start_ev.is_set():
-                        return
-                    tnow = time.monotonic()
-
-                    # scan through tiers and collect statuses, also check start times.
-                    statuses = dict()
-                    tfill_thresh = tnow - Params.start_time_max
-                    for t, pool in mytierpools.items():
-                        if client not in pool.pool:
-                            continue
-                        status = pb.TierStatusUpdate.TierStatus(players = len(pool.pool), min_players = Params.min_clients)
-
-                        remtime = inftime
-                        if pool.fill_time is not None:
-                            # a non-favoured pool will start eventually
-                            remtime = pool.fill_time - tfill_thresh
-                        if t == self.tier_best:
-                            # this is the favoured pool, can start at a special time
-                            remtime = min(remtime, self.tier_best_starttime - tnow)
-                        if remtime <= 0:
-                            self.start_fuse(t)
-                            return
-                        elif remtime != inftime:
-                            status.time_remaining = round(remtime)
-                        statuses[t] = status
+                statuses = self.get_tier_statuses(client, mytierpools)
+                if statuses is None:
+                    return
                 client.send(pb.TierStatusUpdate(statuses = statuses))
-                start_ev.wait(2)
+                client.start_ev.wait(2)
         except:
-            # Remove client from waiting pools on failure (on success, we are already removed; on stop we don't care.)
-            with self.lock:
-                for t, pool in mytierpools.items():
-                    if pool.remove(client):
-                        pool.try_move_from_queue()
-                if self.tier_best in mytierpools:
-                    # we left from best pool, so it might not be best anymore.
-                    self.reset_timer()
+            self.leave_pools(client, mytierpools)
+            raise
+
+class AsyncFusionServer(FusionServerMixin, AsyncGenericServer):
+    """Waiting server serving all waiting clients from one asyncio event loop;
+    see FusionServerMixin. Clients can wait in the pools for a long time, so
+    this keeps the number of threads independent of the number of waiting
+    clients.
+
+    The rounds are not run in the event loop: when a fusion starts, each
+    chosen client's connection is handed over (through a BlockingConnection)
+    to a ClientThread for the FusionController. The round jobs do blocking
+    work (validation, blind signing, blockchain lookups) that would stall
+    the loop, and this way they only take a thread per player for the
+    duration of a fusion, with at most Params.max_clients players each."""
+    def __init__(self, config, network, bindhost, port, upnp = None, announcehost = None, donation_address = None,
+                 max_connections = None, max_connections_per_ip = None):
+        super().__init__(bindhost, port, ClientAsync, upnp = upnp, max_connections = max_connections,
+                         max_connections_per_ip = max_connections_per_ip)
+        self._init_fusion(config, network, announcehost, donation_address)
+        self.fusion_clients = weakref.WeakSet()
+
+    def stop(self, reason = None):
+        """ Thread-safe. """
+        for c in list(self.fusion_clients):
+            c.kill(reason = reason)
+        super().stop(reason)
+
+    async def wait_detached(self):
+        # Give the killed fusion clients a moment to send their last message.
+        for _ in range(50):
+            if not any(c.is_alive() for c in list(self.fusion_clients)):
+                break
+            await asyncio.sleep(0.1)
+
+    def start_fuse(self, tier):
+        """ Thread-safe: when called from another thread (e.g. by the plugin's
+        commands or GUI), the fusion is started within the event loop, and
+        this waits for that. """
+        if threading.current_thread() is self:
+            return super().start_fuse(tier)
+        with self.lock:
+            loop = self.loop
+        if loop is None:
+            # not running, so there's no loop to race with
+            return super().start_fuse(tier)
+        coro = self._start_fuse_in_loop(tier)
+        try:
+            fut = asyncio.run_coroutine_threadsafe(coro, loop)
+        except RuntimeError:
+            # loop closed meanwhile
+            coro.close()
+            return super().start_fuse(tier)
+        return fut.result(10)
+
+    async def _start_fuse_in_loop(self, tier):
+        return super().start_fuse(tier)
+
+    def launch_fusion(self, tier, clients):
+        # Called within the event loop, from the waiting job of one of the clients.
+        threads = []
+        for c in clients:
+            c.detached = True
+            self.spawned_clients.discard(c)
+            t = ClientThread(BlockingConnection(c.connection, self.loop))
+            t.noisy = c.noisy
+            t.peername = c.peername
+            self.fusion_clients.add(t)
+            t.start()
+            threads.append(t)
+        super().launch_fusion(tier, threads)
+
+    async def new_client_job(self, client):
+        client_ip = client.connection.get_peername()[0]
+
+        msg = await client.recv('clienthello')
+        try:
+            self.check_hello(client, msg)
+        except _JoinRejection as e:
+            await client.error(e.args[0])
+
+        if self.stopping:
+            return
+
+        await client.send(self.make_server_hello())
+
+        # We allow a long timeout for clients to choose their pool.
+        msg = await client.recv('joinpools', timeout=120)
+
+        # Event for signalling us that a pool started.
+        client.start_ev = asyncio.Event()
+
+        try:
+            mytierpools = self.check_joinpools(client, client_ip, msg)
+        except _JoinRejection as e:
+            await client.error(e.args[0])
+        if mytierpools is None:
+            return
+        try:
+            try:
+                if not self.add_to_pools(client, mytierpools):
+                    return
+            except _JoinRejection as e:
+                await client.error(e.args[0])
+
+            while True:
+                statuses = self.get_tier_statuses(client, mytierpools)
+                if statuses is None:
+                    return
+                await client.send(pb.TierStatusUpdate(statuses = statuses))
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(client.start_ev.wait(), 2)
+        except:
+            self.leave_pools(client, mytierpools)
             raise
 
 class ResultsCollector:
@@ -469,9 +763,10 @@ class ResultsCollector:
 
 class FusionController(threading.Thread, PrintError):
     """ This controls the Fusion rounds running from server side. """
-    def __init__(self, network, tier, clients, bindhost, upnp = None, announcehost = None):
+    def __init__(self, network, tier, clients, bindhost, upnp = None, announcehost = None, nonce_pool = None):
         super().__init__(name="FusionController")
         self.network = network
+        self.nonce_pool = nonce_pool
         self.tier = tier
         self.clients = list(clients)
         self.bindhost = bindhost
@@ -492,7 +787,10 @@ class FusionController(threading.Thread, PrintError):
 
     def run (self, ):
         self.print_error(f'Starting fusion with {len(self.clients)} players at tier={self.tier}')
-        covert_server = CovertServer(self.bindhost, upnp = self.upnp)
+        if Params.covert_asyncio:
+            covert_server = AsyncCovertServer(self.bindhost, upnp = self.upnp, max_connections = Params.covert_max_connections)
+        else:
+            covert_server = CovertServer(self.bindhost, upnp = self.upnp)
         try:
             annhost = covert_server.host if self.announcehost is None else self.announcehost
             annhost_b = annhost.encode('ascii')
@@ -548,9 +846,14 @@ class FusionController(threading.Thread, PrintError):
         # start to accept covert components
         covert_server.start_components(round_pubkey, Params.component_feerate)
 
-        # generate blind nonces (slow!)
-        for c in self.clients:
-            c.blinds = [schnorr.BlindSigner() for _co in range(Params.num_components)]
+        # get blind nonces (slow, unless they were precomputed by the pool!)
+        if self.nonce_pool is not None:
+            signers = self.nonce_pool.get_signers(len(self.clients) * Params.num_components)
+        else:
+            signers = [schnorr.BlindSigner() for _ in range(len(self.clients) * Params.num_components)]
+        for i, c in enumerate(self.clients):
+            c.blinds = signers[i * Params.num_components : (i + 1) * Params.num_components]
+        del signers
 
         lock = threading.Lock()
         seen_salthashes = set()
@@ -606,11 +909,9 @@ class FusionController(threading.Thread, PrintError):
         rng.shuffle(commitment_master_list)
         all_commitments = tuple(commit for commit,ci,cj in commitment_master_list)
 
-        # Send blind signatures
+        # Send blind signatures; each client's are made in parallel, in its own thread
         for c in self.clients:
-            scalars = [b.sign(covert_priv, e) for b,e in zip(c.blinds, c.blind_sig_requests)]
-            c.addjob(clientjob_send, pb.BlindSigResponses(scalars = scalars))
-            del c.blinds, c.blind_sig_requests
+            c.addjob(clientjob_blindsign, covert_priv)
         del results, collector
 
         # Sleep a bit before uploading commitments, as clients are doing this.
@@ -788,6 +1089,8 @@ class FusionController(threading.Thread, PrintError):
 
         live_clients = len(results)
         collector = ResultsCollector(live_clients, done_on_fail = False)
+        # Shared by all clients' jobs, so that the same address is only looked up once.
+        input_validator = InputValidator(self.network)
         def client_get_blames(client, myindex, proofs, collector):
             with collector:
                 # an in-place sort by source commitment idx removes ordering correlations about which client sent which proof
@@ -809,6 +1112,7 @@ class FusionController(threading.Thread, PrintError):
                 # checks against blockchain need to be done, perhaps even still
                 # running after run_round has exited. For this reason we try to
                 # not reference self.<variables> that may change.
+                inputs_to_check = []
                 for blame in msg.blames:
                     try:
                         encproof, src_commitment_idx, dest_key_idx, src_client = proofs[blame.which_proof]
@@ -837,9 +1141,16 @@ class FusionController(threading.Thread, PrintError):
                         continue
 
                     assert ret, 'expecting input component'
+                    inputs_to_check.append((ret, src_commitment_idx, src_client))
+
+                # Look up all the blamed inputs at once, then check them.
+                input_validator.prefetch(ret for ret, _, _ in inputs_to_check)
+                for ret, src_commitment_idx, src_client in inputs_to_check:
+                    if src_client.dead:
+                        continue
                     outpoint = ret.prev_txid[::-1].hex() + ':' + str(ret.prev_index)
                     try:
-                        check_input_electrumx(self.network, ret)
+                        input_validator.check(ret)
                     except ValidationError as e:
                         reason = f'{e.args[0]} ({outpoint})'
                         self.print_error(f"blaming[{src_commitment_idx}] for bad input: {reason}")
@@ -884,7 +1195,32 @@ class CovertClientThread(ClientHandlerThread):
         raise FusionError(f'Rejected client: {msg}')
 
 
-class CovertServer(GenericServer):
+class CovertClientAsync(AsyncClientHandler):
+    """ The asyncio counterpart of CovertClientThread. """
+    async def recv(self, *expected_msg_names, timeout=None):
+        submsg, mtype = await recv_pb_async(self.connection, pb.CovertMessage, *expected_msg_names, timeout=timeout)
+        return submsg, mtype
+
+    async def send(self, submsg, timeout=None):
+        await send_pb_async(self.connection, pb.CovertResponse, submsg, timeout=timeout)
+
+    async def send_ok(self,):
+        await self.send(pb.OK(), timeout=5)
+
+    async def send_error(self, msg):
+        await self.send(pb.Error(message = msg), timeout=5)
+
+    async def error(self, msg):
+        await self.send_error(msg)
+        raise FusionError(f'Rejected client: {msg}')
+
+
+class _CovertRejection(Exception):
+    """ Raised by CovertServerMixin.process_submission when the client should
+    get an error reply (client.error) rather than a ValidationError. """
+
+
+class CovertServerMixin:
     """
     Server for covert submissions. How it works:
     - Launch the server at any time. By default, will bind to an ephemeral port.
@@ -893,17 +1229,22 @@ class CovertServer(GenericServer):
     - Before start of covert signatures phase, owner calls start_signatures.
     - To signal the end of covert signatures phase, owner calls end_signatures, which returns a list of signatures (which will have None at positions of missing signatures).
     - To reset the server for a new round, call .reset(); to kill all connections, call .stop().
+
+    The protocol handling is shared between the thread-per-client CovertServer
+    and the asyncio based AsyncCovertServer.
     """
-    def __init__(self, bindhost, port=0, upnp = None):
-        super().__init__(bindhost, port, CovertClientThread, upnp = upnp)
+    def _init_covert(self):
         self.round_pubkey = None
+        # Incremented at the start of each phase, so that a connection can
+        # submit once per phase.
+        self.phase_num = 0
 
     def start_components(self, round_pubkey, feerate):
-        self.components = dict()
-        self.feerate = feerate
-        self.round_pubkey = round_pubkey
-        for c in self.spawned_clients:
-            c.got_submit = False
+        with self.lock:
+            self.components = dict()
+            self.feerate = feerate
+            self.round_pubkey = round_pubkey
+            self.phase_num += 1
 
     def end_components(self):
         with self.lock:
@@ -914,11 +1255,11 @@ class CovertServer(GenericServer):
     def start_signatures(self, sighashes, pubkeys):
         num_inputs = len(sighashes)
         assert num_inputs == len(pubkeys)
-        self.signatures = [None]*num_inputs
-        self.sighashes = sighashes
-        self.pubkeys = pubkeys
-        for c in self.spawned_clients:
-            c.got_submit = False
+        with self.lock:
+            self.signatures = [None]*num_inputs
+            self.sighashes = sighashes
+            self.pubkeys = pubkeys
+            self.phase_num += 1
 
     def end_signatures(self):
         with self.lock:
@@ -939,69 +1280,105 @@ class CovertServer(GenericServer):
         except AttributeError:
             pass
 
-    def new_client_job(self, client):
-        client.got_submit = False
-        while True:
-            msg, mtype = client.recv('component', 'signature', 'ping', timeout = COVERT_CLIENT_TIMEOUT)
-            if mtype == 'ping':
-                continue
-
-            if client.got_submit:
-                # We got a second submission before a new phase started. As
-                # an anti-spam measure we only allow one submission per connection
-                # per phase.
-                client.error('multiple submission in same phase')
+    def process_submission(self, client, msg, mtype):
+        """ Checks and records a 'component' or 'signature' message. Raises
+        ValidationError for bad submissions, and _CovertRejection for
+        submissions that are out of place. """
+        if client.submit_phase == self.phase_num:
+            # We got a second submission before a new phase started. As
+            # an anti-spam measure we only allow one submission per connection
+            # per phase.
+            raise _CovertRejection('multiple submission in same phase')
+
+        if mtype == 'component':
+            try:
+                round_pubkey = self.round_pubkey
+                feerate = self.feerate
+                _ = self.components
+            except AttributeError:
+                raise _CovertRejection('component submitted at wrong time')
+            sort_key, contrib = check_covert_component(msg, round_pubkey, feerate)
 
-            if mtype == 'component':
+            with self.lock:
                 try:
-                    round_pubkey = self.round_pubkey
-                    feerate = self.feerate
-                    _ = self.components
+                    self.components[msg.component] = (sort_key, contrib)
                 except AttributeError:
-                    client.error('component submitted at wrong time')
-                sort_key, contrib = check_covert_component(msg, round_pubkey, feerate)
+                    raise _CovertRejection('component submitted at wrong time')
+
+        else:
+            assert mtype == 'signature'
+            try:
+                sighash = self.sighashes[msg.which_input]
+                pubkey = self.pubkeys[msg.which_input]
+                existing_sig = self.signatures[msg.which_input]
+            except AttributeError:
+                raise _CovertRejection('signature submitted at wrong time')
+            except IndexError:
+                raise ValidationError('which_input too high')
+
+            sig = msg.txsignature
+            if len(sig) != 64:
+                raise ValidationError('signature length is wrong')
+
+            # It might be we already have this signature. This is fine
+            # since it might be a resubmission after ack failed delivery,
+            # but we don't allow it to consume our CPU power.
+
+            if sig != existing_sig:
+                if not schnorr.verify(pubkey, sig, sighash):
+                    raise ValidationError('bad transaction signature')
+                if existing_sig:
+                    # We received a distinct valid signature. This is not
+                    # allowed and we break the connection as a result.
+                    # Note that we could have aborted earlier but this
+                    # way third parties can't abuse us to find out the
+                    # timing of a given input's signature submission.
+                    raise ValidationError('conflicting valid signature')
 
                 with self.lock:
                     try:
-                        self.components[msg.component] = (sort_key, contrib)
+                        self.signatures[msg.which_input] = sig
                     except AttributeError:
-                        client.error('component submitted at wrong time')
+                        raise _CovertRejection('signature submitted at wrong time')
 
-            else:
-                assert mtype == 'signature'
-                try:
-                    sighash = self.sighashes[msg.which_input]
-                    pubkey = self.pubkeys[msg.which_input]
-                    existing_sig = self.signatures[msg.which_input]
-                except AttributeError:
-                    client.error('signature submitted at wrong time')
-                except IndexError:
-                    raise ValidationError('which_input too high')
-
-                sig = msg.txsignature
-                if len(sig) != 64:
-                    raise ValidationError('signature length is wrong')
-
-                # It might be we already have this signature. This is fine
-                # since it might be a resubmission after ack failed delivery,
-                # but we don't allow it to consume our CPU power.
-
-                if sig != existing_sig:
-                    if not schnorr.verify(pubkey, sig, sighash):
-                        raise ValidationError('bad transaction signature')
-                    if existing_sig:
-                        # We received a distinct valid signature. This is not
-                        # allowed and we break the connection as a result.
-                        # Note that we could have aborted earlier but this
-                        # way third parties can't abuse us to find out the
-                        # timing of a given input's signature submission.
-                        raise ValidationError('conflicting valid signature')
-
-                    with self.lock:
-                        try:
-                            self.signatures[msg.which_input] = sig
-                        except AttributeError:
-                            client.error('signature submitted at wrong time')
+        client.submit_phase = self.phase_num
+
+
+class CovertServer(CovertServerMixin, GenericServer):
+    """ Covert submission server with a thread per connection; see CovertServerMixin. """
+    def __init__(self, bindhost, port=0, upnp = None):
+        super().__init__(bindhost, port, CovertClientThread, upnp = upnp)
+        self._init_covert()
 
+    def new_client_job(self, client):
+        client.submit_phase = None
+        while True:
+            msg, mtype = client.recv('component', 'signature', 'ping', timeout = COVERT_CLIENT_TIMEOUT)
+            if mtype == 'ping':
+                continue
+            try:
+                self.process_submission(client, msg, mtype)
+            except _CovertRejection as e:
+                client.error(e.args[0])
             client.send_ok()
-            client.got_submit = True
+
+
+class AsyncCovertServer(CovertServerMixin, AsyncGenericServer):
+    """ Covert submission server serving all connections from one asyncio
+    event loop; see CovertServerMixin. A public server can see thousands of
+    covert connections per round. """
+    def __init__(self, bindhost, port=0, upnp = None, max_connections = None):
+        super().__init__(bindhost, port, CovertClientAsync, upnp = upnp, max_connections = max_connections)
+        self._init_covert()
+
+    async def new_client_job(self, client):
+        client.submit_phase = None
+        while True:
+            msg, mtype = await client.recv('component', 'signature', 'ping', timeout = COVERT_CLIENT_TIMEOUT)
+            if mtype == 'ping':
+                continue
+            try:
+                self.process_submission(client, msg, mtype)
+            except _CovertRejection as e:
+                await client.error(e.args[0])
+            await client.send_ok()
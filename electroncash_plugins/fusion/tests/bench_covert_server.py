@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -*- mode: python3 -*-
+# Part of the Electron Cash SPV Wallet
+# License: MIT
+"""
+Load test for the covert submission servers. Simulates many covert clients on
+localhost that all connect, ping, and then submit one (blank) component each,
+like players do during the covert components phase, and reports how long it
+took for the server to accept them all and how many threads it needed.
+
+Run from the top of the source tree with:
+
+    python3 -m electroncash_plugins.fusion.tests.bench_covert_server [--threaded] [clients ...]
+"""
+import asyncio
+import sys
+import threading
+import time
+
+from .. import fusion_pb2 as pb
+from ..comms import _wrap_pb, _unwrap_pb
+from ..connection import AsyncConnection
+from ..server import AsyncCovertServer, CovertServer
+from ..util import gen_keypair
+from .test_server import make_covert_component
+
+
+async def client(port, msgbytes, results, sem):
+    async with sem:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    conn = AsyncConnection(reader, writer, 60)
+    try:
+        await conn.send_message(_wrap_pb(pb.CovertMessage, pb.Ping()))
+        await conn.send_message(msgbytes)
+        _, mtype = _unwrap_pb(await conn.recv_message(), pb.CovertResponse, ('ok', 'error'))
+        results.append(mtype)
+    except Exception as e:
+        results.append(repr(e))
+    finally:
+        conn.close()
+
+
+async def run_clients(port, msgs):
+    results = []
+    # don't overflow the listen backlog with connection attempts
+    sem = asyncio.Semaphore(256)
+    await asyncio.gather(*(client(port, m, results, sem) for m in msgs))
+    return results
+
+
+def bench(server_class, nclients):
+    round_priv, _, round_pub = gen_keypair()
+    msgs = [_wrap_pb(pb.CovertMessage, make_covert_component(round_priv)) for _ in range(nclients)]
+
+    server = server_class('127.0.0.1')
+    server.noisy = False
+    server.start()
+    peak_threads = threading.active_count()
+    stop = False
+    def watch_threads():
+        nonlocal peak_threads
+        while not stop:
+            peak_threads = max(peak_threads, threading.active_count())
+            time.sleep(0.01)
+    watcher = threading.Thread(target=watch_threads, daemon=True)
+    watcher.start()
+    try:
+        server.start_components(round_pub, 1000)
+        t0 = time.perf_counter()
+        results = asyncio.run(run_clients(server.port, msgs))
+        t1 = time.perf_counter()
+        components = server.end_components()
+    finally:
+        stop = True
+        server.stop()
+        server.join()
+        watcher.join()
+    ok = results.count('ok')
+    print(f"{server_class.__name__:18s} {nclients:5d} clients: {t1-t0:6.2f} s, {ok} ok, {len(components)} components,"
+          f" peak threads {peak_threads}")
+
+
+def main(args):
+    server_classes = [AsyncCovertServer, CovertServer]
+    if '--threaded' in args:
+        args.remove('--threaded')
+        server_classes = [CovertServer]
+    elif '--async' in args:
+        args.remove('--async')
+        server_classes = [AsyncCovertServer]
+    client_counts = [int(a) for a in args] or [100, 500, 2000]
+    for nclients in client_counts:
+        for server_class in server_classes:
+            bench(server_class, nclients)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
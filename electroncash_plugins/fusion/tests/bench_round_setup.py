@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -*- mode: python3 -*-
+# Part of the Electron Cash SPV Wallet
+# License: MIT
+"""
+Benchmark of the CPU-bound part of FusionController.run_round's setup: making
+the blind nonces for every player's components, and blind signing their
+requests. Compares generating nonces on the spot (as done without a pool) to
+taking them from a pre-filled BlindNoncePool.
+
+Run from the top of the source tree with:
+
+    python3 -m electroncash_plugins.fusion.tests.bench_round_setup [players ...]
+"""
+import secrets
+import sys
+import time
+
+from electroncash import schnorr
+from ..server import BlindNoncePool, Params
+
+
+def sign_all(signers):
+    privkey = secrets.token_bytes(32)
+    for b in signers:
+        b.sign(privkey, secrets.token_bytes(32))
+
+
+def bench(players, pool):
+    n = players * Params.num_components
+
+    t0 = time.perf_counter()
+    signers = [schnorr.BlindSigner() for _ in range(n)]
+    t1 = time.perf_counter()
+    sign_all(signers)
+    t2 = time.perf_counter()
+
+    pool.target_size = n
+    pool.refill_ev.set()
+    while len(pool.nonces) < n:
+        time.sleep(0.01)
+    t3 = time.perf_counter()
+    signers = pool.get_signers(n)
+    t4 = time.perf_counter()
+    sign_all(signers)
+    t5 = time.perf_counter()
+    print(f"{players:4d} players ({n:5d} nonces): on the spot {1e3*(t1-t0):9.1f} ms,"
+          f" from pool {1e3*(t4-t3):7.1f} ms, (pool fill {1e3*(t3-t2):9.1f} ms),"
+          f" signing {1e3*(t2-t1):6.1f} ms / {1e3*(t5-t4):6.1f} ms")
+
+
+def main(args):
+    player_counts = [int(a) for a in args] or [5, 20, 60]
+    print(f"libsecp256k1: {'yes' if schnorr.seclib else 'no'}")
+    pool = BlindNoncePool(0)
+    try:
+        for players in player_counts:
+            bench(players, pool)
+    finally:
+        pool.stop()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -*- mode: python3 -*-
+# Part of the Electron Cash SPV Wallet
+# License: MIT
+import unittest
+
+from electroncash.address import Address, ScriptOutput
+from electroncash.bitcoin import TYPE_ADDRESS, TYPE_SCRIPT
+from electroncash.tests.helpers import FakeWallet
+from ..depth_index import FuzDepthIndex, FUZ_PREFIX
+
+MINE = Address.from_P2PKH_hash(b'\x01' * 20)
+OTHER = Address.from_P2PKH_hash(b'\x02' * 20)
+
+
+class FakeTx:
+
+    def __init__(self, parents, fuz=True, mine=True):
+        self._inputs = [{'prevout_hash': p, 'prevout_n': 0, 'address': MINE if mine else OTHER}
+                        for p in parents]
+        self._outputs = [(TYPE_ADDRESS, MINE, 1000)]
+        if fuz:
+            self._outputs.insert(0, (TYPE_SCRIPT, ScriptOutput(FUZ_PREFIX + b'\x00' * 32), 0))
+        self.raw = None
+
+    def inputs(self):
+        return self._inputs
+
+    def outputs(self):
+        return self._outputs
+
+    def token_datas(self):
+        return [None] * len(self._outputs)
+
+
+def txid(i):
+    return '%064x' % i
+
+
+class TestFuzDepthIndex(unittest.TestCase):
+
+    def make_chain(self, wallet, n, start=1):
+        """ A chain of n fuz txs, each spending the previous one; the first spends an unknown tx. """
+        for i in range(start, start + n):
+            wallet.transactions[txid(i)] = FakeTx([txid(i - 1)])
+
+    def test_rebuild_deep_chain(self):
+        wallet = FakeWallet([MINE])
+        self.make_chain(wallet, 3000)  # deeper than the recursion limit
+        index = FuzDepthIndex(wallet)
+        index.rebuild()
+        self.assertEqual(index.get_depth(txid(1)), 0)
+        self.assertEqual(index.get_depth(txid(2)), 1)
+        self.assertEqual(index.get_depth(txid(3000)), 900)
+        self.assertIsNone(index.get_depth(txid(0)))
+
+    def test_non_fuz(self):
+        wallet = FakeWallet([MINE])
+        wallet.transactions[txid(1)] = FakeTx([txid(0)], fuz=False)
+        wallet.transactions[txid(2)] = FakeTx([txid(1)], mine=False)
+        wallet.transactions[txid(3)] = FakeTx([txid(1)])
+        index = FuzDepthIndex(wallet)
+        index.rebuild()
+        self.assertEqual(index.get_depth(txid(1)), -1)
+        self.assertEqual(index.get_depth(txid(2)), -1)
+        self.assertEqual(index.get_depth(txid(3)), 0)
+
+    def test_min_over_parents(self):
+        wallet = FakeWallet([MINE])
+        self.make_chain(wallet, 5)
+        wallet.transactions[txid(100)] = FakeTx([txid(5), txid(2)])
+        index = FuzDepthIndex(wallet)
+        index.rebuild()
+        self.assertEqual(index.get_depth(txid(100)), 2)
+
+    def test_incremental_matches_rebuild(self):
+        wallet = FakeWallet([MINE])
+        index = FuzDepthIndex(wallet)
+        # Add txs children-first so that depths must propagate down when parents arrive
+        for i in reversed(range(1, 20)):
+            tx = wallet.transactions[txid(i)] = FakeTx([txid(i - 1)])
+            index.add_tx(txid(i), tx)
+        self.assertEqual(index.get_depth(txid(19)), 18)
+        tx = wallet.transactions[txid(0)] = FakeTx([txid(1000)])
+        index.add_tx(txid(0), tx)
+        self.assertEqual(index.get_depth(txid(19)), 19)
+        fresh = FuzDepthIndex(wallet)
+        fresh.rebuild()
+        self.assertEqual(fresh.depths, index.depths)
+        # Removing a tx in the middle lowers the depth of its descendants
+        index.remove_tx(txid(10))
+        self.assertEqual(index.get_depth(txid(10)), -1)
+        self.assertEqual(index.get_depth(txid(11)), 0)
+        self.assertEqual(index.get_depth(txid(19)), 8)
+        index.add_tx(txid(10), wallet.transactions[txid(10)])
+        self.assertEqual(index.get_depth(txid(19)), 19)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -*- mode: python3 -*-
+# Part of the Electron Cash SPV Wallet
+# License: MIT
+import secrets
+import threading
+import time
+import unittest
+from unittest import mock
+
+import ecdsa
+
+from electroncash import schnorr
+from electroncash.bitcoin import point_to_ser
+from .. import fusion_pb2 as pb
+from .. import server
+from ..comms import send_pb, recv_pb, get_current_genesis_hash
+from ..connection import open_connection
+from ..util import gen_keypair, sha256
+
+
+def make_covert_component(round_priv):
+    component = pb.Component(salt_commitment = secrets.token_bytes(32), blank = pb.BlankComponent()).SerializeToString()
+    signature = schnorr.sign(round_priv, sha256(component))
+    return pb.CovertComponent(signature = signature, component = component)
+
+
+class TestBlindNoncePool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = server.BlindNoncePool(20, max_workers = 2)
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def wait_full(self):
+        deadline = time.monotonic() + 60
+        while len(self.pool.nonces) < self.pool.target_size:
+            self.assertLess(time.monotonic(), deadline, "pool did not fill up")
+            time.sleep(0.05)
+
+    def test_unique_valid_nonces(self):
+        self.wait_full()
+        # ask for more than the pool holds, so some are generated on demand
+        signers = self.pool.get_signers(35)
+        self.assertEqual(len(signers), 35)
+        Rs = [s.get_R() for s in signers]
+        self.assertEqual(len(set(Rs)), len(Rs))
+        for signer in signers[::7]:
+            k = signer._kcontainer[0]
+            self.assertEqual(signer.get_R(), point_to_ser(k * ecdsa.SECP256k1.generator, comp=True))
+        # and it refills
+        self.wait_full()
+        Rs2 = [s.get_R() for s in self.pool.get_signers(20)]
+        self.assertFalse(set(Rs) & set(Rs2))
+
+    def test_signers_sign(self):
+        privkey = secrets.token_bytes(32)
+        signer, = self.pool.get_signers(1)
+        signer.sign(privkey, secrets.token_bytes(32))
+        with self.assertRaises(RuntimeError):
+            signer.sign(privkey, secrets.token_bytes(32))
+
+
+class _CovertServerTests:
+    server_class = None
+
+    def setUp(self):
+        self.server = self.make_server()
+        self.server.noisy = False
+        self.server.start()
+        self.round_priv, _, self.round_pub = gen_keypair()
+
+    def make_server(self):
+        return self.server_class('127.0.0.1')
+
+    def tearDown(self):
+        self.server.stop()
+        self.server.join(10)
+
+    def connect(self):
+        return open_connection('127.0.0.1', self.server.port)
+
+    def submit(self, conn, submsg):
+        send_pb(conn, pb.CovertMessage, submsg)
+        return recv_pb(conn, pb.CovertResponse, 'ok', 'error', timeout = 5)[1]
+
+    def test_components(self):
+        self.server.start_components(self.round_pub, 1000)
+        conns = [self.connect() for _ in range(3)]
+        try:
+            msgs = [make_covert_component(self.round_priv) for _ in conns]
+            for conn, msg in zip(conns, msgs):
+                send_pb(conn, pb.CovertMessage, pb.Ping())
+                self.assertEqual(self.submit(conn, msg), 'ok')
+            # only one submission per connection per phase
+            self.assertEqual(self.submit(conns[0], make_covert_component(self.round_priv)), 'error')
+            components = self.server.end_components()
+            self.assertEqual(set(components), set(m.component for m in msgs))
+        finally:
+            for conn in conns:
+                conn.close()
+
+    def test_bad_component(self):
+        self.server.start_components(self.round_pub, 1000)
+        msg = make_covert_component(self.round_priv)
+        msg.signature = bytes(64)
+        conn = self.connect()
+        try:
+            self.assertEqual(self.submit(conn, msg), 'error')
+            self.assertEqual(self.server.end_components(), {})
+        finally:
+            conn.close()
+
+    def test_wrong_time(self):
+        conn = self.connect()
+        try:
+            self.assertEqual(self.submit(conn, make_covert_component(self.round_priv)), 'error')
+        finally:
+            conn.close()
+
+
+class TestCovertServer(_CovertServerTests, unittest.TestCase):
+    server_class = server.CovertServer
+
+
+class TestAsyncCovertServer(_CovertServerTests, unittest.TestCase):
+    server_class = server.AsyncCovertServer
+
+    def make_server(self):
+        return self.server_class('127.0.0.1', max_connections = 3)
+
+    def test_connection_limit(self):
+        self.server.start_components(self.round_pub, 1000)
+        conns = [self.connect() for _ in range(4)]
+        try:
+            results = []
+            for conn in conns:
+                try:
+                    results.append(self.submit(conn, make_covert_component(self.round_priv)))
+                except server.FusionError:
+                    results.append(None)
+            self.assertEqual(results, ['ok', 'ok', 'ok', None])
+        finally:
+            for conn in conns:
+                conn.close()
+
+
+class FakeController:
+    """ Stands in for FusionController: just tells the players to begin. """
+    instances = []
+
+    def __init__(self, network, tier, clients, bindhost, upnp = None, announcehost = None, nonce_pool = None):
+        self.tier = tier
+        self.clients = clients
+        self.thread = threading.current_thread()
+        self.instances.append(self)
+
+    def start(self):
+        msg = pb.FusionBegin(tier = self.tier, covert_domain = b'localhost', covert_port = 1, server_time = int(time.time()))
+        for c in self.clients:
+            c.addjob(server.clientjob_send, msg)
+
+
+class _FusionServerTests:
+    server_class = None
+    # whether fusions are started from the server's own thread, whichever thread asks
+    fuse_in_server_thread = False
+    tier = server.Params.tiers[0]
+
+    def setUp(self):
+        # no curve operations happen while waiting, so don't insist on libsecp256k1
+        for patcher in (mock.patch.object(server.Params, 'blind_nonce_pool_size', 0),
+                        mock.patch.object(server.compatibility, 'check')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.server = self.server_class(None, object(), '127.0.0.1', 0)
+        self.server.noisy = False
+        self.server.start()
+        self.conns = []
+
+    def tearDown(self):
+        for conn in self.conns:
+            conn.close()
+        self.server.stop()
+        self.server.join(10)
+
+    def hello(self, version = server.Protocol.VERSION):
+        conn = open_connection('127.0.0.1', self.server.port)
+        self.conns.append(conn)
+        send_pb(conn, pb.ClientMessage, pb.ClientHello(version = version, genesis_hash = get_current_genesis_hash()))
+        return conn
+
+    def join(self):
+        conn = self.hello()
+        recv_pb(conn, pb.ServerMessage, 'serverhello')
+        send_pb(conn, pb.ClientMessage, pb.JoinPools(tiers = [self.tier]))
+        return conn
+
+    def recv_until(self, conn, mtype, check = lambda msg: True):
+        deadline = time.monotonic() + 10
+        while True:
+            self.assertLess(time.monotonic(), deadline)
+            msg, t = recv_pb(conn, pb.ServerMessage, 'tierstatusupdate', mtype, timeout = 5)
+            if t == mtype and check(msg):
+                return msg
+
+    def players(self, conn, n):
+        self.recv_until(conn, 'tierstatusupdate', lambda msg: msg.statuses[self.tier].players == n)
+
+    def test_bad_version(self):
+        conn = self.hello(version = b'bogus')
+        msg, mtype = recv_pb(conn, pb.ServerMessage, 'error', timeout = 5)
+        self.assertIn('version', msg.message)
+
+    def test_waiting_pools(self):
+        a = self.join()
+        self.players(a, 1)
+        b = self.join()
+        self.players(b, 2)
+        self.players(a, 2)
+        b.close()
+        self.players(a, 1)
+
+    @mock.patch.object(server, 'FusionController', FakeController)
+    def test_start_fuse(self):
+        FakeController.instances.clear()
+        conns = [self.join() for _ in range(3)]
+        for conn in conns:
+            self.players(conn, 3)
+        self.assertEqual(self.server.start_fuse(self.tier), 3)
+        for conn in conns:
+            self.assertEqual(self.recv_until(conn, 'fusionbegin').tier, self.tier)
+        fusion, = FakeController.instances
+        if self.fuse_in_server_thread:
+            self.assertIs(fusion.thread, self.server)
+        for c in fusion.clients:
+            self.assertIsInstance(c, server.ClientThread)
+        self.assertFalse(self.server.waiting_pools[self.tier].pool)
+
+
+class TestFusionServer(_FusionServerTests, unittest.TestCase):
+    server_class = server.FusionServer
+
+
+class TestAsyncFusionServer(_FusionServerTests, unittest.TestCase):
+    server_class = server.AsyncFusionServer
+    fuse_in_server_thread = True
+
+    def test_stop_kills_fusion_clients(self):
+        conn = self.join()
+        self.players(conn, 1)
+        with mock.patch.object(server, 'FusionController', mock.Mock()):
+            self.server.start_fuse(self.tier)
+        client, = self.server.fusion_clients
+        self.server.stop('bye')
+        msg, mtype = recv_pb(conn, pb.ServerMessage, 'error', timeout = 5)
+        self.assertEqual(msg.message, 'bye')
+        client.join(5)
+        self.assertTrue(client.dead)
+
+
+if __name__ == '__main__':
+    unittest.main()
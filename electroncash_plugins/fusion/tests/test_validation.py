@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -*- mode: python3 -*-
+# Part of the Electron Cash SPV Wallet
+# License: MIT
+import threading
+import unittest
+
+from electroncash.address import Address
+from electroncash.util import ServerError, TimeoutException
+from .. import fusion_pb2 as pb
+from .. import validation
+from ..util import gen_keypair
+
+
+class FakeNetwork:
+    """ Answers listunspent from a dict of scripthash -> utxo list, from another thread. """
+
+    def __init__(self, utxos, height = 1000, coinbases = None):
+        self.utxos = utxos
+        self.height = height
+        self.coinbases = coinbases or {}
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def queue_request(self, method, params, interface=None, *, callback=None, max_qlen=None):
+        with self.lock:
+            self.requests.append((method, params))
+        sh = params[0]
+        if sh in self.utxos:
+            response = {'method': method, 'params': params, 'result': self.utxos[sh]}
+        else:
+            response = {'method': method, 'params': params, 'error': 'bad scripthash'}
+        threading.Timer(0.01, callback, (response,)).start()
+
+    def get_server_height(self):
+        return self.height
+
+    def blockchain(self):
+        raise RuntimeError('no headers')
+
+    def synchronous_get(self, request, timeout=30):
+        method, (height, pos) = request
+        assert method == 'blockchain.transaction.id_from_pos' and pos == 0
+        with self.lock:
+            self.requests.append(request)
+        return self.coinbases.get(height, 'ff' * 32)
+
+
+def make_input(pubkey, txid, n, amount):
+    return pb.InputComponent(prev_txid = bytes.fromhex(txid)[::-1], prev_index = n, pubkey = pubkey, amount = amount)
+
+
+class TestInputValidator(unittest.TestCase):
+
+    def setUp(self):
+        validation.coinbase_cache = validation.CoinbaseCache()
+        _, _, self.pubkey = gen_keypair()
+        self.sh = Address.from_pubkey(self.pubkey).to_scripthash_hex()
+        self.utxos = {self.sh: [
+            {'tx_hash': 'aa' * 32, 'tx_pos': 0, 'height': 500, 'value': 10000},
+            {'tx_hash': 'bb' * 32, 'tx_pos': 1, 'height': 500, 'value': 20000},
+            {'tx_hash': 'cc' * 32, 'tx_pos': 0, 'height': 0, 'value': 30000},
+            {'tx_hash': 'dd' * 32, 'tx_pos': 0, 'height': 950, 'value': 40000},
+        ]}
+
+    def test_checks_and_dedup(self):
+        network = FakeNetwork(self.utxos)
+        v = validation.InputValidator(network)
+        inputs = [make_input(self.pubkey, 'aa' * 32, 0, 10000), make_input(self.pubkey, 'bb' * 32, 1, 20000)]
+        v.prefetch(inputs)
+        for inp in inputs:
+            v.check(inp)
+        # one lookup for both inputs on the same address
+        self.assertEqual(network.requests, [('blockchain.scripthash.listunspent', [self.sh])])
+
+        with self.assertRaises(validation.ValidationError):
+            v.check(make_input(self.pubkey, 'aa' * 32, 1, 10000))
+        with self.assertRaises(validation.ValidationError):
+            v.check(make_input(self.pubkey, 'bb' * 32, 1, 20001))
+        with self.assertRaises(validation.ValidationError):
+            v.check(make_input(self.pubkey, 'cc' * 32, 0, 30000))
+        self.assertEqual(len(network.requests), 1)
+
+    def test_immature_coinbase(self):
+        network = FakeNetwork(self.utxos, coinbases = {950: 'dd' * 32})
+        v = validation.InputValidator(network)
+        with self.assertRaises(validation.ValidationError) as cm:
+            v.check(make_input(self.pubkey, 'dd' * 32, 0, 40000))
+        self.assertIn('coinbase', str(cm.exception))
+        # old enough coins aren't looked up
+        v.check(make_input(self.pubkey, 'aa' * 32, 0, 10000))
+        self.assertNotIn(('blockchain.transaction.id_from_pos', [500, 0]), network.requests)
+        # the coinbase txid is cached, so the server is not asked again
+        network.coinbases = {950: 'ee' * 32}
+        with self.assertRaises(validation.ValidationError):
+            v.check(make_input(self.pubkey, 'dd' * 32, 0, 40000))
+
+    def test_server_error(self):
+        network = FakeNetwork({})
+        v = validation.InputValidator(network)
+        with self.assertRaises(ServerError):
+            v.check(make_input(self.pubkey, 'aa' * 32, 0, 10000))
+        # errors are not cached
+        network.utxos = self.utxos
+        v.check(make_input(self.pubkey, 'aa' * 32, 0, 10000))
+
+    def test_timeout(self):
+        network = FakeNetwork(self.utxos)
+        network.queue_request = lambda *args, **kwargs: None
+        v = validation.InputValidator(network, timeout = 0.05)
+        with self.assertRaises(TimeoutException):
+            v.check(make_input(self.pubkey, 'aa' * 32, 0, 10000))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -27,6 +27,7 @@
 """
 Some basic validation primitives
 """
+import threading
 
 from . import fusion_pb2 as pb
 from . import pedersen
@@ -37,6 +38,7 @@ from .protocol import Protocol
 from electroncash.address import Address
 from electroncash.transaction import TYPE_ADDRESS, get_address_from_output_script
 import electroncash.schnorr as schnorr
+from electroncash.util import ServerError, TimeoutException
 
 from google.protobuf.message import DecodeError
 
@@ -228,27 +230,127 @@ def validate_blame(blame, encproof, src_commit_blob, dest_commit_blob, all_compo
     return inpcomp
 
 
+class CoinbaseCache:
+    """ Remembers the coinbase txids of recent blocks, as needed to tell
+    whether an input spends an immature coinbase. Entries are keyed by
+    block hash (where we have the header) so they don't survive a reorg,
+    and entries older than COINBASE_MATURITY blocks are dropped. """
+    COINBASE_MATURITY = 100
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.txids = dict()  # (height, block hash or None) -> coinbase txid
+
+    @staticmethod
+    def _key(network, height):
+        try:
+            return height, network.blockchain().get_hash(height)
+        except Exception:
+            return height, None
+
+    def get(self, network, height, timeout):
+        """ Returns the txid of the coinbase of block `height`. Raises like
+        Network.synchronous_get if it is not cached and the lookup fails. """
+        key = self._key(network, height)
+        with self.lock:
+            txid = self.txids.get(key)
+        if txid is None:
+            txid = network.synchronous_get(('blockchain.transaction.id_from_pos', [height, 0]), timeout=timeout)
+            with self.lock:
+                self.txids[key] = txid
+                tip = network.get_server_height() or height
+                for k in [k for k in self.txids if k[0] <= tip - self.COINBASE_MATURITY]:
+                    del self.txids[k]
+        return txid
+
+coinbase_cache = CoinbaseCache()
+
+
+class InputValidator:
+    """ Checks InputComponents against the electrumx service, for a whole
+    round's worth of inputs:
+
+    - Call prefetch() with all the inputs that will need checking; this sends
+      all the lookups at once, spread over the network's interfaces.
+    - Then call check() on each of them (from any thread). Inputs on the same
+      address share a single lookup.
+
+    Successful lookups are kept for the lifetime of this object, which should
+    therefore only be used for one round. """
+
+    def __init__(self, network, timeout = 5):
+        self.network = network
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.events = dict()  # scripthash -> threading.Event, set once a reply arrived
+        self.replies = dict()  # scripthash -> (error, result)
+
+    def _request(self, sh):
+        with self.lock:
+            ev = self.events.get(sh)
+            if ev is not None:
+                return ev
+            ev = self.events[sh] = threading.Event()
+        def callback(response):
+            with self.lock:
+                self.replies[sh] = response.get('error'), response.get('result')
+            ev.set()
+        self.network.queue_request('blockchain.scripthash.listunspent', [sh], interface='random', callback=callback)
+        return ev
+
+    def _forget(self, sh, ev):
+        # Don't keep failures around; a later check may try again.
+        with self.lock:
+            if self.events.get(sh) is ev:
+                del self.events[sh]
+                self.replies.pop(sh, None)
+
+    def prefetch(self, inpcomps):
+        for inpcomp in inpcomps:
+            self._request(Address.from_pubkey(inpcomp.pubkey).to_scripthash_hex())
+
+    def check(self, inpcomp):
+        """ Returns normally if the check passed. Raises ValidationError if the
+        input is not consistent with blockchain (according to server), and
+        raises other exceptions if the server times out or gives an
+        unexpected kind of response. """
+        address = Address.from_pubkey(inpcomp.pubkey)
+        prevhash = inpcomp.prev_txid[::-1].hex()
+        prevn = inpcomp.prev_index
+        sh = address.to_scripthash_hex()
+        ev = self._request(sh)
+        if not ev.wait(self.timeout):
+            self._forget(sh, ev)
+            raise TimeoutException('Server did not answer')
+        with self.lock:
+            error, u = self.replies[sh]
+        if error:
+            self._forget(sh, ev)
+            raise ServerError(error)
+        for item in u:
+            if prevhash == item['tx_hash'] and prevn == item['tx_pos']:
+                break
+        else:
+            raise ValidationError('missing or spent or scriptpubkey mismatch')
+
+        check(item['height'] > 0, 'not confirmed')
+        check(item['value'] == inpcomp.amount, 'amount mismatch')
+
+        # The fusion tx can be mined in the next block at the earliest, so
+        # a coinbase is immature if it is less than 99 blocks deep now.
+        tip = self.network.get_server_height()
+        if tip and tip - item['height'] < CoinbaseCache.COINBASE_MATURITY - 1:
+            coinbase_txid = coinbase_cache.get(self.network, item['height'], self.timeout)
+            check(coinbase_txid != prevhash, 'immature coinbase')
+
+
 def check_input_electrumx(network, inpcomp):
     """ Check an InputComponent against electrumx service. This can be a bit slow
-    since it gets all utxos on that address.
+    since it gets all utxos on that address. To check many inputs, use an
+    InputValidator instead.
 
     Returns normally if the check passed. Raises ValidationError if the input is not
     consistent with blockchain (according to server), and raises other exceptions if
     the server times out or gives an unexpected kind of response.
     """
-    address = Address.from_pubkey(inpcomp.pubkey)
-    prevhash = inpcomp.prev_txid[::-1].hex()
-    prevn = inpcomp.prev_index
-    sh = address.to_scripthash_hex()
-    u = network.synchronous_get(('blockchain.scripthash.listunspent', [sh]), timeout=5)
-    for item in u:
-        if prevhash == item['tx_hash'] and prevn == item['tx_pos']:
-            break
-    else:
-        raise ValidationError('missing or spent or scriptpubkey mismatch')
-
-    check(item['height'] > 0, 'not confirmed')
-    check(item['value'] == inpcomp.amount, 'amount mismatch')
-    # Not checked: is it a coinbase? is it matured?
-    # A feasible strategy to identify unmatured coinbase is to cache the results
-    # of blockchain.transaction.id_from_pos(height, 0) from the last 100 blocks.
+    InputValidator(network).check(inpcomp)
@@ -161,11 +161,11 @@ def my_custom_utxo_context_menu_setup(window, utxo_list, menu, selected):
     menu.addSection(_('CashShuffle'))
     def on_reshuffle():
         wallet._reshuffles.update(set(shuffled_selected))
-        utxo_list.update()
+        utxo_list.update_all()
 
     def on_cancel_reshuffles():
         wallet._reshuffles.difference_update(set(reshuffles_selected))
-        utxo_list.update()
+        utxo_list.update_all()
 
     len_shufs, len_reshufs = len(shuffled_selected), len(reshuffles_selected)
     if len_shufs:
@@ -293,7 +293,7 @@ def update_coin_status(window, coin_name, msg):
             window.utxo_list.in_progress.pop(coin_name, None)
         else:
             window.utxo_list.in_progress[coin_name] = new_in_progress
-        window.utxo_list.update()
+        window.utxo_list.update_all()
 
 def _got_tx_check_tentative_shuffles(window, tx):
     ''' GUI thread: Got a new transaction for a window, so see if we should
@@ -767,7 +767,7 @@ class Plugin(BasePlugin):
         self.windows.append(window)
         self._increment_session_counter(window)
         window.update_status()
-        window.utxo_list.update()
+        window.utxo_list.update_all()
         start_background_shuffling(window, network_settings, password=password)
         return True
 
@@ -876,7 +876,7 @@ class Plugin(BasePlugin):
             self.print_error("Window '{}' closed, ended shuffling for its wallet".format(name))
         self.windows.remove(window)
         monkey_patches_remove(window)
-        window.utxo_list.update()
+        window.utxo_list.update_all()
         window.update_status()
         self.print_error("Window '{}' disabled".format(name))
         if add_to_disabled:
@@ -1421,7 +1421,7 @@ class SendTabExtra(QFrame, PrintError):
             self.window.background_process.set_paused(b)
             # Note: GUI refresh() wil later also set this string but we set it immediately here so UI feel peppier
             self.pauseBut.setText(_("Pause Shuffling") if not b else _("Shuffling Paused"))
-            self.window.utxo_list.update()
+            self.window.utxo_list.update_all()
 
     def do_clear(self): # called by plugin hook do_clear()
         self.forceUnpause()